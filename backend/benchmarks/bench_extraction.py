@@ -0,0 +1,125 @@
+"""Micro-benchmark for video URL extraction on large pages.
+
+Compares ``src.extraction.extract_video_sources`` with a port of the app's
+sequential-regex extractor on synthetic multi-megabyte pages.
+
+Run from the backend directory::
+
+    python -m benchmarks.bench_extraction --sizes 1 4 16 --repeat 5
+"""
+
+import argparse
+import json
+import random
+import re
+import statistics
+import time
+from typing import Callable, List
+
+from src.extraction import extract_video_sources
+
+# Port of WebScrapingService._extractVideoUrlsFromScript and
+# _extractQualityFromUrl: every pattern scans the whole page in turn.
+LEGACY_PATTERNS = [
+    re.compile(r'"(https?://[^"]*\.m3u8[^"]*)"', re.IGNORECASE),
+    re.compile(r'"(https?://[^"]*\.mp4[^"]*)"', re.IGNORECASE),
+    re.compile(r'"(https?://[^"]*\.mkv[^"]*)"', re.IGNORECASE),
+    re.compile(r'"(https?://[^"]*\.avi[^"]*)"', re.IGNORECASE),
+    re.compile(r'"(https?://[^"]*\.webm[^"]*)"', re.IGNORECASE),
+    re.compile(r"src:\s*[\"'`]([^\"'`]+)[\"'`]", re.IGNORECASE),
+    re.compile(r"file:\s*[\"'`]([^\"'`]+)[\"'`]", re.IGNORECASE),
+    re.compile(r"source:\s*[\"'`]([^\"'`]+)[\"'`]", re.IGNORECASE),
+    re.compile(r"url:\s*[\"'`]([^\"'`]+)[\"'`]", re.IGNORECASE),
+    re.compile(r"stream:\s*[\"'`]([^\"'`]+)[\"'`]", re.IGNORECASE),
+    re.compile(r'"(?:videoUrl|streamUrl|playUrl)":\s*"([^"]+)"', re.IGNORECASE),
+    re.compile(
+        r'"(?:file|src|url)":\s*"([^"]+\.(?:mp4|m3u8|mkv|avi|webm)[^"]*)"',
+        re.IGNORECASE,
+    ),
+]
+LEGACY_QUALITY = [
+    re.compile(r"(\d+p)", re.IGNORECASE),
+    re.compile(r"(\d+x\d+)", re.IGNORECASE),
+    re.compile(r"(hd|sd|uhd|4k|1080|720|480|360)", re.IGNORECASE),
+]
+
+
+def legacy_extract(html: str) -> List[str]:
+    found = []
+    for pattern in LEGACY_PATTERNS:
+        for match in pattern.finditer(html):
+            url = match.group(1)
+            lowered = url.lower()
+            if any(ext in lowered for ext in (".mp4", ".m3u8", ".mkv", ".webm")) or (
+                "stream" in url or "video" in url or "player" in url
+            ):
+                for quality in LEGACY_QUALITY:
+                    if quality.search(url):
+                        break
+                found.append(url)
+    return found
+
+
+FILLER = (
+    '<div class="card"><a href="/title/{n}"><img src="/img/{n}.jpg"></a>'
+    '<h3 class="title">Title {n}</h3><p class="summary">Lorem ipsum dolor sit '
+    "amet, consectetur adipiscing elit, sed do eiusmod tempor.</p></div>\n"
+)
+PLAYER = (
+    '<script>jwplayer("p{n}").setup({{file: "https://cdn.example.com/v/{n}/720p.m3u8",'
+    ' "videoUrl": "https://cdn.example.com/v/{n}/1080p.mp4"}});</script>\n'
+)
+
+
+def make_page(megabytes: float, seed: int = 7) -> str:
+    """Build a synthetic listing page with a player script every ~50 cards"""
+    rng = random.Random(seed)
+    parts = []
+    size = 0
+    n = 0
+    while size < megabytes * 1024 * 1024:
+        chunk = FILLER.format(n=n)
+        if rng.random() < 0.02:
+            chunk += PLAYER.format(n=n)
+        parts.append(chunk)
+        size += len(chunk)
+        n += 1
+    return "".join(parts)
+
+
+def time_it(function: Callable[[], object], repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = []
+    for megabytes in args.sizes:
+        page = make_page(megabytes)
+        legacy = time_it(lambda: legacy_extract(page), args.repeat)
+        single = time_it(lambda: extract_video_sources(page), args.repeat)
+        results.append(
+            {
+                "page_mb": megabytes,
+                "sources_found": len(extract_video_sources(page)),
+                "legacy_ms": round(statistics.median(legacy) * 1000, 2),
+                "single_pass_ms": round(statistics.median(single) * 1000, 2),
+                "speedup": round(
+                    statistics.median(legacy) / statistics.median(single), 2
+                ),
+            }
+        )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
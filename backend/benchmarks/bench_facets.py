@@ -0,0 +1,139 @@
+"""Latency of filtered, faceted GET /media queries on large catalogs.
+
+Builds a ``FacetIndex`` over synthetic items (streamed, so a million
+items fit in memory) and times random genre / year range / quality
+filters: the filter bitmaps, their intersection, the disjunctive facet
+counts and the first page of ids, i.e. everything but loading the page's
+items from the catalog. As a baseline, the same filters are run as a
+scan over pre-extracted (genre, year, qualities) tuples and only count
+the matches, which is a lower bound for any scan of the catalog itself.
+
+Run from the backend directory::
+
+    python -m benchmarks.bench_facets --items 100000 1000000
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+from itertools import islice
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from benchmarks.synthetic import GENRES, QUALITIES, make_item
+from src.facets import FacetIndex, facet_values
+
+PAGE_SIZE = 50
+
+Values = Tuple[Optional[str], Optional[int], FrozenSet[str]]
+Query = Tuple[List[str], Optional[int], Optional[int], List[str]]
+
+
+def indexed(count: int, seed: int, values: List[Values]):
+    # Record each item's facet values for the scan while the index consumes it.
+    for n in range(count):
+        item = make_item(n, seed)
+        extracted: Dict[str, list] = {"genre": [], "year": [], "quality": []}
+        for facet, key, _label in facet_values(item):
+            extracted[facet].append(key)
+        values.append(
+            (
+                extracted["genre"][0] if extracted["genre"] else None,
+                extracted["year"][0] if extracted["year"] else None,
+                frozenset(extracted["quality"]),
+            )
+        )
+        yield item
+
+
+def queries(seed: int, count: int) -> List[Tuple[str, Query]]:
+    rng = random.Random(seed + 1)
+    genres = [genre.lower() for genre in GENRES]
+    found = []
+    for _ in range(count):
+        year = rng.randint(1960, 2020)
+        found.append(("genre", ([rng.choice(genres)], None, None, [])))
+        found.append(("genre_years", ([rng.choice(genres)], year, year + 5, [])))
+        found.append(
+            (
+                "two_genres_years_quality",
+                (rng.sample(genres, 2), year, year + 10, [rng.choice(QUALITIES)]),
+            )
+        )
+    return found
+
+
+def scan(values: List[Values], query: Query) -> int:
+    genres, year_from, year_to, qualities = query
+    genres, qualities = set(genres), set(qualities)
+    return sum(
+        1
+        for genre, year, item_qualities in values
+        if (not genres or genre in genres)
+        and (year_from is None or (year is not None and year >= year_from))
+        and (year_to is None or (year is not None and year <= year_to))
+        and (not qualities or not qualities.isdisjoint(item_qualities))
+    )
+
+
+def summary(timings: List[float]) -> dict:
+    return {
+        "p50_ms": round(statistics.median(timings) * 1000, 2),
+        "p99_ms": round(statistics.quantiles(timings, n=100)[98] * 1000, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--scans", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    results = []
+    for count in args.items:
+        index = FacetIndex()
+        values: List[Values] = []
+        started = time.perf_counter()
+        index.build(indexed(count, args.seed, values))
+        build_seconds = time.perf_counter() - started
+
+        timings: Dict[str, List[float]] = {}
+        scan_timings: Dict[str, List[float]] = {}
+        for kind, query in queries(args.seed, args.queries):
+            started = time.perf_counter()
+            filters = index.filters(*query)
+            matched = index.match(filters)
+            total = len(matched)
+            index.counts(filters)
+            list(islice(index.iter_ids(matched), PAGE_SIZE))
+            timings.setdefault(kind, []).append(time.perf_counter() - started)
+
+            if len(scan_timings.get(kind, ())) < args.scans:
+                started = time.perf_counter()
+                assert scan(values, query) == total
+                scan_timings.setdefault(kind, []).append(
+                    time.perf_counter() - started
+                )
+        results.append(
+            {
+                "items": count,
+                "build_seconds_incl_item_generation": round(build_seconds, 1),
+                "queries": {
+                    kind: {
+                        "bitmap": summary(timings[kind]),
+                        "scan_count_only_p50_ms": round(
+                            statistics.median(scan_timings[kind]) * 1000, 1
+                        ),
+                    }
+                    for kind in timings
+                },
+            }
+        )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Throughput of POST /admin/ingest and its effect on the event loop.
+
+Writes a gzip-compressed NDJSON feed of synthetic items, optionally
+preloads the app's catalog, and ingests the feed through ``ingest`` with
+every index the app keeps subscribed to the catalog. A ticker task
+measures how long the event loop is blocked meanwhile; that stall is the
+latency a live request would see. Preloaded items get even numbers and
+feed items odd ones, so new ids land all over the sorted id index.
+
+Run from the backend directory::
+
+    python -m benchmarks.bench_ingest --items 100000 --existing 100000
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import AsyncIterator, List
+
+from benchmarks.load_test import percentile
+from benchmarks.synthetic import make_item
+from src.ingest import DEFAULT_BATCH_SIZE
+
+CHUNK_SIZE = 64 * 1024
+TICK_SECONDS = 0.005
+
+
+def write_feed(path: str, numbers: range, seed: int) -> int:
+    with gzip.open(path, "wb", compresslevel=6) as feed:
+        for n in numbers:
+            feed.write(make_item(n, seed).model_dump_json().encode() + b"\n")
+    return os.path.getsize(path)
+
+
+async def read_chunks(path: str) -> AsyncIterator[bytes]:
+    with open(path, "rb") as feed:
+        while True:
+            chunk = feed.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+async def ticker(stalls: List[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        stalls.append(time.perf_counter() - started - TICK_SECONDS)
+
+
+async def run(args: argparse.Namespace, feed_path: str) -> dict:
+    from src.ingest import ingest
+    from src.main import CATALOG
+
+    started = time.perf_counter()
+    if args.existing:
+        CATALOG.upsert_many(make_item(2 * n, args.seed) for n in range(args.existing))
+    preload_seconds = time.perf_counter() - started
+
+    stalls: List[float] = []
+    stop = asyncio.Event()
+    tick = asyncio.create_task(ticker(stalls, stop))
+    started = time.perf_counter()
+    report = await ingest(CATALOG, read_chunks(feed_path), batch_size=args.batch)
+    seconds = time.perf_counter() - started
+    stop.set()
+    await tick
+    stalls.sort()
+    return {
+        "items": args.items,
+        "existing": args.existing,
+        "batch": args.batch,
+        "preload_seconds": round(preload_seconds, 2),
+        "ingest_seconds": round(seconds, 2),
+        "items_per_second": round(report.upserted / seconds),
+        "failed": report.failed,
+        "catalog_size": len(CATALOG),
+        "loop_stall_p50_ms": round(percentile(stalls, 0.50) * 1000, 2),
+        "loop_stall_p99_ms": round(percentile(stalls, 0.99) * 1000, 2),
+        "loop_stall_max_ms": round(stalls[-1] * 1000, 2) if stalls else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--existing", type=int, default=0)
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="streamy-ingest-") as tmp:
+        feed_path = os.path.join(tmp, "feed.ndjson.gz")
+        started = time.perf_counter()
+        feed_bytes = write_feed(feed_path, range(1, 2 * args.items, 2), args.seed)
+        feed_seconds = time.perf_counter() - started
+        result = asyncio.run(run(args, feed_path))
+    result["feed_mb"] = round(feed_bytes / 1024 / 1024, 1)
+    result["feed_write_seconds"] = round(feed_seconds, 2)
+    result["python"] = sys.version.split()[0]
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Memory cost per item of the in-memory catalog backends.
+
+Fills ``InMemoryCatalog`` (pydantic objects in a dict) and
+``CompactCatalog`` (columnar storage) with the same synthetic items and
+reports the bytes retained per item, measured with tracemalloc, along
+with the cost of materializing items on read.
+
+Run from the backend directory::
+
+    python -m benchmarks.bench_memory --items 10000 100000
+"""
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from typing import Callable
+
+from benchmarks.synthetic import media_id, populate
+from src.catalog import InMemoryCatalog, MediaCatalog
+from src.compact import CompactCatalog
+
+
+def measure(factory: Callable[[], MediaCatalog], items: int, seed: int) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    catalog = factory()
+    populate(catalog, 0, items, seed)
+    load_seconds = time.perf_counter() - started
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    reads = min(items, 20000)
+    for n in range(reads):
+        catalog.get(media_id(n))
+    get_us = (time.perf_counter() - started) / reads * 1e6
+    started = time.perf_counter()
+    for _ in catalog.iter_text():
+        pass
+    iter_text_ms = (time.perf_counter() - started) * 1000
+    return {
+        "bytes_per_item": round(retained / items),
+        "total_mb": round(retained / 1024 / 1024, 1),
+        "load_seconds": round(load_seconds, 2),
+        "get_us": round(get_us, 2),
+        "iter_text_ms": round(iter_text_ms, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    results = []
+    for items in args.items:
+        before = measure(InMemoryCatalog, items, args.seed)
+        after = measure(CompactCatalog, items, args.seed)
+        results.append(
+            {
+                "items": items,
+                "in_memory": before,
+                "compact": after,
+                "reduction": round(
+                    before["bytes_per_item"] / after["bytes_per_item"], 2
+                ),
+            }
+        )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
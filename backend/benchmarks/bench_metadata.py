@@ -0,0 +1,190 @@
+"""Metadata proxy against a local fake TMDB, with an upstream request count.
+
+Starts a fake TMDB ``/search/multi`` on a local port that answers after a
+fixed latency and counts the requests it receives, then drives a
+``MetadataProxy`` pointed at it through the scenarios the proxy exists for:
+
+* ``burst``: many concurrent lookups of one uncached query;
+* ``traffic``: skewed (Pareto) query popularity from concurrent clients;
+* ``stale``: lookups after the TTL expired, answered from the stale entry
+  while one background request refreshes it;
+* ``restart``: a new proxy on the same cache directory (disk tier);
+* ``outage``: the upstream failing, with entries past their stale window.
+
+The proxy clock is simulated, so the TTL scenarios run instantly.
+
+Run from the backend directory::
+
+    python -m benchmarks.bench_metadata --requests 20000 --queries 2000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from aiohttp import web
+
+from benchmarks.load_test import percentile
+from src.metadata_proxy import MetadataProxy, MetadataStats
+from src.scraping import Scraper
+
+API_KEY = "fake-key"
+
+
+class FakeTmdb:
+    """Local stand-in for TMDB's multi search"""
+
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.requests: Counter = Counter()
+        self.failing = False
+
+    async def search(self, request: web.Request) -> web.Response:
+        query = request.query.get("query", "")
+        self.requests[query] += 1
+        await asyncio.sleep(self.latency)
+        if self.failing:
+            return web.Response(status=503)
+        results = [
+            {"id": n, "title": f"{query.title()} {n}", "media_type": "movie"}
+            for n in range(20)
+        ]
+        return web.json_response({"page": 1, "results": results})
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = time.time()
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def lookups(
+    proxy: MetadataProxy, base_url: str, queries: List[str], concurrency: int
+) -> List[float]:
+    pending = iter(queries)
+    timings: List[float] = []
+
+    async def client() -> None:
+        for query in pending:
+            started = time.perf_counter()
+            await proxy.tmdb_search(base_url, API_KEY, query)
+            timings.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return sorted(timings)
+
+
+def report(
+    fake: FakeTmdb,
+    before: Tuple[int, MetadataStats],
+    proxy: MetadataProxy,
+    timings: List[float],
+) -> Dict:
+    """Upstream requests, cache outcomes and latency since before"""
+    requests, previous = before
+    stats = proxy.stats()
+    hits = sum(
+        getattr(stats, name) - getattr(previous, name)
+        for name in ("memory_hits", "disk_hits", "stale_hits")
+    )
+    return {
+        "lookups": len(timings),
+        "upstream_requests": sum(fake.requests.values()) - requests,
+        "hit_ratio": round(hits / len(timings), 4) if timings else 0.0,
+        "disk_hits": stats.disk_hits - previous.disk_hits,
+        "stale_hits": stats.stale_hits - previous.stale_hits,
+        "coalesced": stats.coalesced - previous.coalesced,
+        "revalidations": stats.revalidations - previous.revalidations,
+        "p50_ms": round(percentile(timings, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(timings, 0.99) * 1000, 3),
+    }
+
+
+async def run(args: argparse.Namespace, cache_dir: str) -> Dict:
+    fake = FakeTmdb(args.latency / 1000)
+    app = web.Application()
+    app.router.add_get("/3/search/multi", fake.search)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    base_url = f"http://127.0.0.1:{port}/3"
+
+    scraper = Scraper()
+    clock = Clock()
+
+    def new_proxy() -> MetadataProxy:
+        return MetadataProxy(
+            scraper, cache_dir, ttl=args.ttl, stale_ttl=args.stale_ttl, clock=clock
+        )
+
+    results = {}
+    try:
+        proxy = new_proxy()
+        before = sum(fake.requests.values()), proxy.stats()
+        timings = await lookups(proxy, base_url, ["burst"] * args.burst, args.burst)
+        results["burst"] = report(fake, before, proxy, timings)
+
+        rng = random.Random(args.seed)
+        population = [f"title {n}" for n in range(args.queries)]
+        # Pareto ranks: a few queries are asked for very often.
+        traffic = [
+            population[min(int(rng.paretovariate(1.2)) - 1, args.queries - 1)]
+            for _ in range(args.requests)
+        ]
+        proxy = new_proxy()
+        before = sum(fake.requests.values()), proxy.stats()
+        timings = await lookups(proxy, base_url, traffic, args.concurrency)
+        results["traffic"] = report(fake, before, proxy, timings)
+        results["traffic"]["distinct_queries"] = len(set(traffic))
+
+        clock.now += args.ttl + 1
+        hot = [query for query, _ in Counter(traffic).most_common(10)]
+        before = sum(fake.requests.values()), proxy.stats()
+        timings = await lookups(proxy, base_url, hot * 50, args.concurrency)
+        await asyncio.sleep(args.latency / 1000 * 3)
+        results["stale"] = report(fake, before, proxy, timings)
+
+        proxy = new_proxy()
+        before = sum(fake.requests.values()), proxy.stats()
+        timings = await lookups(proxy, base_url, hot * 50, args.concurrency)
+        results["restart"] = report(fake, before, proxy, timings)
+
+        fake.failing = True
+        clock.now += args.ttl + args.stale_ttl + 1
+        before = sum(fake.requests.values()), proxy.stats()
+        timings = await lookups(proxy, base_url, hot, args.concurrency)
+        results["outage"] = report(fake, before, proxy, timings)
+    finally:
+        await scraper.close()
+        await runner.cleanup()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--burst", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=50.0, help="upstream ms")
+    parser.add_argument("--ttl", type=float, default=3600.0)
+    parser.add_argument("--stale-ttl", type=float, default=86400.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="streamy-metadata-") as cache_dir:
+        results = asyncio.run(run(args, cache_dir))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
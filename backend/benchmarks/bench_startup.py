@@ -0,0 +1,142 @@
+"""Server startup time from a SQLite catalog versus a mapped snapshot.
+
+For each catalog size, writes the same synthetic catalog to a SQLite
+file and, with its search, suggest and facet indexes, to a binary
+snapshot. Then imports ``src.main`` in a fresh interpreter four ways:
+with no catalog (the import cost of the app itself), with
+``STREAMY_CATALOG_DB`` (the catalog is read and every index built from
+it), with ``STREAMY_CATALOG_DB`` and the index snapshot saved beside the
+database (the indexes are mapped) and with ``STREAMY_CATALOG_SNAPSHOT``
+(everything is mapped and decoded on use). Each run reports the import time, resident memory and the
+latency of the first and second call of each kind of query, since with
+a snapshot the first call pays for decoding what it touches.
+
+Run from the backend directory::
+
+    python -m benchmarks.bench_startup --items 10000 100000
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict
+
+from benchmarks.load_test import BACKEND_DIR
+from benchmarks.synthetic import media_id, populate
+from src.catalog import SnapshotCatalog, SQLiteCatalog
+from src.compact import CompactCatalog
+from src.indexes import build_indexes, load_indexes, write_index_snapshot, write_indexes
+from src.snapshot import Snapshot, SnapshotWriter
+
+# Runs in the child interpreter; prints one JSON object.
+_PROBE = """
+import json, os, sys, time
+
+started = time.perf_counter()
+import src.main as main
+seconds = time.perf_counter() - started
+middle = sys.argv[1]
+queries = {
+    "get": lambda: main.CATALOG.get(middle),
+    "page": lambda: main.CATALOG.page(middle, 50),
+    "search": lambda: main.SEARCH_INDEX.search("midnight river", 20),
+    "suggest": lambda: main.SUGGEST_INDEX.suggest("hol", 10),
+    "facets": lambda: main.FACET_INDEX.counts(
+        main.FACET_INDEX.filters(genres=["drama"], year_from=1990)
+    ),
+}
+latency = {}
+for name, query in queries.items():
+    for call in ("first", "second"):
+        started = time.perf_counter()
+        query()
+        latency[f"{name}_{call}_ms"] = round((time.perf_counter() - started) * 1000, 3)
+print(json.dumps({
+    "catalog": type(main.CATALOG).__name__,
+    "items": len(main.CATALOG),
+    "import_seconds": round(seconds, 3),
+    # Resident now (ru_maxrss would include the parent's peak from before exec).
+    "rss_mb": round(
+        int(open("/proc/self/statm").read().split()[1])
+        * os.sysconf("SC_PAGE_SIZE") / 1e6, 1
+    ),
+    **latency,
+}))
+"""
+
+
+def probe(env: Dict[str, str], middle: str) -> Dict:
+    environ = {
+        name: value
+        for name, value in os.environ.items()
+        if not name.startswith("STREAMY_CATALOG_")
+    }
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE, middle],
+        cwd=BACKEND_DIR,
+        env={**environ, **env},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def write_snapshot(path: str, items: int, seed: int) -> Dict:
+    catalog = CompactCatalog()
+    populate(catalog, 0, items, seed)
+    indexes = build_indexes(catalog)
+
+    started = time.perf_counter()
+    with SnapshotWriter(path) as writer:
+        positions = catalog.write_snapshot(writer)
+        write_indexes(writer, indexes, positions)
+    seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    snapshot = Snapshot(path)
+    SnapshotCatalog(snapshot)
+    load_indexes(snapshot)
+    return {
+        "write_seconds": round(seconds, 3),
+        "open_ms": round((time.perf_counter() - started) * 1000, 2),
+        "megabytes": round(os.path.getsize(path) / 1e6, 1),
+    }
+
+
+def run(items: int, seed: int, directory: str) -> Dict:
+    database = os.path.join(directory, f"catalog-{items}.db")
+    snapshot = os.path.join(directory, f"catalog-{items}.snap")
+    catalog = SQLiteCatalog(database)
+    populate(catalog, 0, items, seed)
+    middle = media_id(items // 2)
+    sqlite = probe({"STREAMY_CATALOG_DB": database}, middle)
+    write_index_snapshot(catalog, build_indexes(catalog))
+    catalog.close()
+    return {
+        "items": items,
+        "snapshot": write_snapshot(snapshot, items, seed),
+        "no_catalog": probe({}, middle),
+        "sqlite": sqlite,
+        "sqlite_indexes": probe({"STREAMY_CATALOG_DB": database}, middle),
+        "snapshot_load": probe({"STREAMY_CATALOG_SNAPSHOT": snapshot}, middle),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="streamy-startup-") as directory:
+        results = [run(items, args.seed, directory) for items in args.items]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Latency of /suggest lookups on large title sets.
+
+Builds a ``SuggestIndex`` over synthetic titles and times prefix,
+multi-word and misspelled queries, with the result cache disabled, so
+every query walks the index.
+
+Run from the backend directory::
+
+    python -m benchmarks.bench_suggest --titles 100000 1000000
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+from typing import Iterator, List, Tuple
+
+from benchmarks.synthetic import ADJECTIVES, NOUNS, WORDS
+from src.suggest import SuggestIndex
+
+VOCABULARY = [word.lower() for word in ADJECTIVES + NOUNS] + list(WORDS)
+
+
+def titles(count: int, seed: int) -> Iterator[Tuple[str, str, float]]:
+    rng = random.Random(seed)
+    # Add rarer made-up words so the vocabulary grows with the catalog.
+    syllables = ["ka", "lo", "mi", "ren", "tor", "vak", "sel", "dun", "ari", "zo"]
+    for n in range(count):
+        words = rng.sample(VOCABULARY, rng.randint(1, 3))
+        if rng.random() < 0.5:
+            words.append("".join(rng.choices(syllables, k=rng.randint(2, 4))))
+        yield f"m{n}", " ".join(words).title(), rng.paretovariate(1.5)
+
+
+def misspell(word: str, rng: random.Random) -> str:
+    if len(word) < 4:
+        return word
+    i = rng.randrange(len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2 :]
+
+
+def queries(seed: int) -> List[Tuple[str, str]]:
+    rng = random.Random(seed + 1)
+    found = []
+    for _ in range(300):
+        word = rng.choice(VOCABULARY)
+        found.append(("prefix", word[: rng.randint(1, len(word))]))
+        found.append(("two_words", f"{word} {rng.choice(VOCABULARY)[:2]}"))
+        found.append(("misspelled", misspell(word, rng)))
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--titles", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    results = []
+    for count in args.titles:
+        index = SuggestIndex(cache_size=0)
+        started = time.perf_counter()
+        index.build(titles(count, args.seed))
+        build_seconds = time.perf_counter() - started
+
+        timings = {}
+        for kind, query in queries(args.seed):
+            started = time.perf_counter()
+            index.suggest(query, 10)
+            timings.setdefault(kind, []).append(time.perf_counter() - started)
+        results.append(
+            {
+                "titles": count,
+                "build_seconds": round(build_seconds, 1),
+                "queries": {
+                    kind: {
+                        "p50_us": round(statistics.median(values) * 1e6, 1),
+                        "p99_us": round(
+                            statistics.quantiles(values, n=100)[98] * 1e6, 1
+                        ),
+                    }
+                    for kind, values in timings.items()
+                },
+            }
+        )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""Load test for the read endpoints on synthetic catalogs.
+
+Grows a synthetic catalog through each requested size and, at every size,
+drives ``/media``, ``/media/{media_id}`` and ``/search/{query}`` with a
+fixed number of concurrent clients. Results (throughput and p50/p95/p99
+latency per endpoint) are printed as JSON.
+
+Two drivers are available:
+
+* ``inprocess`` calls the ASGI app directly, measuring the application
+  without any network or server overhead;
+* ``socket`` starts ``run.py`` on a local port for every size and drives it
+  over HTTP with aiohttp, measuring the full server stack.
+
+Run from the backend directory::
+
+    python -m benchmarks.load_test --sizes 10000 100000 --concurrency 32
+    python -m benchmarks.load_test --driver socket --workers 4 --sizes 100000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.synthetic import ADJECTIVES, NOUNS, WORDS, media_id, populate
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (status, body size) for one request.
+Fetch = Callable[[str], Awaitable[Tuple[int, int]]]
+
+
+def endpoint_paths(size: int, seed: int) -> Dict[str, Callable[[], str]]:
+    """Path generators for each endpoint under test"""
+    rng = random.Random(seed)
+    terms = [word.lower() for word in ADJECTIVES + NOUNS] + list(WORDS)
+
+    def media_page() -> str:
+        return f"/media?limit=100&after={media_id(rng.randrange(size))}"
+
+    def media_item() -> str:
+        return f"/media/{media_id(rng.randrange(size))}"
+
+    def search() -> str:
+        query = " ".join(rng.sample(terms, rng.randint(1, 2)))
+        # Type-ahead style: sometimes search for a prefix of the last word.
+        if rng.random() < 0.3:
+            query = query[: max(len(query) - 2, 1)]
+        return f"/search/{query}?limit=20"
+
+    return {"media_page": media_page, "media_item": media_item, "search": search}
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    index = max(int(round(fraction * len(ordered))) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+async def drive(
+    fetch: Fetch,
+    next_path: Callable[[], str],
+    concurrency: int,
+    requests: int,
+    duration: float,
+) -> dict:
+    """Issue requests from concurrency clients until either budget runs out"""
+    latencies: List[float] = []
+    errors = 0
+    received_bytes = 0
+    issued = 0
+    started = time.perf_counter()
+    stop_at = started + duration
+
+    async def client() -> None:
+        nonlocal errors, received_bytes, issued
+        while issued < requests and time.perf_counter() < stop_at:
+            issued += 1
+            path = next_path()
+            begin = time.perf_counter()
+            try:
+                status, size = await fetch(path)
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - begin)
+            received_bytes += size
+            if status >= 400:
+                errors += 1
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "mean_response_bytes": (
+            round(received_bytes / len(latencies)) if latencies else 0
+        ),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+    }
+
+
+def asgi_fetcher(app) -> Fetch:
+    """Call the ASGI app directly with a minimal HTTP GET scope"""
+
+    async def fetch(path: str) -> Tuple[int, int]:
+        raw_path, _, query = path.partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": raw_path,
+            "raw_path": raw_path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": [(b"host", b"bench"), (b"accept", b"application/json")],
+            "client": ("127.0.0.1", 0),
+            "server": ("bench", 80),
+        }
+        status = 0
+        size = 0
+
+        async def receive() -> dict:
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message: dict) -> None:
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+
+        await app(scope, receive, send)
+        return status, size
+
+    return fetch
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Server:
+    """run.py started in a subprocess on a free local port"""
+
+    def __init__(self, catalog_path: str, workers: int, startup_timeout: float):
+        self.port = _free_port()
+        env = dict(os.environ, STREAMY_CATALOG_DB=catalog_path)
+        self.process = subprocess.Popen(
+            [
+                sys.executable,
+                "run.py",
+                "--host",
+                "127.0.0.1",
+                "--port",
+                str(self.port),
+                "--workers",
+                str(workers),
+                "--log-level",
+                "warning",
+            ],
+            cwd=BACKEND_DIR,
+            env=env,
+        )
+        self.startup_timeout = startup_timeout
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    async def wait_ready(self, session) -> None:
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"server exited with {self.process.returncode}")
+            try:
+                async with session.get(self.base_url + "/") as response:
+                    if response.status == 200:
+                        return
+            except Exception:
+                pass
+            await asyncio.sleep(0.2)
+        raise RuntimeError("server did not start in time")
+
+    def stop(self) -> None:
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+async def run_inprocess(args: argparse.Namespace, catalog_path: Optional[str]) -> list:
+    if catalog_path:
+        os.environ["STREAMY_CATALOG_DB"] = catalog_path
+    from src.main import CATALOG, app
+
+    results = []
+    loaded = 0
+    fetch = asgi_fetcher(app)
+    for size in sorted(args.sizes):
+        started = time.perf_counter()
+        populate(CATALOG, loaded, size, args.seed)
+        loaded = size
+        results.append(await run_size(args, size, fetch, time.perf_counter() - started))
+    return results
+
+
+async def run_socket(args: argparse.Namespace, catalog_path: str) -> list:
+    import aiohttp
+
+    from src.catalog import SQLiteCatalog
+
+    results = []
+    loaded = 0
+    for size in sorted(args.sizes):
+        started = time.perf_counter()
+        catalog = SQLiteCatalog(catalog_path)
+        populate(catalog, loaded, size, args.seed)
+        catalog.close()
+        loaded = size
+        load_seconds = time.perf_counter() - started
+
+        server = Server(catalog_path, args.workers, args.startup_timeout)
+        connector = aiohttp.TCPConnector(limit=args.concurrency)
+        try:
+            async with aiohttp.ClientSession(connector=connector) as session:
+                await server.wait_ready(session)
+
+                async def fetch(path: str) -> Tuple[int, int]:
+                    async with session.get(server.base_url + path) as response:
+                        body = await response.read()
+                        return response.status, len(body)
+
+                results.append(await run_size(args, size, fetch, load_seconds))
+        finally:
+            server.stop()
+    return results
+
+
+async def run_size(
+    args: argparse.Namespace, size: int, fetch: Fetch, load_seconds: float
+) -> dict:
+    paths = endpoint_paths(size, args.seed)
+    endpoints = {}
+    for name in args.endpoints:
+        # Warm caches and lazily built structures before measuring.
+        await drive(fetch, paths[name], args.concurrency, args.warmup, args.duration)
+        endpoints[name] = await drive(
+            fetch, paths[name], args.concurrency, args.requests, args.duration
+        )
+    return {
+        "items": size,
+        "load_seconds": round(load_seconds, 2),
+        "endpoints": endpoints,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--driver", choices=("inprocess", "socket"), default="inprocess"
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument(
+        "--endpoints",
+        nargs="+",
+        choices=("media_page", "media_item", "search"),
+        default=["media_page", "media_item", "search"],
+    )
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument(
+        "--requests", type=int, default=5000, help="requests per endpoint"
+    )
+    parser.add_argument(
+        "--duration", type=float, default=30.0, help="max seconds per endpoint"
+    )
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--catalog",
+        choices=("memory", "sqlite"),
+        default="memory",
+        help="catalog backend for the in-process driver (socket always uses sqlite)",
+    )
+    parser.add_argument("--workers", type=int, default=1, help="socket driver only")
+    parser.add_argument("--startup-timeout", type=float, default=600.0)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="streamy-bench-") as tmp:
+        catalog_path = os.path.join(tmp, "catalog.db")
+        if args.driver == "socket":
+            results = asyncio.run(run_socket(args, catalog_path))
+        else:
+            sqlite_path = catalog_path if args.catalog == "sqlite" else None
+            results = asyncio.run(run_inprocess(args, sqlite_path))
+
+    report = {
+        "driver": args.driver,
+        "catalog": "sqlite" if args.driver == "socket" else args.catalog,
+        "concurrency": args.concurrency,
+        "workers": args.workers if args.driver == "socket" else 1,
+        "seed": args.seed,
+        "python": sys.version.split()[0],
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
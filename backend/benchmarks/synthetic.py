@@ -0,0 +1,121 @@
+"""Reproducible synthetic media catalogs for benchmarks.
+
+Item ``n`` of a catalog depends only on ``n`` and the seed, so a catalog
+can be grown from 10k to 1M items without regenerating the first ones and
+every run with the same seed sees byte-identical data.
+
+Write a catalog to a SQLite file (run from the backend directory)::
+
+    python -m benchmarks.synthetic --items 100000 --output /tmp/catalog.db
+"""
+
+import argparse
+import random
+import time
+from typing import Iterator, List
+
+from src.catalog import MediaCatalog, SQLiteCatalog
+from src.models import MediaItem, MediaSource
+
+ADJECTIVES = (
+    "Silent", "Crimson", "Hidden", "Broken", "Golden", "Last", "Frozen", "Wild",
+    "Dark", "Electric", "Lost", "Eternal", "Savage", "Midnight", "Hollow", "Iron",
+    "Secret", "Burning", "Distant", "Fallen", "Northern", "Shattered", "Velvet",
+)  # fmt: skip
+NOUNS = (
+    "River", "Empire", "Horizon", "Garden", "Kingdom", "Signal", "Harbor",
+    "Shadow", "Frontier", "Protocol", "Mirror", "Storm", "Orchard", "Citadel",
+    "Voyage", "Legacy", "Circuit", "Desert", "Lantern", "Tide", "Station",
+)  # fmt: skip
+WORDS = (
+    "a", "detective", "family", "secret", "journey", "city", "war", "love",
+    "mystery", "crew", "island", "past", "future", "escape", "friendship",
+    "betrayal", "heist", "village", "scientist", "survivors", "ancient",
+    "discovers", "must", "team", "young", "against", "revenge", "truth",
+)  # fmt: skip
+GENRES = (
+    "Action", "Comedy", "Drama", "Horror", "Sci-Fi", "Romance", "Thriller",
+    "Documentary", "Animation", "Fantasy",
+)  # fmt: skip
+QUALITIES = ("360p", "480p", "720p", "1080p", "2160p")
+HOSTS = ("cdn1.example.com", "cdn2.example.com", "media.example.net")
+
+
+def media_id(n: int) -> str:
+    """Return the id of item n (ids sort in generation order)"""
+    return f"bench-{n:08d}"
+
+
+def make_item(n: int, seed: int = 42) -> MediaItem:
+    """Build item n of the catalog for seed"""
+    rng = random.Random((seed << 32) | n)
+    title = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}"
+    if rng.random() < 0.3:
+        title += f" {rng.randint(2, 5)}"
+    description = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 30)))
+    sources = [
+        MediaSource(
+            name=f"Source {index + 1}",
+            url=f"https://{rng.choice(HOSTS)}/v/{n}/{quality}.m3u8",
+            quality=quality,
+            size=f"{rng.randint(200, 9000)} MB",
+        )
+        for index, quality in enumerate(
+            rng.sample(QUALITIES, rng.randint(1, len(QUALITIES)))
+        )
+    ]
+    return MediaItem(
+        id=media_id(n),
+        title=title,
+        thumbnail=f"https://img.example.com/{n}.jpg",
+        description=description.capitalize(),
+        sources=sources,
+        metadata={
+            "year": str(rng.randint(1960, 2025)),
+            "genre": rng.choice(GENRES),
+            "rating": round(rng.uniform(1.0, 10.0), 1),
+            "duration": rng.randint(20, 180),
+        },
+    )
+
+
+def generate(start: int, stop: int, seed: int = 42) -> Iterator[MediaItem]:
+    """Yield items start..stop-1"""
+    for n in range(start, stop):
+        yield make_item(n, seed)
+
+
+def populate(
+    catalog: MediaCatalog, start: int, stop: int, seed: int = 42, batch: int = 5000
+) -> None:
+    """Upsert items start..stop-1 into catalog in batches"""
+    items: List[MediaItem] = []
+    for item in generate(start, stop, seed):
+        items.append(item)
+        if len(items) >= batch:
+            catalog.upsert_many(items)
+            items = []
+    if items:
+        catalog.upsert_many(items)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", required=True, help="SQLite catalog path")
+    args = parser.parse_args()
+
+    catalog = SQLiteCatalog(args.output)
+    existing = len(catalog)
+    started = time.perf_counter()
+    populate(catalog, existing, args.items, args.seed)
+    catalog.close()
+    print(
+        f"wrote items {existing}..{args.items} to {args.output} "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
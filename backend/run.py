@@ -1,7 +1,216 @@
+"""Launch the Streamy backend.
+
+Development (defaults)::
+
+    python run.py --reload
+
+Production, one worker per core::
+
+    python run.py --workers 4 --limit-concurrency 1000
+
+Every option can also be set with a ``STREAMY_*`` environment variable (see
+``--help``). uvloop and httptools are used when they are installed
+(``pip install 'uvicorn[standard]'``). With more than one worker every
+worker opens the catalog read-only: a SQLite catalog is copied once, with
+its indexes, to files the workers map, and a binary snapshot
+(STREAMY_CATALOG_SNAPSHOT) is mapped as it is, so the OS page cache holds
+a single shared copy of the data.
+uvicorn's supervisor restarts crashed workers but cannot roll them on
+SIGHUP; for zero-downtime reloads run the same app under gunicorn with
+``-k uvicorn.workers.UvicornWorker`` and send it HUP.
+"""
+
+import argparse
+import importlib.util
 import logging
+import os
+import secrets
+import shutil
+import socket
+import tempfile
+from typing import List, Optional
+
 import uvicorn
-from src.main import app
+from uvicorn.supervisors import ChangeReload, Multiprocess
+
+APP = "src.main:app"
+
+logger = logging.getLogger("streamy.run")
+
+
+def _env(name: str, default: Optional[str] = None) -> Optional[str]:
+    return os.environ.get(name) or default
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the Streamy backend")
+    parser.add_argument("--host", default=_env("STREAMY_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(_env("STREAMY_PORT", "8000")))
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(_env("STREAMY_WORKERS", "1")),
+        help="worker processes (STREAMY_WORKERS)",
+    )
+    parser.add_argument(
+        "--reload",
+        action="store_true",
+        default=_env("STREAMY_RELOAD", "") in ("1", "true", "yes"),
+        help="restart on code changes; development only (STREAMY_RELOAD)",
+    )
+    parser.add_argument(
+        "--backlog",
+        type=int,
+        default=int(_env("STREAMY_BACKLOG", "2048")),
+        help="listen socket backlog (STREAMY_BACKLOG)",
+    )
+    parser.add_argument(
+        "--timeout-keep-alive",
+        type=int,
+        default=int(_env("STREAMY_KEEP_ALIVE", "5")),
+        help="seconds to hold idle keep-alive connections (STREAMY_KEEP_ALIVE)",
+    )
+    parser.add_argument(
+        "--limit-concurrency",
+        type=int,
+        default=int(_env("STREAMY_LIMIT_CONCURRENCY", "0")) or None,
+        help="per-worker cap on connections and tasks before answering 503 "
+        "(STREAMY_LIMIT_CONCURRENCY)",
+    )
+    parser.add_argument(
+        "--graceful-timeout",
+        type=int,
+        default=int(_env("STREAMY_GRACEFUL_TIMEOUT", "30")),
+        help="seconds to let in-flight requests finish on shutdown "
+        "(STREAMY_GRACEFUL_TIMEOUT)",
+    )
+    parser.add_argument("--log-level", default=_env("STREAMY_LOG_LEVEL", "info"))
+    return parser.parse_args()
+
+
+class Config(uvicorn.Config):
+    """uvicorn.Config whose shared listening socket disables Nagle's algorithm.
+
+    uvicorn 0.28 creates the socket it hands to workers (and to the reloader)
+    without IPPROTO_TCP, so asyncio skips TCP_NODELAY on accepted connections
+    and small keep-alive responses stall ~40 ms on delayed ACKs. Accepted
+    sockets inherit the option from the listening socket.
+    """
+
+    def bind_socket(self) -> socket.socket:
+        sock = super().bind_socket()
+        if sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+
+def share_catalog() -> List[str]:
+    """Prepare the catalog for workers that open it read-only.
+
+    A configured STREAMY_CATALOG_DB is copied to a file in rollback-journal
+    mode, which read-only connections can open without the WAL, and its
+    indexes are saved beside the copy (and beside the database, for the
+    next start). The database itself is left as it was. An in-memory
+    catalog needs nothing: workers map its STREAMY_CATALOG_SNAPSHOT, if
+    any, without saving it, and otherwise hold their own sample catalog.
+    Returns the temporary files the caller must delete.
+
+    Only the catalog modules are imported here; src.main would set up the
+    whole app in the supervisor.
+    """
+    from src.catalog import SQLiteCatalog
+    from src.config import settings
+    from src.indexes import (
+        build_indexes,
+        index_snapshot_path,
+        load_index_snapshot,
+        write_index_snapshot,
+    )
+
+    if not settings.catalog_db:
+        # Workers must not each save the snapshot they all map.
+        if settings.catalog_snapshot:
+            os.environ["STREAMY_CATALOG_READONLY"] = "1"
+        return []
+    os.environ["STREAMY_CATALOG_READONLY"] = "1"
+
+    database = SQLiteCatalog(settings.catalog_db)
+    handle, path = tempfile.mkstemp(
+        prefix=".streamy-catalog-",
+        suffix=".db",
+        dir=os.path.dirname(os.path.abspath(database.path)),
+    )
+    os.close(handle)
+    temporary = [path, f"{path}.indexes"]
+    try:
+        database.copy_to(path)
+        copy = SQLiteCatalog(path, readonly=True)
+        if os.path.exists(index_snapshot_path(database)):
+            shutil.copyfile(index_snapshot_path(database), index_snapshot_path(copy))
+        if load_index_snapshot(copy) is None and write_index_snapshot(
+            copy, build_indexes(copy)
+        ):
+            # The copy has the database's generation, so the indexes also
+            # serve the database until it next changes.
+            shutil.copyfile(index_snapshot_path(copy), f"{path}.saved")
+            os.replace(f"{path}.saved", index_snapshot_path(database))
+        copy.close()
+    except BaseException:
+        for name in temporary:
+            if os.path.exists(name):
+                os.unlink(name)
+        raise
+    finally:
+        database.close()
+    os.environ["STREAMY_CATALOG_DB"] = path
+    logger.info("Workers share read-only catalog copy %s", path)
+    return temporary
+
+
+def main() -> None:
+    args = parse_args()
+    logging.basicConfig(level=args.log_level.upper())
+
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    logger.info("Using %s event loop and %s HTTP parser", loop, http)
+
+    workers = 1 if args.reload else max(args.workers, 1)
+    # Every worker (and every reload) must sign /hls URLs with the same key.
+    os.environ.setdefault("STREAMY_HLS_SECRET", secrets.token_hex(32))
+    temporary = share_catalog() if workers > 1 else []
+    config = Config(
+        APP,
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        reload=args.reload,
+        loop=loop,
+        http=http,
+        backlog=args.backlog,
+        timeout_keep_alive=args.timeout_keep_alive,
+        limit_concurrency=args.limit_concurrency,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        log_level=args.log_level.lower(),
+    )
+    server = uvicorn.Server(config)
+    # Same dispatch as uvicorn.run(), which cannot take a Config subclass.
+    try:
+        if config.should_reload:
+            ChangeReload(
+                config, target=server.run, sockets=[config.bind_socket()]
+            ).run()
+        elif config.workers > 1:
+            Multiprocess(
+                config, target=server.run, sockets=[config.bind_socket()]
+            ).run()
+        else:
+            server.run()
+    finally:
+        for path in temporary:
+            if os.path.exists(path):
+                os.unlink(path)
+
 
 if __name__ == "__main__":
-    logging.basicConfig(level=logging.INFO)
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    main()
@@ -0,0 +1,472 @@
+"""Ad-block filter engine for Adblock Plus / EasyList network rules.
+
+Rules are parsed once and stored in a token index: every rule is filed
+under one token (a run of URL characters it requires, chosen to be as
+rare as possible) and a URL is only tested against the rules filed under
+the tokens it contains. The compiled index can be saved to a compact
+binary file and reloaded without re-parsing the filter list.
+"""
+
+import logging
+import os
+import re
+import struct
+from itertools import count
+from typing import BinaryIO, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+
+from pydantic import BaseModel, Field, field_validator
+
+logger = logging.getLogger(__name__)
+
+# Network filters from the app's AdBlockingEngine._commonNetworkPatterns.
+DEFAULT_FILTERS = [
+    "||googletagmanager.com^",
+    "||google-analytics.com^",
+    "||googlesyndication.com^",
+    "||doubleclick.net^",
+    "||amazon-adsystem.com^",
+    "||facebook.com/tr^",
+    "||scorecardresearch.com^",
+    "||outbrain.com^",
+    "||taboola.com^",
+    "||adsystem.com^",
+    "||googletag^",
+    "||adnxs.com^",
+    "||adsafeprotected.com^",
+    "||casalemedia.com^",
+    "||addthis.com^",
+    "||quantserve.com^",
+    "||hotjar.com^",
+    "||mixpanel.com^",
+    "||intercom.io^",
+    "||zendesk.com^",
+    "||livechatinc.com^",
+    "||zopim.com^",
+    "||freshworks.com^",
+    "||pusher.com^",
+    "||segment.com^",
+    "||amplitude.com^",
+    "||fullstory.com^",
+    "||logrocket.com^",
+    "||bugsnag.com^",
+    "||sentry.io^",
+    "||newrelic.com^",
+]
+
+RESOURCE_TYPES = {
+    "script": 1 << 0,
+    "image": 1 << 1,
+    "stylesheet": 1 << 2,
+    "xmlhttprequest": 1 << 3,
+    "subdocument": 1 << 4,
+    "media": 1 << 5,
+    "font": 1 << 6,
+    "object": 1 << 7,
+    "ping": 1 << 8,
+    "websocket": 1 << 9,
+    "document": 1 << 10,
+    "other": 1 << 11,
+}
+ALL_TYPES = (1 << 12) - 1 & ~RESOURCE_TYPES["document"]
+
+FLAG_EXCEPTION = 1 << 0
+FLAG_MATCH_CASE = 1 << 1
+FLAG_THIRD_PARTY = 1 << 2
+FLAG_FIRST_PARTY = 1 << 3
+
+_MAGIC = b"SADB"
+# Version 2: wildcard rules compile to atomic scans (see _pattern_to_regex).
+# Version 3: the scans use lookahead and backreference, not atomic groups.
+_FORMAT_VERSION = 3
+_HEADER = struct.Struct("<4sHI")
+_RULE_HEADER = struct.Struct("<BIHHHH")
+
+_TOKEN_RE = re.compile(r"[a-z0-9%]+")
+_PATTERN_TOKEN_RE = re.compile(r"[a-zA-Z0-9%]+")
+# Characters that can never be part of a URL token; a pattern run next to
+# one of these (or to an anchor) is a complete token.
+_TOKEN_BOUNDARY = set("/.^?=&:;-_~+,!@#$'()[]{}<>|\"")
+
+
+class FilterRule(NamedTuple):
+    text: str
+    regex: str
+    token: str
+    flags: int = 0
+    types: int = ALL_TYPES
+    domains: str = ""
+
+
+# Bounds on one POST /adblock/check request.
+MAX_CHECK_URLS = 256
+MAX_URL_LENGTH = 8192
+MAX_REQUEST_PATTERNS = 256
+MAX_PATTERN_LENGTH = 1024
+
+
+class UrlCheck(BaseModel):
+    url: str = Field(max_length=MAX_URL_LENGTH)
+    # Resource type, e.g. "script" or "image"; defaults to "other".
+    type: Optional[str] = None
+    # URL of the page that issues the request, for third-party/domain rules.
+    origin: Optional[str] = None
+
+
+class AdBlockCheckRequest(BaseModel):
+    urls: List[UrlCheck] = Field(max_length=MAX_CHECK_URLS)
+    # WebSource id whose adBlockPatterns are applied on top of the global list.
+    source_id: Optional[str] = None
+    # Extra filters for sources the server does not know (e.g. custom ones).
+    # Regular-expression rules are refused: the client would choose the
+    # regex the server runs.
+    patterns: Optional[List[str]] = Field(None, max_length=MAX_REQUEST_PATTERNS)
+
+    @field_validator("patterns")
+    @classmethod
+    def _check_patterns(cls, patterns: Optional[List[str]]) -> Optional[List[str]]:
+        for pattern in patterns or ():
+            if len(pattern) > MAX_PATTERN_LENGTH:
+                raise ValueError(
+                    f"filters are limited to {MAX_PATTERN_LENGTH} characters"
+                )
+            if is_regex_filter(pattern):
+                raise ValueError(
+                    f"regular-expression filters are not accepted: {pattern}"
+                )
+        return patterns
+
+
+class AdBlockVerdict(BaseModel):
+    url: str
+    blocked: bool
+    # The filter that decided the verdict (blocking rule or exception).
+    rule: Optional[str] = None
+
+
+class AdBlockCheckResponse(BaseModel):
+    results: List[AdBlockVerdict]
+
+
+def _segment_to_regex(segment: str) -> str:
+    return "".join(
+        r"(?:[^\w.%-]|$)" if char == "^" else re.escape(char) for char in segment
+    )
+
+
+def _pattern_to_regex(pattern: str) -> str:
+    """Translate an ABP pattern (||, |, ^, *) into an equivalent regex
+
+    The segments between wildcards only ever need to match at their
+    earliest position after the previous one, so each is found with an
+    atomic lazy scan instead of ``.*``. The regex then never backtracks
+    into an earlier wildcard, and matching stays linear in the URL length
+    however many wildcards a rule has. A scan is a lookahead capturing it
+    followed by a backreference to the capture: a lookahead is not
+    re-entered once it has matched, which makes it atomic on every
+    Python version (atomic groups need 3.11).
+    """
+    prefix = suffix = ""
+    if pattern.startswith("||"):
+        prefix = r"^[a-z][a-z0-9+.-]*://(?:[^/?#]*\.)?"
+        pattern = pattern[2:]
+    elif pattern.startswith("|"):
+        prefix = "^"
+        pattern = pattern[1:]
+    if pattern.endswith("|"):
+        suffix = "$"
+        pattern = pattern[:-1]
+    segments = [_segment_to_regex(segment) for segment in pattern.split("*")]
+    if len(segments) == 1:
+        return prefix + segments[0] + suffix
+    first, *rest = segments
+    groups = count(1)
+
+    def scan(segment: str) -> str:
+        return rf"(?=(.*?{segment}))\{next(groups)}"
+
+    # An unanchored rule is anchored too, with a scan for its first segment,
+    # so a failed search does not restart at every position of the URL.
+    parts = [prefix + first if prefix else r"\A" + scan(first)]
+    if suffix:
+        # The last segment must end the URL, not just occur after the others.
+        *rest, last = rest
+    parts.extend(scan(segment) for segment in rest if segment)
+    if suffix:
+        parts.append(rf".*{last}$")
+    return "".join(parts)
+
+
+def is_regex_filter(line: str) -> bool:
+    """Whether a filter line is a /regular expression/ rule"""
+    body = line.strip()
+    if body.startswith("@@"):
+        body = body[2:]
+    if not (body.startswith("/") and body.endswith("/")):
+        dollar = body.rfind("$")
+        if dollar != -1:
+            body = body[:dollar]
+    return body.startswith("/") and body.endswith("/") and len(body) > 2
+
+
+def _pattern_tokens(pattern: str) -> List[str]:
+    """Return the runs of pattern that must appear as whole tokens in a URL"""
+    tokens = []
+    for match in _PATTERN_TOKEN_RE.finditer(pattern):
+        start, end = match.span()
+        before = pattern[start - 1] if start > 0 else None
+        after = pattern[end] if end < len(pattern) else None
+        if before is None or after is None or before == "*" or after == "*":
+            continue
+        if before in _TOKEN_BOUNDARY and after in _TOKEN_BOUNDARY:
+            tokens.append(match.group().lower())
+    return tokens
+
+
+def parse_filter(line: str) -> Optional[Tuple[FilterRule, List[str]]]:
+    """Parse one filter list line into a rule and its candidate tokens.
+
+    Comments, cosmetic (element hiding) filters and rules with options this
+    engine does not understand return None.
+    """
+    text = line.strip()
+    if not text or text.startswith(("!", "[")) or "##" in text or "#@#" in text:
+        return None
+    if "#?#" in text or "#$#" in text:
+        return None
+
+    flags = 0
+    body = text
+    if body.startswith("@@"):
+        flags |= FLAG_EXCEPTION
+        body = body[2:]
+
+    types = ALL_TYPES
+    domains = ""
+    dollar = body.rfind("$")
+    if dollar != -1 and not (body.startswith("/") and body.endswith("/")):
+        options = body[dollar + 1 :].split(",")
+        body = body[:dollar]
+        included = 0
+        excluded = 0
+        for option in options:
+            option = option.strip().lower()
+            negated = option.startswith("~")
+            name = option.lstrip("~")
+            if name in RESOURCE_TYPES:
+                if negated:
+                    excluded |= RESOURCE_TYPES[name]
+                else:
+                    included |= RESOURCE_TYPES[name]
+            elif name == "third-party":
+                flags |= FLAG_FIRST_PARTY if negated else FLAG_THIRD_PARTY
+            elif name == "match-case":
+                flags |= FLAG_MATCH_CASE
+            elif name.startswith("domain="):
+                domains = option[len("domain=") :]
+            else:
+                return None
+        if included:
+            types = included
+        types &= ~excluded
+
+    if body.startswith("/") and body.endswith("/") and len(body) > 2:
+        return FilterRule(text, body[1:-1], "", flags, types, domains), []
+    if not body or body == "*":
+        return None
+
+    tokens = _pattern_tokens(body)
+    return FilterRule(text, _pattern_to_regex(body), "", flags, types, domains), tokens
+
+
+def _host(url: str) -> str:
+    try:
+        return (urlsplit(url).hostname or "").lower()
+    except ValueError:
+        return ""
+
+
+def _registrable(host: str) -> str:
+    # Approximation of the registrable domain without a public suffix list.
+    return ".".join(host.split(".")[-2:])
+
+
+def _domain_matches(host: str, domains: str) -> bool:
+    included = False
+    has_includes = False
+    for entry in domains.split("|"):
+        negated = entry.startswith("~")
+        domain = entry.lstrip("~")
+        hit = host == domain or host.endswith("." + domain)
+        if negated and hit:
+            return False
+        if not negated:
+            has_includes = True
+            included = included or hit
+    return included or not has_includes
+
+
+class FilterEngine:
+    """Token-indexed set of network filters"""
+
+    def __init__(self) -> None:
+        self._buckets: Dict[str, List[FilterRule]] = {}
+        self._compiled: Dict[str, "re.Pattern[str]"] = {}
+        self.rule_count = 0
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]) -> "FilterEngine":
+        """Parse a filter list; unsupported lines are skipped"""
+        engine = cls()
+        parsed = [rule for rule in map(parse_filter, lines) if rule is not None]
+        # Count how often each token is offered so rules can be filed under
+        # their rarest token, keeping every bucket short.
+        frequency: Dict[str, int] = {}
+        for _rule, tokens in parsed:
+            for token in tokens:
+                frequency[token] = frequency.get(token, 0) + 1
+        for rule, tokens in parsed:
+            token = ""
+            if tokens:
+                token = min(tokens, key=lambda t: (frequency[t], -len(t)))
+            engine._add(rule._replace(token=token))
+        return engine
+
+    def _add(self, rule: FilterRule) -> None:
+        self._buckets.setdefault(rule.token, []).append(rule)
+        self.rule_count += 1
+
+    def _regex(self, rule: FilterRule) -> "re.Pattern[str]":
+        key = rule.regex if rule.flags & FLAG_MATCH_CASE else "(?i)" + rule.regex
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            compiled = self._compiled[key] = re.compile(key)
+        return compiled
+
+    def _candidates(self, url: str) -> Iterable[FilterRule]:
+        yield from self._buckets.get("", ())
+        for token in set(_TOKEN_RE.findall(url.lower())):
+            yield from self._buckets.get(token, ())
+
+    def match(
+        self,
+        url: str,
+        resource_type: Optional[str] = None,
+        origin: Optional[str] = None,
+    ) -> Tuple[bool, Optional[FilterRule]]:
+        """Return (blocked, deciding rule) for a request URL"""
+        type_bit = RESOURCE_TYPES.get(resource_type or "other", RESOURCE_TYPES["other"])
+        origin_host = _host(origin) if origin else ""
+        third_party = None
+        if origin_host:
+            third_party = _registrable(_host(url)) != _registrable(origin_host)
+
+        blocking = None
+        exception = None
+        for rule in self._candidates(url):
+            if not rule.types & type_bit:
+                continue
+            if rule.flags & FLAG_THIRD_PARTY and third_party is not True:
+                continue
+            if rule.flags & FLAG_FIRST_PARTY and third_party is not False:
+                continue
+            if rule.domains and not (
+                origin_host and _domain_matches(origin_host, rule.domains)
+            ):
+                continue
+            if not self._regex(rule).search(url):
+                continue
+            if rule.flags & FLAG_EXCEPTION:
+                exception = rule
+                break
+            if blocking is None:
+                blocking = rule
+        if exception is not None:
+            return False, exception
+        return blocking is not None, blocking
+
+    def save(self, handle: BinaryIO) -> None:
+        """Write the compiled index in the binary format read by load()"""
+        rules = [rule for bucket in self._buckets.values() for rule in bucket]
+        handle.write(_HEADER.pack(_MAGIC, _FORMAT_VERSION, len(rules)))
+        for rule in rules:
+            fields = [
+                value.encode("utf-8")
+                for value in (rule.token, rule.regex, rule.text, rule.domains)
+            ]
+            handle.write(
+                _RULE_HEADER.pack(rule.flags, rule.types, *(len(f) for f in fields))
+            )
+            for field in fields:
+                handle.write(field)
+
+    @classmethod
+    def load(cls, handle: BinaryIO) -> "FilterEngine":
+        """Read an index written by save(); regexes are compiled on first use"""
+        data = handle.read()
+        magic, version, count = _HEADER.unpack_from(data, 0)
+        if magic != _MAGIC or version != _FORMAT_VERSION:
+            raise ValueError("Not a compiled filter index (or an incompatible version)")
+        engine = cls()
+        offset = _HEADER.size
+        for _ in range(count):
+            flags, types, *lengths = _RULE_HEADER.unpack_from(data, offset)
+            offset += _RULE_HEADER.size
+            fields = []
+            for length in lengths:
+                fields.append(data[offset : offset + length].decode("utf-8"))
+                offset += length
+            token, regex, text, domains = fields
+            engine._add(FilterRule(text, regex, token, flags, types, domains))
+        return engine
+
+
+def check_url(
+    engines: List[FilterEngine],
+    url: str,
+    resource_type: Optional[str] = None,
+    origin: Optional[str] = None,
+) -> AdBlockVerdict:
+    """Check url against several engines; an exception in any of them wins"""
+    blocking = None
+    for engine in engines:
+        blocked, rule = engine.match(url, resource_type, origin)
+        if rule is not None and not blocked:
+            return AdBlockVerdict(url=url, blocked=False, rule=rule.text)
+        if blocked and blocking is None:
+            blocking = rule
+    return AdBlockVerdict(
+        url=url, blocked=blocking is not None, rule=blocking.text if blocking else None
+    )
+
+
+def load_filter_engine(
+    filters_path: Optional[str] = None, cache_path: Optional[str] = None
+) -> FilterEngine:
+    """Build the global engine from DEFAULT_FILTERS plus an optional filter list.
+
+    When cache_path is set, a compiled index that is newer than the filter
+    list is loaded instead of re-parsing it, and a fresh compile is saved.
+    """
+    if cache_path and os.path.exists(cache_path):
+        source_mtime = os.path.getmtime(filters_path) if filters_path else 0.0
+        if os.path.getmtime(cache_path) >= source_mtime:
+            try:
+                with open(cache_path, "rb") as handle:
+                    return FilterEngine.load(handle)
+            except (OSError, ValueError, struct.error) as exc:
+                logger.warning(
+                    "Ignoring unreadable filter cache %s: %s", cache_path, exc
+                )
+
+    lines = list(DEFAULT_FILTERS)
+    if filters_path:
+        with open(filters_path, encoding="utf-8", errors="replace") as handle:
+            lines.extend(handle)
+    engine = FilterEngine.from_lines(lines)
+    if cache_path:
+        temporary = cache_path + ".tmp"
+        with open(temporary, "wb") as handle:
+            engine.save(handle)
+        os.replace(temporary, cache_path)
+    return engine
@@ -0,0 +1,252 @@
+"""Roaring-style compressed bitmaps of unsigned 32-bit integers.
+
+Values are split into 65536-value chunks keyed by their high 16 bits.
+A chunk with at most ``ARRAY_MAX`` values is a sorted ``array("H")`` of
+its low 16 bits (2 bytes per value); a denser chunk is a 65536-bit
+bitset held in a Python int (8 KiB). Set operations work chunk by chunk
+on ints, so ``&``, ``|`` and population counts run in C whatever the
+density. The int form of an array chunk is cached until the chunk
+changes, and the results of set operations stay ints, which makes
+repeated cardinality queries against the same bitmaps (facet counts) a
+handful of word-sized operations per value instead of a Python loop.
+"""
+
+import re
+import struct
+from array import array
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+# Chunks switch from array to bitset above this many values, where the
+# array would outgrow the 8 KiB bitset.
+ARRAY_MAX = 4096
+CHUNK_BYTES = 8192
+
+Chunk = Union[array, int]
+
+# Serialized form: chunk count, then per chunk its key and value count
+# (``_BITSET`` for a bitset) followed by its little-endian data.
+_COUNT = struct.Struct("<I")
+_CHUNK = struct.Struct("<II")
+_BITSET = 0xFFFFFFFF
+
+# Set bit positions of every byte value.
+_BITS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+_NONZERO = re.compile(rb"[^\x00]")
+# Set bits of an int; int.bit_count() needs Python 3.10.
+_popcount = getattr(int, "bit_count", lambda value: bin(value).count("1"))
+
+
+def _bitset(values: Iterable[int]) -> int:
+    bits = bytearray(CHUNK_BYTES)
+    for value in values:
+        bits[value >> 3] |= 1 << (value & 7)
+    return int.from_bytes(bits, "little")
+
+
+def _positions(bits: int, start: int = 0) -> Iterator[int]:
+    """Set bits of a bitset at or after start, in order"""
+    data = bits.to_bytes(CHUNK_BYTES, "little")
+    # The regex skips runs of empty bytes in C.
+    for match in _NONZERO.finditer(data, start >> 3):
+        index = match.start()
+        base = index << 3
+        for bit in _BITS[data[index]]:
+            if base + bit >= start:
+                yield base + bit
+
+
+class Bitmap:
+    """Mutable set of unsigned 32-bit integers, iterated in ascending order"""
+
+    __slots__ = ("_keys", "_chunks", "_ints")
+
+    def __init__(self, values: Iterable[int] = ()) -> None:
+        self._keys: List[int] = []
+        self._chunks: Dict[int, Chunk] = {}
+        # Bitset form of array chunks, filled in by set operations.
+        self._ints: Dict[int, int] = {}
+        for value in values:
+            self.add(value)
+
+    @classmethod
+    def from_sorted(cls, values: List[int]) -> "Bitmap":
+        """Build a bitmap from ascending, distinct values in one pass"""
+        bitmap = cls()
+        start = 0
+        while start < len(values):
+            key = values[start] >> 16
+            end = bisect_left(values, (key + 1) << 16, start)
+            low = [value & 0xFFFF for value in values[start:end]]
+            bitmap._keys.append(key)
+            bitmap._chunks[key] = (
+                array("H", low) if len(low) <= ARRAY_MAX else _bitset(low)
+            )
+            start = end
+        return bitmap
+
+    @classmethod
+    def from_bytes(cls, data: Union[bytes, memoryview]) -> "Bitmap":
+        """Rebuild a bitmap serialized by ``to_bytes``"""
+        bitmap = cls()
+        (count,) = _COUNT.unpack_from(data)
+        offset = _COUNT.size
+        for _ in range(count):
+            key, size = _CHUNK.unpack_from(data, offset)
+            offset += _CHUNK.size
+            if size == _BITSET:
+                chunk: Chunk = int.from_bytes(
+                    data[offset : offset + CHUNK_BYTES], "little"
+                )
+                offset += CHUNK_BYTES
+            else:
+                chunk = array("H")
+                chunk.frombytes(data[offset : offset + 2 * size])
+                offset += 2 * size
+            bitmap._keys.append(key)
+            bitmap._chunks[key] = chunk
+        return bitmap
+
+    def to_bytes(self) -> bytes:
+        parts = [_COUNT.pack(len(self._keys))]
+        for key in self._keys:
+            chunk = self._chunks[key]
+            if isinstance(chunk, int):
+                parts.append(_CHUNK.pack(key, _BITSET))
+                parts.append(chunk.to_bytes(CHUNK_BYTES, "little"))
+            else:
+                parts.append(_CHUNK.pack(key, len(chunk)))
+                parts.append(chunk.tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def _of(cls, chunks: Dict[int, int]) -> "Bitmap":
+        bitmap = cls()
+        bitmap._keys = sorted(chunks)
+        bitmap._chunks = chunks
+        return bitmap
+
+    def _int(self, key: int) -> int:
+        chunk = self._chunks[key]
+        if isinstance(chunk, int):
+            return chunk
+        value = self._ints.get(key)
+        if value is None:
+            value = self._ints[key] = _bitset(chunk)
+        return value
+
+    def add(self, value: int) -> None:
+        key, low = value >> 16, value & 0xFFFF
+        chunk = self._chunks.get(key)
+        if chunk is None:
+            insort(self._keys, key)
+            self._chunks[key] = array("H", (low,))
+        elif isinstance(chunk, int):
+            self._chunks[key] = chunk | 1 << low
+        else:
+            position = bisect_left(chunk, low)
+            if position < len(chunk) and chunk[position] == low:
+                return
+            self._ints.pop(key, None)
+            chunk.insert(position, low)
+            if len(chunk) > ARRAY_MAX:
+                self._chunks[key] = _bitset(chunk)
+
+    def discard(self, value: int) -> None:
+        key, low = value >> 16, value & 0xFFFF
+        chunk = self._chunks.get(key)
+        if chunk is None:
+            return
+        if isinstance(chunk, int):
+            # Bitsets are not shrunk back to arrays here, so a chunk
+            # hovering around ARRAY_MAX is not converted on every update.
+            chunk = self._chunks[key] = chunk & ~(1 << low)
+        else:
+            position = bisect_left(chunk, low)
+            if position < len(chunk) and chunk[position] == low:
+                self._ints.pop(key, None)
+                del chunk[position]
+        if not chunk:
+            del self._chunks[key]
+            del self._keys[bisect_left(self._keys, key)]
+
+    def __contains__(self, value: int) -> bool:
+        chunk = self._chunks.get(value >> 16)
+        if chunk is None:
+            return False
+        low = value & 0xFFFF
+        if isinstance(chunk, int):
+            return bool(chunk >> low & 1)
+        position = bisect_left(chunk, low)
+        return position < len(chunk) and chunk[position] == low
+
+    def __len__(self) -> int:
+        return sum(
+            _popcount(chunk) if isinstance(chunk, int) else len(chunk)
+            for chunk in self._chunks.values()
+        )
+
+    def __bool__(self) -> bool:
+        return bool(self._chunks)
+
+    def __iter__(self) -> Iterator[int]:
+        return self.iter_from(0)
+
+    def iter_from(self, start: int) -> Iterator[int]:
+        """Values greater than or equal to start, in ascending order"""
+        first = start >> 16
+        for index in range(bisect_left(self._keys, first), len(self._keys)):
+            key = self._keys[index]
+            chunk = self._chunks.get(key)
+            if chunk is None:
+                # Emptied by a mutation since the iteration started.
+                continue
+            low = start & 0xFFFF if key == first else 0
+            base = key << 16
+            if isinstance(chunk, int):
+                for value in _positions(chunk, low):
+                    yield base | value
+            else:
+                for position in range(bisect_left(chunk, low), len(chunk)):
+                    yield base | chunk[position]
+
+    def __and__(self, other: "Bitmap") -> "Bitmap":
+        chunks = {}
+        for key in self._chunks.keys() & other._chunks.keys():
+            both = self._int(key) & other._int(key)
+            if both:
+                chunks[key] = both
+        return Bitmap._of(chunks)
+
+    def __or__(self, other: "Bitmap") -> "Bitmap":
+        chunks = {key: self._int(key) for key in self._chunks}
+        for key in other._chunks:
+            chunks[key] = chunks.get(key, 0) | other._int(key)
+        return Bitmap._of(chunks)
+
+    def intersection_len(self, other: "Bitmap") -> int:
+        """len(self & other) without building the intersection"""
+        return sum(
+            _popcount(self._int(key) & other._int(key))
+            for key in self._chunks.keys() & other._chunks.keys()
+        )
+
+    @staticmethod
+    def union(bitmaps: Iterable["Bitmap"]) -> "Bitmap":
+        result = Bitmap()
+        for bitmap in bitmaps:
+            result = result | bitmap
+        return result
+
+    @staticmethod
+    def intersection(bitmaps: List["Bitmap"]) -> Optional["Bitmap"]:
+        """Intersect bitmaps, fewest chunks first; None for an empty list"""
+        if not bitmaps:
+            return None
+        ordered = sorted(bitmaps, key=lambda bitmap: len(bitmap._chunks))
+        result = ordered[0]
+        for bitmap in ordered[1:]:
+            if not result:
+                break
+            result = result & bitmap
+        return result
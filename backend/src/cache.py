@@ -0,0 +1,190 @@
+"""Size-bounded byte caches and request coalescing.
+
+``ByteLRU`` keeps hot values in memory and ``DiskLRU`` keeps a larger set
+on disk; both evict least recently used entries once their byte budget is
+exceeded. ``SingleFlight`` makes concurrent callers asking for the same key
+share one computation instead of each running their own.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ByteLRU:
+    """In-memory LRU bounded by the total size of its values.
+
+    Values are bytes by default; other values (e.g. a body with its
+    headers) can be stored by passing a function returning their size.
+    """
+
+    def __init__(self, max_bytes: int, sizeof: Callable[[Any], int] = len) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._sizeof = sizeof
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: Any) -> None:
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= self._sizeof(previous)
+            self._entries[key] = value
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= self._sizeof(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class DiskLRU:
+    """LRU of bytes values stored as files in one directory.
+
+    Files are named after a hash of their key and written atomically, so
+    several processes may share the directory; each keeps its own recency
+    index (seeded from file access times at startup) and treats a file
+    removed by another process as a miss.
+    """
+
+    SUFFIX = ".bin"
+
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._files: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def _load(self) -> None:
+        found = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(self.SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_atime, entry.name, stat.st_size))
+        for _, name, size in sorted(found):
+            self._files[name] = size
+            self.size += size
+        self._evict()
+
+    def _name(self, key: str) -> str:
+        return hashlib.sha256(key.encode()).hexdigest() + self.SUFFIX
+
+    def get(self, key: str) -> Optional[bytes]:
+        name = self._name(key)
+        try:
+            with open(os.path.join(self.directory, name), "rb") as handle:
+                value = handle.read()
+        except FileNotFoundError:
+            with self._lock:
+                size = self._files.pop(name, None)
+                if size is not None:
+                    self.size -= size
+            return None
+        with self._lock:
+            if name not in self._files:
+                # Written by another process sharing the directory.
+                self.size += len(value)
+            self._files[name] = len(value)
+            self._files.move_to_end(name)
+        return value
+
+    def put(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        name = self._name(key)
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as output:
+                output.write(value)
+            os.replace(temporary, os.path.join(self.directory, name))
+        except OSError:
+            logger.warning("Could not write cache file %s", name, exc_info=True)
+            try:
+                os.unlink(temporary)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            self.size += len(value) - self._files.pop(name, 0)
+            self._files[name] = len(value)
+            self._evict()
+
+    def _evict(self) -> None:
+        while self.size > self.max_bytes and self._files:
+            name, size = self._files.popitem(last=False)
+            self.size -= size
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+
+class SingleFlight:
+    """Coalesce concurrent async computations of the same key.
+
+    The first caller for a key starts the computation as a task; callers
+    arriving while it runs await the same result (or exception). A caller
+    that is cancelled, e.g. because its client went away, does not cancel
+    the shared task. Nothing is kept once it completes.
+    """
+
+    def __init__(self) -> None:
+        self._tasks: Dict[Hashable, "asyncio.Task"] = {}
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._tasks
+
+    async def do(self, key: Hashable, compute: Callable[[], Awaitable[T]]) -> T:
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(compute())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: "asyncio.Task") -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            # Mark the exception retrieved even if every caller went away.
+            task.exception()
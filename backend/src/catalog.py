@@ -0,0 +1,575 @@
+"""Media catalog storage.
+
+``MediaCatalog`` is the interface the API routes use to read and mutate
+the catalog. ``InMemoryCatalog`` keeps items in a dict keyed by id,
+``compact.CompactCatalog`` (the default in-memory backend) stores them
+column-wise, and ``SQLiteCatalog`` persists them in a WAL-mode SQLite
+database so the catalog size is bounded by disk rather than RAM and
+survives restarts. ``SnapshotCatalog`` reads items from a memory-mapped
+snapshot file, decoding each one when it is accessed.
+"""
+
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right, insort
+from heapq import merge
+from itertools import islice
+from operator import itemgetter
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+from urllib.parse import quote
+
+from .models import MediaItem
+from .snapshot import Snapshot, SnapshotWriter
+
+# Called after every mutation with (upserted items, deleted ids).
+CatalogListener = Callable[[List[MediaItem], List[str]], None]
+
+
+def metadata_genre(item: MediaItem) -> Optional[str]:
+    """Return the item's genre from its free-form metadata, if any"""
+    genre = item.metadata.get("genre")
+    return str(genre) if genre not in (None, "") else None
+
+
+def metadata_year(item: MediaItem) -> Optional[int]:
+    """Return the item's release year from its free-form metadata, if parseable"""
+    try:
+        return int(str(item.metadata.get("year", "")).strip()[:4])
+    except ValueError:
+        return None
+
+
+def insert_sorted(sorted_values: List[Any], new_values: List[Any]) -> None:
+    """Add values to a sorted list in place, keeping it sorted"""
+    if len(new_values) < 64:
+        for value in new_values:
+            insort(sorted_values, value)
+        return
+    # Timsort finds the two sorted runs and gallops through the merge,
+    # where insort would shift the tail of the list once per value.
+    sorted_values.extend(sorted(new_values))
+    sorted_values.sort()
+
+
+class MediaCatalog(ABC):
+    """Abstract catalog of media items with O(1) lookup by id.
+
+    Subclasses implement storage; this base class takes care of the
+    mutation ``version`` counter and of notifying listeners (such as the
+    search index) so derived structures are updated incrementally.
+    """
+
+    def __init__(self) -> None:
+        self.version = 0
+        self._listeners: List[CatalogListener] = []
+
+    def subscribe(self, listener: CatalogListener) -> None:
+        """Register a callback invoked after every mutation"""
+        self._listeners.append(listener)
+
+    @abstractmethod
+    def __len__(self) -> int: ...
+
+    def __iter__(self) -> Iterator[MediaItem]:
+        """Iterate over all items in id order"""
+        return self.iter_from(None)
+
+    @abstractmethod
+    def page(self, after: Optional[str], limit: int) -> List[MediaItem]:
+        """Return up to limit items with ids greater than after, in id order.
+
+        This is keyset pagination: the cursor is the last id of the
+        previous page, so every page costs the same regardless of depth.
+        """
+
+    def iter_from(
+        self, after: Optional[str], chunk_size: int = 500
+    ) -> Iterator[MediaItem]:
+        """Iterate items after the given cursor, fetching chunk_size at a time"""
+        while True:
+            items = self.page(after, chunk_size)
+            yield from items
+            if len(items) < chunk_size:
+                return
+            after = items[-1].id
+
+    @abstractmethod
+    def get(self, media_id: str) -> Optional[MediaItem]:
+        """Return the item with the given id, or None"""
+
+    def __contains__(self, media_id: str) -> bool:
+        return self.get(media_id) is not None
+
+    def get_many(self, media_ids: Iterable[str]) -> Dict[str, MediaItem]:
+        """Return the found items keyed by id; missing ids are omitted"""
+        found = {}
+        for media_id in media_ids:
+            item = self.get(media_id)
+            if item is not None:
+                found[media_id] = item
+        return found
+
+    def iter_text(self) -> Iterator[Tuple[str, str, Optional[str]]]:
+        """Iterate (id, title, description) tuples for building text indexes"""
+        for item in self:
+            yield item.id, item.title, item.description
+
+    def iter_ids(self) -> Iterator[str]:
+        """Iterate item ids in order"""
+        for item in self:
+            yield item.id
+
+    def iter_payloads(self) -> Iterator[Tuple[str, bytes]]:
+        """Iterate (id, JSON payload) pairs in id order"""
+        for item in self:
+            yield item.id, item.model_dump_json().encode()
+
+    def write_snapshot(self, writer: SnapshotWriter) -> Dict[str, int]:
+        """Write all items to a snapshot; returns each id's record number"""
+        ids: List[str] = []
+
+        def payloads() -> Iterator[bytes]:
+            for media_id, payload in self.iter_payloads():
+                ids.append(media_id)
+                yield payload
+
+        writer.add_strings("catalog.records", payloads())
+        writer.add_strings("catalog.ids", ids)
+        return {media_id: position for position, media_id in enumerate(ids)}
+
+    def find(
+        self,
+        genre: Optional[str] = None,
+        year_from: Optional[int] = None,
+        year_to: Optional[int] = None,
+    ) -> Iterator[MediaItem]:
+        """Iterate items matching the given metadata filters"""
+        for item in self:
+            if genre is not None and metadata_genre(item) != genre:
+                continue
+            year = metadata_year(item)
+            if year_from is not None and (year is None or year < year_from):
+                continue
+            if year_to is not None and (year is None or year > year_to):
+                continue
+            yield item
+
+    def upsert(self, item: MediaItem) -> None:
+        """Insert or replace a single item"""
+        self.upsert_many([item])
+
+    def upsert_many(self, items: Iterable[MediaItem]) -> None:
+        """Insert or replace items and notify listeners"""
+        items = list(items)
+        if not items:
+            return
+        self._store(items)
+        self._changed(items, [])
+
+    def delete(self, media_ids: Iterable[str]) -> List[str]:
+        """Delete items by id and return the ids that actually existed"""
+        deleted = self._remove(list(media_ids))
+        if deleted:
+            self._changed([], deleted)
+        return deleted
+
+    def close(self) -> None:
+        """Release any resources held by the catalog"""
+
+    def _changed(self, upserted: List[MediaItem], deleted: List[str]) -> None:
+        self.version += 1
+        for listener in self._listeners:
+            listener(upserted, deleted)
+
+    @abstractmethod
+    def _store(self, items: List[MediaItem]) -> None: ...
+
+    @abstractmethod
+    def _remove(self, media_ids: List[str]) -> List[str]: ...
+
+
+class InMemoryCatalog(MediaCatalog):
+    """Catalog held in a dict keyed by media id"""
+
+    def __init__(self, items: Iterable[MediaItem] = ()) -> None:
+        super().__init__()
+        self._items: Dict[str, MediaItem] = {}
+        self._sorted_ids: List[str] = []
+        self._store(list(items))
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def page(self, after: Optional[str], limit: int) -> List[MediaItem]:
+        start = 0 if after is None else bisect_right(self._sorted_ids, after)
+        return [self._items[m] for m in self._sorted_ids[start : start + limit]]
+
+    def __contains__(self, media_id: str) -> bool:
+        return media_id in self._items
+
+    def get(self, media_id: str) -> Optional[MediaItem]:
+        return self._items.get(media_id)
+
+    def _store(self, items: List[MediaItem]) -> None:
+        new_ids = []
+        for item in items:
+            if item.id not in self._items:
+                new_ids.append(item.id)
+            self._items[item.id] = item
+        insert_sorted(self._sorted_ids, new_ids)
+
+    def _remove(self, media_ids: List[str]) -> List[str]:
+        deleted = []
+        for media_id in media_ids:
+            if self._items.pop(media_id, None) is not None:
+                del self._sorted_ids[bisect_left(self._sorted_ids, media_id)]
+                deleted.append(media_id)
+        return deleted
+
+
+class SQLiteCatalog(MediaCatalog):
+    """Durable catalog stored in SQLite.
+
+    Items are kept as JSON payloads in a ``WITHOUT ROWID`` table clustered
+    on the id, with secondary indexes on the genre and year taken from
+    ``metadata``. The connection runs in WAL mode so readers in other
+    processes never block on a writer. All statements are class-level
+    constants, so sqlite3's statement cache prepares each of them once.
+
+    Triggers count every row change in ``catalog_state.generation``, which
+    identifies the table contents across restarts and processes: index
+    snapshots stored beside the database are reused only while it matches.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS media (
+            id TEXT PRIMARY KEY,
+            title TEXT NOT NULL,
+            genre TEXT,
+            year INTEGER,
+            payload TEXT NOT NULL
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS media_genre ON media (genre, id);
+        CREATE INDEX IF NOT EXISTS media_year ON media (year, id);
+        CREATE TABLE IF NOT EXISTS catalog_state (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            generation INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO catalog_state (id, generation) VALUES (0, 0);
+        CREATE TRIGGER IF NOT EXISTS media_inserted AFTER INSERT ON media BEGIN
+            UPDATE catalog_state SET generation = generation + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS media_updated AFTER UPDATE ON media BEGIN
+            UPDATE catalog_state SET generation = generation + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS media_deleted AFTER DELETE ON media BEGIN
+            UPDATE catalog_state SET generation = generation + 1;
+        END;
+    """
+    _COUNT = "SELECT COUNT(*) FROM media"
+    _GET = "SELECT payload FROM media WHERE id = ?"
+    _GET_MANY = (
+        "SELECT media.id, media.payload FROM json_each(?) AS wanted "
+        "JOIN media ON media.id = wanted.value"
+    )
+    _ITER = "SELECT id, payload FROM media WHERE id > ? ORDER BY id LIMIT ?"
+    _ITER_IDS = "SELECT id FROM media WHERE id > ? ORDER BY id LIMIT ?"
+    _ITER_TEXT = (
+        "SELECT id, title, json_extract(payload, '$.description') "
+        "FROM media WHERE id > ? ORDER BY id LIMIT ?"
+    )
+    # Rows fetched per round trip when iterating the whole table.
+    _CHUNK = 1000
+    _UPSERT = (
+        "INSERT INTO media (id, title, genre, year, payload) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT (id) DO UPDATE SET title = excluded.title, "
+        "genre = excluded.genre, year = excluded.year, payload = excluded.payload"
+    )
+    _DELETE = "DELETE FROM media WHERE id = ? RETURNING id"
+    _GENERATION = "SELECT generation FROM catalog_state"
+
+    def __init__(self, path: str, readonly: bool = False) -> None:
+        super().__init__()
+        self.path = path
+        self.readonly = readonly
+        if readonly:
+            # Workers sharing one snapshot map the same file pages instead of
+            # each holding a private copy; mutations are rejected.
+            self._conn = sqlite3.connect(
+                f"file:{quote(path)}?mode=ro", uri=True, check_same_thread=False
+            )
+        else:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode = WAL")
+            self._conn.execute("PRAGMA synchronous = NORMAL")
+            self._conn.executescript(self._SCHEMA)
+        self._conn.execute("PRAGMA temp_store = MEMORY")
+        self._conn.execute("PRAGMA mmap_size = 268435456")
+        self._lock = threading.Lock()
+        # Generation of the table as of this connection's last read or
+        # write, or None once another connection has changed it (or for a
+        # read-only database created before generations were recorded).
+        self.generation = self._read_generation()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(self._COUNT).fetchone()[0]
+
+    def page(self, after: Optional[str], limit: int) -> List[MediaItem]:
+        with self._lock:
+            rows = self._conn.execute(self._ITER, (after or "", limit)).fetchall()
+        return [MediaItem.model_validate_json(payload) for _media_id, payload in rows]
+
+    def iter_from(
+        self, after: Optional[str], chunk_size: int = 500
+    ) -> Iterator[MediaItem]:
+        # Avoid materializing a page of models just to learn its last id.
+        for _media_id, payload in self._iter_rows(self._ITER, after or ""):
+            yield MediaItem.model_validate_json(payload)
+
+    def _iter_rows(self, statement: str, last_id: str = "") -> Iterator[tuple]:
+        # Walk the clustered primary key in chunks instead of holding a
+        # cursor (and the lock) open for the whole table.
+        while True:
+            with self._lock:
+                rows = self._conn.execute(statement, (last_id, self._CHUNK)).fetchall()
+            yield from rows
+            if len(rows) < self._CHUNK:
+                return
+            last_id = rows[-1][0]
+
+    def get(self, media_id: str) -> Optional[MediaItem]:
+        with self._lock:
+            row = self._conn.execute(self._GET, (media_id,)).fetchone()
+        return MediaItem.model_validate_json(row[0]) if row else None
+
+    def get_many(self, media_ids: Iterable[str]) -> Dict[str, MediaItem]:
+        with self._lock:
+            rows = self._conn.execute(
+                self._GET_MANY, (json.dumps(list(media_ids)),)
+            ).fetchall()
+        return {
+            media_id: MediaItem.model_validate_json(payload)
+            for media_id, payload in rows
+        }
+
+    def iter_text(self) -> Iterator[Tuple[str, str, Optional[str]]]:
+        return self._iter_rows(self._ITER_TEXT)
+
+    def iter_ids(self) -> Iterator[str]:
+        for (media_id,) in self._iter_rows(self._ITER_IDS):
+            yield media_id
+
+    def iter_payloads(self) -> Iterator[Tuple[str, bytes]]:
+        for media_id, payload in self._iter_rows(self._ITER):
+            yield media_id, payload.encode()
+
+    def find(
+        self,
+        genre: Optional[str] = None,
+        year_from: Optional[int] = None,
+        year_to: Optional[int] = None,
+    ) -> Iterator[MediaItem]:
+        clauses = []
+        params: List[object] = []
+        if genre is not None:
+            clauses.append("genre = ?")
+            params.append(genre)
+        if year_from is not None:
+            clauses.append("year >= ?")
+            params.append(year_from)
+        if year_to is not None:
+            clauses.append("year <= ?")
+            params.append(year_to)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT payload FROM media{where} ORDER BY id", params
+            ).fetchall()
+        for (payload,) in rows:
+            yield MediaItem.model_validate_json(payload)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def copy_to(self, path: str) -> None:
+        """Copy the database to a single file that can be opened read-only
+
+        The copy uses a rollback journal, so readers need no -wal or -shm
+        file; this database keeps its WAL mode.
+        """
+        with self._lock:
+            target = sqlite3.connect(path)
+            try:
+                self._conn.backup(target)
+                target.execute("PRAGMA journal_mode = DELETE")
+            finally:
+                target.close()
+
+    def current_generation(self) -> Optional[int]:
+        """The generation stored in the database now"""
+        with self._lock:
+            return self._read_generation()
+
+    def _read_generation(self) -> Optional[int]:
+        try:
+            return self._conn.execute(self._GENERATION).fetchone()[0]
+        except sqlite3.OperationalError:
+            return None
+
+    def _follow_generation(self, before: Optional[int]) -> None:
+        # Called inside a write transaction: keep tracking the generation
+        # only if nobody else wrote since this connection last saw it.
+        after = self._read_generation()
+        self.generation = after if before == self.generation else None
+
+    def _check_writable(self) -> None:
+        if self.readonly:
+            raise PermissionError(f"catalog {self.path} is opened read-only")
+
+    def _store(self, items: List[MediaItem]) -> None:
+        self._check_writable()
+        rows = [
+            (
+                item.id,
+                item.title,
+                metadata_genre(item),
+                metadata_year(item),
+                item.model_dump_json(),
+            )
+            for item in items
+        ]
+        with self._lock, self._conn:
+            # Take the write lock before reading the generation.
+            self._conn.execute("BEGIN IMMEDIATE")
+            before = self._read_generation()
+            self._conn.executemany(self._UPSERT, rows)
+            self._follow_generation(before)
+
+    def _remove(self, media_ids: List[str]) -> List[str]:
+        self._check_writable()
+        deleted = []
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            before = self._read_generation()
+            for media_id in media_ids:
+                if self._conn.execute(self._DELETE, (media_id,)).fetchone():
+                    deleted.append(media_id)
+            self._follow_generation(before)
+        return deleted
+
+
+class SnapshotCatalog(MediaCatalog):
+    """Catalog read from a snapshot, with changes held in memory.
+
+    Items are decoded from their JSON records when accessed. Items
+    upserted after loading go to an ``InMemoryCatalog`` overlay, and the
+    snapshot records they replace or that are deleted are shadowed; the
+    changes last until the next snapshot is written.
+    """
+
+    def __init__(self, snapshot: Snapshot, readonly: bool = False) -> None:
+        super().__init__()
+        self.snapshot = snapshot
+        self.readonly = readonly
+        self._ids = snapshot.strings("catalog.ids")
+        self._records = snapshot.strings("catalog.records")
+        self._overlay = InMemoryCatalog()
+        self._shadowed: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._ids) - len(self._shadowed) + len(self._overlay)
+
+    def __contains__(self, media_id: str) -> bool:
+        if media_id in self._overlay:
+            return True
+        return media_id not in self._shadowed and self._ids.find(media_id) is not None
+
+    def page(self, after: Optional[str], limit: int) -> List[MediaItem]:
+        return list(islice(self.iter_from(after), limit))
+
+    def iter_from(
+        self, after: Optional[str], chunk_size: int = 500
+    ) -> Iterator[MediaItem]:
+        for _media_id, source in self._merged(after):
+            yield source if isinstance(source, MediaItem) else self._decode(source)
+
+    def get(self, media_id: str) -> Optional[MediaItem]:
+        item = self._overlay.get(media_id)
+        if item is not None or media_id in self._shadowed:
+            return item
+        position = self._ids.find(media_id)
+        return None if position is None else self._decode(position)
+
+    def iter_payloads(self) -> Iterator[Tuple[str, bytes]]:
+        for media_id, source in self._merged(None):
+            if isinstance(source, MediaItem):
+                yield media_id, source.model_dump_json().encode()
+            else:
+                yield media_id, bytes(self._records.raw(source))
+
+    def _merged(
+        self, after: Optional[str]
+    ) -> Iterator[Tuple[str, Union[int, MediaItem]]]:
+        """(id, record number or overlay item) pairs after the cursor, in id order"""
+        start = 0 if after is None else bisect_right(self._ids, after)
+
+        def records() -> Iterator[Tuple[str, int]]:
+            for position in range(start, len(self._ids)):
+                media_id = self._ids[position]
+                if media_id not in self._shadowed:
+                    yield media_id, position
+
+        overlay = ((item.id, item) for item in self._overlay.iter_from(after))
+        return merge(records(), overlay, key=itemgetter(0))
+
+    def _decode(self, position: int) -> MediaItem:
+        return MediaItem.model_validate_json(bytes(self._records.raw(position)))
+
+    def _check_writable(self) -> None:
+        if self.readonly:
+            raise PermissionError(f"catalog {self.snapshot.path} is opened read-only")
+
+    def _store(self, items: List[MediaItem]) -> None:
+        self._check_writable()
+        self._overlay.upsert_many(items)
+        for item in items:
+            if self._ids.find(item.id) is not None:
+                self._shadowed.add(item.id)
+
+    def _remove(self, media_ids: List[str]) -> List[str]:
+        self._check_writable()
+        deleted = []
+        for media_id in media_ids:
+            if self._overlay.delete([media_id]):
+                deleted.append(media_id)
+            elif (
+                media_id not in self._shadowed and self._ids.find(media_id) is not None
+            ):
+                self._shadowed.add(media_id)
+                deleted.append(media_id)
+        return deleted
+
+
+def open_catalog(path: Optional[str] = None, readonly: bool = False) -> MediaCatalog:
+    """Open the SQLite catalog at path, or an empty in-memory catalog if path is None"""
+    if path:
+        return SQLiteCatalog(path, readonly=readonly)
+    # Imported here because compact builds on MediaCatalog from this module.
+    from .compact import CompactCatalog
+
+    return CompactCatalog()
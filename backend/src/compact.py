@@ -0,0 +1,258 @@
+"""Compact columnar storage for the in-memory catalog.
+
+A pydantic ``MediaItem`` with its ``MediaSource`` list and metadata dict
+costs a few KB of Python objects. ``CompactCatalog`` instead stores each
+field in a column indexed by row number:
+
+* low-cardinality strings (source names, qualities) are interned in a
+  ``StringPool`` and stored as integer codes in ``array`` columns;
+* the sources of all items live in shared flat columns, and each row keeps
+  only the offset and count of its range;
+* metadata is split into a shared key tuple (its "shape") and a tuple of
+  values, with short string values interned.
+
+``MediaItem`` objects are only built, with ``model_construct`` (no
+re-validation), when an item is read, i.e. at the response boundary.
+Mutable metadata values are copied on the way in and out, so neither the
+caller's items nor the returned ones share state with the columns.
+"""
+
+import copy
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .catalog import MediaCatalog, insert_sorted
+from .models import MediaItem, MediaSource
+
+# Metadata string values up to this length are interned (years, genres, ...).
+INTERN_MAX_LENGTH = 64
+
+
+class StringPool:
+    """Strings referenced by small integer codes; code 0 stands for None"""
+
+    __slots__ = ("_codes", "values")
+
+    def __init__(self) -> None:
+        self._codes: Dict[str, int] = {}
+        self.values: List[Optional[str]] = [None]
+
+    def code(self, value: Optional[str]) -> int:
+        if value is None:
+            return 0
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(sys.intern(value))
+        return code
+
+    def __len__(self) -> int:
+        return len(self.values) - 1
+
+
+_MUTABLE = (dict, list, set)
+
+
+def _stored_value(value: Any) -> Any:
+    if isinstance(value, str):
+        return sys.intern(value) if len(value) <= INTERN_MAX_LENGTH else value
+    return copy.deepcopy(value) if isinstance(value, _MUTABLE) else value
+
+
+def _returned_value(value: Any) -> Any:
+    return copy.deepcopy(value) if isinstance(value, _MUTABLE) else value
+
+
+class CompactCatalog(MediaCatalog):
+    """In-memory catalog stored column-wise instead of as pydantic objects"""
+
+    # Rebuild the source columns once more than this share is unused.
+    _MAX_GARBAGE_RATIO = 0.5
+
+    def __init__(self, items: Iterable[MediaItem] = ()) -> None:
+        super().__init__()
+        self._rows: Dict[str, int] = {}
+        self._sorted_ids: List[str] = []
+        self._free_rows: List[int] = []
+
+        # Item columns.
+        self._ids: List[Optional[str]] = []
+        self._titles: List[str] = []
+        self._thumbnails: List[Optional[str]] = []
+        self._descriptions: List[Optional[str]] = []
+        self._meta_shapes = array("I")
+        self._meta_values: List[Tuple[Any, ...]] = []
+        self._source_start = array("I")
+        self._source_count = array("I")
+
+        # Flat source columns shared by all rows.
+        self._source_names = array("I")
+        self._source_urls: List[str] = []
+        self._source_qualities = array("I")
+        self._source_sizes = array("I")
+        self._source_garbage = 0
+
+        self._strings = StringPool()
+        self._shapes: List[Tuple[str, ...]] = []
+        self._shape_codes: Dict[Tuple[str, ...], int] = {}
+
+        self._store(list(items))
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, media_id: str) -> bool:
+        return media_id in self._rows
+
+    def get(self, media_id: str) -> Optional[MediaItem]:
+        row = self._rows.get(media_id)
+        return self._materialize(row) if row is not None else None
+
+    def page(self, after: Optional[str], limit: int) -> List[MediaItem]:
+        start = 0 if after is None else bisect_right(self._sorted_ids, after)
+        return [
+            self._materialize(self._rows[media_id])
+            for media_id in self._sorted_ids[start : start + limit]
+        ]
+
+    def iter_text(self) -> Iterator[Tuple[str, str, Optional[str]]]:
+        # Read straight from the columns; no MediaItem is built.
+        for media_id in self._sorted_ids:
+            row = self._rows[media_id]
+            yield media_id, self._titles[row], self._descriptions[row]
+
+    def metadata(self, media_id: str) -> Optional[Dict[str, Any]]:
+        """Return an item's metadata without materializing the item"""
+        row = self._rows.get(media_id)
+        return self._metadata(row) if row is not None else None
+
+    def _metadata(self, row: int) -> Dict[str, Any]:
+        return {
+            key: _returned_value(value)
+            for key, value in zip(
+                self._shapes[self._meta_shapes[row]], self._meta_values[row]
+            )
+        }
+
+    def _materialize(self, row: int) -> MediaItem:
+        start = self._source_start[row]
+        strings = self._strings.values
+        sources = [
+            MediaSource.model_construct(
+                name=strings[self._source_names[index]],
+                url=self._source_urls[index],
+                quality=strings[self._source_qualities[index]],
+                size=strings[self._source_sizes[index]],
+            )
+            for index in range(start, start + self._source_count[row])
+        ]
+        return MediaItem.model_construct(
+            id=self._ids[row],
+            title=self._titles[row],
+            thumbnail=self._thumbnails[row],
+            description=self._descriptions[row],
+            sources=sources,
+            metadata=self._metadata(row),
+        )
+
+    def _shape(self, keys: Tuple[str, ...]) -> int:
+        code = self._shape_codes.get(keys)
+        if code is None:
+            code = self._shape_codes[keys] = len(self._shapes)
+            self._shapes.append(tuple(sys.intern(key) for key in keys))
+        return code
+
+    def _store(self, items: List[MediaItem]) -> None:
+        new_ids = []
+        for item in items:
+            row = self._rows.get(item.id)
+            if row is None:
+                row = self._new_row(item.id)
+                new_ids.append(self._ids[row])
+            self._titles[row] = item.title
+            self._thumbnails[row] = item.thumbnail
+            self._descriptions[row] = item.description
+            self._meta_shapes[row] = self._shape(tuple(item.metadata))
+            self._meta_values[row] = tuple(
+                _stored_value(value) for value in item.metadata.values()
+            )
+            self._store_sources(row, item.sources)
+        insert_sorted(self._sorted_ids, new_ids)
+        self._maybe_compact_sources()
+
+    def _new_row(self, media_id: str) -> int:
+        media_id = sys.intern(media_id)
+        if self._free_rows:
+            row = self._free_rows.pop()
+            self._ids[row] = media_id
+        else:
+            row = len(self._ids)
+            self._ids.append(media_id)
+            self._titles.append("")
+            self._thumbnails.append(None)
+            self._descriptions.append(None)
+            self._meta_shapes.append(0)
+            self._meta_values.append(())
+            self._source_start.append(0)
+            self._source_count.append(0)
+        self._rows[media_id] = row
+        return row
+
+    def _store_sources(self, row: int, sources: List[MediaSource]) -> None:
+        count = self._source_count[row]
+        if len(sources) <= count:
+            # Overwrite the existing range in place.
+            start = self._source_start[row]
+            self._source_garbage += count - len(sources)
+        else:
+            start = len(self._source_urls)
+            self._source_garbage += count
+            self._source_names.extend([0] * len(sources))
+            self._source_urls.extend([""] * len(sources))
+            self._source_qualities.extend([0] * len(sources))
+            self._source_sizes.extend([0] * len(sources))
+        for index, source in enumerate(sources, start):
+            self._source_names[index] = self._strings.code(source.name)
+            self._source_urls[index] = source.url
+            self._source_qualities[index] = self._strings.code(source.quality)
+            self._source_sizes[index] = self._strings.code(source.size)
+        self._source_start[row] = start
+        self._source_count[row] = len(sources)
+
+    def _maybe_compact_sources(self) -> None:
+        total = len(self._source_urls)
+        if total < 1024 or self._source_garbage <= total * self._MAX_GARBAGE_RATIO:
+            return
+        names, qualities, sizes = array("I"), array("I"), array("I")
+        urls: List[str] = []
+        for row in self._rows.values():
+            start, count = self._source_start[row], self._source_count[row]
+            self._source_start[row] = len(urls)
+            names.extend(self._source_names[start : start + count])
+            urls.extend(self._source_urls[start : start + count])
+            qualities.extend(self._source_qualities[start : start + count])
+            sizes.extend(self._source_sizes[start : start + count])
+        self._source_names, self._source_urls = names, urls
+        self._source_qualities, self._source_sizes = qualities, sizes
+        self._source_garbage = 0
+
+    def _remove(self, media_ids: List[str]) -> List[str]:
+        deleted = []
+        for media_id in media_ids:
+            row = self._rows.pop(media_id, None)
+            if row is None:
+                continue
+            del self._sorted_ids[bisect_left(self._sorted_ids, media_id)]
+            self._source_garbage += self._source_count[row]
+            self._source_count[row] = 0
+            self._ids[row] = None
+            self._titles[row] = ""
+            self._thumbnails[row] = None
+            self._descriptions[row] = None
+            self._meta_values[row] = ()
+            self._free_rows.append(row)
+            deleted.append(media_id)
+        self._maybe_compact_sources()
+        return deleted
@@ -0,0 +1,191 @@
+"""Runtime settings for the Streamy backend, read from the environment."""
+
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Optional
+
+
+def _env_str(name: str) -> Optional[str]:
+    return os.environ.get(name) or None
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    value = os.environ.get(name)
+    if not value:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_optional_float(name: str) -> Optional[float]:
+    value = os.environ.get(name)
+    return float(value) if value else None
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Backend configuration.
+
+    Every field maps to a ``STREAMY_*`` environment variable so the same
+    code runs unchanged in development, tests and production.
+    """
+
+    # Path to the SQLite catalog database; None keeps the catalog in memory.
+    catalog_db: Optional[str] = None
+    # Open catalog_db read-only (set by run.py for workers sharing a snapshot).
+    catalog_readonly: bool = False
+    # Binary snapshot of the in-memory catalog and its indexes: mapped at
+    # startup when it exists, written on shutdown and by POST /admin/snapshot.
+    catalog_snapshot: Optional[str] = None
+
+    # JSON file with a list of WebSource definitions used by /scrape/search.
+    scrape_sources_file: Optional[str] = None
+    # Connection pool limits shared by every outbound scraping request.
+    scrape_max_connections: int = 100
+    scrape_connections_per_host: int = 8
+    # Total timeout in seconds for a single upstream page fetch.
+    scrape_timeout: float = 15.0
+    # Threads used to parse HTML off the event loop.
+    scrape_parse_workers: int = 4
+
+    # Extra EasyList-style filter list and where to keep its compiled index.
+    adblock_filters: Optional[str] = None
+    adblock_cache: Optional[str] = None
+
+    # Federated search: global deadline and per-provider budgets, in seconds.
+    federated_deadline: float = 2.5
+    federated_provider_timeout: float = 2.0
+    # Start a duplicate request to a slow remote provider after this delay.
+    federated_hedge_after: Optional[float] = None
+
+    # Metadata providers; a provider is only enabled when its key is set.
+    tmdb_api_key: Optional[str] = None
+    tmdb_base_url: str = "https://api.themoviedb.org/3"
+    omdb_api_key: Optional[str] = None
+    omdb_base_url: str = "http://www.omdbapi.com"
+
+    # Metadata proxy in front of TMDB/OMDB: disk cache directory, memory and
+    # disk budgets in bytes, how long entries are fresh and how much longer
+    # a stale entry is served while it is refreshed, in seconds.
+    metadata_cache_dir: Optional[str] = None
+    metadata_memory_bytes: int = 16 * 1024 * 1024
+    metadata_disk_bytes: int = 256 * 1024 * 1024
+    metadata_ttl: float = 3600.0
+    metadata_stale_ttl: float = 86400.0
+
+    # POST /events and /trending: directory of the event log and trending
+    # checkpoints, whether log writes are fsynced, an optional extra wait
+    # (seconds) letting more batches share each write, ranking length,
+    # and how often rankings are refreshed and checkpointed (seconds).
+    events_dir: Optional[str] = None
+    events_fsync: bool = True
+    events_commit_delay: float = 0.0
+    events_top_k: int = 100
+    events_refresh_interval: float = 1.0
+    events_checkpoint_interval: float = 60.0
+
+    # Opt-in sampling profiler kept for the slowest requests (/metrics/profile).
+    profile_requests: bool = False
+    profile_interval: float = 0.005
+    profile_keep: int = 20
+
+    # /thumbnail: disk and memory cache budgets in bytes, resize threads,
+    # encoder quality and an optional directory for file:// originals.
+    thumbnail_cache_dir: Optional[str] = None
+    thumbnail_disk_bytes: int = 1024 * 1024 * 1024
+    thumbnail_memory_bytes: int = 64 * 1024 * 1024
+    thumbnail_workers: int = 2
+    thumbnail_quality: int = 80
+    thumbnail_local_dir: Optional[str] = None
+
+    # /hls proxy: key signing proxied URLs (random per process when unset;
+    # run.py shares one between workers), segment cache budget and the
+    # largest segment that is cached.
+    hls_secret: Optional[str] = None
+    hls_cache_bytes: int = 256 * 1024 * 1024
+    hls_max_segment_bytes: int = 16 * 1024 * 1024
+
+    # /files: directory of locally stored media, and an optional internal
+    # location of a fronting nginx (X-Accel-Redirect) that sends them.
+    media_dir: Optional[str] = None
+    media_accel_prefix: Optional[str] = None
+
+    # Bearer token for the /admin endpoints, which are disabled when unset.
+    admin_token: Optional[str] = None
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            catalog_db=_env_str("STREAMY_CATALOG_DB"),
+            catalog_readonly=_env_bool("STREAMY_CATALOG_READONLY"),
+            catalog_snapshot=_env_str("STREAMY_CATALOG_SNAPSHOT"),
+            scrape_sources_file=_env_str("STREAMY_SCRAPE_SOURCES"),
+            scrape_max_connections=_env_int("STREAMY_SCRAPE_MAX_CONNECTIONS", 100),
+            scrape_connections_per_host=_env_int("STREAMY_SCRAPE_PER_HOST", 8),
+            scrape_timeout=_env_float("STREAMY_SCRAPE_TIMEOUT", 15.0),
+            scrape_parse_workers=_env_int("STREAMY_SCRAPE_PARSE_WORKERS", 4),
+            adblock_filters=_env_str("STREAMY_ADBLOCK_FILTERS"),
+            adblock_cache=_env_str("STREAMY_ADBLOCK_CACHE"),
+            federated_deadline=_env_float("STREAMY_FEDERATED_DEADLINE", 2.5),
+            federated_provider_timeout=_env_float("STREAMY_FEDERATED_TIMEOUT", 2.0),
+            federated_hedge_after=_env_optional_float("STREAMY_FEDERATED_HEDGE_AFTER"),
+            tmdb_api_key=_env_str("STREAMY_TMDB_API_KEY"),
+            tmdb_base_url=_env_str("STREAMY_TMDB_BASE_URL")
+            or "https://api.themoviedb.org/3",
+            omdb_api_key=_env_str("STREAMY_OMDB_API_KEY"),
+            omdb_base_url=_env_str("STREAMY_OMDB_BASE_URL") or "http://www.omdbapi.com",
+            metadata_cache_dir=_env_str("STREAMY_METADATA_CACHE_DIR")
+            or os.path.join(tempfile.gettempdir(), "streamy-metadata"),
+            metadata_memory_bytes=_env_int(
+                "STREAMY_METADATA_MEMORY_BYTES", 16 * 1024 * 1024
+            ),
+            metadata_disk_bytes=_env_int(
+                "STREAMY_METADATA_DISK_BYTES", 256 * 1024 * 1024
+            ),
+            metadata_ttl=_env_float("STREAMY_METADATA_TTL", 3600.0),
+            metadata_stale_ttl=_env_float("STREAMY_METADATA_STALE_TTL", 86400.0),
+            events_dir=_env_str("STREAMY_EVENTS_DIR")
+            or os.path.join(tempfile.gettempdir(), "streamy-events"),
+            events_fsync=_env_bool("STREAMY_EVENTS_FSYNC", True),
+            events_commit_delay=_env_float("STREAMY_EVENTS_COMMIT_DELAY", 0.0),
+            events_top_k=_env_int("STREAMY_EVENTS_TOP_K", 100),
+            events_refresh_interval=_env_float("STREAMY_EVENTS_REFRESH_INTERVAL", 1.0),
+            events_checkpoint_interval=_env_float(
+                "STREAMY_EVENTS_CHECKPOINT_INTERVAL", 60.0
+            ),
+            profile_requests=_env_bool("STREAMY_PROFILE"),
+            profile_interval=_env_float("STREAMY_PROFILE_INTERVAL", 0.005),
+            profile_keep=_env_int("STREAMY_PROFILE_KEEP", 20),
+            thumbnail_cache_dir=_env_str("STREAMY_THUMBNAIL_CACHE_DIR")
+            or os.path.join(tempfile.gettempdir(), "streamy-thumbnails"),
+            thumbnail_disk_bytes=_env_int(
+                "STREAMY_THUMBNAIL_DISK_BYTES", 1024 * 1024 * 1024
+            ),
+            thumbnail_memory_bytes=_env_int(
+                "STREAMY_THUMBNAIL_MEMORY_BYTES", 64 * 1024 * 1024
+            ),
+            thumbnail_workers=_env_int("STREAMY_THUMBNAIL_WORKERS", 2),
+            thumbnail_quality=_env_int("STREAMY_THUMBNAIL_QUALITY", 80),
+            thumbnail_local_dir=_env_str("STREAMY_THUMBNAIL_LOCAL_DIR"),
+            hls_secret=_env_str("STREAMY_HLS_SECRET"),
+            hls_cache_bytes=_env_int("STREAMY_HLS_CACHE_BYTES", 256 * 1024 * 1024),
+            hls_max_segment_bytes=_env_int(
+                "STREAMY_HLS_MAX_SEGMENT_BYTES", 16 * 1024 * 1024
+            ),
+            media_dir=_env_str("STREAMY_MEDIA_DIR"),
+            media_accel_prefix=_env_str("STREAMY_MEDIA_ACCEL_PREFIX"),
+            admin_token=_env_str("STREAMY_ADMIN_TOKEN"),
+        )
+
+
+settings = Settings.from_env()
@@ -0,0 +1,884 @@
+"""Watch events: durable batched ingestion and windowed trending rankings.
+
+Apps post batches of play and progress events, optionally gzip- or
+zlib-compressed. A batch is counted at once and appended to a write-ahead
+log as one checksummed frame, and the request is answered when the frame
+is on disk. Frames queued while a write is in flight are written and
+fsynced together (group commit), so the number of fsyncs follows the
+speed of the disk rather than the request rate.
+
+Counts are kept in count-min sketches, one per time bucket. A window
+(the last hour, the last day) adds up its live buckets in a running
+window sketch, from which an expiring bucket is subtracted, and keeps
+its most counted keys in a bounded min-heap. Rankings are recomputed on
+a timer, so ``GET /trending`` only returns a precomputed, encoded list.
+
+The aggregated counts are checkpointed periodically and on shutdown, as
+raw sketch counters plus JSON in a ``Snapshot`` file; startup loads the
+checkpoint and replays only the log frames written after it. Every
+process claims its own slot directory under the events directory
+(guarded by a lock file), so workers never share a log. Rankings add
+the counts of the other slots, read from their latest checkpoints, so
+every worker ranks the events all of them received, those of the other
+workers lagging by up to the checkpoint interval.
+"""
+
+import asyncio
+import fcntl
+import hashlib
+import heapq
+import json
+import logging
+import os
+import stat
+import struct
+import time
+import zlib
+from array import array
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from operator import itemgetter
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+)
+
+from pydantic import BaseModel, Field, ValidationError
+
+from .response_cache import CachedResponse, make_etag
+from .snapshot import Snapshot, SnapshotError, SnapshotWriter
+
+logger = logging.getLogger(__name__)
+
+# Limits of one POST /events batch; the byte limit applies to the body
+# as received and to its inflated size.
+MAX_BATCH_BYTES = 1024 * 1024
+MAX_BATCH_EVENTS = 10000
+# A start counts as much as a few progress reports, so titles people keep
+# watching rank alongside the ones they only open.
+EVENT_WEIGHTS = {"play": 3, "progress": 1}
+# Trending windows: length and bucket length, in seconds.
+WINDOWS = {"1h": (3600, 60), "24h": (86400, 900)}
+# 4 x 2048 counters: with a total count N, an estimate exceeds the true
+# count by more than N / 750 with a probability below 2%.
+SKETCH_WIDTH = 2048
+SKETCH_DEPTH = 4
+SEGMENT_BYTES = 64 * 1024 * 1024
+CHECKPOINT_VERSION = 2
+CHECKPOINT_NAME = "checkpoint.snapshot"
+
+_FRAME = struct.Struct("<II")
+_GZIP_MAGIC = b"\x1f\x8b"
+
+Cells = Tuple[int, ...]
+
+# A checkpoint only loads into sketches and windows of the same shape.
+_LAYOUT = {
+    "width": SKETCH_WIDTH,
+    "depth": SKETCH_DEPTH,
+    "windows": {name: list(spec) for name, spec in WINDOWS.items()},
+}
+
+
+class WatchEvent(BaseModel):
+    media_id: str = Field(..., min_length=1, max_length=256)
+    type: Literal["play", "progress"]
+    # Playback position in seconds.
+    position: Optional[float] = Field(None, ge=0)
+
+
+class EventBatch(BaseModel):
+    events: List[WatchEvent] = Field(..., max_length=MAX_BATCH_EVENTS)
+
+
+class EventsAccepted(BaseModel):
+    accepted: int
+
+
+class TrendingItem(BaseModel):
+    id: str
+    title: Optional[str] = None
+    # Weighted event count in the window; an estimate that may exceed,
+    # but never falls short of, the true count.
+    score: int
+
+
+class TrendingResponse(BaseModel):
+    window: str
+    generated_at: float
+    items: List[TrendingItem]
+
+
+class EventError(Exception):
+    """Raised when a batch of events cannot be decoded or validated"""
+
+
+class EventLogError(Exception):
+    """Raised when events could not be written to the log"""
+
+
+def decode_batch(body: bytes) -> List[WatchEvent]:
+    """Validate a JSON event batch, inflating it first if it is compressed"""
+    # JSON starts with "{" or whitespace, never with these bytes.
+    if body[:2] == _GZIP_MAGIC or body[:1] == b"\x78":
+        # wbits=47 accepts both gzip and zlib headers.
+        inflater = zlib.decompressobj(wbits=47)
+        try:
+            data = inflater.decompress(body, MAX_BATCH_BYTES)
+        except zlib.error as exc:
+            raise EventError(f"Corrupt compressed batch: {exc}") from None
+        if inflater.unconsumed_tail:
+            raise EventError(f"Batch inflates to more than {MAX_BATCH_BYTES} bytes")
+        if not inflater.eof:
+            raise EventError("Truncated compressed batch")
+        body = data
+    try:
+        return EventBatch.model_validate_json(body).events
+    except ValidationError as exc:
+        first = exc.errors(include_url=False)[0]
+        location = ".".join(str(part) for part in first["loc"])
+        raise EventError(f"{location}: {first['msg']}" if location else first["msg"])
+
+
+def sketch_cells(key: str) -> Cells:
+    """Counter index of key in each row of a sketch"""
+    digest = hashlib.blake2b(key.encode(), digest_size=4 * SKETCH_DEPTH).digest()
+    return tuple(
+        value % SKETCH_WIDTH for value in struct.unpack(f"<{SKETCH_DEPTH}I", digest)
+    )
+
+
+class CountMinSketch:
+    """Approximate counts of any number of keys in fixed memory"""
+
+    __slots__ = ("rows",)
+
+    # Size of the encoded counters.
+    BYTES = 8 * SKETCH_WIDTH * SKETCH_DEPTH
+
+    def __init__(self) -> None:
+        self.rows = [array("q", bytes(8 * SKETCH_WIDTH)) for _ in range(SKETCH_DEPTH)]
+
+    def add(self, cells: Cells, amount: int) -> None:
+        for row, cell in zip(self.rows, cells):
+            row[cell] += amount
+
+    def estimate(self, cells: Cells) -> int:
+        return min(row[cell] for row, cell in zip(self.rows, cells))
+
+    def merge(self, other: "CountMinSketch") -> None:
+        for row, counts in zip(self.rows, other.rows):
+            for cell, value in enumerate(counts):
+                if value:
+                    row[cell] += value
+
+    def subtract(self, other: "CountMinSketch") -> None:
+        for row, counts in zip(self.rows, other.rows):
+            for cell, value in enumerate(counts):
+                if value:
+                    row[cell] -= value
+
+    def to_bytes(self) -> bytes:
+        return b"".join(row.tobytes() for row in self.rows)
+
+    @classmethod
+    def from_bytes(cls, data: memoryview) -> "CountMinSketch":
+        if len(data) != cls.BYTES:
+            raise ValueError(f"sketch of {len(data)} bytes, expected {cls.BYTES}")
+        sketch = cls.__new__(cls)
+        sketch.rows = []
+        size = 8 * SKETCH_WIDTH
+        for start in range(0, cls.BYTES, size):
+            row = array("q")
+            row.frombytes(data[start : start + size])
+            sketch.rows.append(row)
+        return sketch
+
+
+class SlidingWindow:
+    """Counts of the last ``length`` seconds, expired one bucket at a time.
+
+    Up to ``capacity`` candidate keys are kept with their window estimate
+    in a min-heap; a key that is not a candidate replaces the lowest one
+    once its estimate is higher. Candidates are re-estimated when buckets
+    expire, while other keys only come back with their next event.
+    """
+
+    def __init__(self, length: int, bucket: int, capacity: int) -> None:
+        self.bucket = bucket
+        self.live_buckets = length // bucket
+        self.capacity = capacity
+        self.total = CountMinSketch()
+        self.buckets: Dict[int, CountMinSketch] = {}
+        # Number of the oldest bucket still in the window.
+        self.oldest = 0
+        self.candidates: Dict[str, int] = {}
+        self.cells: Dict[str, Cells] = {}
+        # (estimate, key) pairs; pairs whose estimate is out of date are
+        # skipped and dropped when they reach the top.
+        self._heap: List[Tuple[int, str]] = []
+
+    def add(self, timestamp: float, key: str, cells: Cells, amount: int) -> None:
+        number = int(timestamp // self.bucket)
+        if number < self.oldest:
+            return
+        sketch = self.buckets.get(number)
+        if sketch is None:
+            sketch = self.buckets[number] = CountMinSketch()
+        sketch.add(cells, amount)
+        self.total.add(cells, amount)
+        if amount > 0 or key in self.candidates:
+            self._offer(key, cells, self.total.estimate(cells))
+
+    def expire(self, now: float) -> bool:
+        """Drop the buckets that left the window; True if there were any"""
+        self.oldest = int(now // self.bucket) - self.live_buckets + 1
+        expired = [number for number in self.buckets if number < self.oldest]
+        for number in expired:
+            self.total.subtract(self.buckets.pop(number))
+        if not expired:
+            return False
+        estimates = {
+            key: self.total.estimate(cells) for key, cells in self.cells.items()
+        }
+        self.candidates = {key: value for key, value in estimates.items() if value > 0}
+        self.cells = {key: self.cells[key] for key in self.candidates}
+        self._rebuild_heap()
+        return True
+
+    def top(self, limit: int) -> List[Tuple[str, int]]:
+        """The limit highest (key, estimate) pairs, highest first"""
+        return heapq.nlargest(limit, self.candidates.items(), key=itemgetter(1))
+
+    def dump(self) -> Tuple[Dict[str, Any], bytes]:
+        """JSON-compatible state and encoded sketches, for a checkpoint"""
+        numbers = sorted(self.buckets)
+        data = self.total.to_bytes() + b"".join(
+            self.buckets[number].to_bytes() for number in numbers
+        )
+        meta = {
+            "oldest": self.oldest,
+            "buckets": numbers,
+            "candidates": dict(self.candidates),
+        }
+        return meta, data
+
+    def load(self, meta: Dict[str, Any], data: memoryview) -> None:
+        """Restore the state saved by ``dump``"""
+        size = CountMinSketch.BYTES
+        numbers = meta["buckets"]
+        if len(data) != size * (len(numbers) + 1):
+            raise ValueError("window sketches do not match its buckets")
+        self.total = CountMinSketch.from_bytes(data[:size])
+        self.buckets = {
+            number: CountMinSketch.from_bytes(data[start : start + size])
+            for start, number in zip(range(size, len(data), size), numbers)
+        }
+        self.oldest = meta["oldest"]
+        self.candidates = dict(
+            heapq.nlargest(self.capacity, meta["candidates"].items(), key=itemgetter(1))
+        )
+        self.cells = {key: sketch_cells(key) for key in self.candidates}
+        self._rebuild_heap()
+
+    def _offer(self, key: str, cells: Cells, estimate: int) -> None:
+        if key not in self.candidates:
+            if len(self.candidates) >= self.capacity:
+                lowest, lowest_key = self._lowest()
+                if estimate <= lowest:
+                    return
+                heapq.heappop(self._heap)
+                del self.candidates[lowest_key]
+                del self.cells[lowest_key]
+            self.cells[key] = cells
+        self.candidates[key] = estimate
+        heapq.heappush(self._heap, (estimate, key))
+        if len(self._heap) > 2 * self.capacity + 64:
+            self._rebuild_heap()
+
+    def _lowest(self) -> Tuple[int, str]:
+        heap = self._heap
+        while True:
+            estimate, key = heap[0]
+            if self.candidates.get(key) == estimate:
+                return estimate, key
+            heapq.heappop(heap)
+
+    def _rebuild_heap(self) -> None:
+        self._heap = [(estimate, key) for key, estimate in self.candidates.items()]
+        heapq.heapify(self._heap)
+
+
+class TrendingTracker:
+    """Weighted event counts in every window of WINDOWS"""
+
+    def __init__(self, capacity: int) -> None:
+        self.windows = {
+            name: SlidingWindow(length, bucket, capacity)
+            for name, (length, bucket) in WINDOWS.items()
+        }
+
+    def add(
+        self, timestamp: float, events: Iterable[Tuple[str, str]], sign: int = 1
+    ) -> None:
+        """Count (media id, event type) pairs; sign=-1 takes them back"""
+        amounts: Counter = Counter()
+        for media_id, kind in events:
+            amounts[media_id] += EVENT_WEIGHTS[kind]
+        for media_id, amount in amounts.items():
+            cells = sketch_cells(media_id)
+            for window in self.windows.values():
+                window.add(timestamp, media_id, cells, sign * amount)
+
+    def expire(self, now: float) -> bool:
+        return any([window.expire(now) for window in self.windows.values()])
+
+    def dump(self) -> Dict[str, Tuple[Dict[str, Any], bytes]]:
+        """The state of every window, see ``SlidingWindow.dump``"""
+        return {name: window.dump() for name, window in self.windows.items()}
+
+
+def write_checkpoint(
+    path: str, seq: int, state: Dict[str, Tuple[Dict[str, Any], bytes]]
+) -> None:
+    """Save a ``TrendingTracker.dump`` covering the log up to frame seq"""
+    windows = {}
+    with SnapshotWriter(path) as writer:
+        for name, (meta, data) in state.items():
+            windows[name] = meta
+            writer.add_bytes(f"window.{name}", data)
+        writer.add_json(
+            "checkpoint",
+            {
+                "version": CHECKPOINT_VERSION,
+                "layout": _LAYOUT,
+                "seq": seq,
+                "windows": windows,
+            },
+        )
+
+
+def read_checkpoint(path: str, capacity: int) -> Tuple[int, TrendingTracker]:
+    """Load a checkpoint saved by ``write_checkpoint``
+
+    Raises OSError, SnapshotError or ValueError if it cannot be read.
+    """
+    snapshot = Snapshot(path)
+    meta = snapshot.json("checkpoint")
+    if not isinstance(meta, dict) or (
+        meta.get("version"),
+        meta.get("layout"),
+    ) != (CHECKPOINT_VERSION, _LAYOUT):
+        raise ValueError("checkpoint of another version or window layout")
+    tracker = TrendingTracker(capacity)
+    try:
+        for name, window in tracker.windows.items():
+            window.load(meta["windows"][name], snapshot.bytes(f"window.{name}"))
+    except (KeyError, TypeError, AttributeError) as exc:
+        raise ValueError(f"malformed checkpoint: {exc!r}") from None
+    return meta["seq"], tracker
+
+
+class EventLog:
+    """Segment files of checksummed frames, appended with group commit.
+
+    ``append`` queues a frame and waits until it is durable. A single
+    writer task takes every frame queued so far and writes them with one
+    ``write`` and ``fsync`` on a dedicated thread; frames queued meanwhile
+    make up the next group. Each process run writes to new segments, so a
+    torn frame left by a crash is only ever at the end of a segment.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        fsync: bool = True,
+        commit_delay: float = 0.0,
+        segment_bytes: int = SEGMENT_BYTES,
+    ) -> None:
+        self.directory = directory
+        self.fsync = fsync
+        # Extra wait before each write to let more frames join the group.
+        self.commit_delay = commit_delay
+        self.segment_bytes = segment_bytes
+        self.appends = 0
+        self.commits = 0
+        self._pending: List[Tuple[bytes, "asyncio.Future[None]"]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._writer: Optional["asyncio.Task[None]"] = None
+        self._closing = False
+        # Every file operation runs on this thread, in submission order.
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="streamy-events")
+        self._file = None
+        self._file_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def segments(self) -> List[str]:
+        return sorted(
+            name for name in os.listdir(self.directory) if name.endswith(".wal")
+        )
+
+    def replay(self) -> Iterator[bytes]:
+        """Payloads of every intact frame, oldest first"""
+        for name in self.segments():
+            with open(os.path.join(self.directory, name), "rb") as file:
+                data = file.read()
+            offset = 0
+            while offset + _FRAME.size <= len(data):
+                length, checksum = _FRAME.unpack_from(data, offset)
+                start = offset + _FRAME.size
+                payload = data[start : start + length]
+                if len(payload) != length or zlib.crc32(payload) != checksum:
+                    break
+                yield payload
+                offset = start + length
+            if offset < len(data):
+                logger.warning("Ignoring torn event log tail of %s at %d", name, offset)
+
+    async def append(self, payload: bytes) -> None:
+        """Add a frame to the log and wait until it is written"""
+        if self._closing:
+            raise EventLogError("Event log is closed")
+        if self._writer is None:
+            self._wakeup = asyncio.Event()
+            self._writer = asyncio.ensure_future(self._write_loop())
+        future = asyncio.get_running_loop().create_future()
+        frame = _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+        self._pending.append((frame, future))
+        self.appends += 1
+        self._wakeup.set()
+        await future
+
+    def rotate(self) -> "asyncio.Future[List[str]]":
+        """Close the current segment; resolves to every segment closed so far.
+
+        Runs after the writes already handed to the writer thread, so the
+        segments it returns hold only frames queued before the call.
+        """
+        return asyncio.get_running_loop().run_in_executor(self._executor, self._rotate)
+
+    async def remove(self, names: List[str]) -> None:
+        await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._remove, names
+        )
+
+    async def close(self) -> None:
+        """Write the frames still queued and close the log"""
+        self._closing = True
+        if self._writer is not None:
+            self._wakeup.set()
+            await self._writer
+        await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._close_segment
+        )
+        self._executor.shutdown()
+
+    async def _write_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._pending:
+                if self._closing:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            if self.commit_delay:
+                await asyncio.sleep(self.commit_delay)
+            group, self._pending = self._pending, []
+            try:
+                await loop.run_in_executor(
+                    self._executor, self._write, b"".join(frame for frame, _ in group)
+                )
+            except OSError as exc:
+                error = EventLogError(f"Writing the event log failed: {exc}")
+                for _, future in group:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            self.commits += 1
+            for _, future in group:
+                # Done already if the request waiting for it was cancelled.
+                if not future.done():
+                    future.set_result(None)
+
+    def _write(self, data: bytes) -> None:
+        if self._file is None or self._file_bytes >= self.segment_bytes:
+            self._close_segment()
+            name = f"{time.time_ns():020d}.wal"
+            self._file = open(os.path.join(self.directory, name), "ab")
+            self._file_bytes = 0
+        try:
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+        except OSError:
+            # The segment may end in a partial frame; continue in a new one.
+            self._close_segment()
+            raise
+        self._file_bytes += len(data)
+
+    def _close_segment(self) -> None:
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError as exc:
+                logger.warning("Closing event log segment failed: %s", exc)
+            self._file = None
+
+    def _rotate(self) -> List[str]:
+        self._close_segment()
+        return self.segments()
+
+    def _remove(self, names: List[str]) -> None:
+        for name in names:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+
+def _private_directory(directory: str) -> None:
+    """Create directory accessible to this user only, or check an existing one"""
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise EventLogError(
+            f"{directory} is not a directory owned by this user; "
+            "set STREAMY_EVENTS_DIR to one that is"
+        )
+    if stat.S_IMODE(info.st_mode) & 0o077:
+        os.chmod(directory, 0o700)
+
+
+def _claim_slot(directory: str) -> Tuple[str, int]:
+    """Lock the first slot directory no other process holds"""
+    _private_directory(directory)
+    for number in count():
+        slot = os.path.join(directory, f"slot-{number}")
+        os.makedirs(slot, mode=0o700, exist_ok=True)
+        fd = os.open(os.path.join(slot, "lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            continue
+        return slot, fd
+    raise AssertionError("unreachable")
+
+
+class EventService:
+    """Durable event ingestion feeding periodically refreshed trending rankings.
+
+    With ``directory`` None events are only counted in memory. Otherwise
+    rankings also count the events of the other slots under directory, as
+    of their last checkpoint.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str],
+        titles: Callable[[List[str]], Dict[str, str]],
+        top_k: int = 100,
+        fsync: bool = True,
+        commit_delay: float = 0.0,
+        refresh_interval: float = 1.0,
+        checkpoint_interval: float = 60.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.directory = directory
+        self.top_k = top_k
+        self.fsync = fsync
+        self.commit_delay = commit_delay
+        self.refresh_interval = refresh_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.events = 0
+        self.batches = 0
+        self.replayed = 0
+        self._titles = titles
+        self._clock = clock
+        # Candidates beyond top_k keep keys near the cut from being evicted
+        # by a burst of one-off ids.
+        self._capacity = max(4 * top_k, 256)
+        self._tracker = TrendingTracker(self._capacity)
+        self._seq = 0
+        self._checkpoint_seq = 0
+        self._checkpointed_at = clock()
+        self._slot: Optional[str] = None
+        self._checkpoint_path: Optional[str] = None
+        # Checkpoint of each other slot by its (inode, mtime), None if it
+        # could not be read, and the sum of their window totals.
+        self._peers: Dict[str, Tuple[Tuple[int, int], Optional[TrendingTracker]]] = {}
+        self._peer_totals: Dict[str, CountMinSketch] = {}
+        self._lock_fd: Optional[int] = None
+        self._log: Optional[EventLog] = None
+        self._refresher: Optional["asyncio.Task[None]"] = None
+        self._dirty = True
+        self._rankings: Dict[str, Tuple[float, List[Tuple[str, int]]]] = {}
+        self._responses: Dict[Tuple[str, int], CachedResponse] = {}
+        self._refresh(self._clock())
+
+    async def start(self) -> None:
+        """Recover the counts of the previous run and start refreshing rankings"""
+        if self.directory is not None and self._log is None:
+            slot, self._lock_fd = _claim_slot(self.directory)
+            self._slot = slot
+            self._checkpoint_path = os.path.join(slot, CHECKPOINT_NAME)
+            self._load_checkpoint()
+            self._log = EventLog(slot, fsync=self.fsync, commit_delay=self.commit_delay)
+            started = time.perf_counter()
+            for payload in self._log.replay():
+                seq, timestamp, events = json.loads(payload)
+                if seq > self._checkpoint_seq:
+                    self._tracker.add(timestamp, events)
+                    self.replayed += len(events)
+                self._seq = max(self._seq, seq)
+            logger.info(
+                "Replayed %d watch events from %s in %.3fs",
+                self.replayed,
+                slot,
+                time.perf_counter() - started,
+            )
+            self._update_peers(self._read_peers())
+            self._refresh(self._clock(), force=True)
+        if self._refresher is None:
+            self._refresher = asyncio.ensure_future(self._refresh_loop())
+
+    async def record(self, events: List[WatchEvent]) -> int:
+        """Count events and return once they are durable"""
+        if not events:
+            return 0
+        self._seq += 1
+        timestamp = self._clock()
+        pairs = [(event.media_id, event.type) for event in events]
+        # Counted before the write, so a checkpoint taken while it is in
+        # flight covers every frame up to its sequence number.
+        self._tracker.add(timestamp, pairs)
+        self._dirty = True
+        if self._log is not None:
+            payload = json.dumps(
+                [self._seq, timestamp, pairs], separators=(",", ":")
+            ).encode()
+            try:
+                await self._log.append(payload)
+            except EventLogError:
+                # The client retries a failed batch; do not count it twice.
+                self._tracker.add(timestamp, pairs, sign=-1)
+                raise
+        self.events += len(events)
+        self.batches += 1
+        return len(events)
+
+    def trending(self, window: str, limit: int) -> CachedResponse:
+        """The encoded ranking of a window as of the last refresh"""
+        key = (window, limit)
+        entry = self._responses.get(key)
+        if entry is None:
+            generated_at, ranking = self._rankings[window]
+            ranking = ranking[:limit]
+            titles = self._titles([media_id for media_id, _ in ranking])
+            body = (
+                TrendingResponse(
+                    window=window,
+                    generated_at=generated_at,
+                    items=[
+                        TrendingItem(
+                            id=media_id, title=titles.get(media_id), score=score
+                        )
+                        for media_id, score in ranking
+                    ],
+                )
+                .model_dump_json()
+                .encode()
+            )
+            max_age = max(1, int(self.refresh_interval))
+            entry = self._responses[key] = CachedResponse(
+                body, make_etag(body), {"Cache-Control": f"public, max-age={max_age}"}
+            )
+        return entry
+
+    async def checkpoint(self) -> None:
+        """Save the counts and delete the log segments they cover"""
+        if self._log is None:
+            return
+        seq = self._seq
+        state = self._tracker.dump()
+        # Requested before anything else can run on the loop, so the
+        # closed segments hold no frame numbered above seq.
+        covered = await self._log.rotate()
+        await asyncio.get_running_loop().run_in_executor(
+            None, write_checkpoint, self._checkpoint_path, seq, state
+        )
+        self._checkpoint_seq = seq
+        self._checkpointed_at = self._clock()
+        await self._log.remove(covered)
+
+    async def close(self) -> None:
+        if self._refresher is not None:
+            self._refresher.cancel()
+            try:
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+            self._refresher = None
+        if self._log is not None:
+            try:
+                await self.checkpoint()
+            except OSError as exc:
+                logger.warning("Saving the trending checkpoint failed: %s", exc)
+            await self._log.close()
+            self._log = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def metrics(self) -> List[str]:
+        """Prometheus lines for ingested events and log commits"""
+        lines = []
+        for name, help_text, value in (
+            ("events", "Watch events accepted.", self.events),
+            ("event_batches", "Watch event batches accepted.", self.batches),
+            (
+                "event_log_commits",
+                "Event log writes, each covering one or more batches.",
+                self._log.commits if self._log is not None else 0,
+            ),
+        ):
+            lines.append(f"# HELP streamy_{name}_total {help_text}")
+            lines.append(f"# TYPE streamy_{name}_total counter")
+            lines.append(f"streamy_{name}_total {value}")
+        return lines
+
+    def _refresh(self, now: float, force: bool = False) -> None:
+        expired = self._tracker.expire(now)
+        if any(
+            [
+                tracker.expire(now)
+                for _, tracker in self._peers.values()
+                if tracker is not None
+            ]
+        ):
+            self._peer_totals = {}
+            expired = True
+        if not (expired or self._dirty or force):
+            return
+        self._dirty = False
+        self._rankings = {
+            name: (now, self._rank(name, window))
+            for name, window in self._tracker.windows.items()
+        }
+        self._responses = {}
+
+    def _rank(self, name: str, window: SlidingWindow) -> List[Tuple[str, int]]:
+        """Top keys of a window, counting the events of every slot"""
+        peers = [
+            tracker.windows[name]
+            for _, tracker in self._peers.values()
+            if tracker is not None
+        ]
+        if not peers:
+            return window.top(self.top_k)
+        others = self._peer_totals.get(name)
+        if others is None:
+            others = self._peer_totals[name] = CountMinSketch()
+            for peer in peers:
+                others.merge(peer.total)
+        cells = dict(window.cells)
+        for peer in peers:
+            for key, key_cells in peer.cells.items():
+                cells.setdefault(key, key_cells)
+        # Sketches add up, so the sum of the slots' counters estimates the
+        # total count just as each of them estimates its own.
+        estimates = (
+            (
+                key,
+                min(
+                    own[cell] + other[cell]
+                    for own, other, cell in zip(
+                        window.total.rows, others.rows, key_cells
+                    )
+                ),
+            )
+            for key, key_cells in cells.items()
+        )
+        return heapq.nlargest(
+            self.top_k,
+            (pair for pair in estimates if pair[1] > 0),
+            key=itemgetter(1),
+        )
+
+    async def _refresh_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                now = self._clock()
+                changed = False
+                if self._slot is not None:
+                    changed = self._update_peers(
+                        await loop.run_in_executor(None, self._read_peers)
+                    )
+                self._refresh(now, force=changed)
+                if (
+                    self._seq != self._checkpoint_seq
+                    and now - self._checkpointed_at >= self.checkpoint_interval
+                ):
+                    await self.checkpoint()
+            except Exception:
+                logger.exception("Refreshing trending rankings failed")
+
+    def _read_peers(
+        self,
+    ) -> Dict[str, Tuple[Tuple[int, int], Optional[TrendingTracker]]]:
+        """Checkpoints of the other slots, reading only the changed ones"""
+        peers = {}
+        for name in os.listdir(self.directory):
+            slot = os.path.join(self.directory, name)
+            if not name.startswith("slot-") or slot == self._slot:
+                continue
+            path = os.path.join(slot, CHECKPOINT_NAME)
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            version = (info.st_ino, info.st_mtime_ns)
+            known = self._peers.get(slot)
+            if known is not None and known[0] == version:
+                peers[slot] = known
+                continue
+            try:
+                peers[slot] = (version, read_checkpoint(path, self._capacity)[1])
+            except (OSError, SnapshotError, ValueError) as exc:
+                logger.warning("Ignoring unreadable trending checkpoint: %s", exc)
+                peers[slot] = (version, None)
+        return peers
+
+    def _update_peers(
+        self, peers: Dict[str, Tuple[Tuple[int, int], Optional[TrendingTracker]]]
+    ) -> bool:
+        """Use the checkpoints read by ``_read_peers``; True if any changed"""
+        if peers == self._peers:
+            return False
+        self._peers = peers
+        self._peer_totals = {}
+        return True
+
+    def _load_checkpoint(self) -> None:
+        try:
+            self._seq, self._tracker = read_checkpoint(
+                self._checkpoint_path, self._capacity
+            )
+        except FileNotFoundError:
+            return
+        except (OSError, SnapshotError, ValueError) as exc:
+            logger.warning("Ignoring unreadable trending checkpoint: %s", exc)
+            return
+        self._checkpoint_seq = self._seq
@@ -0,0 +1,176 @@
+"""Single-pass extraction of video URLs from HTML pages.
+
+The app's ``WebScrapingService.extractVideoSources`` runs a dozen
+case-insensitive regexes over a page one after another. Here all of them
+are folded into one precompiled alternation that is scanned once, behind
+a literal prefilter that skips pages which cannot contain a playable URL.
+"""
+
+import re
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
+
+from pydantic import BaseModel
+
+from .models import VideoSource
+
+VIDEO_EXTENSIONS = (".mp4", ".m3u8", ".mkv", ".avi", ".webm", ".mov", ".flv")
+PLAYER_HINTS = (
+    "youtube.com",
+    "vimeo.com",
+    "dailymotion.com",
+    "player",
+    "embed",
+    "stream",
+)
+
+# A URL is only kept when it contains one of these (see _is_valid_video_url
+# and _is_video_iframe), so a page without any of them has nothing to find.
+_PREFILTER_LITERALS = VIDEO_EXTENSIONS + PLAYER_HINTS + ("video",)
+
+# One alternation for every pattern of the app's extractor. Branches are
+# grouped by their first character ('"', ':' or '<') so the regex engine
+# can skip every other position with its first-character prefilter. The
+# pattern is matched against the lowercased page, which is cheaper than
+# re.IGNORECASE; spans are then used to slice the original text.
+_EXTRACT_PATTERN = r"""
+    "(?:
+        (?P<direct>https?://[^"]*\.(?:m3u8|mp4|mkv|avi|webm)[^"]*)"
+      | (?:videourl|streamurl|playurl)":\s*"(?P<json>[^"]+)"
+      | (?:file|src|url)":\s*"(?P<json_file>[^"]+\.(?:mp4|m3u8|mkv|avi|webm)[^"]*)"
+    )
+    | :\s*(?P<quote>["'`])(?P<config>[^"'`]+)["'`]
+    | <(?:
+        (?:video|source)\b[^>]*?\bsrc\s*=\s*["'](?P<tag>[^"']+)["']
+      | iframe\b[^>]*?\bsrc\s*=\s*["'](?P<iframe>[^"']+)["']
+    )
+"""
+_EXTRACT_RE = re.compile(_EXTRACT_PATTERN, re.VERBOSE)
+# Fallback for pages whose length changes when lowercased (rare non-ASCII).
+_EXTRACT_RE_IGNORECASE = re.compile(_EXTRACT_PATTERN, re.VERBOSE | re.IGNORECASE)
+# Player-config keys that may precede the ':' of the config branch.
+_CONFIG_KEYS = ("src", "file", "source", "url", "stream")
+_DIRECT_VALUE_RE = re.compile(r"https?://.*\.(?:m3u8|mp4|mkv|avi|webm)", re.IGNORECASE)
+
+# Quality hints in priority order; the first group that matches anywhere in
+# the URL wins, as with the app's sequential quality patterns.
+_QUALITY_RE = re.compile(
+    r"(?P<label>\d+p)|(?P<resolution>\d+x\d+)|(?P<keyword>hd|sd|uhd|4k|1080|720|480|360)",
+    re.IGNORECASE,
+)
+_QUALITY_GROUPS = ("label", "resolution", "keyword")
+
+_VIDEO_TYPES = (
+    (".m3u8", "HLS"),
+    (".mp4", "MP4"),
+    (".mkv", "MKV"),
+    (".avi", "AVI"),
+    (".webm", "WebM"),
+)
+
+
+class ExtractRequest(BaseModel):
+    # Raw page HTML; when omitted the page is fetched from url.
+    html: Optional[str] = None
+    # Page URL, used to fetch the page and to resolve relative links.
+    url: Optional[str] = None
+
+
+class ExtractResponse(BaseModel):
+    sources: List[VideoSource]
+
+
+def classify_quality(url: str) -> str:
+    """Return the quality hint found in url, or 'Unknown'"""
+    first: Dict[str, str] = {}
+    for match in _QUALITY_RE.finditer(url):
+        group = match.lastgroup
+        if group not in first:
+            first[group] = match.group(group)
+            if group == _QUALITY_GROUPS[0]:
+                break
+    for group in _QUALITY_GROUPS:
+        if group in first:
+            return first[group]
+    return "Unknown"
+
+
+def video_type(url: str) -> str:
+    """Return the container/streaming type implied by url"""
+    lowered = url.lower()
+    for extension, name in _VIDEO_TYPES:
+        if extension in lowered:
+            return name
+    return "Unknown"
+
+
+def _is_valid_video_url(url: str) -> bool:
+    lowered = url.lower()
+    return (
+        any(extension in lowered for extension in VIDEO_EXTENSIONS)
+        or "stream" in url
+        or "video" in url
+        or "player" in url
+    )
+
+
+def _is_video_iframe(url: str) -> bool:
+    lowered = url.lower()
+    return any(hint in lowered for hint in PLAYER_HINTS)
+
+
+def _resolve(url: str, page_url: Optional[str]) -> str:
+    if url.startswith("//"):
+        return "https:" + url
+    return urljoin(page_url, url) if page_url else url
+
+
+def extract_video_sources(
+    html: str, page_url: Optional[str] = None
+) -> List[VideoSource]:
+    """Find video sources in a page with one scan; results are deduplicated by URL"""
+    lowered = html.lower()
+    if not any(literal in lowered for literal in _PREFILTER_LITERALS):
+        return []
+    if len(lowered) == len(html):
+        matches = _EXTRACT_RE.finditer(lowered)
+    else:
+        matches = _EXTRACT_RE_IGNORECASE.finditer(html)
+        lowered = html
+
+    sources: List[VideoSource] = []
+    seen = set()
+    for match in matches:
+        group = match.lastgroup
+        if group == "config":
+            # The branch is anchored on ':' so check the key before it; a
+            # quoted absolute video URL is still taken as a direct link.
+            if not lowered.endswith(_CONFIG_KEYS, 0, match.start()):
+                group = "direct"
+                if match.group("quote") != '"' or not _DIRECT_VALUE_RE.match(
+                    match.group("config")
+                ):
+                    continue
+            raw = html[match.start("config") : match.end("config")]
+        else:
+            raw = html[match.start(group) : match.end(group)]
+
+        if group == "iframe":
+            if not _is_video_iframe(raw):
+                continue
+        elif not _is_valid_video_url(raw):
+            continue
+
+        url = _resolve(raw, page_url)
+        if url in seen:
+            continue
+        seen.add(url)
+        if group == "iframe":
+            sources.append(VideoSource(url=url, quality="Unknown", type="iframe"))
+        else:
+            sources.append(
+                VideoSource(
+                    url=url, quality=classify_quality(raw), type=video_type(raw)
+                )
+            )
+    return sources
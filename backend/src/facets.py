@@ -0,0 +1,274 @@
+"""Faceted browsing of the media catalog by genre, year and quality.
+
+``FacetIndex`` keeps one compressed ``Bitmap`` of docnos per facet value
+(each genre, release year and source quality). A filtered listing is the
+union of the selected values within a facet (several genres, a year
+range) intersected across facets, so a query touches bitmaps rather than
+items however large the catalog is.
+
+Facet counts are disjunctive: the counts of a facet apply the filters of
+every other facet but not its own, so selecting "Drama" still shows how
+many results each other genre would give. They are cardinalities of
+bitmap intersections and never materialize the matching items.
+
+Docnos are handed out in the order items are first indexed and survive
+updates and deletes, so results are listed in that order and the last id
+of a page is a stable cursor for the next one. Writing a snapshot
+renumbers the live docnos without changing their order.
+"""
+
+from array import array
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from .bitmap import Bitmap
+from .catalog import metadata_genre, metadata_year
+from .models import MediaItem
+from .snapshot import LayeredDict, LayeredList, Snapshot, SnapshotWriter
+
+FACETS = ("genre", "year", "quality")
+
+FacetValues = Tuple[Tuple[str, Hashable], ...]
+
+
+class FacetCount(BaseModel):
+    value: str
+    count: int
+
+
+class MediaFacetsResponse(BaseModel):
+    items: List[MediaItem]
+    total: int
+    facets: Dict[str, List[FacetCount]]
+    next_cursor: Optional[str] = None
+
+
+class UnknownCursor(Exception):
+    """The cursor of a filtered listing does not name an indexed item"""
+
+
+def facet_values(item: MediaItem) -> Iterator[Tuple[str, Hashable, str]]:
+    """Yield (facet, key, label) for every facet value of an item"""
+    genre = metadata_genre(item)
+    if genre is not None:
+        yield "genre", genre.strip().lower(), genre.strip()
+    year = metadata_year(item)
+    if year is not None:
+        yield "year", year, str(year)
+    for quality in {
+        source.quality.strip() for source in item.sources if source.quality
+    }:
+        if quality:
+            yield "quality", quality.lower(), quality
+
+
+class FacetIndex:
+    """Per-value docno bitmaps for the genre, year and quality facets"""
+
+    def __init__(self) -> None:
+        self._docno_by_id: Dict[str, int] = {}
+        self._id_by_docno: List[str] = []
+        # Indexed (facet, key) pairs of each docno, empty once deleted; None
+        # for items loaded from a snapshot that have not changed since.
+        self._values: List[Optional[FacetValues]] = []
+        self._bitmaps: Dict[str, Dict[Hashable, Bitmap]] = {
+            facet: {} for facet in FACETS
+        }
+        self._labels: Dict[str, Dict[Hashable, str]] = {facet: {} for facet in FACETS}
+        self._live = Bitmap()
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def build(self, items: Iterable[MediaItem]) -> None:
+        """Index items into an empty index with one bulk pass per bitmap"""
+        docnos: Dict[str, Dict[Hashable, List[int]]] = {facet: {} for facet in FACETS}
+        for item in items:
+            docno = self._docno(item.id)
+            values = []
+            for facet, key, label in facet_values(item):
+                docnos[facet].setdefault(key, []).append(docno)
+                self._labels[facet].setdefault(key, label)
+                values.append((facet, key))
+            self._values[docno] = tuple(values)
+        # Docnos were handed out in ascending order, so every list is sorted.
+        for facet, lists in docnos.items():
+            for key, values in lists.items():
+                self._bitmaps[facet][key] = Bitmap.from_sorted(values)
+        self._live = Bitmap.from_sorted(range(len(self._id_by_docno)))
+
+    def add_many(self, items: Iterable[MediaItem]) -> None:
+        """Index new items and re-index updated ones under their docno"""
+        for item in items:
+            docno = self._docno(item.id)
+            self._unindex(docno)
+            values = []
+            for facet, key, label in facet_values(item):
+                bitmap = self._bitmaps[facet].get(key)
+                if bitmap is None:
+                    bitmap = self._bitmaps[facet][key] = Bitmap()
+                    self._labels[facet][key] = label
+                bitmap.add(docno)
+                values.append((facet, key))
+            self._values[docno] = tuple(values)
+            self._live.add(docno)
+
+    def remove_many(self, media_ids: Iterable[str]) -> None:
+        for media_id in media_ids:
+            docno = self._docno_by_id.get(media_id)
+            if docno is not None:
+                self._unindex(docno)
+                self._live.discard(docno)
+
+    def filters(
+        self,
+        genres: Iterable[str] = (),
+        year_from: Optional[int] = None,
+        year_to: Optional[int] = None,
+        qualities: Iterable[str] = (),
+    ) -> Dict[str, Bitmap]:
+        """Return the docnos allowed by each filtered facet.
+
+        Values within a facet are alternatives (OR); facets missing from
+        the result are unfiltered.
+        """
+        filters = {}
+        genres = {genre.strip().lower() for genre in genres}
+        if genres:
+            filters["genre"] = self._union("genre", genres)
+        if year_from is not None or year_to is not None:
+            low = year_from if year_from is not None else -(1 << 31)
+            high = year_to if year_to is not None else 1 << 31
+            filters["year"] = self._union(
+                "year", [year for year in self._bitmaps["year"] if low <= year <= high]
+            )
+        qualities = {quality.strip().lower() for quality in qualities}
+        if qualities:
+            filters["quality"] = self._union("quality", qualities)
+        return filters
+
+    def match(self, filters: Dict[str, Bitmap]) -> Bitmap:
+        """Docnos passing every filter"""
+        if not filters:
+            return self._live
+        return Bitmap.intersection(list(filters.values()))
+
+    def counts(self, filters: Dict[str, Bitmap]) -> Dict[str, List[FacetCount]]:
+        """Disjunctive counts of every facet value under the given filters"""
+        result = {}
+        for facet in FACETS:
+            others = Bitmap.intersection(
+                [bitmap for name, bitmap in filters.items() if name != facet]
+            )
+            counts = []
+            for key, bitmap in self._bitmaps[facet].items():
+                count = (
+                    len(bitmap) if others is None else bitmap.intersection_len(others)
+                )
+                if count:
+                    counts.append((key, count))
+            if facet == "year":
+                counts.sort(key=lambda pair: pair[0], reverse=True)
+            else:
+                counts.sort(key=lambda pair: (-pair[1], self._labels[facet][pair[0]]))
+            result[facet] = [
+                FacetCount(value=self._labels[facet][key], count=count)
+                for key, count in counts
+            ]
+        return result
+
+    def iter_ids(self, matched: Bitmap, after: Optional[str] = None) -> Iterator[str]:
+        """Ids of the matched docnos in listing order, starting past the cursor"""
+        start = 0
+        if after is not None:
+            docno = self._docno_by_id.get(after)
+            if docno is None:
+                raise UnknownCursor(after)
+            start = docno + 1
+        # Not a generator itself, so an unknown cursor raises at the call.
+        return (self._id_by_docno[docno] for docno in matched.iter_from(start))
+
+    def write_snapshot(self, writer: SnapshotWriter, positions: Dict[str, int]) -> None:
+        """Write the index to a snapshot, with live docnos renumbered in order"""
+        live = list(self._live)
+        if len(live) != len(positions):
+            raise ValueError("facet index is out of sync with the catalog")
+        renumbered = {docno: number for number, docno in enumerate(live)}
+        # Catalog record of each docno, and the reverse.
+        records = array("I", (positions[self._id_by_docno[docno]] for docno in live))
+        docnos = array("I", [0]) * len(records)
+        for docno, position in enumerate(records):
+            docnos[position] = docno
+
+        data = bytearray()
+        bitmaps = []
+        for facet in FACETS:
+            for key, bitmap in self._bitmaps[facet].items():
+                encoded = Bitmap.from_sorted(
+                    [renumbered[docno] for docno in bitmap]
+                ).to_bytes()
+                label = self._labels[facet][key]
+                bitmaps.append([facet, key, label, len(data), len(encoded)])
+                data += encoded
+        live = Bitmap.from_sorted(range(len(records))).to_bytes()
+        meta = {"bitmaps": bitmaps, "live": [len(data), len(live)]}
+        data += live
+        writer.add_array("facets.records", records)
+        writer.add_array("facets.docnos", docnos)
+        writer.add_bytes("facets.bitmaps", data)
+        writer.add_json("facets.meta", meta)
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Snapshot) -> "FacetIndex":
+        """Load an index written by ``write_snapshot``; bitmaps are read eagerly"""
+        index = cls()
+        ids = snapshot.strings("catalog.ids")
+        records = snapshot.array("facets.records", "I")
+        docnos = snapshot.array("facets.docnos", "I")
+        data = snapshot.bytes("facets.bitmaps")
+        size = len(records)
+        index._docno_by_id = LayeredDict(
+            size, ids.find, docnos.__getitem__, lambda: ids
+        )
+        index._id_by_docno = LayeredList(size, lambda docno: ids[records[docno]])
+        index._values = LayeredList(size, lambda docno: None)
+        meta = snapshot.json("facets.meta")
+        for facet, key, label, offset, length in meta["bitmaps"]:
+            index._bitmaps[facet][key] = Bitmap.from_bytes(
+                data[offset : offset + length]
+            )
+            index._labels[facet][key] = label
+        offset, length = meta["live"]
+        index._live = Bitmap.from_bytes(data[offset : offset + length])
+        return index
+
+    def _docno(self, media_id: str) -> int:
+        docno = self._docno_by_id.get(media_id)
+        if docno is None:
+            docno = self._docno_by_id[media_id] = len(self._id_by_docno)
+            self._id_by_docno.append(media_id)
+            self._values.append(())
+        return docno
+
+    def _unindex(self, docno: int) -> None:
+        values = self._values[docno]
+        if values is None:
+            values = tuple(
+                (facet, key)
+                for facet in FACETS
+                for key, bitmap in self._bitmaps[facet].items()
+                if docno in bitmap
+            )
+        for facet, key in values:
+            bitmap = self._bitmaps[facet][key]
+            bitmap.discard(docno)
+            if not bitmap:
+                del self._bitmaps[facet][key]
+                del self._labels[facet][key]
+        self._values[docno] = ()
+
+    def _union(self, facet: str, keys: Iterable[Hashable]) -> Bitmap:
+        return Bitmap.union(
+            self._bitmaps[facet][key] for key in keys if key in self._bitmaps[facet]
+        )
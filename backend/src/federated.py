@@ -0,0 +1,273 @@
+"""Federated search across the local index and remote providers.
+
+Every provider is queried concurrently under one global deadline. Each
+provider also has its own timeout and may be hedged (a second attempt is
+started if the first one has not answered after a delay; whichever
+finishes first wins). Results are yielded as each provider answers and
+merged by normalized title and year, so the caller can stream them and
+the slowest provider can never hold back the others past the deadline.
+"""
+
+import asyncio
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Set, Tuple
+from urllib.parse import urlencode
+
+from .catalog import metadata_year
+from .metadata_proxy import MetadataProxy
+from .models import MediaItem, WebSource
+from .scraping import Scraper
+from .search import normalize_text
+
+
+class SearchProvider(ABC):
+    """A source of search results taking part in federated search"""
+
+    def __init__(
+        self, name: str, timeout: float = 2.0, hedge_after: Optional[float] = None
+    ) -> None:
+        self.name = name
+        # Per-provider time budget in seconds (still capped by the deadline).
+        self.timeout = timeout
+        # Start a duplicate request if the first is still pending after this.
+        self.hedge_after = hedge_after
+
+    @abstractmethod
+    async def search(self, query: str, limit: int) -> List[MediaItem]: ...
+
+
+class LocalSearchProvider(SearchProvider):
+    """Provider backed by an in-process search function"""
+
+    def __init__(
+        self, search: Callable[[str, int], List[MediaItem]], name: str = "local"
+    ) -> None:
+        super().__init__(name)
+        self._search = search
+
+    async def search(self, query: str, limit: int) -> List[MediaItem]:
+        return self._search(query, limit)
+
+
+class ScrapeSourceProvider(SearchProvider):
+    """Provider that scrapes one WebSource"""
+
+    def __init__(self, scraper: Scraper, source: WebSource, **kwargs) -> None:
+        super().__init__(source.id, **kwargs)
+        self._scraper = scraper
+        self._source = source
+
+    async def search(self, query: str, limit: int) -> List[MediaItem]:
+        items = await self._scraper.search_source(self._source, query)
+        return items[:limit]
+
+
+def parse_tmdb_item(item: dict) -> Optional[MediaItem]:
+    """Map a TMDB /search/multi result to a MediaItem, as the app does"""
+    title = item.get("title") or item.get("name") or ""
+    if not title:
+        return None
+    release_date = item.get("release_date") or item.get("first_air_date") or ""
+    poster_path = item.get("poster_path")
+    return MediaItem(
+        id=f"tmdb_{item.get('id', '')}",
+        title=title,
+        thumbnail=(
+            f"https://image.tmdb.org/t/p/w500{poster_path}" if poster_path else None
+        ),
+        description=item.get("overview") or None,
+        metadata={
+            "tmdb_id": str(item.get("id", "")),
+            "release_date": release_date,
+            "year": release_date[:4],
+            "rating": float(item.get("vote_average") or 0),
+            "media_type": item.get("media_type") or "movie",
+            "source": "TMDB",
+        },
+    )
+
+
+def parse_omdb_item(item: dict) -> Optional[MediaItem]:
+    """Map an OMDB search result to a MediaItem, as the app does"""
+    title = item.get("Title") or ""
+    if not title:
+        return None
+    poster = item.get("Poster") or ""
+    return MediaItem(
+        id=f"omdb_{item.get('imdbID', '')}",
+        title=title,
+        thumbnail=poster if poster and poster != "N/A" else None,
+        metadata={
+            "imdb_id": item.get("imdbID", ""),
+            "year": item.get("Year", ""),
+            "type": item.get("Type") or "movie",
+            "source": "OMDB",
+        },
+    )
+
+
+class TmdbProvider(SearchProvider):
+    """Provider for TMDB's multi search"""
+
+    def __init__(
+        self,
+        scraper: Scraper,
+        api_key: str,
+        base_url: str = "https://api.themoviedb.org/3",
+        metadata: Optional[MetadataProxy] = None,
+        **kwargs,
+    ) -> None:
+        super().__init__("tmdb", **kwargs)
+        self._scraper = scraper
+        self._api_key = api_key
+        self._base_url = base_url.rstrip("/")
+        self._metadata = metadata
+
+    async def search(self, query: str, limit: int) -> List[MediaItem]:
+        if self._metadata is not None:
+            entry = await self._metadata.tmdb_search(
+                self._base_url, self._api_key, query
+            )
+            data = entry.json()
+        else:
+            params = urlencode({"api_key": self._api_key, "query": query})
+            data = await self._scraper.fetch_json(
+                f"{self._base_url}/search/multi?{params}"
+            )
+        items = (parse_tmdb_item(item) for item in data.get("results") or [])
+        return [item for item in items if item is not None][:limit]
+
+
+class OmdbProvider(SearchProvider):
+    """Provider for OMDB's title search"""
+
+    def __init__(
+        self,
+        scraper: Scraper,
+        api_key: str,
+        base_url: str = "http://www.omdbapi.com",
+        metadata: Optional[MetadataProxy] = None,
+        **kwargs,
+    ) -> None:
+        super().__init__("omdb", **kwargs)
+        self._scraper = scraper
+        self._api_key = api_key
+        self._base_url = base_url.rstrip("/")
+        self._metadata = metadata
+
+    async def search(self, query: str, limit: int) -> List[MediaItem]:
+        if self._metadata is not None:
+            entry = await self._metadata.omdb_search(
+                self._base_url, self._api_key, query
+            )
+            data = entry.json()
+        else:
+            params = urlencode({"apikey": self._api_key, "s": query})
+            data = await self._scraper.fetch_json(f"{self._base_url}/?{params}")
+        items = (parse_omdb_item(item) for item in data.get("Search") or [])
+        return [item for item in items if item is not None][:limit]
+
+
+@dataclass
+class ProviderResult:
+    provider: str
+    # Items not already returned by an earlier provider.
+    items: List[MediaItem] = field(default_factory=list)
+    elapsed_ms: float = 0.0
+    # Set when the provider failed or ran out of time.
+    error: Optional[str] = None
+
+
+def dedup_key(item: MediaItem) -> Tuple[str, Optional[int]]:
+    """Key under which results from different providers are considered equal"""
+    return " ".join(normalize_text(item.title).split()), metadata_year(item)
+
+
+async def _hedged(
+    call: Callable[[], Awaitable[List[MediaItem]]], hedge_after: Optional[float]
+) -> List[MediaItem]:
+    first = asyncio.ensure_future(call())
+    if hedge_after is None:
+        return await first
+    pending: Set[asyncio.Future] = {first}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=hedge_after)
+        if not done:
+            pending.add(asyncio.ensure_future(call()))
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def federated_search(
+    query: str,
+    providers: List[SearchProvider],
+    deadline: float,
+    limit: int = 20,
+) -> AsyncIterator[ProviderResult]:
+    """Yield one ProviderResult per provider, in completion order.
+
+    Providers still running when deadline (seconds from now) expires are
+    cancelled and reported with a timeout error.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    expires = started + deadline
+    seen: Set[Tuple[str, Optional[int]]] = set()
+
+    async def run(provider: SearchProvider) -> List[MediaItem]:
+        return await asyncio.wait_for(
+            _hedged(lambda: provider.search(query, limit), provider.hedge_after),
+            timeout=provider.timeout,
+        )
+
+    tasks = {asyncio.ensure_future(run(p)): p for p in providers}
+    pending = set(tasks)
+    try:
+        while pending:
+            remaining = expires - loop.time()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(
+                pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                provider = tasks[task]
+                result = ProviderResult(
+                    provider.name, elapsed_ms=(loop.time() - started) * 1000
+                )
+                if task.exception() is not None:
+                    exc = task.exception()
+                    if isinstance(exc, asyncio.TimeoutError):
+                        result.error = "timeout"
+                    else:
+                        result.error = str(exc) or exc.__class__.__name__
+                else:
+                    for item in task.result():
+                        key = dedup_key(item)
+                        if key not in seen:
+                            seen.add(key)
+                            result.items.append(item)
+                yield result
+        for task in pending:
+            task.cancel()
+            yield ProviderResult(
+                tasks[task].name,
+                elapsed_ms=(loop.time() - started) * 1000,
+                error="deadline exceeded",
+            )
+    finally:
+        # Also runs when the consumer goes away (e.g. client disconnect).
+        for task in tasks:
+            task.cancel()
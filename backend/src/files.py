@@ -0,0 +1,276 @@
+"""Range-aware serving of locally stored media files.
+
+``FileIndex`` resolves request paths under a media directory and keeps a
+small LRU of their size, mtime and strong ETag, re-checking a file with
+``os.stat`` at most once per revalidation interval. ``FileRangeResponse``
+answers a single byte range with ``206 Partial Content`` (``If-Range``
+aware), so seeking and resumed downloads transfer only the bytes asked
+for.
+
+The body is sent with the cheapest transfer the deployment offers:
+
+* the ASGI ``http.response.zerocopysend`` extension, for servers that
+  implement it with ``sendfile(2)``;
+* an ``X-Accel-Redirect`` to an internal location, when a reverse proxy
+  such as nginx fronts the backend and serves the file with sendfile;
+* otherwise ``os.pread`` in a worker thread, in bounded chunks.
+"""
+
+import mimetypes
+import os
+import stat
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import List, NamedTuple, Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+from starlette.background import BackgroundTask
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+CHUNK_SIZE = 256 * 1024
+
+for _type, _extension in (
+    ("application/vnd.apple.mpegurl", ".m3u8"),
+    ("video/mp2t", ".ts"),
+    ("video/x-matroska", ".mkv"),
+    ("video/webm", ".webm"),
+):
+    mimetypes.add_type(_type, _extension)
+
+
+class FileInfo(NamedTuple):
+    path: str
+    size: int
+    mtime: float
+    etag: str
+    last_modified: str
+    content_type: str
+    # (st_dev, st_ino, st_size, st_mtime_ns), compared on revalidation.
+    identity: Tuple[int, int, int, int]
+    checked: float
+
+
+def _identity(result: os.stat_result) -> Tuple[int, int, int, int]:
+    return (result.st_dev, result.st_ino, result.st_size, result.st_mtime_ns)
+
+
+class FileIndex:
+    """Cached metadata of the regular files under root"""
+
+    def __init__(
+        self, root: str, max_entries: int = 10000, revalidate: float = 1.0
+    ) -> None:
+        self.root = os.path.realpath(root)
+        self.max_entries = max_entries
+        self.revalidate = revalidate
+        self._entries: "OrderedDict[str, FileInfo]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def resolve(self, relative: str) -> Optional[str]:
+        """Absolute path for relative, or None if it escapes the root"""
+        path = os.path.realpath(os.path.join(self.root, relative.lstrip("/")))
+        if os.path.commonpath([path, self.root]) != self.root:
+            return None
+        return path
+
+    def lookup(self, relative: str) -> Optional[FileInfo]:
+        """Metadata of a regular file under the root, or None"""
+        now = time.monotonic()
+        with self._lock:
+            info = self._entries.get(relative)
+            if info is not None and now - info.checked < self.revalidate:
+                self._entries.move_to_end(relative)
+                return info
+        path = self.resolve(relative)
+        if path is None:
+            return None
+        try:
+            result = os.stat(path)
+        except OSError:
+            result = None
+        with self._lock:
+            if result is None or not stat.S_ISREG(result.st_mode):
+                self._entries.pop(relative, None)
+                return None
+            if info is not None and info.identity == _identity(result):
+                info = info._replace(checked=now)
+            else:
+                info = self._describe(path, result, now)
+            self._entries[relative] = info
+            self._entries.move_to_end(relative)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return info
+
+    @staticmethod
+    def _describe(path: str, result: os.stat_result, now: float) -> FileInfo:
+        identity = _identity(result)
+        # Inode, size and mtime change whenever the content is replaced.
+        etag = '"%x-%x-%x"' % (result.st_ino, result.st_size, result.st_mtime_ns)
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        return FileInfo(
+            path=path,
+            size=result.st_size,
+            mtime=result.st_mtime,
+            etag=etag,
+            last_modified=formatdate(result.st_mtime, usegmt=True),
+            content_type=content_type,
+            identity=identity,
+            checked=now,
+        )
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[List[Tuple[int, int]]]:
+    """Parse a Range header into inclusive (start, end) byte ranges.
+
+    Returns None when the header is absent, malformed or not in bytes
+    (the full file is served) and an empty list when no range overlaps
+    the file (416 Range Not Satisfiable).
+    """
+    if not header:
+        return None
+    unit, _, specs = header.partition("=")
+    if unit.strip().lower() != "bytes" or not specs.strip():
+        return None
+    ranges = []
+    for spec in specs.split(","):
+        first, dash, last = spec.strip().partition("-")
+        if not dash:
+            return None
+        try:
+            if first:
+                start = int(first)
+                end = int(last) if last else size - 1
+                if last and end < start:
+                    return None
+            else:
+                suffix = int(last)
+                start, end = max(size - suffix, 0), size - 1
+                if suffix == 0:
+                    continue
+        except ValueError:
+            return None
+        if start < 0:
+            return None
+        if start < size:
+            ranges.append((start, min(end, size - 1)))
+    return ranges
+
+
+def if_range_matches(if_range: Optional[str], info: FileInfo) -> bool:
+    """Evaluate If-Range: a strong ETag match or the exact Last-Modified date"""
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"'):
+        return if_range == info.etag
+    if if_range.startswith("W/"):
+        return False
+    try:
+        return int(parsedate_to_datetime(if_range).timestamp()) == int(info.mtime)
+    except (TypeError, ValueError):
+        return False
+
+
+class FileRangeResponse(Response):
+    """Response for a whole file or one byte range of it"""
+
+    def __init__(
+        self,
+        info: FileInfo,
+        start: int = 0,
+        end: Optional[int] = None,
+        status_code: int = 200,
+        headers: Optional[dict] = None,
+        accel_path: Optional[str] = None,
+        background: Optional[BackgroundTask] = None,
+    ) -> None:
+        self.info = info
+        self.start = start
+        self.end = info.size - 1 if end is None else end
+        self.accel_path = accel_path
+        self.status_code = status_code
+        self.media_type = info.content_type
+        self.background = background
+        headers = {
+            "Accept-Ranges": "bytes",
+            "ETag": info.etag,
+            "Last-Modified": info.last_modified,
+            **(headers or {}),
+        }
+        if status_code == 206:
+            headers["Content-Range"] = f"bytes {start}-{self.end}/{info.size}"
+        if accel_path is not None:
+            # The proxy serves the file, and applies Range, itself.
+            headers["X-Accel-Redirect"] = accel_path
+        else:
+            headers["Content-Length"] = str(self.count)
+        self.init_headers(headers)
+
+    @property
+    def count(self) -> int:
+        return max(self.end - self.start + 1, 0)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        if scope["method"].upper() == "HEAD" or self.accel_path is not None:
+            await send({"type": "http.response.body", "body": b""})
+        elif "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.info.path, "rb") as file:
+                await send(
+                    {
+                        "type": "http.response.zerocopysend",
+                        "file": file,
+                        "offset": self.start,
+                        "count": self.count,
+                    }
+                )
+        else:
+            await self._send_chunks(send)
+        if self.background is not None:
+            await self.background()
+
+    async def _send_chunks(self, send: Send) -> None:
+        fd = await anyio.to_thread.run_sync(os.open, self.info.path, os.O_RDONLY)
+        try:
+            offset, remaining = self.start, self.count
+            while remaining > 0:
+                chunk = await anyio.to_thread.run_sync(
+                    os.pread, fd, min(CHUNK_SIZE, remaining), offset
+                )
+                if not chunk:
+                    break  # truncated since it was indexed
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": remaining > 0,
+                    }
+                )
+            if remaining > 0:
+                raise RuntimeError(f"{self.info.path} shrank while being sent")
+        finally:
+            os.close(fd)
+
+
+def accel_location(prefix: Optional[str], info: FileInfo, root: str) -> Optional[str]:
+    """Internal redirect path for info under prefix, if offloading is enabled"""
+    if not prefix:
+        return None
+    relative = os.path.relpath(info.path, root).replace(os.sep, "/")
+    return prefix.rstrip("/") + "/" + quote(relative)
@@ -0,0 +1,383 @@
+"""HLS proxy: rewritten playlists and cached, coalesced segments.
+
+Playlists are fetched from origin and every URI in them (variant and
+rendition playlists, segments, keys, init sections) is rewritten to a
+``/hls/{media_id}/{kind}/{token}/{name}`` path on this server. The token
+carries the upstream URL and an HMAC over it, so the proxy only follows
+URLs it handed out itself and cannot be used as an open relay. Those URLs
+come from origin playlists rather than the catalog, so they are fetched
+through the scraper's public pool: a playlist naming an internal address
+cannot make the proxy fetch it.
+
+Segments are streamed to the client chunk by chunk as they arrive from
+origin. Concurrent requests for the same segment share one upstream
+download: later viewers replay the chunks received so far and then follow
+the live download. Finished segments up to a size limit are kept in a
+byte-bounded LRU, so a popular title is fetched from origin once rather
+than once per viewer. A download that grows past the limit stops being
+shared: its chunks are dropped once its current viewers have read them,
+and later requests for that URL are passed straight through, as range
+requests are.
+"""
+
+import asyncio
+import base64
+import binascii
+import hashlib
+import hmac
+import re
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+import aiohttp
+
+from .cache import ByteLRU, SingleFlight
+from .scraping import Scraper, ScrapeError
+
+PLAYLIST_MEDIA_TYPE = "application/vnd.apple.mpegurl"
+PLAYLIST = "p"
+SEGMENT = "s"
+CHUNK_SIZE = 64 * 1024
+
+# Tags whose URI attribute names another playlist; other URIs are media.
+_PLAYLIST_TAGS = (
+    "#EXT-X-MEDIA:",
+    "#EXT-X-I-FRAME-STREAM-INF:",
+    "#EXT-X-RENDITION-REPORT:",
+)
+_URI_RE = re.compile(r'URI="([^"]*)"')
+_NAME_RE = re.compile(r"[^A-Za-z0-9._-]")
+# Response headers forwarded from origin for segments.
+_FORWARDED_HEADERS = (
+    "Content-Type",
+    "Content-Length",
+    "Content-Range",
+    "Accept-Ranges",
+)
+# Segment URLs remembered as too large to cache.
+_MAX_OVERSIZED_URLS = 4096
+
+
+class HlsError(Exception):
+    """Raised when a playlist or segment cannot be served"""
+
+    def __init__(self, message: str, status_code: int = 502) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CachedSegment(NamedTuple):
+    content_type: str
+    body: bytes
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def proxy_name(url: str, kind: str) -> str:
+    """File name for a proxied URL, so players can sniff the type"""
+    name = _NAME_RE.sub("", urlparse(url).path.rsplit("/", 1)[-1])[-64:]
+    return name or ("index.m3u8" if kind == PLAYLIST else "segment")
+
+
+class _Download:
+    """One upstream segment download that several responses can follow
+
+    Followers ``join`` before the headers arrive and read the chunks from
+    the start. While the download is ``shared`` every chunk is kept, for
+    later joiners and for the cache; after ``unshare`` no one else may
+    join, and each chunk is dropped once every follower has read it.
+    """
+
+    def __init__(self) -> None:
+        self.chunks: List[bytes] = []
+        # Index in the whole download of chunks[0].
+        self.first = 0
+        self.size = 0
+        self.shared = True
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.headers: "asyncio.Future[Dict[str, str]]" = (
+            asyncio.get_running_loop().create_future()
+        )
+        self.task: Optional["asyncio.Future[None]"] = None
+        self._changed = asyncio.Event()
+        # Next chunk index of each follower.
+        self._cursors: Dict[object, int] = {}
+
+    def publish(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def fail(self, error: HlsError) -> None:
+        self.error = error
+        if not self.headers.done():
+            self.headers.set_exception(error)
+            self.headers.exception()  # followers may all be gone
+
+    def unshare(self) -> None:
+        self.shared = False
+        self._trim()
+
+    def join(self) -> object:
+        follower = object()
+        self._cursors[follower] = self.first
+        return follower
+
+    def leave(self, follower: object) -> None:
+        del self._cursors[follower]
+        self._trim()
+        if not self.shared and not self._cursors and self.task is not None:
+            # Nobody is left to read an uncached download.
+            self.task.cancel()
+
+    def _trim(self) -> None:
+        if self.shared:
+            return
+        low = min(self._cursors.values(), default=self.first + len(self.chunks))
+        del self.chunks[: low - self.first]
+        self.first = low
+
+    async def follow(self, follower: object) -> AsyncIterator[bytes]:
+        try:
+            while True:
+                index = self._cursors[follower]
+                while index < self.first + len(self.chunks):
+                    chunk = self.chunks[index - self.first]
+                    index += 1
+                    self._cursors[follower] = index
+                    self._trim()
+                    yield chunk
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._changed.wait()
+        finally:
+            self.leave(follower)
+
+
+class HlsProxy:
+    """Rewrite playlists and relay segments for one shared upstream session"""
+
+    def __init__(
+        self,
+        scraper: Scraper,
+        secret: bytes,
+        cache_bytes: int = 256 * 1024 * 1024,
+        max_segment_bytes: int = 16 * 1024 * 1024,
+        playlist_cache_bytes: int = 16 * 1024 * 1024,
+    ) -> None:
+        self.scraper = scraper
+        self.secret = secret
+        self.max_segment_bytes = max_segment_bytes
+        self.segments = ByteLRU(cache_bytes, sizeof=lambda entry: len(entry.body))
+        self.playlists = ByteLRU(playlist_cache_bytes)
+        self._playlist_flights = SingleFlight()
+        self._downloads: Dict[str, _Download] = {}
+        # URLs of segments larger than max_segment_bytes, passed through.
+        self._oversized: "OrderedDict[str, None]" = OrderedDict()
+        self.origin_requests = 0
+
+    # URL signing
+
+    def _signature(self, media_id: str, kind: str, url: str) -> str:
+        message = f"{media_id}\0{kind}\0{url}".encode()
+        return _b64encode(hmac.new(self.secret, message, hashlib.sha256).digest()[:12])
+
+    def token(self, media_id: str, kind: str, url: str) -> str:
+        return f"{self._signature(media_id, kind, url)}.{_b64encode(url.encode())}"
+
+    def resolve(self, media_id: str, kind: str, token: str) -> str:
+        """Return the upstream URL in a token, rejecting forged tokens"""
+        signature, _, encoded = token.partition(".")
+        try:
+            url = _b64decode(encoded).decode()
+        except (binascii.Error, UnicodeDecodeError):
+            raise HlsError("Malformed proxy URL", 404) from None
+        if not hmac.compare_digest(signature, self._signature(media_id, kind, url)):
+            raise HlsError("Invalid proxy URL signature", 403)
+        return url
+
+    def proxy_path(self, prefix: str, media_id: str, kind: str, url: str) -> str:
+        token = self.token(media_id, kind, url)
+        return f"{prefix}/hls/{media_id}/{kind}/{token}/{proxy_name(url, kind)}"
+
+    # Playlists
+
+    def rewrite(self, text: str, base_url: str, prefix: str, media_id: str) -> str:
+        """Point every URI in a playlist at the proxy"""
+
+        def proxied(uri: str, kind: str) -> str:
+            url = urljoin(base_url, uri.strip())
+            if urlparse(url).scheme not in ("http", "https"):
+                return uri  # data:, skd:// and other non-fetchable URIs
+            return self.proxy_path(prefix, media_id, kind, url)
+
+        lines = []
+        next_kind = SEGMENT
+        for line in text.splitlines():
+            stripped = line.strip()
+            if stripped.startswith("#"):
+                if stripped.startswith("#EXT-X-STREAM-INF:"):
+                    next_kind = PLAYLIST
+                kind = PLAYLIST if stripped.startswith(_PLAYLIST_TAGS) else SEGMENT
+                line = _URI_RE.sub(
+                    lambda match: f'URI="{proxied(match.group(1), kind)}"', line
+                )
+            elif stripped:
+                line = proxied(stripped, next_kind)
+                next_kind = SEGMENT
+            lines.append(line)
+        return "\n".join(lines) + "\n"
+
+    async def playlist(
+        self, media_id: str, url: str, prefix: str, public_only: bool = True
+    ) -> Tuple[bytes, bool]:
+        """Return a rewritten playlist and whether it may be cached (not live)
+
+        Only a catalog source URL may be fetched with ``public_only`` off.
+        """
+        key = f"{prefix}\0{media_id}\0{url}\0{public_only:d}"
+        body = self.playlists.get(key)
+        if body is not None:
+            return body, True
+        return await self._playlist_flights.do(
+            key, lambda: self._fetch_playlist(key, media_id, url, prefix, public_only)
+        )
+
+    async def _fetch_playlist(
+        self, key: str, media_id: str, url: str, prefix: str, public_only: bool
+    ) -> Tuple[bytes, bool]:
+        self.origin_requests += 1
+        try:
+            text = await self.scraper.fetch_text(url, public_only=public_only)
+        except ScrapeError as exc:
+            raise HlsError(str(exc)) from exc
+        if not text.lstrip("\ufeff").startswith("#EXTM3U"):
+            raise HlsError(f"{url} is not an HLS playlist")
+        body = self.rewrite(text, url, prefix, media_id).encode()
+        # Master playlists and finished media playlists never change.
+        static = "#EXT-X-ENDLIST" in text or "#EXT-X-STREAM-INF" in text
+        if static:
+            self.playlists.put(key, body)
+        return body, static
+
+    # Segments
+
+    async def segment(
+        self, url: str, range_header: Optional[str] = None
+    ) -> Tuple[int, Dict[str, str], AsyncIterator[bytes]]:
+        """Return status, headers and body chunks for a segment"""
+        if range_header:
+            return await self._passthrough(url, {"Range": range_header})
+        cached = self.segments.get(url)
+        if cached is not None:
+            headers = {
+                "Content-Type": cached.content_type,
+                "Content-Length": str(len(cached.body)),
+            }
+            return 200, headers, _once(cached.body)
+        if url in self._oversized:
+            self._oversized.move_to_end(url)
+            return await self._passthrough(url, {})
+
+        download = self._downloads.get(url)
+        if download is None:
+            download = _Download()
+            self._downloads[url] = download
+            download.task = asyncio.ensure_future(self._download(url, download))
+        follower = download.join()
+        try:
+            headers = await asyncio.shield(download.headers)
+        except BaseException:
+            download.leave(follower)
+            raise
+        return 200, headers, download.follow(follower)
+
+    def _stop_sharing(self, url: str, download: _Download) -> None:
+        # Too large to cache: new requests bypass the download from now on.
+        download.unshare()
+        if self._downloads.get(url) is download:
+            del self._downloads[url]
+        self._oversized[url] = None
+        if len(self._oversized) > _MAX_OVERSIZED_URLS:
+            self._oversized.popitem(last=False)
+
+    async def _download(self, url: str, download: _Download) -> None:
+        self.origin_requests += 1
+        try:
+            async with self.scraper.public_session.get(
+                url, headers={"Accept-Encoding": "identity"}
+            ) as response:
+                if response.status != 200:
+                    raise HlsError(f"{url} returned HTTP {response.status}")
+                headers = {
+                    name: response.headers[name]
+                    for name in ("Content-Type", "Content-Length")
+                    if name in response.headers
+                }
+                download.headers.set_result(headers)
+                if (response.content_length or 0) > self.max_segment_bytes:
+                    self._stop_sharing(url, download)
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    download.chunks.append(chunk)
+                    download.size += len(chunk)
+                    if download.shared and download.size > self.max_segment_bytes:
+                        self._stop_sharing(url, download)
+                    download.publish()
+        except HlsError as exc:
+            download.fail(exc)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            download.fail(HlsError(f"{url}: {exc.__class__.__name__} {exc}"))
+        except BaseException:
+            download.fail(HlsError(f"{url}: download aborted"))
+            raise
+        else:
+            if download.shared:
+                content_type = headers.get("Content-Type", "application/octet-stream")
+                body = b"".join(download.chunks)
+                self.segments.put(url, CachedSegment(content_type, body))
+        finally:
+            download.done = True
+            download.publish()
+            if self._downloads.get(url) is download:
+                del self._downloads[url]
+
+    async def _passthrough(
+        self, url: str, headers: Dict[str, str]
+    ) -> Tuple[int, Dict[str, str], AsyncIterator[bytes]]:
+        self.origin_requests += 1
+        try:
+            response = await self.scraper.public_session.get(
+                url, headers={**headers, "Accept-Encoding": "identity"}
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            raise HlsError(f"{url}: {exc.__class__.__name__} {exc}") from exc
+        if response.status not in (200, 206, 416):
+            response.release()
+            raise HlsError(f"{url} returned HTTP {response.status}")
+        forwarded = {
+            name: response.headers[name]
+            for name in _FORWARDED_HEADERS
+            if name in response.headers
+        }
+
+        async def body() -> AsyncIterator[bytes]:
+            try:
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    yield chunk
+            finally:
+                response.release()
+
+        return response.status, forwarded, body()
+
+
+async def _once(body: bytes) -> AsyncIterator[bytes]:
+    yield body
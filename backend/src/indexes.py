@@ -0,0 +1,99 @@
+"""The catalog's search, suggest and facet indexes as one unit.
+
+Builds the three indexes from a catalog and writes them to, or loads
+them from, a snapshot. An in-memory catalog is snapshotted together with
+its indexes (see ``main.write_catalog_snapshot``); a SQLite catalog
+already persists its items, so only the indexes are written, to
+``<database>.indexes``. That file records the database generation it was
+built from and is ignored once the database has changed since.
+"""
+
+import os
+import time
+from typing import Dict, NamedTuple, Optional
+
+from .catalog import MediaCatalog, SQLiteCatalog
+from .facets import FacetIndex
+from .search import SearchIndex
+from .snapshot import Snapshot, SnapshotInfo, SnapshotWriter
+from .suggest import SuggestIndex, popularity
+
+
+class CatalogIndexes(NamedTuple):
+    search: SearchIndex
+    suggest: SuggestIndex
+    facets: FacetIndex
+
+
+def build_indexes(catalog: MediaCatalog) -> CatalogIndexes:
+    """Build every index from the items in catalog"""
+    search = SearchIndex()
+    search.add_many(catalog.iter_text())
+    suggest = SuggestIndex()
+    suggest.build((media.id, media.title, popularity(media)) for media in catalog)
+    facets = FacetIndex()
+    facets.build(catalog)
+    return CatalogIndexes(search, suggest, facets)
+
+
+def load_indexes(snapshot: Snapshot) -> CatalogIndexes:
+    """Map the indexes stored in a snapshot"""
+    return CatalogIndexes(
+        SearchIndex.from_snapshot(snapshot),
+        SuggestIndex.from_snapshot(snapshot),
+        FacetIndex.from_snapshot(snapshot),
+    )
+
+
+def write_indexes(
+    writer: SnapshotWriter, indexes: CatalogIndexes, positions: Dict[str, int]
+) -> None:
+    """Write every index, numbering documents by their catalog record"""
+    for index in indexes:
+        index.write_snapshot(writer, positions)
+
+
+def index_snapshot_path(catalog: SQLiteCatalog) -> str:
+    return f"{catalog.path}.indexes"
+
+
+def load_index_snapshot(catalog: SQLiteCatalog) -> Optional[CatalogIndexes]:
+    """The indexes saved beside catalog, if they match its current contents
+
+    Raises OSError or SnapshotError if the file exists but is unreadable.
+    """
+    path = index_snapshot_path(catalog)
+    if catalog.generation is None or not os.path.exists(path):
+        return None
+    snapshot = Snapshot(path)
+    if snapshot.json("indexes.meta")["generation"] != catalog.generation:
+        return None
+    return load_indexes(snapshot)
+
+
+def write_index_snapshot(
+    catalog: SQLiteCatalog, indexes: CatalogIndexes
+) -> Optional[SnapshotInfo]:
+    """Save indexes beside catalog; returns None if they may be out of date
+
+    The indexes must reflect every change this process made to catalog.
+    Nothing is written once another connection has changed the database,
+    since the indexes have not seen that change.
+    """
+    started = time.perf_counter()
+    generation = catalog.generation
+    ids = list(catalog.iter_ids())
+    if generation is None or catalog.current_generation() != generation:
+        return None
+    path = index_snapshot_path(catalog)
+    with SnapshotWriter(path) as writer:
+        writer.add_strings("catalog.ids", ids)
+        positions = {media_id: position for position, media_id in enumerate(ids)}
+        write_indexes(writer, indexes, positions)
+        writer.add_json("indexes.meta", {"generation": generation})
+    return SnapshotInfo(
+        path=path,
+        items=len(ids),
+        bytes=os.path.getsize(path),
+        seconds=round(time.perf_counter() - started, 3),
+    )
@@ -0,0 +1,187 @@
+"""Streaming bulk ingestion of NDJSON catalog feeds.
+
+``ingest`` reads an upload chunk by chunk, inflating it on the fly when
+it is gzip- or zlib-compressed, splits it into lines and validates each
+line as a ``MediaItem``. Valid items are upserted in batches, so the
+search indexes and response caches subscribed to the catalog are updated
+incrementally, one batch at a time. The event loop is yielded to between
+batches so live requests keep being served while a large feed loads.
+Memory stays bounded by one chunk, one batch and the (capped) error list.
+"""
+
+import asyncio
+import logging
+import time
+import zlib
+from typing import AsyncIterator, List, Optional, Tuple
+
+from pydantic import BaseModel, ValidationError
+
+from .catalog import MediaCatalog
+from .models import MediaItem
+
+logger = logging.getLogger(__name__)
+
+# Bounds how long one batch holds the event loop (validation, then upsert).
+DEFAULT_BATCH_SIZE = 500
+# Lines longer than this are reported as errors without being buffered.
+MAX_LINE_BYTES = 1024 * 1024
+INFLATE_STEP_BYTES = 256 * 1024
+# Per-line errors listed in a report; later ones are only counted.
+MAX_REPORTED_ERRORS = 100
+
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+class IngestLineError(BaseModel):
+    line: int
+    error: str
+
+
+class IngestReport(BaseModel):
+    lines: int = 0
+    upserted: int = 0
+    failed: int = 0
+    batches: int = 0
+    compressed: bool = False
+    done: bool = False
+    seconds: float = 0.0
+    errors: List[IngestLineError] = []
+
+
+class IngestError(Exception):
+    """Raised when the upload as a whole cannot be read"""
+
+
+async def _inflate(
+    chunks: AsyncIterator[bytes], report: IngestReport
+) -> AsyncIterator[bytes]:
+    """Pass chunks through, inflating them if the upload is compressed"""
+    inflater = None
+    sniffed = False
+    # Whether the current stream has been fed data but not reached its end.
+    in_stream = False
+    async for chunk in chunks:
+        if not sniffed and chunk:
+            sniffed = True
+            # NDJSON starts with "{" or whitespace, never with these bytes.
+            if chunk[:1] in (_GZIP_MAGIC[:1], b"\x78"):
+                # wbits=47 accepts both gzip and zlib headers.
+                inflater = zlib.decompressobj(wbits=47)
+                report.compressed = True
+        if inflater is None:
+            yield chunk
+            continue
+        while chunk:
+            in_stream = True
+            try:
+                # Bounded output per step, so a small upload cannot expand
+                # into one huge buffer.
+                yield inflater.decompress(chunk, INFLATE_STEP_BYTES)
+            except zlib.error as exc:
+                raise IngestError(f"Corrupt compressed upload: {exc}") from exc
+            if inflater.eof:
+                # A gzip file may hold several members back to back (as
+                # written by concatenating .gz files or by pigz); each
+                # one after the first starts in the unused data.
+                chunk = inflater.unused_data
+                inflater = zlib.decompressobj(wbits=47)
+                in_stream = False
+            else:
+                chunk = inflater.unconsumed_tail
+    if in_stream:
+        raise IngestError("Truncated compressed upload")
+
+
+async def iter_lines(
+    chunks: AsyncIterator[bytes], report: IngestReport
+) -> AsyncIterator[Tuple[int, Optional[bytes]]]:
+    """Yield (line number, line) pairs; None stands for an overlong line"""
+    pending = b""
+    number = 0
+    skipping = False
+    async for data in _inflate(chunks, report):
+        pending += data
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            if skipping:
+                skipping = False  # tail of an overlong line, already reported
+                continue
+            number += 1
+            yield number, line if len(line) <= MAX_LINE_BYTES else None
+        if len(pending) > MAX_LINE_BYTES and not skipping:
+            number += 1
+            yield number, None
+            skipping = True
+        if skipping:
+            pending = b""
+    if pending.strip() and not skipping:
+        yield number + 1, pending
+
+
+def _record_error(report: IngestReport, line: int, error: str) -> None:
+    report.failed += 1
+    if len(report.errors) < MAX_REPORTED_ERRORS:
+        report.errors.append(IngestLineError(line=line, error=error))
+
+
+def _describe(exc: ValidationError) -> str:
+    first = exc.errors(include_url=False)[0]
+    location = ".".join(str(part) for part in first["loc"])
+    message = f"{location}: {first['msg']}" if location else first["msg"]
+    extra = exc.error_count() - 1
+    return f"{message} (+{extra} more)" if extra else message
+
+
+async def ingest(
+    catalog: MediaCatalog,
+    chunks: AsyncIterator[bytes],
+    report: Optional[IngestReport] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> IngestReport:
+    """Validate NDJSON MediaItems from chunks and upsert them in batches"""
+    report = report if report is not None else IngestReport()
+    started = time.perf_counter()
+    batch: List[MediaItem] = []
+
+    async def flush() -> None:
+        # Yield both before and after the upsert: a request that arrived
+        # while the batch was being validated is queued behind this task,
+        # so one yield alone would still make it wait for the upsert.
+        await asyncio.sleep(0)
+        catalog.upsert_many(batch)
+        report.upserted += len(batch)
+        report.batches += 1
+        report.seconds = round(time.perf_counter() - started, 3)
+        batch.clear()
+        await asyncio.sleep(0)
+
+    try:
+        async for number, line in iter_lines(chunks, report):
+            report.lines = number
+            if line is None:
+                _record_error(report, number, f"Line exceeds {MAX_LINE_BYTES} bytes")
+                continue
+            if not line.strip():
+                continue
+            try:
+                batch.append(MediaItem.model_validate_json(line))
+            except ValidationError as exc:
+                _record_error(report, number, _describe(exc))
+                continue
+            if len(batch) >= batch_size:
+                await flush()
+        if batch:
+            await flush()
+    finally:
+        report.done = True
+        report.seconds = round(time.perf_counter() - started, 3)
+        logger.info(
+            "Ingested %d items from %d lines (%d failed) in %.2fs",
+            report.upserted,
+            report.lines,
+            report.failed,
+            report.seconds,
+        )
+    return report
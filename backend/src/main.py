@@ -1,7 +1,88 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from fastapi.responses import JSONResponse, StreamingResponse
+from collections import deque
+from functools import lru_cache
+from itertools import islice
+import anyio
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Literal, Optional, Tuple, Union
+from urllib.parse import urlencode
+
+from .adblock import (
+    AdBlockCheckRequest,
+    AdBlockCheckResponse,
+    FilterEngine,
+    check_url,
+    load_filter_engine,
+)
+from .catalog import MediaCatalog, SnapshotCatalog, SQLiteCatalog, open_catalog
+from .config import settings
+from .extraction import ExtractRequest, ExtractResponse, extract_video_sources
+from .events import (
+    MAX_BATCH_BYTES as MAX_EVENT_BATCH_BYTES,
+    EventError,
+    EventLogError,
+    EventService,
+    EventsAccepted,
+    TrendingResponse,
+    decode_batch,
+)
+from .facets import FacetIndex, MediaFacetsResponse, UnknownCursor
+from .files import FileIndex, FileRangeResponse, accel_location, if_range_matches, parse_range
+from .federated import (
+    LocalSearchProvider,
+    OmdbProvider,
+    ScrapeSourceProvider,
+    SearchProvider,
+    TmdbProvider,
+    federated_search,
+)
+from .hls import PLAYLIST, PLAYLIST_MEDIA_TYPE, SEGMENT, HlsError, HlsProxy
+from .indexes import (
+    CatalogIndexes,
+    build_indexes,
+    index_snapshot_path,
+    load_index_snapshot,
+    load_indexes,
+    write_index_snapshot,
+    write_indexes,
+)
+from .ingest import DEFAULT_BATCH_SIZE as DEFAULT_INGEST_BATCH, IngestError, IngestReport, ingest
+from .metadata_proxy import MetadataEntry, MetadataError, MetadataProxy, MetadataStats
+from .metrics import (
+    PROMETHEUS_MEDIA_TYPE,
+    Metrics,
+    MetricsMiddleware,
+    SamplingProfiler,
+    TimedRoute,
+)
+from .models import MediaBatchRequest, MediaBatchResponse, MediaItem, MediaSource, WebSource
+from .response_cache import CachedResponse, ResponseCache, etag_matches, json_response, make_etag
+from .scraping import (
+    ScrapeError,
+    Scraper,
+    ScrapeSearchRequest,
+    ScrapeSearchResponse,
+    load_sources,
+)
+from .search import SearchIndex
+from .snapshot import Snapshot, SnapshotError, SnapshotInfo, SnapshotWriter
+from .suggest import (
+    MAX_LIMIT as MAX_SUGGESTIONS,
+    SuggestIndex,
+    SuggestResponse,
+    Suggestion,
+    popularity,
+)
+from .thumbnails import FORMATS as THUMBNAIL_FORMATS, ThumbnailError, ThumbnailService, snap_width
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Streamy API", description="Backend API for Streamy streaming app")
 
@@ -14,20 +95,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Define data models
-class MediaSource(BaseModel):
-    name: str
-    url: str
-    quality: str
-    size: Optional[str] = None
-
-class MediaItem(BaseModel):
-    id: str
-    title: str
-    thumbnail: Optional[str] = None
-    description: Optional[str] = None
-    sources: List[MediaSource] = []
-    metadata: Dict[str, Any] = {}
+# Request metrics; TimedRoute must be installed before any route is declared
+METRICS = Metrics()
+PROFILER = (
+    SamplingProfiler(settings.profile_interval, settings.profile_keep)
+    if settings.profile_requests
+    else None
+)
+app.router.route_class = TimedRoute
+app.add_middleware(MetricsMiddleware, metrics=METRICS, profiler=PROFILER)
+
+if PROFILER is not None:
+    app.add_event_handler("startup", PROFILER.start)
+    app.add_event_handler("shutdown", PROFILER.stop)
 
 # Sample data - to be replaced with proper implementation
 SAMPLE_MEDIA = [
@@ -53,27 +133,648 @@ SAMPLE_MEDIA = [
     )
 ]
 
+def _load_snapshot() -> Optional[Tuple[SnapshotCatalog, SearchIndex, SuggestIndex, FacetIndex]]:
+    path = settings.catalog_snapshot
+    if not path or settings.catalog_db or not os.path.exists(path):
+        return None
+    try:
+        snapshot = Snapshot(path)
+        return (
+            SnapshotCatalog(snapshot, readonly=settings.catalog_readonly),
+            *load_indexes(snapshot),
+        )
+    except (OSError, SnapshotError) as exc:
+        logger.warning("Ignoring catalog snapshot %s: %s", path, exc)
+        return None
+
+def _load_index_snapshot(catalog: MediaCatalog) -> Optional[CatalogIndexes]:
+    if not isinstance(catalog, SQLiteCatalog):
+        return None
+    try:
+        return load_index_snapshot(catalog)
+    except (OSError, SnapshotError, KeyError) as exc:
+        logger.warning("Ignoring index snapshot %s: %s", index_snapshot_path(catalog), exc)
+        return None
+
+# Catalog and indexes mapped from the snapshot file when there is a usable one,
+# which replaces loading the catalog and building the indexes below
+SNAPSHOT_STATE = _load_snapshot()
+if SNAPSHOT_STATE is not None:
+    CATALOG, SEARCH_INDEX, SUGGEST_INDEX, FACET_INDEX = SNAPSHOT_STATE
+else:
+    CATALOG = open_catalog(settings.catalog_db, readonly=settings.catalog_readonly)
+    # A read-only in-memory catalog is only read-only to clients; it is
+    # still seeded, as nothing is saved
+    if (not settings.catalog_readonly or not settings.catalog_db) and len(CATALOG) == 0:
+        CATALOG.upsert_many(SAMPLE_MEDIA)
+
+# Indexes saved beside a SQLite catalog, when it has not changed since;
+# otherwise they are built from the catalog once at startup. Catalog
+# mutations then update them incrementally.
+INDEX_STATE = _load_index_snapshot(CATALOG) if SNAPSHOT_STATE is None else None
+if INDEX_STATE is not None:
+    SEARCH_INDEX, SUGGEST_INDEX, FACET_INDEX = INDEX_STATE
+elif SNAPSHOT_STATE is None:
+    SEARCH_INDEX, SUGGEST_INDEX, FACET_INDEX = build_indexes(CATALOG)
+
+def _sync_search_index(upserted: List[MediaItem], deleted: List[str]) -> None:
+    for media in upserted:
+        SEARCH_INDEX.add(media.id, media.title, media.description)
+    for media_id in deleted:
+        SEARCH_INDEX.remove(media_id)
+
+CATALOG.subscribe(_sync_search_index)
+
+# Autocomplete index for /suggest, kept in sync the same way
+def _sync_suggest_index(upserted: List[MediaItem], deleted: List[str]) -> None:
+    SUGGEST_INDEX.remove_many(deleted)
+    SUGGEST_INDEX.add_many((media.id, media.title, popularity(media)) for media in upserted)
+
+CATALOG.subscribe(_sync_suggest_index)
+
+# Genre/year/quality bitmaps for filtered GET /media, kept in sync the same way
+def _sync_facet_index(upserted: List[MediaItem], deleted: List[str]) -> None:
+    FACET_INDEX.remove_many(deleted)
+    FACET_INDEX.add_many(upserted)
+
+CATALOG.subscribe(_sync_facet_index)
+
+# Encoded /media responses, invalidated whenever the catalog changes
+RESPONSE_CACHE = ResponseCache(CATALOG)
+
+# Catalog version held by the snapshot file, so an unchanged catalog is not rewritten
+SNAPSHOT_VERSION: Optional[int] = CATALOG.version if SNAPSHOT_STATE is not None else None
+
+def write_catalog_snapshot(path: str) -> SnapshotInfo:
+    """Write the catalog and its indexes to path, replacing the file atomically"""
+    global SNAPSHOT_VERSION
+    started = time.perf_counter()
+    version = CATALOG.version
+    with SnapshotWriter(path) as writer:
+        positions = CATALOG.write_snapshot(writer)
+        write_indexes(writer, CatalogIndexes(SEARCH_INDEX, SUGGEST_INDEX, FACET_INDEX), positions)
+    SNAPSHOT_VERSION = version
+    return SnapshotInfo(
+        path=path,
+        items=len(positions),
+        bytes=os.path.getsize(path),
+        seconds=round(time.perf_counter() - started, 3),
+    )
+
+@app.on_event("shutdown")
+def save_catalog_snapshot():
+    # Registered before close_catalog, which runs after it
+    if not settings.catalog_snapshot or settings.catalog_db or settings.catalog_readonly:
+        return
+    if CATALOG.version == SNAPSHOT_VERSION:
+        return
+    try:
+        info = write_catalog_snapshot(settings.catalog_snapshot)
+    except (OSError, SnapshotError, ValueError) as exc:
+        logger.error("Writing catalog snapshot %s failed: %s", settings.catalog_snapshot, exc)
+        return
+    logger.info("Wrote catalog snapshot of %d items in %.2fs", info.items, info.seconds)
+
+# Catalog version the index snapshot beside a SQLite catalog was loaded at
+INDEX_SNAPSHOT_VERSION: Optional[int] = CATALOG.version if INDEX_STATE is not None else None
+
+@app.on_event("shutdown")
+def save_index_snapshot():
+    # Saves rebuilding the indexes of an unchanged SQLite catalog next start
+    if not isinstance(CATALOG, SQLiteCatalog) or settings.catalog_readonly:
+        return
+    if CATALOG.version == INDEX_SNAPSHOT_VERSION:
+        return
+    path = index_snapshot_path(CATALOG)
+    try:
+        info = write_index_snapshot(
+            CATALOG, CatalogIndexes(SEARCH_INDEX, SUGGEST_INDEX, FACET_INDEX)
+        )
+    except (OSError, SnapshotError, ValueError) as exc:
+        logger.error("Writing index snapshot %s failed: %s", path, exc)
+        return
+    if info is None:
+        logger.info("Not saving index snapshot %s: the catalog was changed elsewhere", path)
+    else:
+        logger.info("Wrote index snapshot of %d items in %.2fs", info.items, info.seconds)
+
+@app.on_event("shutdown")
+def close_catalog():
+    CATALOG.close()
+
+# Shared connection pool for all outbound scraping
+SCRAPER = Scraper(
+    max_connections=settings.scrape_max_connections,
+    connections_per_host=settings.scrape_connections_per_host,
+    timeout=settings.scrape_timeout,
+    parse_workers=settings.scrape_parse_workers,
+)
+WEB_SOURCES = load_sources(settings.scrape_sources_file)
+
+# Global network filters, compiled once (or loaded from the binary cache)
+ADBLOCK_ENGINE = load_filter_engine(settings.adblock_filters, settings.adblock_cache)
+WEB_SOURCES_BY_ID = {source.id: source for source in WEB_SOURCES}
+
+@lru_cache(maxsize=64)
+def _pattern_engine(patterns: Tuple[str, ...]) -> FilterEngine:
+    return FilterEngine.from_lines(patterns)
+
+@app.on_event("shutdown")
+async def close_scraper():
+    await SCRAPER.close()
+
+# Resized posters, cached on disk and in memory
+THUMBNAILS = ThumbnailService(
+    SCRAPER,
+    cache_dir=settings.thumbnail_cache_dir,
+    memory_bytes=settings.thumbnail_memory_bytes,
+    disk_bytes=settings.thumbnail_disk_bytes,
+    workers=settings.thumbnail_workers,
+    quality=settings.thumbnail_quality,
+    local_dir=settings.thumbnail_local_dir,
+)
+app.add_event_handler("shutdown", THUMBNAILS.close)
+
+# HLS playlists and segments relayed through the backend
+HLS_PROXY = HlsProxy(
+    SCRAPER,
+    secret=settings.hls_secret.encode() if settings.hls_secret else secrets.token_bytes(32),
+    cache_bytes=settings.hls_cache_bytes,
+    max_segment_bytes=settings.hls_max_segment_bytes,
+)
+
+# TMDB/OMDB responses, cached in memory and on disk and shared by every client
+METADATA_PROXY = MetadataProxy(
+    SCRAPER,
+    cache_dir=settings.metadata_cache_dir,
+    memory_bytes=settings.metadata_memory_bytes,
+    disk_bytes=settings.metadata_disk_bytes,
+    ttl=settings.metadata_ttl,
+    stale_ttl=settings.metadata_stale_ttl,
+)
+METRICS.collectors.append(METADATA_PROXY.metrics)
+
+# Play/progress events from the apps, logged durably and ranked for /trending
+def _titles(media_ids: List[str]) -> Dict[str, str]:
+    return {media_id: media.title for media_id, media in CATALOG.get_many(media_ids).items()}
+
+EVENTS = EventService(
+    settings.events_dir,
+    _titles,
+    top_k=settings.events_top_k,
+    fsync=settings.events_fsync,
+    commit_delay=settings.events_commit_delay,
+    refresh_interval=settings.events_refresh_interval,
+    checkpoint_interval=settings.events_checkpoint_interval,
+)
+METRICS.collectors.append(EVENTS.metrics)
+app.add_event_handler("startup", EVENTS.start)
+app.add_event_handler("shutdown", EVENTS.close)
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to Streamy API"}
 
-@app.get("/media", response_model=List[MediaItem])
-async def get_media():
-    return SAMPLE_MEDIA
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(METRICS.render(), media_type=PROMETHEUS_MEDIA_TYPE)
+
+@app.get("/metrics/profile", include_in_schema=False)
+async def metrics_profile():
+    # Folded stacks of the slowest requests, e.g. for flamegraph.pl
+    if PROFILER is None:
+        raise HTTPException(status_code=404, detail="Profiler is disabled (set STREAMY_PROFILE=1)")
+    return Response(PROFILER.folded(), media_type="text/plain; charset=utf-8")
+
+# Page sizes for GET /media; NDJSON streams are not capped
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+def _stream_ndjson(items: Iterator[MediaItem], limit: Optional[int]) -> Iterator[bytes]:
+    # Encode one catalog chunk at a time so memory stays flat for any catalog size
+    lines = []
+    for count, media in enumerate(items, start=1):
+        lines.append(media.model_dump_json().encode())
+        if limit is not None and count >= limit:
+            break
+        if len(lines) >= DEFAULT_PAGE_SIZE:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+def _load_ids(media_ids: Iterator[str]) -> Iterator[MediaItem]:
+    # Fetch filtered items a page at a time, in the order of the ids
+    while True:
+        chunk = list(islice(media_ids, DEFAULT_PAGE_SIZE))
+        if not chunk:
+            return
+        found = CATALOG.get_many(chunk)
+        yield from (found[media_id] for media_id in chunk if media_id in found)
+
+def _next_link(path: str, next_cursor: str, page_size: int, query: Optional[List[Tuple[str, str]]] = None) -> Dict[str, str]:
+    # Built only from the parameters in the cache key, since the headers
+    # are cached with the page and shared by every request for that key
+    query = (query or []) + [("after", next_cursor), ("limit", str(page_size))]
+    next_url = f"{path}?{urlencode(query)}"
+    return {"X-Next-Cursor": next_cursor, "Link": f'<{next_url}>; rel="next"'}
+
+@app.get("/media", response_model=Union[List[MediaItem], MediaFacetsResponse])
+async def get_media(
+    request: Request,
+    after: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    genre: Optional[List[str]] = Query(None),
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    quality: Optional[List[str]] = Query(None),
+    facets: bool = False,
+):
+    # Any filter (or facets=true) switches to the bitmap index and the
+    # {items, total, facets, next_cursor} envelope; repeated genre or
+    # quality parameters match any of their values
+    genres = tuple(sorted({value.strip().lower() for value in genre or ()}))
+    qualities = tuple(sorted({value.strip().lower() for value in quality or ()}))
+    filtered = facets or bool(genres or qualities) or year_from is not None or year_to is not None
+
+    if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        if not filtered:
+            return StreamingResponse(_stream_ndjson(CATALOG.iter_from(after), limit), media_type=NDJSON_MEDIA_TYPE)
+        matched = FACET_INDEX.match(FACET_INDEX.filters(genres, year_from, year_to, qualities))
+        try:
+            media_ids = FACET_INDEX.iter_ids(matched, after)
+        except UnknownCursor:
+            raise HTTPException(status_code=400, detail="Unknown cursor")
+        return StreamingResponse(_stream_ndjson(_load_ids(media_ids), limit), media_type=NDJSON_MEDIA_TYPE)
+
+    page_size = min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+
+    def build_page() -> CachedResponse:
+        page = CATALOG.page(after, page_size + 1)
+        headers = {}
+        if len(page) > page_size:
+            page = page[:page_size]
+            headers = _next_link(request.url.path, page[-1].id, page_size)
+        body = RESPONSE_CACHE.items(page)
+        return CachedResponse(body, make_etag(body), headers)
+
+    def build_filtered_page() -> CachedResponse:
+        filters = FACET_INDEX.filters(genres, year_from, year_to, qualities)
+        matched = FACET_INDEX.match(filters)
+        page_ids = list(islice(FACET_INDEX.iter_ids(matched, after), page_size + 1))
+        headers = {}
+        next_cursor = None
+        if len(page_ids) > page_size:
+            page_ids = page_ids[:page_size]
+            next_cursor = page_ids[-1]
+            query = [("genre", value) for value in genres] + [("quality", value) for value in qualities]
+            if year_from is not None:
+                query.append(("year_from", str(year_from)))
+            if year_to is not None:
+                query.append(("year_to", str(year_to)))
+            if facets:
+                query.append(("facets", "true"))
+            headers = _next_link(request.url.path, next_cursor, page_size, query)
+        found = CATALOG.get_many(page_ids)
+        response = MediaFacetsResponse(
+            items=[found[media_id] for media_id in page_ids if media_id in found],
+            total=len(matched),
+            facets=FACET_INDEX.counts(filters) if facets else {},
+            next_cursor=next_cursor,
+        )
+        body = response.model_dump_json().encode()
+        return CachedResponse(body, make_etag(body), headers)
+
+    if not filtered:
+        return json_response(request, RESPONSE_CACHE.route(("media", after, page_size), build_page))
+    key = ("media", after, page_size, genres, year_from, year_to, qualities, facets)
+    try:
+        return json_response(request, RESPONSE_CACHE.route(key, build_filtered_page))
+    except UnknownCursor:
+        raise HTTPException(status_code=400, detail="Unknown cursor")
 
 @app.get("/media/{media_id}", response_model=MediaItem)
-async def get_media_by_id(media_id: str):
-    for media in SAMPLE_MEDIA:
-        if media.id == media_id:
-            return media
+async def get_media_by_id(media_id: str, request: Request):
+    entry = RESPONSE_CACHE.item_by_id(media_id, CATALOG.get)
+    if entry is not None:
+        return json_response(request, entry)
     raise HTTPException(status_code=404, detail="Media not found")
 
+@app.post("/media/batch", response_model=MediaBatchResponse)
+async def get_media_batch(request: MediaBatchRequest):
+    # Items are spliced from their cached encodings, or projected when fields is set
+    if request.fields is None:
+        entries = RESPONSE_CACHE.items_by_ids(request.ids, CATALOG.get_many)
+        bodies = [entry.body if entry is not None else None for entry in entries]
+    else:
+        include = set(request.fields) | {"id"}
+        found = CATALOG.get_many(set(request.ids))
+        bodies = [
+            found[media_id].model_dump_json(include=include).encode() if media_id in found else None
+            for media_id in request.ids
+        ]
+    missing = [media_id for media_id, body in zip(request.ids, bodies) if body is None]
+    body = b'{"items":[%s],"missing":%s}' % (
+        b",".join(body if body is not None else b"null" for body in bodies),
+        json.dumps(list(dict.fromkeys(missing)), separators=(",", ":")).encode(),
+    )
+    return Response(content=body, media_type="application/json")
+
+def _search_local(query: str, limit: int) -> List[MediaItem]:
+    hits = SEARCH_INDEX.search(query, limit=limit)
+    found = CATALOG.get_many(media_id for media_id, _score in hits)
+    return [found[media_id] for media_id, _score in hits if media_id in found]
+
 @app.get("/search/{query}", response_model=List[MediaItem])
-async def search_media(query: str):
-    # Simple search implementation - replace with proper search in the future
-    results = []
-    query = query.lower()
-    for media in SAMPLE_MEDIA:
-        if query in media.title.lower() or (media.description and query in media.description.lower()):
-            results.append(media)
-    return results
+async def search_media(query: str, limit: int = Query(20, ge=1, le=100)):
+    return _search_local(query, limit)
+
+# Locally stored media, served with Range support
+FILE_INDEX = FileIndex(settings.media_dir) if settings.media_dir else None
+
+@app.api_route("/files/{path:path}", methods=["GET", "HEAD"])
+async def get_file(path: str, request: Request):
+    info = FILE_INDEX.lookup(path) if FILE_INDEX is not None else None
+    if info is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    if etag_matches(request.headers.get("if-none-match"), info.etag):
+        return Response(status_code=304, headers={"ETag": info.etag, "Accept-Ranges": "bytes"})
+    accel_path = accel_location(settings.media_accel_prefix, info, FILE_INDEX.root)
+    if accel_path is not None:
+        return FileRangeResponse(info, accel_path=accel_path)
+    ranges = None
+    if if_range_matches(request.headers.get("if-range"), info):
+        ranges = parse_range(request.headers.get("range"), info.size)
+    if ranges == []:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{info.size}", "Accept-Ranges": "bytes"})
+    if ranges is not None and len(ranges) == 1:
+        start, end = ranges[0]
+        return FileRangeResponse(info, start, end, status_code=206)
+    # No Range, a stale If-Range, or several ranges: send the whole file
+    return FileRangeResponse(info)
+
+@app.get("/thumbnail/{media_id}", responses={200: {"content": {"image/webp": {}, "image/jpeg": {}}}})
+async def get_thumbnail(
+    media_id: str,
+    request: Request,
+    w: int = Query(342, ge=1, le=4096),
+    fmt: Optional[Literal["webp", "jpeg"]] = None,
+):
+    media = CATALOG.get(media_id)
+    if media is None or not media.thumbnail:
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    headers = {"Cache-Control": "public, max-age=86400"}
+    if fmt is None:
+        # Without an explicit format, pick WebP for clients that accept it
+        fmt = "webp" if "image/webp" in request.headers.get("accept", "") else "jpeg"
+        headers["Vary"] = "Accept"
+    try:
+        body = await THUMBNAILS.get(media.thumbnail, snap_width(w), fmt)
+    except ThumbnailError as exc:
+        raise HTTPException(status_code=502, detail=str(exc))
+    headers["ETag"] = make_etag(body)
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type=THUMBNAIL_FORMATS[fmt][1], headers=headers)
+
+def _hls_playlist_response(body: bytes, static: bool) -> Response:
+    # Live playlists change every target duration; VOD and master playlists do not
+    cache_control = "public, max-age=3600" if static else "no-cache"
+    return Response(body, media_type=PLAYLIST_MEDIA_TYPE, headers={"Cache-Control": cache_control})
+
+@app.get("/hls/{media_id}/index.m3u8")
+async def hls_entry(media_id: str, request: Request, source: int = Query(0, ge=0)):
+    media = CATALOG.get(media_id)
+    if media is None or source >= len(media.sources):
+        raise HTTPException(status_code=404, detail="Media source not found")
+    try:
+        body, static = await HLS_PROXY.playlist(
+            media_id, media.sources[source].url, request.scope.get("root_path", ""), public_only=False
+        )
+    except HlsError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+    return _hls_playlist_response(body, static)
+
+@app.get("/hls/{media_id}/{kind}/{token}/{name}")
+async def hls_proxy(media_id: str, kind: str, token: str, name: str, request: Request):
+    if kind not in (PLAYLIST, SEGMENT):
+        raise HTTPException(status_code=404, detail="Not found")
+    try:
+        url = HLS_PROXY.resolve(media_id, kind, token)
+        if kind == PLAYLIST:
+            body, static = await HLS_PROXY.playlist(media_id, url, request.scope.get("root_path", ""))
+            return _hls_playlist_response(body, static)
+        status, headers, chunks = await HLS_PROXY.segment(url, request.headers.get("range"))
+    except HlsError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+    headers["Cache-Control"] = "public, max-age=86400"
+    return StreamingResponse(chunks, status_code=status, headers=headers)
+
+@app.get("/suggest", response_model=SuggestResponse)
+async def suggest(q: str = Query(..., max_length=200), limit: int = Query(10, ge=1, le=MAX_SUGGESTIONS)):
+    # Per-keystroke autocomplete: titles only, never the full-text search path
+    suggestions = [Suggestion(id=media_id, title=title) for media_id, title in SUGGEST_INDEX.suggest(q, limit)]
+    return SuggestResponse(query=q, suggestions=suggestions)
+
+def _search_providers() -> List[SearchProvider]:
+    remote = {
+        "timeout": settings.federated_provider_timeout,
+        "hedge_after": settings.federated_hedge_after,
+    }
+    providers: List[SearchProvider] = [LocalSearchProvider(_search_local)]
+    providers.extend(
+        ScrapeSourceProvider(SCRAPER, source, **remote)
+        for source in WEB_SOURCES
+        if source.is_enabled
+    )
+    if settings.tmdb_api_key:
+        providers.append(
+            TmdbProvider(SCRAPER, settings.tmdb_api_key, settings.tmdb_base_url, METADATA_PROXY, **remote)
+        )
+    if settings.omdb_api_key:
+        providers.append(
+            OmdbProvider(SCRAPER, settings.omdb_api_key, settings.omdb_base_url, METADATA_PROXY, **remote)
+        )
+    return providers
+
+SEARCH_PROVIDERS = _search_providers()
+
+def _metadata_response(entry: MetadataEntry) -> Response:
+    # Let clients reuse the body for as long as the proxy considers it fresh
+    max_age = max(0, int(METADATA_PROXY.ttl - (time.time() - entry.fetched_at)))
+    return Response(entry.body, media_type="application/json", headers={"Cache-Control": f"public, max-age={max_age}"})
+
+# Upstream JSON of TMDB's multi search and OMDB's title search, so apps need
+# no API keys of their own and share one cache
+@app.get("/metadata/tmdb/search")
+async def metadata_tmdb_search(query: str = Query(..., min_length=1, max_length=200)):
+    if not settings.tmdb_api_key:
+        raise HTTPException(status_code=404, detail="TMDB is not configured")
+    try:
+        entry = await METADATA_PROXY.tmdb_search(settings.tmdb_base_url.rstrip("/"), settings.tmdb_api_key, query)
+    except MetadataError as exc:
+        raise HTTPException(status_code=502, detail=str(exc))
+    return _metadata_response(entry)
+
+@app.get("/metadata/omdb/search")
+async def metadata_omdb_search(query: str = Query(..., min_length=1, max_length=200)):
+    if not settings.omdb_api_key:
+        raise HTTPException(status_code=404, detail="OMDB is not configured")
+    try:
+        entry = await METADATA_PROXY.omdb_search(settings.omdb_base_url.rstrip("/"), settings.omdb_api_key, query)
+    except MetadataError as exc:
+        raise HTTPException(status_code=502, detail=str(exc))
+    return _metadata_response(entry)
+
+@app.get("/metadata/stats", response_model=MetadataStats)
+async def metadata_stats():
+    return METADATA_PROXY.stats()
+
+@app.post("/events", response_model=EventsAccepted)
+async def post_events(request: Request):
+    # {"events": [...]} as JSON, optionally gzip- or zlib-compressed; answered
+    # once the batch is in the event log
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > MAX_EVENT_BATCH_BYTES:
+            raise HTTPException(status_code=413, detail=f"Batches are limited to {MAX_EVENT_BATCH_BYTES} bytes")
+    try:
+        events = decode_batch(bytes(body))
+    except EventError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    try:
+        accepted = await EVENTS.record(events)
+    except EventLogError as exc:
+        raise HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": "1"})
+    return EventsAccepted(accepted=accepted)
+
+@app.get("/trending", response_model=TrendingResponse)
+async def trending(
+    request: Request,
+    window: Literal["1h", "24h"] = "1h",
+    limit: int = Query(20, ge=1, le=settings.events_top_k),
+):
+    # Rankings are recomputed in the background; this only sends the latest one
+    return json_response(request, EVENTS.trending(window, limit))
+
+def _sse(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+@app.get("/search/{query}/stream")
+async def search_media_stream(
+    query: str,
+    limit: int = Query(20, ge=1, le=100),
+    deadline_ms: Optional[int] = Query(None, ge=1, le=30000),
+):
+    deadline = deadline_ms / 1000 if deadline_ms else settings.federated_deadline
+
+    async def events() -> AsyncIterator[bytes]:
+        total = 0
+        failed = []
+        async for result in federated_search(query, SEARCH_PROVIDERS, deadline, limit):
+            if result.error is not None:
+                failed.append(result.provider)
+                yield _sse("error", {
+                    "provider": result.provider,
+                    "elapsed_ms": round(result.elapsed_ms, 1),
+                    "error": result.error,
+                })
+                continue
+            total += len(result.items)
+            yield _sse("results", {
+                "provider": result.provider,
+                "elapsed_ms": round(result.elapsed_ms, 1),
+                "items": [item.model_dump() for item in result.items],
+            })
+        yield _sse("done", {"total": total, "failed": failed})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/scrape/search", response_model=ScrapeSearchResponse)
+async def scrape_search(request: ScrapeSearchRequest):
+    if request.sources is None:
+        return await SCRAPER.search(request.query, WEB_SOURCES, limit=request.limit)
+    # Sources sent by the client may only reach public addresses
+    return await SCRAPER.search(request.query, request.sources, limit=request.limit, public_only=True)
+
+@app.post("/extract", response_model=ExtractResponse)
+async def extract(request: ExtractRequest):
+    html = request.html
+    if html is None:
+        if not request.url:
+            raise HTTPException(status_code=422, detail="Either html or url is required")
+        try:
+            # The URL comes from the client, so it may only reach public addresses
+            html = await SCRAPER.fetch_text(request.url, {"Referer": request.url}, public_only=True)
+        except ScrapeError as exc:
+            raise HTTPException(status_code=502, detail=str(exc))
+    sources = await SCRAPER.run_in_parser(extract_video_sources, html, request.url)
+    return ExtractResponse(sources=sources)
+
+def _check_urls(request: AdBlockCheckRequest, source: Optional[WebSource]) -> AdBlockCheckResponse:
+    engines = [ADBLOCK_ENGINE]
+    if source is not None:
+        engines.append(_pattern_engine(tuple(source.ad_block_patterns)))
+    if request.patterns:
+        engines.append(_pattern_engine(tuple(request.patterns)))
+    results = [check_url(engines, check.url, check.type, check.origin) for check in request.urls]
+    return AdBlockCheckResponse(results=results)
+
+@app.post("/adblock/check", response_model=AdBlockCheckResponse)
+async def adblock_check(request: AdBlockCheckRequest):
+    source = None
+    if request.source_id is not None:
+        source = WEB_SOURCES_BY_ID.get(request.source_id)
+        if source is None:
+            raise HTTPException(status_code=404, detail="Source not found")
+    # Compiling filters and matching a batch of URLs is CPU-bound
+    return await anyio.to_thread.run_sync(_check_urls, request, source)
+
+# Reports of the most recent bulk ingestions, running ones included
+INGEST_REPORTS: "deque[IngestReport]" = deque(maxlen=20)
+
+def _require_admin(request: Request) -> None:
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), settings.admin_token.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token", headers={"WWW-Authenticate": "Bearer"})
+
+@app.post("/admin/ingest", response_model=IngestReport)
+async def admin_ingest(request: Request, batch_size: int = Query(DEFAULT_INGEST_BATCH, ge=1, le=10000)):
+    # NDJSON MediaItems, optionally gzip-compressed, consumed as the body streams in
+    _require_admin(request)
+    if settings.catalog_readonly:
+        raise HTTPException(status_code=409, detail="Catalog is read-only")
+    report = IngestReport()
+    INGEST_REPORTS.appendleft(report)
+    try:
+        await ingest(CATALOG, request.stream(), report, batch_size)
+    except IngestError as exc:
+        return JSONResponse(status_code=400, content={"detail": str(exc), "report": report.model_dump()})
+    return report
+
+@app.post("/admin/snapshot", response_model=SnapshotInfo)
+async def admin_snapshot(request: Request):
+    # Written on the event loop, so the worker pauses while it runs and the
+    # catalog cannot change half-way through
+    _require_admin(request)
+    if not settings.catalog_snapshot or settings.catalog_db:
+        raise HTTPException(status_code=409, detail="No catalog snapshot is configured")
+    if settings.catalog_readonly:
+        raise HTTPException(status_code=409, detail="Catalog is read-only")
+    try:
+        return write_catalog_snapshot(settings.catalog_snapshot)
+    except (OSError, SnapshotError, ValueError) as exc:
+        raise HTTPException(status_code=500, detail=f"Writing the snapshot failed: {exc}")
+
+@app.get("/admin/ingest", response_model=List[IngestReport])
+async def admin_ingest_reports(request: Request):
+    _require_admin(request)
+    return list(INGEST_REPORTS)
@@ -0,0 +1,259 @@
+"""Cached, coalescing proxy for TMDB and OMDB metadata lookups.
+
+Remote metadata searches are answered from two cache tiers, an
+in-process ``ByteLRU`` and a shared ``DiskLRU``, before the upstream API
+is called. Entries are fresh for ``ttl`` seconds; after that they are
+still served for up to ``stale_ttl`` more while one background request
+revalidates them (stale-while-revalidate), and served regardless of age
+when the upstream fails (stale-if-error). Concurrent misses for the same
+key share one upstream request through ``SingleFlight``.
+
+Keys never contain API keys: they are built from the provider and the
+normalized query, so "The  Matrix" and "the matrix" share an entry.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+from urllib.parse import urlencode
+
+from pydantic import BaseModel, computed_field
+
+from .cache import ByteLRU, DiskLRU, SingleFlight
+from .scraping import ScrapeError, Scraper, redact_url
+
+logger = logging.getLogger(__name__)
+
+# Upstream JSON bodies larger than this are returned but not cached.
+MAX_BODY_BYTES = 1024 * 1024
+
+
+class MetadataError(Exception):
+    """Raised when the upstream fails and no cached entry can stand in"""
+
+
+class MetadataEntry(NamedTuple):
+    fetched_at: float
+    # Upstream JSON body as received.
+    body: bytes
+
+    def json(self):
+        return json.loads(self.body)
+
+    def encode(self) -> bytes:
+        return f"{self.fetched_at!r}\n".encode() + self.body
+
+    @classmethod
+    def decode(cls, data: bytes) -> "MetadataEntry":
+        header, _, body = data.partition(b"\n")
+        return cls(float(header), body)
+
+
+class MetadataStats(BaseModel):
+    lookups: int = 0
+    memory_hits: int = 0
+    disk_hits: int = 0
+    # Expired entries served while revalidating or while upstream fails.
+    stale_hits: int = 0
+    misses: int = 0
+    # Misses that joined an upstream request already in flight.
+    coalesced: int = 0
+    revalidations: int = 0
+    upstream_requests: int = 0
+    upstream_errors: int = 0
+    memory_entries: int = 0
+    disk_entries: int = 0
+
+    @computed_field
+    @property
+    def hit_ratio(self) -> float:
+        hits = self.memory_hits + self.disk_hits + self.stale_hits
+        return hits / self.lookups if self.lookups else 0.0
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a search query"""
+    return " ".join(query.split()).lower()
+
+
+class MetadataProxy:
+    """Two-tier TTL cache with request coalescing in front of metadata APIs"""
+
+    def __init__(
+        self,
+        scraper: Scraper,
+        cache_dir: Optional[str] = None,
+        memory_bytes: int = 16 * 1024 * 1024,
+        disk_bytes: int = 256 * 1024 * 1024,
+        ttl: float = 3600.0,
+        stale_ttl: float = 86400.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.scraper = scraper
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.memory = ByteLRU(memory_bytes, sizeof=lambda entry: len(entry.body))
+        self.disk = DiskLRU(cache_dir, disk_bytes) if cache_dir else None
+        self._clock = clock
+        self._flights = SingleFlight()
+        self._revalidating: Dict[str, "asyncio.Task"] = {}
+        self._stats = MetadataStats()
+
+    async def get(self, key: str, url: str) -> MetadataEntry:
+        """Return the cached response for key, fetching url when needed"""
+        stats = self._stats
+        stats.lookups += 1
+        entry = self.memory.get(key)
+        tier = "memory"
+        if entry is None:
+            entry = await self._flights.do(("disk", key), lambda: self._read_disk(key))
+            tier = "disk"
+            if entry is not None:
+                self.memory.put(key, entry)
+        if entry is not None:
+            age = self._clock() - entry.fetched_at
+            if age < self.ttl:
+                if tier == "memory":
+                    stats.memory_hits += 1
+                else:
+                    stats.disk_hits += 1
+                return entry
+            if age < self.ttl + self.stale_ttl:
+                stats.stale_hits += 1
+                self._revalidate(key, url)
+                return entry
+
+        if key in self._flights:
+            stats.coalesced += 1
+        try:
+            fetched = await self._flights.do(key, lambda: self._fetch(key, url))
+        except MetadataError:
+            if entry is None:
+                stats.misses += 1
+                raise
+            # Too old to serve normally, but better than an error.
+            stats.stale_hits += 1
+            return entry
+        stats.misses += 1
+        return fetched
+
+    def stats(self) -> MetadataStats:
+        return self._stats.model_copy(
+            update={
+                "memory_entries": len(self.memory),
+                "disk_entries": len(self.disk) if self.disk is not None else 0,
+            }
+        )
+
+    async def tmdb_search(
+        self, base_url: str, api_key: str, query: str
+    ) -> MetadataEntry:
+        """Cached TMDB /search/multi lookup"""
+        query = normalize_query(query)
+        params = urlencode({"api_key": api_key, "query": query})
+        return await self.get(
+            f"tmdb/search/multi/{query}", f"{base_url}/search/multi?{params}"
+        )
+
+    async def omdb_search(
+        self, base_url: str, api_key: str, query: str
+    ) -> MetadataEntry:
+        """Cached OMDB title search"""
+        query = normalize_query(query)
+        params = urlencode({"apikey": api_key, "s": query})
+        return await self.get(f"omdb/search/{query}", f"{base_url}/?{params}")
+
+    def metrics(self) -> List[str]:
+        """Prometheus lines for the cache counters and hit ratio"""
+        stats = self.stats()
+        lines = [
+            "# HELP streamy_metadata_lookups_total Metadata lookups by outcome.",
+            "# TYPE streamy_metadata_lookups_total counter",
+        ]
+        for outcome, count in (
+            ("memory_hit", stats.memory_hits),
+            ("disk_hit", stats.disk_hits),
+            ("stale_hit", stats.stale_hits),
+            ("miss", stats.misses),
+        ):
+            lines.append(
+                f'streamy_metadata_lookups_total{{outcome="{outcome}"}} {count}'
+            )
+        for name, help_text, count in (
+            ("coalesced", "Misses that joined a request in flight.", stats.coalesced),
+            (
+                "revalidations",
+                "Background refreshes of stale entries.",
+                stats.revalidations,
+            ),
+            (
+                "upstream_requests",
+                "Requests sent to metadata APIs.",
+                stats.upstream_requests,
+            ),
+            ("upstream_errors", "Failed metadata API requests.", stats.upstream_errors),
+        ):
+            lines.append(f"# HELP streamy_metadata_{name}_total {help_text}")
+            lines.append(f"# TYPE streamy_metadata_{name}_total counter")
+            lines.append(f"streamy_metadata_{name}_total {count}")
+        lines.append(
+            "# HELP streamy_metadata_hit_ratio Share of lookups answered from cache."
+        )
+        lines.append("# TYPE streamy_metadata_hit_ratio gauge")
+        lines.append(f"streamy_metadata_hit_ratio {stats.hit_ratio:.6f}")
+        return lines
+
+    def _revalidate(self, key: str, url: str) -> None:
+        if key in self._revalidating or key in self._flights:
+            return
+        self._stats.revalidations += 1
+
+        async def refresh() -> None:
+            try:
+                await self._flights.do(key, lambda: self._fetch(key, url))
+            except MetadataError as exc:
+                logger.info("Revalidating %s failed: %s", key, exc)
+
+        # Registered before the task first runs, so the lookups arriving
+        # until then do not start refreshes of their own.
+        self._revalidating[key] = asyncio.ensure_future(refresh())
+        self._revalidating[key].add_done_callback(
+            lambda _: self._revalidating.pop(key, None)
+        )
+
+    async def _fetch(self, key: str, url: str) -> MetadataEntry:
+        self._stats.upstream_requests += 1
+        try:
+            body, _ = await self.scraper.fetch_bytes(url)
+            json.loads(body)
+        except (ScrapeError, ValueError) as exc:
+            self._stats.upstream_errors += 1
+            # Name the request by its cache key rather than the upstream URL.
+            message = str(exc).replace(redact_url(url), key)
+            raise MetadataError(f"{key}: {message}") from None
+        entry = MetadataEntry(self._clock(), body)
+        if len(body) <= MAX_BODY_BYTES:
+            self.memory.put(key, entry)
+            await self._write_disk(key, entry)
+        return entry
+
+    async def _read_disk(self, key: str) -> Optional[MetadataEntry]:
+        if self.disk is None:
+            return None
+        data = await asyncio.get_running_loop().run_in_executor(
+            None, self.disk.get, key
+        )
+        if data is None:
+            return None
+        try:
+            return MetadataEntry.decode(data)
+        except ValueError:
+            return None
+
+    async def _write_disk(self, key: str, entry: MetadataEntry) -> None:
+        if self.disk is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.disk.put, key, entry.encode()
+            )
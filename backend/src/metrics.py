@@ -0,0 +1,406 @@
+"""Request metrics and an opt-in sampling profiler.
+
+``MetricsMiddleware`` is a pure ASGI middleware that records, per method
+and route template, request counts by status, in-flight requests, total
+latency, response sizes and, through ``TimedRoute``, the time spent in
+the endpoint function versus validating and serializing its result.
+``Metrics.render()`` produces the Prometheus text exposition format.
+
+Each worker process keeps its own registry, so with several workers a
+scrape sees the process that happened to answer it.
+
+``SamplingProfiler`` samples the stacks of all threads at a fixed
+interval, attributes each sample to the request whose middleware frame is
+on the stack and keeps the folded stacks of the slowest requests, ready
+for ``flamegraph.pl`` or speedscope.
+"""
+
+import asyncio
+import functools
+import heapq
+import itertools
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from fastapi.routing import APIRoute
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+SIZE_BUCKETS = tuple(float(256 * 4**power) for power in range(9))  # 256 B .. 16 MB
+
+# Label used for requests that did not match any route, so unknown paths
+# cannot blow up the number of series.
+UNMATCHED_ROUTE = "unmatched"
+
+
+class Histogram:
+    """Fixed-bucket histogram with Prometheus ``le`` semantics"""
+
+    __slots__ = ("bounds", "counts", "total", "count")
+
+    def __init__(self, bounds: Sequence[float]) -> None:
+        self.bounds = bounds
+        # One slot per bound plus the +Inf overflow bucket.
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def render(self, name: str, labels: str, lines: List[str]) -> None:
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.total:.6f}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+
+
+class RequestTiming:
+    """Per-request measurements shared by the middleware and TimedRoute"""
+
+    __slots__ = (
+        "metrics",
+        "route",
+        "handler",
+        "serialize",
+        "endpoint_done",
+        "stacks",
+    )
+
+    def __init__(self, metrics: "Metrics") -> None:
+        self.metrics = metrics
+        self.route: Optional[str] = None
+        # Seconds spent in the endpoint function itself.
+        self.handler: Optional[float] = None
+        # Seconds from the endpoint returning to the Response being built.
+        self.serialize: Optional[float] = None
+        self.endpoint_done: Optional[float] = None
+        # Folded stack -> samples, filled in by the profiler thread.
+        self.stacks: Optional[Counter] = None
+
+
+_CURRENT: ContextVar[Optional[RequestTiming]] = ContextVar(
+    "streamy_request_timing", default=None
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """Registry of per-route request metrics"""
+
+    def __init__(self) -> None:
+        self.requests: Counter = Counter()
+        self.in_flight: Counter = Counter()
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.handler: Dict[Tuple[str, str], Histogram] = {}
+        self.serialize: Dict[Tuple[str, str], Histogram] = {}
+        self.size: Dict[Tuple[str, str], Histogram] = {}
+        # Functions returning more exposition lines (e.g. cache counters).
+        self.collectors: List[Callable[[], List[str]]] = []
+
+    @staticmethod
+    def _histogram(
+        family: Dict[Tuple[str, str], Histogram],
+        key: Tuple[str, str],
+        bounds: Sequence[float],
+    ) -> Histogram:
+        histogram = family.get(key)
+        if histogram is None:
+            histogram = family[key] = Histogram(bounds)
+        return histogram
+
+    def observe(
+        self,
+        method: str,
+        timing: RequestTiming,
+        status: int,
+        seconds: float,
+        size: int,
+    ) -> None:
+        key = (method, timing.route or UNMATCHED_ROUTE)
+        self.requests[key + (str(status),)] += 1
+        self._histogram(self.latency, key, LATENCY_BUCKETS).observe(seconds)
+        self._histogram(self.size, key, SIZE_BUCKETS).observe(size)
+        if timing.handler is not None:
+            self._histogram(self.handler, key, LATENCY_BUCKETS).observe(timing.handler)
+        if timing.serialize is not None:
+            self._histogram(self.serialize, key, LATENCY_BUCKETS).observe(
+                timing.serialize
+            )
+
+    def render(self) -> bytes:
+        """Return every metric in the Prometheus text exposition format"""
+        lines = [
+            "# HELP streamy_http_requests_total Requests by route and status.",
+            "# TYPE streamy_http_requests_total counter",
+        ]
+        for (method, route, status), count in sorted(self.requests.items()):
+            lines.append(
+                f'streamy_http_requests_total{{method="{method}",'
+                f'route="{_escape(route)}",status="{status}"}} {count}'
+            )
+        lines.append(
+            "# HELP streamy_http_requests_in_flight Requests currently being handled."
+        )
+        lines.append("# TYPE streamy_http_requests_in_flight gauge")
+        for (method, route), count in sorted(self.in_flight.items()):
+            lines.append(
+                f'streamy_http_requests_in_flight{{method="{method}",'
+                f'route="{_escape(route)}"}} {count}'
+            )
+        for name, help_text, family in (
+            (
+                "streamy_http_request_duration_seconds",
+                "Time from request start to the last body byte sent.",
+                self.latency,
+            ),
+            (
+                "streamy_http_handler_duration_seconds",
+                "Time spent in the endpoint function.",
+                self.handler,
+            ),
+            (
+                "streamy_http_serialization_duration_seconds",
+                "Time spent validating and encoding the endpoint's result.",
+                self.serialize,
+            ),
+            (
+                "streamy_http_response_size_bytes",
+                "Response body size.",
+                self.size,
+            ),
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for (method, route), histogram in sorted(family.items()):
+                histogram.render(
+                    name, f'method="{method}",route="{_escape(route)}"', lines
+                )
+        for collect in self.collectors:
+            lines.extend(collect())
+        return ("\n".join(lines) + "\n").encode()
+
+
+class TimedRoute(APIRoute):
+    """APIRoute that reports its template and splits handler from serialization time.
+
+    Install with ``app.router.route_class = TimedRoute`` before routes are
+    declared.
+    """
+
+    def get_route_handler(self) -> Callable:
+        call = self.dependant.call
+        if asyncio.iscoroutinefunction(call):
+
+            @functools.wraps(call)
+            async def timed_call(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await call(*args, **kwargs)
+                finally:
+                    _endpoint_finished(start)
+
+        else:
+
+            @functools.wraps(call)
+            def timed_call(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return call(*args, **kwargs)
+                finally:
+                    _endpoint_finished(start)
+
+        self.dependant.call = timed_call
+        handler = super().get_route_handler()
+
+        async def timed_handler(request: Request) -> Response:
+            response = await handler(request)
+            timing = _CURRENT.get()
+            if timing is not None and timing.endpoint_done is not None:
+                timing.serialize = time.perf_counter() - timing.endpoint_done
+            return response
+
+        return timed_handler
+
+    async def handle(self, scope: Scope, receive: Receive, send: Send) -> None:
+        timing = _CURRENT.get()
+        if timing is None:
+            await super().handle(scope, receive, send)
+            return
+        timing.route = self.path
+        key = (scope["method"], self.path)
+        timing.metrics.in_flight[key] += 1
+        try:
+            await super().handle(scope, receive, send)
+        finally:
+            timing.metrics.in_flight[key] -= 1
+
+
+def _endpoint_finished(start: float) -> None:
+    # Sync endpoints run in a worker thread with a copy of the context,
+    # which still refers to the same RequestTiming object.
+    timing = _CURRENT.get()
+    if timing is not None:
+        timing.endpoint_done = time.perf_counter()
+        timing.handler = timing.endpoint_done - start
+
+
+class SamplingProfiler:
+    """Low-overhead stack sampler that keeps profiles of the slowest requests.
+
+    Stacks are sampled with ``sys._current_frames()`` from a daemon thread.
+    A sample belongs to a request when the middleware's frame for that
+    request is on the sampled stack; work handed to other threads (sync
+    endpoints, parser pools) is not attributed.
+    """
+
+    def __init__(self, interval: float = 0.005, keep: int = 20) -> None:
+        self.interval = interval
+        self.keep = keep
+        # Min-heap of (duration, sequence, label, stacks) for the slowest requests.
+        self._slowest: List[Tuple[float, int, str, Counter]] = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="streamy-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        anchor = MetricsMiddleware.__call__.__code__
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                names = []
+                while frame is not None and frame.f_code is not anchor:
+                    code = frame.f_code
+                    names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if frame is None:
+                    continue
+                timing = frame.f_locals.get("timing")
+                if isinstance(timing, RequestTiming) and timing.stacks is not None:
+                    timing.stacks[";".join(reversed(names))] += 1
+
+    def offer(self, label: str, seconds: float, stacks: Counter) -> None:
+        """Keep stacks if the request is among the slowest seen so far"""
+        if not stacks:
+            return
+        entry = (seconds, next(self._sequence), label, stacks)
+        with self._lock:
+            if len(self._slowest) < self.keep:
+                heapq.heappush(self._slowest, entry)
+            elif seconds > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def folded(self) -> bytes:
+        """Return the kept profiles in folded-stack format, slowest first"""
+        with self._lock:
+            entries = sorted(self._slowest, reverse=True)
+        lines = []
+        for seconds, _sequence, label, stacks in entries:
+            root = f"{label} [{seconds * 1000:.1f}ms]"
+            for stack, count in stacks.most_common():
+                lines.append(f"{root};{stack} {count}" if stack else f"{root} {count}")
+        return ("\n".join(lines) + "\n").encode() if lines else b""
+
+    def clear(self) -> None:
+        with self._lock:
+            self._slowest.clear()
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware feeding a Metrics registry (and optional profiler)"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        metrics: Metrics,
+        profiler: Optional[SamplingProfiler] = None,
+    ) -> None:
+        self.app = app
+        self.metrics = metrics
+        self.profiler = profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # The profiler finds this local on the sampled stack; keep the name.
+        timing = RequestTiming(self.metrics)
+        if self.profiler is not None:
+            timing.stacks = Counter()
+        status = 500
+        size = 0
+
+        async def send_wrapper(message) -> None:
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        token = _CURRENT.set(timing)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            seconds = time.perf_counter() - start
+            _CURRENT.reset(token)
+            self.metrics.observe(scope["method"], timing, status, seconds, size)
+            if self.profiler is not None:
+                self.profiler.offer(
+                    f"{scope['method']} {timing.route or UNMATCHED_ROUTE}",
+                    seconds,
+                    timing.stacks,
+                )
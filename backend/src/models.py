@@ -0,0 +1,49 @@
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List, Literal, Optional, Dict, Any
+
+# Define data models
+class MediaSource(BaseModel):
+    name: str
+    url: str
+    quality: str
+    size: Optional[str] = None
+
+class MediaItem(BaseModel):
+    id: str
+    title: str
+    thumbnail: Optional[str] = None
+    description: Optional[str] = None
+    sources: List[MediaSource] = []
+    metadata: Dict[str, Any] = {}
+
+# Upper bound on ids per POST /media/batch request
+MAX_BATCH_IDS = 500
+
+MediaField = Literal["id", "title", "thumbnail", "description", "sources", "metadata"]
+
+class MediaBatchRequest(BaseModel):
+    ids: List[str] = Field(max_length=MAX_BATCH_IDS)
+    # Fields to return for each item; id is always included. None returns all.
+    fields: Optional[List[MediaField]] = None
+
+class MediaBatchResponse(BaseModel):
+    # One entry per requested id, in request order; null where the id is unknown
+    items: List[Optional[Dict[str, Any]]]
+    missing: List[str]
+
+class WebSource(BaseModel):
+    # Mirrors the app's WebSource model, including its camelCase JSON keys
+    model_config = ConfigDict(populate_by_name=True)
+
+    id: str
+    name: str
+    base_url: str = Field(alias="baseUrl")
+    ad_block_patterns: List[str] = Field(default=[], alias="adBlockPatterns")
+    video_selectors: Dict[str, str] = Field(default={}, alias="videoSelectors")
+    headers: Dict[str, str] = {}
+    is_enabled: bool = Field(default=True, alias="isEnabled")
+
+class VideoSource(BaseModel):
+    url: str
+    quality: str
+    type: str
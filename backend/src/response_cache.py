@@ -0,0 +1,149 @@
+"""Cache of pre-serialized JSON responses with strong ETags.
+
+Read-heavy routes store the encoded response body once per catalog
+state, so a repeat request is a dict lookup and, when the client sends a
+matching ``If-None-Match``, a body-less ``304 Not Modified``.
+"""
+
+import hashlib
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, List, NamedTuple, Optional
+
+from fastapi import Request, Response
+
+from .catalog import MediaCatalog
+from .models import MediaItem
+
+JSON_MEDIA_TYPE = "application/json"
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    headers: Dict[str, str]
+
+
+def make_etag(body: bytes) -> str:
+    """Return a strong ETag derived from the response bytes"""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluate an If-None-Match header against etag (weak comparison, RFC 9110)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """Store of encoded JSON bodies kept in step with the catalog.
+
+    Entries for single items are keyed by media id and dropped when that
+    item changes; every other entry (lists, pages) depends on the catalog
+    as a whole and is dropped on any mutation. The store is bounded and
+    evicts least recently used entries first.
+    """
+
+    def __init__(self, catalog: MediaCatalog, max_entries: int = 10000) -> None:
+        self.max_entries = max_entries
+        self._items: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._routes: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        catalog.subscribe(self._invalidate)
+
+    def item(self, media: MediaItem) -> CachedResponse:
+        """Return the cached encoding of a single item"""
+        entry = self._items.get(media.id)
+        if entry is None:
+            body = media.model_dump_json().encode()
+            entry = CachedResponse(body, make_etag(body), {})
+            self._put(self._items, media.id, entry)
+        else:
+            self._items.move_to_end(media.id)
+        return entry
+
+    def item_by_id(
+        self, media_id: str, load: Callable[[str], Optional[MediaItem]]
+    ) -> Optional[CachedResponse]:
+        """Return the cached item for media_id, loading it on a miss"""
+        entry = self._items.get(media_id)
+        if entry is not None:
+            self._items.move_to_end(media_id)
+            return entry
+        media = load(media_id)
+        return self.item(media) if media is not None else None
+
+    def items_by_ids(
+        self,
+        media_ids: List[str],
+        load_many: Callable[[Iterable[str]], Dict[str, MediaItem]],
+    ) -> List[Optional[CachedResponse]]:
+        """Return cached items for media_ids in order, loading all misses at once"""
+        entries: List[Optional[CachedResponse]] = []
+        misses = set()
+        for media_id in media_ids:
+            entry = self._items.get(media_id)
+            if entry is None:
+                misses.add(media_id)
+            else:
+                self._items.move_to_end(media_id)
+            entries.append(entry)
+        if misses:
+            loaded = {
+                media_id: self.item(media)
+                for media_id, media in load_many(misses).items()
+            }
+            entries = [
+                entry if entry is not None else loaded.get(media_id)
+                for media_id, entry in zip(media_ids, entries)
+            ]
+        return entries
+
+    def items(self, media: List[MediaItem]) -> bytes:
+        """Encode a JSON array by splicing the cached item encodings"""
+        return b"[" + b",".join(self.item(m).body for m in media) + b"]"
+
+    def route(
+        self, key: Hashable, build: Callable[[], CachedResponse]
+    ) -> CachedResponse:
+        """Return the cached response for key, building it on a miss"""
+        entry = self._routes.get(key)
+        if entry is None:
+            entry = build()
+            self._put(self._routes, key, entry)
+        else:
+            self._routes.move_to_end(key)
+        return entry
+
+    def clear(self) -> None:
+        self._items.clear()
+        self._routes.clear()
+
+    def _put(self, store: OrderedDict, key: Hashable, entry: CachedResponse) -> None:
+        store[key] = entry
+        if len(store) > self.max_entries:
+            store.popitem(last=False)
+
+    def _invalidate(self, upserted: List[MediaItem], deleted: List[str]) -> None:
+        for media in upserted:
+            self._items.pop(media.id, None)
+        for media_id in deleted:
+            self._items.pop(media_id, None)
+        self._routes.clear()
+
+
+def json_response(
+    request: Request, entry: CachedResponse, headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """Send a cached entry, or 304 if the client already holds this version"""
+    headers = {**entry.headers, **(headers or {}), "ETag": entry.etag}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type=JSON_MEDIA_TYPE, headers=headers)
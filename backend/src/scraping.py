@@ -0,0 +1,322 @@
+"""Server-side scraping of the app's web sources.
+
+All outbound requests share one pooled ``aiohttp.ClientSession`` with a
+global and a per-host connection limit, cached DNS lookups and keep-alive
+connections. HTML is parsed with BeautifulSoup on the lxml parser in a
+thread pool, so parsing a large page never blocks the event loop.
+
+URLs supplied by API clients rather than by the server's configuration
+are fetched with ``public_only``, through a second pool whose connector
+refuses to connect to loopback, private, link-local and other non-global
+addresses. The check runs on the resolved addresses of every connection,
+redirects included, so a hostname cannot point the backend at the
+internal network.
+"""
+
+import asyncio
+import errno
+import hashlib
+import ipaddress
+import json
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote, urljoin, urlsplit, urlunsplit
+
+import aiohttp
+from bs4 import BeautifulSoup
+from bs4.element import Tag
+from pydantic import BaseModel, Field, TypeAdapter
+
+from .models import MediaItem, MediaSource, WebSource
+
+logger = logging.getLogger(__name__)
+
+# Listing selectors tried in order, as in the app's WebScrapingService;
+# the first one that yields results wins.
+RESULT_SELECTORS = [
+    ".movie-item, .film-item, .video-item",
+    ".search-result, .result-item",
+    '[class*="movie"], [class*="film"], [class*="video"]',
+    "article, .item, .card",
+]
+TITLE_SELECTOR = 'h1, h2, h3, h4, .title, [class*="title"], .name, [class*="name"]'
+DESCRIPTION_SELECTOR = ".description, .synopsis, .summary, p"
+YEAR_SELECTOR = '.year, [class*="year"], .date, [class*="date"]'
+RATING_SELECTOR = '.rating, [class*="rating"], .score, [class*="score"]'
+
+_YEAR_RE = re.compile(r"(\d{4})")
+_RATING_RE = re.compile(r"(\d+\.?\d*)")
+
+# Pages larger than this are rejected instead of being buffered in memory.
+MAX_PAGE_BYTES = 8 * 1024 * 1024
+# Client-supplied sources accepted by one /scrape/search request.
+MAX_REQUEST_SOURCES = 20
+
+
+class ScrapeError(Exception):
+    """Raised when a source cannot be fetched or returns an error status
+
+    Messages name the URL without its query string, which may carry API
+    keys, since they reach logs and API responses.
+    """
+
+
+def redact_url(url: str) -> str:
+    """url without credentials, query string or fragment"""
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url.split("?", 1)[0].split("#", 1)[0]
+    host = parts.netloc.rpartition("@")[2]
+    return urlunsplit((parts.scheme, host, parts.path, "", ""))
+
+
+class ScrapeSearchRequest(BaseModel):
+    query: str
+    # Sources to search; when omitted the server's configured sources are used.
+    # Client-supplied sources may only point at public addresses.
+    sources: Optional[List[WebSource]] = Field(None, max_length=MAX_REQUEST_SOURCES)
+    limit: int = Field(20, ge=1, le=100)
+
+
+class ScrapeSearchResponse(BaseModel):
+    results: List[MediaItem]
+    # Error message per source id for sources that failed.
+    errors: Dict[str, str] = {}
+
+
+def load_sources(path: Optional[str]) -> List[WebSource]:
+    """Load WebSource definitions from a JSON file in the app's format"""
+    if not path:
+        return []
+    with open(path, encoding="utf-8") as handle:
+        return TypeAdapter(List[WebSource]).validate_python(json.load(handle))
+
+
+def _select_text(element: Tag, selector: str) -> str:
+    found = element.select_one(selector)
+    return found.get_text(strip=True) if found is not None else ""
+
+
+def _parse_media_item(element: Tag, source: WebSource) -> Optional[MediaItem]:
+    title = _select_text(element, TITLE_SELECTOR)
+    if not title:
+        return None
+
+    image = element.find("img")
+    image_url = (image.get("src") or image.get("data-src") or "") if image else ""
+    link = element.find("a")
+    url = urljoin(source.base_url + "/", link.get("href") or "") if link else ""
+
+    year_match = _YEAR_RE.search(_select_text(element, YEAR_SELECTOR))
+    rating_match = _RATING_RE.search(_select_text(element, RATING_SELECTOR))
+
+    return MediaItem(
+        id="scraped-" + hashlib.sha1(url.encode()).hexdigest()[:16],
+        title=title,
+        thumbnail=urljoin(source.base_url + "/", image_url) if image_url else None,
+        description=_select_text(element, DESCRIPTION_SELECTOR) or None,
+        sources=[MediaSource(name=source.name, url=url, quality="Unknown")],
+        metadata={
+            "year": year_match.group(1) if year_match else "",
+            "rating": float(rating_match.group(1)) if rating_match else 0.0,
+            "source": source.name,
+            "url": url,
+        },
+    )
+
+
+def parse_search_results(source: WebSource, html: str) -> List[MediaItem]:
+    """Parse a search results page into media items (CPU-bound; run off-loop)"""
+    document = BeautifulSoup(html, "lxml")
+    items: List[MediaItem] = []
+    for selector in RESULT_SELECTORS:
+        for element in document.select(selector):
+            try:
+                item = _parse_media_item(element, source)
+            except Exception as exc:  # One bad card must not drop the page
+                logger.debug("Error parsing media item from %s: %s", source.name, exc)
+                continue
+            if item is not None:
+                items.append(item)
+        if items:
+            break
+    return items
+
+
+def is_public_address(host: str) -> bool:
+    """Whether an IP address is globally routable"""
+    try:
+        address = ipaddress.ip_address(host.split("%", 1)[0])
+    except ValueError:
+        return False
+    if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    return address.is_global and not address.is_multicast
+
+
+class PublicConnector(aiohttp.TCPConnector):
+    """TCP connector that only connects to public addresses"""
+
+    async def _resolve_host(self, host: str, port: int, traces=None):
+        # IP literals skip the resolver, so the filter goes here rather
+        # than in a custom resolver.
+        hosts = await super()._resolve_host(host, port, traces=traces)
+        public = [entry for entry in hosts if is_public_address(entry["host"])]
+        if not public:
+            raise OSError(errno.EACCES, f"{host} does not resolve to a public address")
+        return public
+
+
+class Scraper:
+    """Pooled HTTP client and parser for scraping web sources.
+
+    The session is created lazily inside the running event loop and must
+    be released with ``close()`` on shutdown.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        connections_per_host: int = 8,
+        timeout: float = 15.0,
+        parse_workers: int = 4,
+        dns_cache_ttl: int = 300,
+        keepalive_timeout: float = 30.0,
+    ) -> None:
+        self.max_connections = max_connections
+        self.connections_per_host = connections_per_host
+        self.timeout = timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.parse_workers = parse_workers
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._public_session: Optional[aiohttp.ClientSession] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = self._create_session(aiohttp.TCPConnector)
+        return self._session
+
+    @property
+    def public_session(self) -> aiohttp.ClientSession:
+        """Session for client-supplied URLs; see ``PublicConnector``"""
+        if self._public_session is None or self._public_session.closed:
+            self._public_session = self._create_session(PublicConnector)
+        return self._public_session
+
+    def _create_session(self, connector_class) -> aiohttp.ClientSession:
+        connector = connector_class(
+            limit=self.max_connections,
+            limit_per_host=self.connections_per_host,
+            ttl_dns_cache=self.dns_cache_ttl,
+            keepalive_timeout=self.keepalive_timeout,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+
+    async def fetch_bytes(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        max_bytes: int = MAX_PAGE_BYTES,
+        public_only: bool = False,
+    ) -> Tuple[bytes, Optional[str]]:
+        """GET url and return its body and charset, raising ScrapeError on failure
+
+        With ``public_only``, connecting to a non-public address fails.
+        """
+        session = self.public_session if public_only else self.session
+        shown = redact_url(url)
+        try:
+            async with session.get(url, headers=headers) as response:
+                if response.status != 200:
+                    raise ScrapeError(f"{shown} returned HTTP {response.status}")
+                if (response.content_length or 0) > max_bytes:
+                    raise ScrapeError(f"{shown} is larger than {max_bytes} bytes")
+                chunks = []
+                size = 0
+                async for chunk in response.content.iter_chunked(64 * 1024):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ScrapeError(f"{shown} is larger than {max_bytes} bytes")
+                    chunks.append(chunk)
+                return b"".join(chunks), response.charset
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            message = str(exc).replace(url, shown)
+            raise ScrapeError(f"{shown}: {exc.__class__.__name__} {message}") from exc
+
+    async def fetch_text(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        public_only: bool = False,
+    ) -> str:
+        """GET url and return the decoded body, raising ScrapeError on failure"""
+        body, charset = await self.fetch_bytes(url, headers, public_only=public_only)
+        return body.decode(charset or "utf-8", errors="replace")
+
+    async def fetch_json(
+        self, url: str, headers: Optional[Dict[str, str]] = None
+    ) -> Any:
+        """GET url and decode its JSON body, raising ScrapeError on failure"""
+        text = await self.fetch_text(url, headers)
+        try:
+            return json.loads(text)
+        except ValueError as exc:
+            raise ScrapeError(f"{redact_url(url)} did not return JSON: {exc}") from exc
+
+    async def run_in_parser(self, function, *args):
+        """Run a CPU-bound parsing function in the parser thread pool"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.parse_workers, thread_name_prefix="scrape-parse"
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, function, *args)
+
+    async def search_source(
+        self, source: WebSource, query: str, public_only: bool = False
+    ) -> List[MediaItem]:
+        """Search one source the way the app's _searchInSource does"""
+        url = f"{source.base_url.rstrip('/')}/search?q={quote(query, safe='')}"
+        html = await self.fetch_text(url, source.headers, public_only=public_only)
+        return await self.run_in_parser(parse_search_results, source, html)
+
+    async def search(
+        self,
+        query: str,
+        sources: List[WebSource],
+        limit: int = 20,
+        public_only: bool = False,
+    ) -> ScrapeSearchResponse:
+        """Search all enabled sources concurrently and merge their results"""
+        enabled = [source for source in sources if source.is_enabled]
+        outcomes = await asyncio.gather(
+            *(self.search_source(source, query, public_only) for source in enabled),
+            return_exceptions=True,
+        )
+        results: List[MediaItem] = []
+        errors: Dict[str, str] = {}
+        for source, outcome in zip(enabled, outcomes):
+            if isinstance(outcome, BaseException):
+                logger.warning("Error searching in %s: %s", source.name, outcome)
+                errors[source.id] = str(outcome)
+            else:
+                results.extend(outcome)
+        return ScrapeSearchResponse(results=results[:limit], errors=errors)
+
+    async def close(self) -> None:
+        for session in (self._session, self._public_session):
+            if session is not None:
+                await session.close()
+        self._session = self._public_session = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,343 @@
+"""Inverted-index full-text search for the media catalog.
+
+Documents are tokenized once when they are added and stored as postings
+lists (term -> {docno: weighted term frequency}). Queries are answered by
+intersecting the postings of the query terms and ranking the survivors
+with BM25, so a lookup only touches documents that share a term with the
+query instead of scanning the whole catalog.
+
+An index can also be written to a catalog snapshot and loaded from one
+(``from_snapshot``), in which case a term's postings are decoded from
+the mapped file the first time a query uses the term.
+"""
+
+import heapq
+import math
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .snapshot import LayeredDict, Snapshot, SnapshotWriter, StringColumn
+
+# Title matches count more than description matches (a cheap BM25F).
+TITLE_WEIGHT = 3
+DESCRIPTION_WEIGHT = 1
+
+# Maximum number of vocabulary terms a trailing partial token expands to.
+MAX_PREFIX_EXPANSIONS = 64
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _build_translation_table() -> Dict[int, Optional[str]]:
+    """Build the str.translate table used by normalize_text"""
+    table: Dict[int, Optional[str]] = {}
+    # Drop every non-spacing mark in the BMP: Latin accents once the text
+    # is NFKD-decomposed, and Arabic harakat, shadda, sukun, etc.
+    for codepoint in range(0x10000):
+        if unicodedata.category(chr(codepoint)) == "Mn":
+            table[codepoint] = None
+    table[0x0640] = None  # Tatweel (kashida)
+    table[0x0671] = "ا"  # Alef wasla -> alef
+    table[0x0629] = "ه"  # Teh marbuta -> heh
+    table[0x0649] = "ي"  # Alef maksura -> yeh
+    # Arabic-Indic and extended Arabic-Indic digits -> ASCII digits
+    for offset in range(10):
+        table[0x0660 + offset] = str(offset)
+        table[0x06F0 + offset] = str(offset)
+    return table
+
+
+_TRANSLATION_TABLE = _build_translation_table()
+
+
+def normalize_text(text: str) -> str:
+    """Fold case, accents and Arabic letter variants so equivalent spellings match"""
+    if text.isascii():
+        return text.lower()
+    # NFKD splits hamza/madda carriers (أ إ آ ؤ ئ) and accented Latin letters
+    # into a base letter plus a combining mark, which the table then drops.
+    text = unicodedata.normalize("NFKD", text).translate(_TRANSLATION_TABLE)
+    return text.casefold()
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Split text into normalized search terms"""
+    if not text:
+        return []
+    return _TOKEN_RE.findall(normalize_text(text))
+
+
+class SearchIndex:
+    """Incrementally updatable inverted index with BM25 ranking.
+
+    Documents are identified externally by their media id and internally
+    by a small integer docno that keeps the postings compact.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, int]] = {}
+        # Sorted terms; with a snapshot loaded, only those not in the snapshot.
+        self._vocabulary: List[str] = []
+        self._base_terms: Optional[StringColumn] = None
+        # New terms seen during add_many, merged into _vocabulary at the end.
+        self._pending_terms: Optional[Set[str]] = None
+        self._docno_by_id: Dict[str, int] = {}
+        self._id_by_docno: Dict[int, str] = {}
+        self._doc_terms: Dict[int, Tuple[str, ...]] = {}
+        self._doc_lengths: Dict[int, int] = {}
+        self._total_length = 0
+        self._next_docno = 0
+
+    def __len__(self) -> int:
+        return len(self._docno_by_id)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._docno_by_id
+
+    def add(self, doc_id: str, title: str, description: Optional[str] = None) -> None:
+        """Index a document, replacing any previous version with the same id"""
+        if doc_id in self._docno_by_id:
+            self.remove(doc_id)
+
+        frequencies: Dict[str, int] = {}
+        for term in tokenize(title):
+            frequencies[term] = frequencies.get(term, 0) + TITLE_WEIGHT
+        for term in tokenize(description):
+            frequencies[term] = frequencies.get(term, 0) + DESCRIPTION_WEIGHT
+
+        docno = self._next_docno
+        self._next_docno += 1
+        self._docno_by_id[doc_id] = docno
+        self._id_by_docno[docno] = doc_id
+        self._doc_terms[docno] = tuple(frequencies)
+        length = sum(frequencies.values())
+        self._doc_lengths[docno] = length
+        self._total_length += length
+
+        for term, frequency in frequencies.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                if self._in_base(term):
+                    pass
+                elif self._pending_terms is not None:
+                    self._pending_terms.add(term)
+                else:
+                    insort(self._vocabulary, term)
+            postings[docno] = frequency
+
+    def add_many(self, documents: Iterable[Tuple[str, str, Optional[str]]]) -> None:
+        """Index (doc_id, title, description) tuples
+
+        New terms are collected and sorted into the vocabulary once, rather
+        than inserted one at a time.
+        """
+        self._pending_terms = set()
+        try:
+            for doc_id, title, description in documents:
+                self.add(doc_id, title, description)
+        finally:
+            pending, self._pending_terms = self._pending_terms, None
+            if pending:
+                self._vocabulary.extend(pending)
+                self._vocabulary.sort()
+
+    def remove(self, doc_id: str) -> bool:
+        """Drop a document from the index; returns False if it was not indexed"""
+        docno = self._docno_by_id.pop(doc_id, None)
+        if docno is None:
+            return False
+        del self._id_by_docno[docno]
+        self._total_length -= self._doc_lengths.pop(docno)
+        for term in self._doc_terms.pop(docno):
+            postings = self._postings[term]
+            del postings[docno]
+            # Snapshot terms stay listed, with no postings, until the next
+            # snapshot leaves them out.
+            if not postings and not self._in_base(term):
+                del self._postings[term]
+                if self._pending_terms is not None and term in self._pending_terms:
+                    self._pending_terms.remove(term)
+                else:
+                    del self._vocabulary[bisect_left(self._vocabulary, term)]
+        return True
+
+    def clear(self) -> None:
+        """Remove every document"""
+        self.__init__(self.k1, self.b)
+
+    def write_snapshot(self, writer: SnapshotWriter, positions: Dict[str, int]) -> None:
+        """Write the index to a snapshot, numbering documents by catalog record"""
+        if len(self) != len(positions):
+            raise ValueError("search index is out of sync with the catalog")
+        position_of = {
+            docno: positions[doc_id] for doc_id, docno in self._docno_by_id.items()
+        }
+        terms = sorted(term for term, postings in self._postings.items() if postings)
+        starts = array("Q", [0])
+        docnos = array("I")
+        frequencies = array("I")
+        for term in terms:
+            for position, frequency in sorted(
+                (position_of[docno], frequency)
+                for docno, frequency in self._postings[term].items()
+            ):
+                docnos.append(position)
+                frequencies.append(frequency)
+            starts.append(len(docnos))
+
+        # Forward index, for removing a document without a scan of the postings.
+        number_of = {term: number for number, term in enumerate(terms)}
+        lengths = array("I", [0]) * len(positions)
+        doc_terms: List[Tuple[str, ...]] = [()] * len(positions)
+        for docno, position in position_of.items():
+            lengths[position] = self._doc_lengths[docno]
+            doc_terms[position] = self._doc_terms[docno]
+        term_starts = array("Q", [0])
+        term_numbers = array("I")
+        for document in doc_terms:
+            term_numbers.extend(number_of[term] for term in document)
+            term_starts.append(len(term_numbers))
+
+        writer.add_strings("search.terms", terms)
+        writer.add_array("search.starts", starts)
+        writer.add_array("search.docnos", docnos)
+        writer.add_array("search.frequencies", frequencies)
+        writer.add_array("search.lengths", lengths)
+        writer.add_array("search.term_starts", term_starts)
+        writer.add_array("search.term_numbers", term_numbers)
+        writer.add_json("search.meta", {"total_length": self._total_length})
+
+    @classmethod
+    def from_snapshot(
+        cls, snapshot: Snapshot, k1: float = 1.2, b: float = 0.75
+    ) -> "SearchIndex":
+        """Load an index written by ``write_snapshot``; postings decode on use"""
+        index = cls(k1, b)
+        ids = snapshot.strings("catalog.ids")
+        terms = snapshot.strings("search.terms")
+        starts = snapshot.array("search.starts", "Q")
+        docnos = snapshot.array("search.docnos", "I")
+        frequencies = snapshot.array("search.frequencies", "I")
+        lengths = snapshot.array("search.lengths", "I")
+        term_starts = snapshot.array("search.term_starts", "Q")
+        term_numbers = snapshot.array("search.term_numbers", "I")
+        size = len(ids)
+
+        def postings(number: int) -> Dict[int, int]:
+            start, end = starts[number], starts[number + 1]
+            return dict(zip(docnos[start:end], frequencies[start:end]))
+
+        def document_terms(docno: int) -> Tuple[str, ...]:
+            numbers = term_numbers[term_starts[docno] : term_starts[docno + 1]]
+            return tuple(terms[number] for number in numbers)
+
+        def locate_docno(docno: int) -> Optional[int]:
+            return docno if 0 <= docno < size else None
+
+        # Postings are cached once decoded, since updates change them in place.
+        index._postings = LayeredDict(
+            len(terms), terms.find, postings, lambda: terms, cache=True
+        )
+        index._base_terms = terms
+        index._docno_by_id = LayeredDict(size, ids.find, int, lambda: ids)
+        index._id_by_docno = LayeredDict(
+            size, locate_docno, ids.__getitem__, lambda: range(size)
+        )
+        index._doc_terms = LayeredDict(
+            size, locate_docno, document_terms, lambda: range(size)
+        )
+        index._doc_lengths = LayeredDict(
+            size, locate_docno, lengths.__getitem__, lambda: range(size)
+        )
+        index._total_length = snapshot.json("search.meta")["total_length"]
+        index._next_docno = size
+        return index
+
+    def _in_base(self, term: str) -> bool:
+        return self._base_terms is not None and self._base_terms.find(term) is not None
+
+    def _expand_prefix(self, prefix: str) -> List[str]:
+        """Return indexed terms starting with prefix, capped to the most frequent"""
+        terms = []
+        for vocabulary in (self._vocabulary, self._base_terms or ()):
+            position = bisect_left(vocabulary, prefix)
+            while position < len(vocabulary):
+                term = vocabulary[position]
+                if not term.startswith(prefix):
+                    break
+                terms.append(term)
+                position += 1
+        if len(terms) > MAX_PREFIX_EXPANSIONS:
+            terms = heapq.nlargest(
+                MAX_PREFIX_EXPANSIONS, terms, key=lambda t: len(self._postings[t])
+            )
+        return terms
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[str, float]]:
+        """Return up to limit (doc_id, score) pairs matching every query term.
+
+        The last query term also matches as a prefix so that results keep
+        up with a user who is still typing.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self._docno_by_id or limit <= 0:
+            return []
+
+        # Each group is a set of alternative terms; a document must match
+        # at least one term of every group.
+        groups: List[List[str]] = [[t] for t in terms[:-1] if t in self._postings]
+        if len(groups) != len(terms) - 1:
+            return []
+        last_group = self._expand_prefix(terms[-1])
+        if not last_group:
+            return []
+        groups.append(last_group)
+
+        def group_size(group: List[str]) -> int:
+            return sum(len(self._postings[t]) for t in group)
+
+        # Intersect starting from the most selective group.
+        groups.sort(key=group_size)
+        candidates = set(self._postings[groups[0][0]])
+        for term in groups[0][1:]:
+            candidates.update(self._postings[term])
+        for group in groups[1:]:
+            matched = set()
+            for term in group:
+                postings = self._postings[term]
+                if len(postings) < len(candidates):
+                    matched.update(d for d in postings if d in candidates)
+                else:
+                    matched.update(d for d in candidates if d in postings)
+            candidates = matched
+            if not candidates:
+                return []
+
+        doc_count = len(self._docno_by_id)
+        average_length = self._total_length / doc_count or 1.0
+        scores = dict.fromkeys(candidates, 0.0)
+        for group in groups:
+            for term in group:
+                postings = self._postings[term]
+                idf = math.log(
+                    1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5)
+                )
+                for docno in candidates:
+                    frequency = postings.get(docno)
+                    if frequency is None:
+                        continue
+                    norm = self.k1 * (
+                        1 - self.b + self.b * self._doc_lengths[docno] / average_length
+                    )
+                    scores[docno] += (
+                        idf * frequency * (self.k1 + 1) / (frequency + norm)
+                    )
+
+        top = heapq.nlargest(limit, scores.items(), key=lambda entry: entry[1])
+        return [(self._id_by_docno[docno], score) for docno, score in top]
@@ -0,0 +1,341 @@
+"""Versioned binary snapshots of the catalog and its indexes, loaded with mmap.
+
+A snapshot file holds the catalog records and the state of the search,
+suggest and facet indexes as named sections: arrays of fixed-size
+numbers, stored as they are laid out in memory, and string columns (the
+strings back to back plus an array of their offsets). Loading maps the
+file, reads the section table and wraps the sections in memoryviews;
+nothing is decoded until it is used. A record is parsed when its item
+is read and a term's postings when a query needs them, so opening a
+snapshot takes a few milliseconds whatever the catalog size, and every
+worker mapping the same file shares one copy of it in the page cache.
+
+Snapshots are immutable. Changes made after loading are kept in memory
+on top of the mapped data (``LayeredDict``, ``LayeredList``) until the
+next snapshot is written.
+
+File layout, little-endian::
+
+    header    magic "STRMSNAP", format version u32, section count u32,
+              section table offset u64
+    sections  each starting at a multiple of 8 bytes
+    table     per section: name (32 bytes, NUL-padded), offset u64, length u64
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    MutableMapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+from pydantic import BaseModel
+
+MAGIC = b"STRMSNAP"
+# Bumped on any change to the layout of a section.
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<8sIIQ")
+_ENTRY = struct.Struct("<32sQQ")
+_ALIGNMENT = 8
+_MISSING = object()
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot is corrupt, incomplete or of another version"""
+
+
+class SnapshotInfo(BaseModel):
+    path: str
+    items: int
+    bytes: int
+    seconds: float
+
+
+class SnapshotWriter:
+    """Writes sections to a temporary file that replaces path once complete"""
+
+    def __init__(self, path: str) -> None:
+        if sys.byteorder != "little":
+            raise SnapshotError("snapshots are only supported on little-endian hosts")
+        self.path = path
+        self._temp = f"{path}.{os.getpid()}.tmp"
+        self._file = open(self._temp, "wb")
+        self._file.write(_HEADER.pack(MAGIC, FORMAT_VERSION, 0, 0))
+        self._table: List[Tuple[str, int, int]] = []
+
+    def __enter__(self) -> "SnapshotWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.remove(self._temp)
+
+    def add_bytes(self, name: str, data: Union[bytes, memoryview]) -> None:
+        start = self._align()
+        self._file.write(data)
+        self._table.append((name, start, self._file.tell() - start))
+
+    def add_array(self, name: str, values: array) -> None:
+        self.add_bytes(name, values.tobytes())
+
+    def add_json(self, name: str, value: Any) -> None:
+        self.add_bytes(name, json.dumps(value).encode())
+
+    def add_strings(self, name: str, values: Iterable[Union[str, bytes]]) -> int:
+        """Write a string column, streaming the values; returns their count"""
+        offsets = array("Q", [0])
+        start = self._align()
+        size = 0
+        for value in values:
+            data = value.encode() if isinstance(value, str) else value
+            self._file.write(data)
+            size += len(data)
+            offsets.append(size)
+        self._table.append((name, start, size))
+        self.add_array(f"{name}.offsets", offsets)
+        return len(offsets) - 1
+
+    def close(self) -> None:
+        table_offset = self._align()
+        for name, offset, length in self._table:
+            encoded = name.encode()
+            if len(encoded) > 32:
+                raise ValueError(f"section name {name!r} is longer than 32 bytes")
+            self._file.write(_ENTRY.pack(encoded, offset, length))
+        self._file.seek(0)
+        self._file.write(
+            _HEADER.pack(MAGIC, FORMAT_VERSION, len(self._table), table_offset)
+        )
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        # A reader that mapped the previous file keeps its (unlinked) copy.
+        os.replace(self._temp, self.path)
+
+    def _align(self) -> int:
+        position = self._file.tell()
+        padding = -position % _ALIGNMENT
+        self._file.write(bytes(padding))
+        return position + padding
+
+
+class StringColumn(Sequence):
+    """Strings stored back to back in a snapshot, decoded on access"""
+
+    __slots__ = ("_data", "_offsets")
+
+    def __init__(self, data: memoryview, offsets: memoryview) -> None:
+        self._data = data
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        return str(self.raw(index), "utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def raw(self, index: int) -> memoryview:
+        """The encoded bytes of a string, without copying"""
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self._data[self._offsets[index] : self._offsets[index + 1]]
+
+    def find(self, value: str) -> Optional[int]:
+        """Position of value in a sorted column, or None"""
+        position = bisect_left(self, value)
+        if position < len(self) and self[position] == value:
+            return position
+        return None
+
+
+class Snapshot:
+    """A snapshot file mapped read-only into memory"""
+
+    def __init__(self, path: str) -> None:
+        if sys.byteorder != "little":
+            raise SnapshotError("snapshots are only supported on little-endian hosts")
+        self.path = path
+        with open(path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size < _HEADER.size:
+                raise SnapshotError(f"{path} is truncated")
+            # The mapping stays valid after the file is closed.
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = size
+        view = memoryview(self._map)
+        magic, version, count, table_offset = _HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise SnapshotError(f"{path} is not a catalog snapshot")
+        if version != FORMAT_VERSION:
+            raise SnapshotError(
+                f"{path} has format version {version}, expected {FORMAT_VERSION}"
+            )
+        if table_offset + count * _ENTRY.size > size:
+            raise SnapshotError(f"{path} is truncated")
+        self._sections: Dict[str, memoryview] = {}
+        for number in range(count):
+            name, offset, length = _ENTRY.unpack_from(
+                view, table_offset + number * _ENTRY.size
+            )
+            if offset + length > table_offset:
+                raise SnapshotError(f"{path} has a corrupt section table")
+            self._sections[name.rstrip(b"\0").decode()] = view[offset : offset + length]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._sections
+
+    def bytes(self, name: str) -> memoryview:
+        try:
+            return self._sections[name]
+        except KeyError:
+            raise SnapshotError(f"{self.path} has no section {name!r}") from None
+
+    def array(self, name: str, typecode: str) -> memoryview:
+        """A section as a sequence of numbers of the given array typecode"""
+        data = self.bytes(name)
+        if len(data) % array(typecode).itemsize:
+            raise SnapshotError(f"{self.path}: section {name!r} has a partial value")
+        return data.cast(typecode)
+
+    def json(self, name: str) -> Any:
+        return json.loads(bytes(self.bytes(name)))
+
+    def strings(self, name: str) -> StringColumn:
+        return StringColumn(self.bytes(name), self.array(f"{name}.offsets", "Q"))
+
+
+class LayeredDict(MutableMapping):
+    """Mapping over read-only snapshot data, with changes kept in memory.
+
+    ``locate`` finds a key in the snapshot (its index there, or None) and
+    ``load`` decodes the value at an index; ``keys`` lists the snapshot's
+    keys. With ``cache`` set, loaded values are kept, so changes made to
+    mutable values (sets, dicts) in place are not lost.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        locate: Callable[[Any], Optional[int]],
+        load: Callable[[int], Any],
+        keys: Callable[[], Iterable[Any]],
+        cache: bool = False,
+    ) -> None:
+        self._size = size
+        self._locate = locate
+        self._load = load
+        self._keys = keys
+        self._cache = cache
+        self._values: Dict[Any, Any] = {}
+        # Snapshot keys deleted since loading.
+        self._removed: Set[Any] = set()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, key: Any) -> bool:
+        if key in self._values:
+            return True
+        return key not in self._removed and self._locate(key) is not None
+
+    def __getitem__(self, key: Any) -> Any:
+        value = self._values.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        index = None if key in self._removed else self._locate(key)
+        if index is None:
+            raise KeyError(key)
+        value = self._load(index)
+        if self._cache:
+            self._values[key] = value
+        return value
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        if key not in self:
+            self._size += 1
+        self._values[key] = value
+
+    def __delitem__(self, key: Any) -> None:
+        if key not in self:
+            raise KeyError(key)
+        self._values.pop(key, None)
+        if self._locate(key) is not None:
+            self._removed.add(key)
+        self._size -= 1
+
+    def __iter__(self) -> Iterator[Any]:
+        for key in self._keys():
+            if key not in self._removed and key not in self._values:
+                yield key
+        yield from self._values
+
+
+class LayeredList:
+    """List over read-only snapshot data, with changes kept in memory.
+
+    Supports what the indexes use of a list: indexing, slicing, item
+    assignment, ``append``, ``len`` and iteration.
+    """
+
+    __slots__ = ("_size", "_load", "_changed", "_appended")
+
+    def __init__(self, size: int, load: Callable[[int], Any]) -> None:
+        self._size = size
+        self._load = load
+        self._changed: Dict[int, Any] = {}
+        self._appended: List[Any] = []
+
+    def __len__(self) -> int:
+        return self._size + len(self._appended)
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index >= self._size:
+            return self._appended[index - self._size]
+        if index < 0:
+            raise IndexError(index)
+        value = self._changed.get(index, _MISSING)
+        return self._load(index) if value is _MISSING else value
+
+    def __setitem__(self, index: int, value: Any) -> None:
+        if index < 0:
+            index += len(self)
+        if index >= self._size:
+            self._appended[index - self._size] = value
+        elif index < 0:
+            raise IndexError(index)
+        else:
+            self._changed[index] = value
+
+    def __iter__(self) -> Iterator[Any]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def append(self, value: Any) -> None:
+        self._appended.append(value)
@@ -0,0 +1,616 @@
+"""Typo-tolerant title autocomplete.
+
+``SuggestIndex`` answers "titles starting with what the user typed so
+far", where a title also matches from the start of any of its words
+("knig" finds "The Dark Knight"). Results are ranked by popularity.
+
+The bulk of the index is a static sorted array of word-start suffixes,
+each encoded as ``docno << 8 | offset`` into the normalized title, so a
+prefix maps to one contiguous range found by binary search. A segment
+tree over fixed-size blocks of that array stores the most popular
+documents of every block and block range, so the top results of any
+range, however large, are found by merging O(log n) short lists.
+Mutations go to a small sorted delta and a tombstone set. The static
+part is rebuilt once the delta outgrows a fraction of it, which keeps
+rebuilds amortized.
+
+When exact prefixes do not fill the result list, a trigram index over
+the title vocabulary proposes corrections. Tokens within edit distance
+1-2 of a vocabulary word (of a word prefix, for the token being typed)
+are used as alternative prefixes.
+
+An index written to a catalog snapshot is loaded with its static part
+already merged; titles, node lists and vocabulary entries are decoded
+from the mapped file as queries reach them.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from pydantic import BaseModel
+
+from .catalog import insert_sorted
+from .models import MediaItem
+from .search import tokenize
+from .snapshot import LayeredDict, LayeredList, Snapshot, SnapshotWriter
+
+logger = logging.getLogger(__name__)
+
+# Entries of the static array address word starts with 8 bits.
+MAX_OFFSET = 255
+# Entries per segment tree leaf; partial blocks at range edges are scanned.
+BLOCK_SIZE = 64
+# Documents kept per segment tree node (the largest limit plus slack for
+# tombstoned documents until the next rebuild).
+NODE_CAPACITY = 48
+MAX_LIMIT = 20
+# Trigram candidates checked with the edit distance per query token.
+MAX_FUZZY_CANDIDATES = 64
+# Alternatives kept per token and prefix combinations tried per query.
+MAX_CORRECTIONS = 4
+MAX_VARIANTS = 8
+
+_HIGH = "\U0010ffff"
+
+
+class Suggestion(BaseModel):
+    id: str
+    title: str
+
+
+class SuggestResponse(BaseModel):
+    query: str
+    suggestions: List[Suggestion]
+
+
+class _Suffixes:
+    """The suffix each entry addresses, as a sequence ``bisect`` can search
+
+    Stands in for ``bisect``'s ``key`` argument, which needs Python 3.10.
+    """
+
+    __slots__ = ("_entries", "_keys")
+
+    def __init__(self, entries: array, keys: List[str]) -> None:
+        self._entries = entries
+        self._keys = keys
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __getitem__(self, position: int) -> str:
+        entry = self._entries[position]
+        return self._keys[entry >> 8][entry & 0xFF :]
+
+
+def popularity(item: MediaItem) -> float:
+    """Ranking weight of an item: metadata popularity, else its rating"""
+    for key in ("popularity", "rating"):
+        try:
+            return float(item.metadata[key])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return 0.0
+
+
+def max_distance(token: str) -> int:
+    """Edit distance tolerated for a token of this length"""
+    if len(token) < 3:
+        return 0
+    return 1 if len(token) < 6 else 2
+
+
+def edit_distance(query: str, word: str, limit: int, prefix: bool = False) -> int:
+    """Edit distance from query to word, or to its closest prefix.
+
+    Insertions, deletions, substitutions and transpositions of adjacent
+    characters cost 1 (optimal string alignment). Only the diagonal band
+    of width 2 * limit + 1 is computed, and limit + 1 is returned as soon
+    as the distance is known to exceed limit.
+    """
+    if prefix:
+        # A prefix longer than this is always more than limit edits away.
+        word = word[: len(query) + limit]
+    elif abs(len(word) - len(query)) > limit:
+        return limit + 1
+    over = limit + 1
+    width = len(word)
+    before: List[int] = []
+    previous = [j if j <= limit else over for j in range(width + 1)]
+    for i in range(1, len(query) + 1):
+        query_char = query[i - 1]
+        current = [i if i <= limit else over] + [over] * width
+        low = max(1, i - limit)
+        high = min(width, i + limit)
+        best = current[0]
+        for j in range(low, high + 1):
+            word_char = word[j - 1]
+            cost = previous[j - 1] + (query_char != word_char)
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            if (
+                i > 1
+                and j > 1
+                and query_char == word[j - 2]
+                and query[i - 2] == word_char
+                and before[j - 2] + 1 < cost
+            ):
+                cost = before[j - 2] + 1
+            current[j] = cost
+            if cost < best:
+                best = cost
+        if best > limit:
+            return over
+        before, previous = previous, current
+    distance = min(previous) if prefix else previous[width]
+    return distance if distance <= limit else over
+
+
+def trigrams(word: str) -> Set[str]:
+    # Padded at the start only, so a prefix shares the trigrams of its word.
+    padded = "  " + word
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class SuggestIndex:
+    """Popularity-ranked prefix index over titles with fuzzy fallback"""
+
+    def __init__(self, cache_size: int = 4096) -> None:
+        self.cache_size = cache_size
+        # Guards the structures against the background merge thread.
+        self._lock = threading.Lock()
+        self._merging = False
+        # Bumped when docnos are renumbered, invalidating a running merge.
+        self._generation = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self._docno_by_id: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self._titles: List[Optional[str]] = []
+        self._keys: List[str] = []
+        self._popularity = array("d")
+
+        # Static part: sorted entries and the segment tree over their blocks.
+        self._entries = array("Q")
+        self._tree: List[Tuple[int, ...]] = []
+        self._leaves = 0
+        # Dynamic part: sorted (suffix, docno) pairs and removed docnos.
+        self._delta: List[Tuple[str, int]] = []
+        self._tombstones: Set[int] = set()
+
+        # Vocabulary with reference counts and its trigram index.
+        self._word_counts: Counter = Counter()
+        self._trigram_words: Dict[str, Set[str]] = {}
+
+        self._cache: "OrderedDict[Tuple[str, bool, int], List[Tuple[str, str]]]" = (
+            OrderedDict()
+        )
+
+    def __len__(self) -> int:
+        return len(self._docno_by_id)
+
+    def __contains__(self, media_id: str) -> bool:
+        return media_id in self._docno_by_id
+
+    # Building and updating
+
+    def build(self, documents: Iterable[Tuple[str, str, float]]) -> None:
+        """Replace the index with (media_id, title, popularity) documents"""
+        with self._lock:
+            self._reset()
+            for media_id, title, weight in documents:
+                self._new_doc(media_id, title, weight)
+            self._rebuild()
+
+    def add_many(self, documents: Iterable[Tuple[str, str, float]]) -> None:
+        """Index or replace (media_id, title, popularity) documents"""
+        with self._lock:
+            pairs = []
+            for media_id, title, weight in documents:
+                self._drop(media_id)
+                docno = self._new_doc(media_id, title, weight)
+                key = self._keys[docno]
+                pairs.extend((key[offset:], docno) for offset in self._offsets(key))
+            insert_sorted(self._delta, pairs)
+            self._changed()
+
+    def remove_many(self, media_ids: Iterable[str]) -> None:
+        with self._lock:
+            for media_id in media_ids:
+                self._drop(media_id)
+            self._changed()
+
+    def set_popularity(self, media_id: str, weight: float) -> None:
+        """Update a ranking weight; static node lists pick it up on rebuild"""
+        with self._lock:
+            docno = self._docno_by_id.get(media_id)
+            if docno is not None:
+                self._popularity[docno] = weight
+                self._cache.clear()
+
+    def _new_doc(self, media_id: str, title: str, weight: float) -> int:
+        docno = len(self._ids)
+        key = " ".join(tokenize(title))
+        self._docno_by_id[media_id] = docno
+        self._ids.append(media_id)
+        self._titles.append(title)
+        self._keys.append(key)
+        self._popularity.append(weight)
+        for word in key.split():
+            count = self._word_counts.get(word, 0)
+            if count == 0:
+                for trigram in trigrams(word):
+                    self._trigram_words.setdefault(trigram, set()).add(word)
+            self._word_counts[word] = count + 1
+        return docno
+
+    def _drop(self, media_id: str) -> None:
+        docno = self._docno_by_id.pop(media_id, None)
+        if docno is None:
+            return
+        self._tombstones.add(docno)
+        for word in self._keys[docno].split():
+            self._word_counts[word] -= 1
+            if self._word_counts[word] == 0:
+                del self._word_counts[word]
+                for trigram in trigrams(word):
+                    words = self._trigram_words[trigram]
+                    words.discard(word)
+                    if not words:
+                        del self._trigram_words[trigram]
+        self._ids[docno] = None
+        self._titles[docno] = None
+
+    def _changed(self) -> None:
+        self._cache.clear()
+        budget = max(4096, len(self._entries) // 8)
+        if len(self._delta) <= budget and len(self._tombstones) <= budget:
+            return
+        if len(self._docno_by_id) * 2 < len(self._ids):
+            # Mostly removed documents: renumber to reclaim their slots.
+            self._rebuild()
+        elif not self._merging:
+            self._merging = True
+            threading.Thread(
+                target=self._merge_in_background, name="suggest-merge", daemon=True
+            ).start()
+
+    @staticmethod
+    def _offsets(key: str) -> List[int]:
+        offsets = [0] if key else []
+        offsets.extend(i + 1 for i, char in enumerate(key[:MAX_OFFSET]) if char == " ")
+        return offsets
+
+    def _rebuild(self) -> None:
+        """Renumber live documents and rebuild the static part from scratch"""
+        live = [
+            (media_id, self._titles[docno], self._keys[docno], self._popularity[docno])
+            for docno, media_id in enumerate(self._ids)
+            if media_id is not None
+        ]
+        self._docno_by_id = {}
+        self._ids = [media_id for media_id, _, _, _ in live]
+        self._titles = [title for _, title, _, _ in live]
+        self._keys = [key for _, _, key, _ in live]
+        self._popularity = array("d", (weight for _, _, _, weight in live))
+        for docno, media_id in enumerate(self._ids):
+            self._docno_by_id[media_id] = docno
+        self._delta = []
+        self._tombstones = set()
+        self._generation += 1
+
+        keys = self._keys
+        entries = [
+            docno << 8 | offset
+            for docno, key in enumerate(keys)
+            for offset in self._offsets(key)
+        ]
+        entries.sort(key=lambda entry: keys[entry >> 8][entry & 0xFF :])
+        self._entries = array("Q", entries)
+        self._tree, self._leaves = self._build_tree(self._entries, self._popularity)
+        self._cache.clear()
+
+    def _merge_in_background(self) -> None:
+        """Fold the delta and tombstones into a new static part, off the loop.
+
+        Docnos are only ever appended between renumberings, so everything
+        added after the snapshot has a docno of at least ``limit`` and stays
+        in the delta, and only tombstones from the snapshot are cleared.
+        """
+        try:
+            with self._lock:
+                generation = self._generation
+                limit = len(self._ids)
+                keys = self._keys[:limit]
+                weights = array("d", self._popularity)
+                entries = self._entries
+                delta = list(self._delta)
+                dead = set(self._tombstones)
+            merged = self._merge(entries, delta, dead, keys)
+            tree, leaves = self._build_tree(merged, weights)
+            with self._lock:
+                if self._generation != generation:
+                    return
+                self._entries, self._tree, self._leaves = merged, tree, leaves
+                self._delta = [pair for pair in self._delta if pair[1] >= limit]
+                self._tombstones -= dead
+                self._cache.clear()
+        except Exception:
+            logger.exception("Suggest index merge failed")
+        finally:
+            self._merging = False
+
+    @staticmethod
+    def _merge(
+        entries: array,
+        delta: List[Tuple[str, int]],
+        dead: Set[int],
+        keys: List[str],
+    ) -> array:
+        """Sorted entries without dead docnos, with the sorted delta merged in"""
+        if dead:
+            entries = array("Q", (entry for entry in entries if entry >> 8 not in dead))
+        suffixes = _Suffixes(entries, keys)
+        merged = array("Q")
+        start = 0
+        for suffix, docno in delta:
+            if docno in dead:
+                continue
+            position = bisect_left(suffixes, suffix, start)
+            merged.extend(entries[start:position])
+            merged.append(docno << 8 | (len(keys[docno]) - len(suffix)))
+            start = position
+        merged.extend(entries[start:])
+        return merged
+
+    @classmethod
+    def _build_tree(
+        cls, entries: array, weights: array
+    ) -> Tuple[List[Tuple[int, ...]], int]:
+        blocks = -(-len(entries) // BLOCK_SIZE)
+        leaves = 1
+        while leaves < blocks:
+            leaves *= 2
+        tree: List[Tuple[int, ...]] = [()] * (2 * leaves)
+        for block in range(blocks):
+            start = block * BLOCK_SIZE
+            tree[leaves + block] = cls._top(
+                {entry >> 8 for entry in entries[start : start + BLOCK_SIZE]}, weights
+            )
+        for node in range(leaves - 1, 0, -1):
+            tree[node] = cls._top({*tree[2 * node], *tree[2 * node + 1]}, weights)
+        return tree, leaves
+
+    @staticmethod
+    def _top(
+        docnos: Set[int], weights: array, count: int = NODE_CAPACITY
+    ) -> Tuple[int, ...]:
+        # A C-level key and one sort beat nsmallest for sets this small.
+        ranked = sorted(docnos, key=weights.__getitem__, reverse=True)
+        return tuple(ranked[:count])
+
+    # Snapshots
+
+    def write_snapshot(self, writer: SnapshotWriter, positions: Dict[str, int]) -> None:
+        """Write the index to a snapshot, numbering documents by catalog record"""
+        with self._lock:
+            if len(self) != len(positions):
+                raise ValueError("suggest index is out of sync with the catalog")
+            position_of = {
+                docno: positions[media_id]
+                for media_id, docno in self._docno_by_id.items()
+            }
+            order = sorted(position_of, key=position_of.__getitem__)
+            weights = array("d", (self._popularity[docno] for docno in order))
+            merged = self._merge(
+                self._entries, self._delta, self._tombstones, self._keys
+            )
+            entries = array(
+                "Q", (position_of[entry >> 8] << 8 | entry & 0xFF for entry in merged)
+            )
+            tree, leaves = self._build_tree(entries, weights)
+            tree_starts = array("Q", [0])
+            tree_docnos = array("I")
+            for node in tree:
+                tree_docnos.extend(node)
+                tree_starts.append(len(tree_docnos))
+
+            words = sorted(self._word_counts)
+            number_of = {word: number for number, word in enumerate(words)}
+            counts = array("I", (self._word_counts[word] for word in words))
+            grams = sorted(self._trigram_words)
+            gram_starts = array("Q", [0])
+            gram_words = array("I")
+            for trigram in grams:
+                gram_words.extend(
+                    sorted(number_of[word] for word in self._trigram_words[trigram])
+                )
+                gram_starts.append(len(gram_words))
+
+            writer.add_strings("suggest.titles", (self._titles[d] for d in order))
+            writer.add_strings("suggest.keys", (self._keys[d] for d in order))
+            writer.add_array("suggest.popularity", weights)
+            writer.add_array("suggest.entries", entries)
+            writer.add_array("suggest.tree_starts", tree_starts)
+            writer.add_array("suggest.tree", tree_docnos)
+            writer.add_strings("suggest.words", words)
+            writer.add_array("suggest.word_counts", counts)
+            writer.add_strings("suggest.trigrams", grams)
+            writer.add_array("suggest.trigram_starts", gram_starts)
+            writer.add_array("suggest.trigram_words", gram_words)
+            writer.add_json("suggest.meta", {"leaves": leaves})
+
+    @classmethod
+    def from_snapshot(
+        cls, snapshot: Snapshot, cache_size: int = 4096
+    ) -> "SuggestIndex":
+        """Load an index written by ``write_snapshot``"""
+        index = cls(cache_size)
+        ids = snapshot.strings("catalog.ids")
+        titles = snapshot.strings("suggest.titles")
+        keys = snapshot.strings("suggest.keys")
+        weights = snapshot.array("suggest.popularity", "d")
+        tree_starts = snapshot.array("suggest.tree_starts", "Q")
+        tree = snapshot.array("suggest.tree", "I")
+        words = snapshot.strings("suggest.words")
+        counts = snapshot.array("suggest.word_counts", "I")
+        grams = snapshot.strings("suggest.trigrams")
+        gram_starts = snapshot.array("suggest.trigram_starts", "Q")
+        gram_words = snapshot.array("suggest.trigram_words", "I")
+        size = len(ids)
+
+        def node(number: int) -> Tuple[int, ...]:
+            return tuple(tree[tree_starts[number] : tree_starts[number + 1]])
+
+        def trigram_words(number: int) -> Set[str]:
+            numbers = gram_words[gram_starts[number] : gram_starts[number + 1]]
+            return {words[word] for word in numbers}
+
+        index._docno_by_id = LayeredDict(size, ids.find, int, lambda: ids)
+        index._ids = LayeredList(size, ids.__getitem__)
+        index._titles = LayeredList(size, titles.__getitem__)
+        index._keys = LayeredList(size, keys.__getitem__)
+        index._popularity = LayeredList(size, weights.__getitem__)
+        index._entries = snapshot.array("suggest.entries", "Q")
+        index._tree = LayeredList(len(tree_starts) - 1, node)
+        index._leaves = snapshot.json("suggest.meta")["leaves"]
+        index._word_counts = LayeredDict(
+            len(words), words.find, counts.__getitem__, lambda: words
+        )
+        # Word sets are cached once decoded, since updates change them in place.
+        index._trigram_words = LayeredDict(
+            len(grams), grams.find, trigram_words, lambda: grams, cache=True
+        )
+        return index
+
+    # Queries
+
+    def _prefix_candidates(self, prefix: str, limit: int) -> Set[int]:
+        """Docnos that may be among the limit most popular completions"""
+        candidates: Set[int] = set()
+        # Node lists are sorted by popularity; enough of each to skip tombstones.
+        take = min(NODE_CAPACITY, limit + len(self._tombstones))
+        entries = self._entries
+        suffixes = _Suffixes(entries, self._keys)
+        lo = bisect_left(suffixes, prefix)
+        hi = bisect_left(suffixes, prefix + _HIGH, lo)
+        if lo < hi:
+            first_block = -(-lo // BLOCK_SIZE)
+            last_block = hi // BLOCK_SIZE
+            if first_block >= last_block:
+                candidates.update(entry >> 8 for entry in entries[lo:hi])
+            else:
+                candidates.update(
+                    entry >> 8 for entry in entries[lo : first_block * BLOCK_SIZE]
+                )
+                candidates.update(
+                    entry >> 8 for entry in entries[last_block * BLOCK_SIZE : hi]
+                )
+                left = first_block + self._leaves
+                right = last_block + self._leaves
+                while left < right:
+                    if left & 1:
+                        candidates.update(self._tree[left][:take])
+                        left += 1
+                    if right & 1:
+                        right -= 1
+                        candidates.update(self._tree[right][:take])
+                    left //= 2
+                    right //= 2
+
+        position = bisect_left(self._delta, (prefix,))
+        while position < len(self._delta) and self._delta[position][0].startswith(
+            prefix
+        ):
+            candidates.add(self._delta[position][1])
+            position += 1
+        return candidates - self._tombstones
+
+    def _corrections(self, token: str, prefix: bool) -> List[Tuple[int, str]]:
+        """Vocabulary words within the token's edit distance, closest first"""
+        limit = max_distance(token)
+        if limit == 0:
+            return []
+        shared: Counter = Counter()
+        for trigram in trigrams(token):
+            shared.update(self._trigram_words.get(trigram, ()))
+        found = []
+        for word, _count in shared.most_common(MAX_FUZZY_CANDIDATES):
+            distance = edit_distance(token, word, limit, prefix=prefix)
+            # Distance 0 is an exact (prefix) match, already found without help.
+            if 0 < distance <= limit:
+                found.append((distance, word))
+        found.sort(key=lambda match: (match[0], -self._word_counts[match[1]]))
+        return found[:MAX_CORRECTIONS]
+
+    def _variants(self, tokens: List[str], complete: bool) -> List[str]:
+        """Corrected prefixes for tokens, ordered by total edit distance"""
+        options: List[List[Tuple[int, str]]] = []
+        for position, token in enumerate(tokens):
+            typing = position == len(tokens) - 1 and not complete
+            choices = [(0, token)] if typing or token in self._word_counts else []
+            choices += self._corrections(token, prefix=typing)
+            if not choices:
+                return []
+            options.append(choices)
+        combos = sorted(
+            itertools.islice(itertools.product(*options), 256),
+            key=lambda combo: sum(distance for distance, _ in combo),
+        )
+        variants = []
+        for combo in combos:
+            if all(distance == 0 for distance, _ in combo):
+                continue
+            variants.append(" ".join(word for _, word in combo))
+            if len(variants) >= MAX_VARIANTS:
+                break
+        return variants
+
+    def suggest(self, query: str, limit: int = 10) -> List[Tuple[str, str]]:
+        """Return up to limit (media_id, title) completions of query"""
+        limit = max(1, min(limit, MAX_LIMIT))
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        # A trailing space or punctuation means the last word is finished.
+        complete = not query[-1:].isalnum()
+        prefix = " ".join(tokens)
+        with self._lock:
+            cache_key = (prefix, complete, limit)
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                self._cache.move_to_end(cache_key)
+                return cached
+
+            results = self._rank(self._prefix_candidates(prefix, limit), limit)
+            if len(results) < limit:
+                seen = set(results)
+                for variant in self._variants(tokens, complete):
+                    candidates = self._prefix_candidates(variant, limit) - seen
+                    for docno in self._rank(candidates, limit - len(results)):
+                        results.append(docno)
+                        seen.add(docno)
+                    if len(results) >= limit:
+                        break
+
+            found = [(self._ids[docno], self._titles[docno]) for docno in results]
+            self._cache[cache_key] = found
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return found
+
+    def _rank(self, docnos: Set[int], limit: int) -> List[int]:
+        weights = self._popularity
+        titles = self._titles
+        return heapq.nsmallest(
+            limit, docnos, key=lambda docno: (-weights[docno], titles[docno])
+        )
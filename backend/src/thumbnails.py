@@ -0,0 +1,178 @@
+"""Resized thumbnails for catalog posters.
+
+``ThumbnailService`` fetches an item's original thumbnail once, resizes
+it with Pillow in a thread pool (Pillow releases the GIL while decoding,
+resampling and encoding) and encodes it as WebP or JPEG. Originals and
+variants are kept in a size-bounded disk cache, with a smaller in-memory
+tier for hot variants, and concurrent requests for the same image share
+one fetch and one resize.
+
+Requested widths are rounded up to a fixed set of sizes, so the cache
+holds a bounded number of variants per image. Originals may also be
+local files (``file://`` URLs or bare paths) under a configured
+directory, which is convenient for development and tests.
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Dict, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .cache import ByteLRU, DiskLRU, SingleFlight
+from .scraping import Scraper, ScrapeError
+
+# format name -> (Pillow format, media type)
+FORMATS: Dict[str, Tuple[str, str]] = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+WIDTHS = (92, 154, 185, 342, 500, 780)
+MAX_SOURCE_BYTES = 20 * 1024 * 1024
+# Refuse to decode images larger than this (decompression bombs).
+MAX_SOURCE_PIXELS = 50_000_000
+
+
+class ThumbnailError(Exception):
+    """Raised when an original cannot be fetched or decoded"""
+
+
+def snap_width(width: int) -> int:
+    """Round a requested width up to the nearest supported width"""
+    for candidate in WIDTHS:
+        if candidate >= width:
+            return candidate
+    return WIDTHS[-1]
+
+
+def render(data: bytes, width: int, fmt: str, quality: int) -> bytes:
+    """Resize an encoded image to width (never upscaling) and re-encode it"""
+    pillow_format = FORMATS[fmt][0]
+    try:
+        with Image.open(BytesIO(data)) as source:
+            if source.width * source.height > MAX_SOURCE_PIXELS:
+                raise ThumbnailError(f"image is {source.width}x{source.height}")
+            # Let the JPEG decoder downscale by up to 8x while decoding; both
+            # sides are requested so EXIF rotation cannot leave it too small.
+            source.draft("RGB", (width, width))
+            image = ImageOps.exif_transpose(source)
+            target = min(width, image.width)
+            height = max(1, round(image.height * target / image.width))
+            alpha = image.has_transparency_data
+            image = image.convert("RGBA" if alpha else "RGB")
+            image = image.resize((target, height), Image.LANCZOS, reducing_gap=3.0)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as exc:
+        raise ThumbnailError(f"cannot decode image: {exc}") from exc
+
+    if alpha and pillow_format == "JPEG":
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    output = BytesIO()
+    if pillow_format == "JPEG":
+        image.save(output, "JPEG", quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(output, "WEBP", quality=quality, method=4)
+    return output.getvalue()
+
+
+class ThumbnailService:
+    """Fetch, resize and cache thumbnail variants"""
+
+    def __init__(
+        self,
+        scraper: Scraper,
+        cache_dir: Optional[str] = None,
+        memory_bytes: int = 64 * 1024 * 1024,
+        disk_bytes: int = 1024 * 1024 * 1024,
+        workers: int = 2,
+        quality: int = 80,
+        local_dir: Optional[str] = None,
+    ) -> None:
+        self.scraper = scraper
+        self.quality = quality
+        self.local_dir = os.path.realpath(local_dir) if local_dir else None
+        self.memory = ByteLRU(memory_bytes)
+        self.disk = DiskLRU(cache_dir, disk_bytes) if cache_dir else None
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._flights = SingleFlight()
+
+    async def _run(self, function, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="thumbnail"
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, function, *args)
+
+    async def get(self, url: str, width: int, fmt: str) -> bytes:
+        """Return url resized to width and encoded as fmt"""
+        key = f"{fmt}/{width}/{url}"
+        body = self.memory.get(key)
+        if body is None:
+            body = await self._flights.do(
+                ("variant", key), lambda: self._variant(key, url, width, fmt)
+            )
+        return body
+
+    async def _variant(self, key: str, url: str, width: int, fmt: str) -> bytes:
+        body = await self._cached(key)
+        if body is None:
+            original = await self._flights.do(
+                ("original", url), lambda: self._original(url)
+            )
+            body = await self._run(render, original, width, fmt, self.quality)
+            await self._store(key, body)
+        self.memory.put(key, body)
+        return body
+
+    async def _original(self, url: str) -> bytes:
+        key = f"original/{url}"
+        data = await self._cached(key)
+        if data is None:
+            scheme = urlparse(url).scheme
+            if scheme in ("http", "https"):
+                try:
+                    data, _ = await self.scraper.fetch_bytes(
+                        url, max_bytes=MAX_SOURCE_BYTES
+                    )
+                except ScrapeError as exc:
+                    raise ThumbnailError(str(exc)) from exc
+                await self._store(key, data)
+            else:
+                data = await self._run(self._read_local, url)
+        return data
+
+    def _read_local(self, url: str) -> bytes:
+        if self.local_dir is None:
+            raise ThumbnailError(f"{url} is not an http(s) URL")
+        parsed = urlparse(url)
+        path = unquote(parsed.path) if parsed.scheme == "file" else url
+        path = os.path.realpath(os.path.join(self.local_dir, path))
+        if os.path.commonpath([path, self.local_dir]) != self.local_dir:
+            raise ThumbnailError(f"{url} is outside the thumbnail directory")
+        try:
+            if os.path.getsize(path) > MAX_SOURCE_BYTES:
+                raise ThumbnailError(f"{url} is larger than {MAX_SOURCE_BYTES} bytes")
+            with open(path, "rb") as handle:
+                return handle.read()
+        except OSError as exc:
+            raise ThumbnailError(f"{url}: {exc.strerror}") from exc
+
+    async def _cached(self, key: str) -> Optional[bytes]:
+        if self.disk is None:
+            return None
+        return await self._run(self.disk.get, key)
+
+    async def _store(self, key: str, body: bytes) -> None:
+        if self.disk is not None:
+            await self._run(self.disk.put, key, body)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
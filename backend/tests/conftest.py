@@ -0,0 +1,104 @@
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Tuple
+
+import pytest
+
+# Settings are read when src.config is first imported; keep the caches and
+# logs the app writes out of the shared temp directory.
+_STATE_DIR = tempfile.mkdtemp(prefix="streamy-tests-")
+for _name, _directory in (
+    ("STREAMY_EVENTS_DIR", "events"),
+    ("STREAMY_METADATA_CACHE_DIR", "metadata"),
+    ("STREAMY_THUMBNAIL_CACHE_DIR", "thumbnails"),
+):
+    os.environ[_name] = os.path.join(_STATE_DIR, _directory)
+for _name in (
+    "STREAMY_CATALOG_DB",
+    "STREAMY_CATALOG_SNAPSHOT",
+    "STREAMY_SCRAPE_SOURCES",
+):
+    os.environ.pop(_name, None)
+
+# (status, headers, body) for a request path, query string included.
+Route = Callable[[str], Tuple[int, Dict[str, str], bytes]]
+
+
+class Upstream:
+    """A local HTTP server standing in for the sites the backend fetches"""
+
+    def __init__(self) -> None:
+        self.routes: Dict[str, Route] = {}
+        self.requests: List[str] = []
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                upstream.requests.append(self.path)
+                route = upstream.routes.get(self.path.split("?", 1)[0])
+                if route is None:
+                    status, headers, body = 404, {}, b"not found"
+                else:
+                    status, headers, body = route(self.path)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def serve(self, path: str, body: bytes, content_type: str = "text/html") -> None:
+        self.routes[path] = lambda _path: (200, {"Content-Type": content_type}, body)
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def upstream():
+    server = Upstream()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def main():
+    import src.main
+
+    return src.main
+
+
+@pytest.fixture
+def add_media(main):
+    """Add items to the app's catalog for one test"""
+    from src.models import MediaItem
+
+    added = []
+
+    def add(media_id: str, **fields) -> MediaItem:
+        item = MediaItem(id=media_id, title=fields.pop("title", media_id), **fields)
+        main.CATALOG.upsert(item)
+        added.append(media_id)
+        return item
+
+    yield add
+    main.CATALOG.delete(added)
+
+
+@pytest.fixture
+def client(main):
+    from fastapi.testclient import TestClient
+
+    with TestClient(main.app) as test_client:
+        yield test_client
@@ -0,0 +1,81 @@
+import re
+import time
+
+import pytest
+
+from src.adblock import FilterEngine, _pattern_to_regex, is_regex_filter
+
+
+@pytest.mark.parametrize(
+    "line, regex",
+    [
+        ("/banner\\d+/", True),
+        ("@@/banner/$script", True),
+        ("/ads/*banner", False),
+        ("||ads.example^$third-party", False),
+        ("//", False),
+    ],
+)
+def test_is_regex_filter(line, regex):
+    assert is_regex_filter(line) is regex
+
+
+def test_wildcards_match_in_linear_time():
+    engine = FilterEngine.from_lines(["*a*a*a*a*a*a*a*a*a*a*a*a*b"])
+    url = "http://example.com/" + "a" * 8000
+    started = time.perf_counter()
+    assert engine.match(url) == (False, None)
+    assert time.perf_counter() - started < 0.5
+
+
+@pytest.mark.parametrize(
+    "pattern, url, matches",
+    [
+        ("/ads/*banner", "http://x.com/ads/1/banner.gif", True),
+        ("/ads/*banner", "http://x.com/banner/ads/", False),
+        ("|http://*.ex.com/*ad|", "http://q.ex.com/foo/ad", True),
+        ("|http://*.ex.com/*ad|", "http://q.ex.com/ad/foo", False),
+        ("||ads.com^*track", "https://cdn.ads.com/v1/track?id=1", True),
+        ("||ads.com^*track", "https://ads.company.com/track", False),
+    ],
+)
+def test_wildcard_patterns(pattern, url, matches):
+    assert bool(re.search(_pattern_to_regex(pattern), url)) is matches
+
+
+def test_check_with_request_patterns(client):
+    response = client.post(
+        "/adblock/check",
+        json={
+            "urls": [
+                {"url": "https://cdn.example/ads/1/banner.png", "type": "image"},
+                {"url": "https://cdn.example/video.mp4"},
+                {"url": "https://www.doubleclick.net/pixel"},
+            ],
+            "patterns": ["/ads/*banner"],
+        },
+    )
+    assert response.status_code == 200
+    assert [result["blocked"] for result in response.json()["results"]] == [
+        True,
+        False,
+        True,
+    ]
+
+
+def test_check_rejects_regex_patterns(client):
+    response = client.post(
+        "/adblock/check",
+        json={"urls": [{"url": "https://x.com/"}], "patterns": ["/(a+)+$/"]},
+    )
+    assert response.status_code == 422
+
+
+def test_check_bounds_request_size(client):
+    urls = [{"url": f"https://x.com/{n}"} for n in range(257)]
+    assert client.post("/adblock/check", json={"urls": urls}).status_code == 422
+    response = client.post(
+        "/adblock/check",
+        json={"urls": [{"url": "https://x.com/"}], "patterns": ["x"] * 257},
+    )
+    assert response.status_code == 422
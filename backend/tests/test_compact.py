@@ -0,0 +1,52 @@
+from src.compact import CompactCatalog
+from src.models import MediaItem, MediaSource
+
+
+def make_item(media_id, sources=1, **metadata):
+    return MediaItem(
+        id=media_id,
+        title=f"Title {media_id}",
+        description="About it",
+        sources=[
+            MediaSource(
+                name="Source",
+                url=f"https://cdn.example/{media_id}/{n}.mp4",
+                quality="720p",
+            )
+            for n in range(sources)
+        ],
+        metadata=metadata,
+    )
+
+
+def test_items_round_trip():
+    items = [
+        make_item("a", 2, year="2020", genre="Drama"),
+        make_item("b", 0, rating=7.5),
+    ]
+    catalog = CompactCatalog(items)
+    for item in items:
+        read = catalog.get(item.id)
+        assert read == item
+        assert read.model_dump_json() == item.model_dump_json()
+
+
+def test_metadata_is_not_shared():
+    tags = ["noir"]
+    item = make_item("a", tags=tags, cast={"lead": "Ann"})
+    catalog = CompactCatalog([item])
+    tags.append("mutated by the caller")
+
+    first = catalog.get("a")
+    assert first.metadata["tags"] == ["noir"]
+    first.metadata["tags"].append("mutated by a reader")
+    first.metadata["cast"]["lead"] = "Bob"
+    second = catalog.get("a")
+    assert second.metadata == {"tags": ["noir"], "cast": {"lead": "Ann"}}
+
+
+def test_more_than_65535_sources():
+    catalog = CompactCatalog([make_item("a", 70000)])
+    sources = catalog.get("a").sources
+    assert len(sources) == 70000
+    assert sources[-1].url == "https://cdn.example/a/69999.mp4"
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import os
+import stat
+
+import pytest
+
+from src.events import (
+    CHECKPOINT_NAME,
+    MAX_BATCH_BYTES,
+    EventLogError,
+    EventService,
+    WatchEvent,
+)
+
+
+def plays(media_id, count=1):
+    return [WatchEvent(media_id=media_id, type="play") for _ in range(count)]
+
+
+def ranking(service, window="1h"):
+    body = json.loads(service.trending(window, 10).body)
+    return [(item["id"], item["score"]) for item in body["items"]]
+
+
+def service(directory, **options):
+    return EventService(
+        str(directory), lambda ids: {}, fsync=False, refresh_interval=0.01, **options
+    )
+
+
+def test_checkpoint_survives_a_restart(tmp_path):
+    async def first():
+        events = service(tmp_path)
+        await events.start()
+        await events.record(plays("a", 2) + plays("b"))
+        await events.close()
+
+    async def second():
+        events = service(tmp_path)
+        await events.start()
+        try:
+            return ranking(events), events.replayed
+        finally:
+            await events.close()
+
+    asyncio.run(first())
+    with open(tmp_path / "slot-0" / CHECKPOINT_NAME, "rb") as file:
+        assert file.read(8) == b"STRMSNAP"
+    # Counted from the checkpoint, with no log left to replay.
+    assert asyncio.run(second()) == ([("a", 6), ("b", 3)], 0)
+
+
+def test_rankings_count_every_worker(tmp_path):
+    async def run():
+        first, second = service(tmp_path), service(tmp_path)
+        await first.start()
+        await second.start()
+        try:
+            await first.record(plays("a", 2))
+            await second.record(plays("b") + plays("a"))
+            # Own events are ranked at once, the other worker's once it
+            # has checkpointed them.
+            await asyncio.sleep(0.1)
+            before = ranking(first)
+            await first.checkpoint()
+            await second.checkpoint()
+            await asyncio.sleep(0.1)
+            return before, ranking(first), ranking(second)
+        finally:
+            await first.close()
+            await second.close()
+
+    before, first, second = asyncio.run(run())
+    assert before == [("a", 6)]
+    assert first == second == [("a", 9), ("b", 3)]
+
+
+def test_events_directory_is_private(tmp_path, monkeypatch):
+    directory = tmp_path / "events"
+    directory.mkdir(mode=0o755)
+    os.chmod(directory, 0o755)
+
+    async def start():
+        events = service(directory)
+        await events.start()
+        await events.close()
+
+    asyncio.run(start())
+    assert stat.S_IMODE(os.stat(directory).st_mode) == 0o700
+
+    owner = os.stat(directory).st_uid
+    monkeypatch.setattr(os, "getuid", lambda: owner + 1)
+    with pytest.raises(EventLogError, match="owned by this user"):
+        asyncio.run(start())
+
+
+def test_post_events_limits_the_body(client):
+    response = client.post(
+        "/events", json={"events": [{"media_id": "a", "type": "play"}]}
+    )
+    assert response.status_code == 200
+    assert response.json() == {"accepted": 1}
+
+    response = client.post("/events", content=b" " * (MAX_BATCH_BYTES + 1))
+    assert response.status_code == 413
@@ -0,0 +1,20 @@
+def test_extract_from_html(client):
+    html = '<video><source src="/media/clip.mp4" type="video/mp4"></video>'
+    response = client.post(
+        "/extract", json={"html": html, "url": "https://videos.example/watch/1"}
+    )
+    assert response.status_code == 200
+    urls = [source["url"] for source in response.json()["sources"]]
+    assert "https://videos.example/media/clip.mp4" in urls
+
+
+def test_extract_requires_html_or_url(client):
+    assert client.post("/extract", json={}).status_code == 422
+
+
+def test_extract_does_not_fetch_private_addresses(client, upstream):
+    upstream.serve("/watch/1", b'<video src="/clip.mp4"></video>')
+    response = client.post("/extract", json={"url": f"{upstream.url}/watch/1"})
+    assert response.status_code == 502
+    assert "public address" in response.json()["detail"]
+    assert upstream.requests == []
@@ -0,0 +1,86 @@
+from src.facets import FacetIndex
+from src.models import MediaItem, MediaSource
+
+
+def item(media_id, genre, year, *qualities):
+    sources = [
+        MediaSource(name="mirror", url=f"https://cdn.example/{media_id}", quality=q)
+        for q in qualities
+    ]
+    return MediaItem(
+        id=media_id,
+        title=media_id,
+        sources=sources,
+        metadata={"genre": genre, "year": year},
+    )
+
+
+def build():
+    index = FacetIndex()
+    index.build(
+        [
+            item("a", "Drama", 1999, "1080p"),
+            item("b", "Drama", 2005, "720p"),
+            item("c", "Comedy", 2005, "1080p", "720p"),
+            item("d", "Horror", 2012, "480p"),
+        ]
+    )
+    return index
+
+
+def listing(index, **filters):
+    return list(index.iter_ids(index.match(index.filters(**filters))))
+
+
+def counts(index, facet, **filters):
+    return {
+        count.value: count.count
+        for count in index.counts(index.filters(**filters))[facet]
+    }
+
+
+def test_no_filters_match_every_item():
+    assert listing(build()) == ["a", "b", "c", "d"]
+
+
+def test_no_match_is_empty():
+    index = build()
+    assert listing(index, genres=["Western"]) == []
+    assert listing(index, genres=["Horror"], qualities=["1080p"]) == []
+    assert listing(index, year_from=2020) == []
+
+
+def test_single_facet_is_a_union_of_its_values():
+    index = build()
+    assert listing(index, genres=["drama"]) == ["a", "b"]
+    assert listing(index, genres=["Drama", "Horror"]) == ["a", "b", "d"]
+    assert listing(index, year_from=2000, year_to=2010) == ["b", "c"]
+
+
+def test_facets_intersect():
+    index = build()
+    assert listing(index, genres=["Drama", "Comedy"], qualities=["720p"]) == ["b", "c"]
+    assert listing(index, genres=["Drama"], year_to=2000, qualities=["1080p"]) == ["a"]
+
+
+def test_counts_skip_their_own_facet():
+    index = build()
+    # Selecting a genre keeps the counts of the other genres...
+    assert counts(index, "genre", genres=["Drama"]) == {
+        "Drama": 2,
+        "Comedy": 1,
+        "Horror": 1,
+    }
+    # ...while the other facets only count the selected genre.
+    assert counts(index, "quality", genres=["Drama"]) == {"1080p": 1, "720p": 1}
+    assert counts(index, "genre", qualities=["720p"]) == {"Drama": 1, "Comedy": 1}
+    assert counts(index, "year", genres=["Horror"]) == {"2012": 1}
+
+
+def test_counts_follow_updates_and_removals():
+    index = build()
+    index.add_many([item("a", "Comedy", 1999, "1080p")])
+    index.remove_many(["d"])
+    assert counts(index, "genre") == {"Comedy": 2, "Drama": 1}
+    assert listing(index, genres=["Horror"]) == []
+    assert listing(index) == ["a", "b", "c"]
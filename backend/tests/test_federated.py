@@ -0,0 +1,183 @@
+import asyncio
+import json
+import time
+
+from src.federated import (
+    OmdbProvider,
+    SearchProvider,
+    TmdbProvider,
+    federated_search,
+)
+from src.models import MediaItem
+from src.scraping import Scraper, redact_url
+
+
+def test_redact_url():
+    assert (
+        redact_url("https://user:pw@api.example:8443/3/search?api_key=k#top")
+        == "https://api.example:8443/3/search"
+    )
+    assert redact_url("http://[::1]:8080/x?apikey=k") == "http://[::1]:8080/x"
+
+
+def test_provider_errors_do_not_leak_api_keys(upstream):
+    upstream.routes["/3/search/multi"] = lambda _path: (401, {}, b"{}")
+    upstream.routes["/omdb/"] = lambda _path: (200, {}, b"not json")
+
+    async def search():
+        scraper = Scraper()
+        try:
+            return [
+                result
+                async for result in federated_search(
+                    "river",
+                    [
+                        TmdbProvider(scraper, "tmdb-secret", f"{upstream.url}/3"),
+                        OmdbProvider(scraper, "omdb-secret", f"{upstream.url}/omdb"),
+                    ],
+                    5.0,
+                )
+            ]
+        finally:
+            await scraper.close()
+
+    results = {result.provider: result for result in asyncio.run(search())}
+    assert "HTTP 401" in results["tmdb"].error
+    assert "JSON" in results["omdb"].error
+    for result in results.values():
+        assert "secret" not in result.error
+        assert "river" not in result.error
+    assert any("api_key=tmdb-secret" in path for path in upstream.requests)
+
+
+def test_provider_results(upstream):
+    body = {"results": [{"id": 7, "media_type": "movie", "title": "Midnight River"}]}
+    upstream.serve("/3/search/multi", json.dumps(body).encode(), "application/json")
+
+    async def search():
+        scraper = Scraper()
+        try:
+            provider = TmdbProvider(scraper, "key", f"{upstream.url}/3")
+            return await provider.search("river", 10)
+        finally:
+            await scraper.close()
+
+    assert [item.title for item in asyncio.run(search())] == ["Midnight River"]
+
+
+class FakeProvider(SearchProvider):
+    """Answers with titles after a delay per call, or raises error"""
+
+    def __init__(self, name, titles=(), delays=(0.0,), error=None, **kwargs):
+        super().__init__(name, **kwargs)
+        self.titles = titles
+        self.delays = list(delays)
+        self.error = error
+        self.calls = 0
+        self.cancelled = 0
+        self.cancelled_in_time = 0
+
+    async def search(self, query, limit):
+        delay = self.delays[min(self.calls, len(self.delays) - 1)]
+        self.calls += 1
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        return [
+            MediaItem(id=f"{self.name}-{n}", title=title, metadata={"year": year})
+            for n, (title, year) in enumerate(self.titles)
+        ]
+
+
+def collect(providers, deadline=5.0, stop_after=None):
+    async def search():
+        results = []
+        stream = federated_search("query", providers, deadline)
+        async for result in stream:
+            results.append(result)
+            if len(results) == stop_after:
+                await stream.aclose()
+                break
+        # Let cancelled providers observe their cancellation, and count it
+        # before asyncio.run cancels whatever is still left running.
+        await asyncio.sleep(0.05)
+        for provider in providers:
+            provider.cancelled_in_time = provider.cancelled
+        return results
+
+    return asyncio.run(search())
+
+
+def test_deadline_cuts_off_slow_providers():
+    fast = FakeProvider("fast", [("Dune", "2021")])
+    slow = FakeProvider("slow", [("Heat", "1995")], delays=[10.0], timeout=20.0)
+    failing = FakeProvider("failing", error=RuntimeError("boom"))
+    started = time.monotonic()
+    results = collect([slow, fast, failing], deadline=0.2)
+    assert time.monotonic() - started < 2
+
+    by_name = {result.provider: result for result in results}
+    assert [item.title for item in by_name["fast"].items] == ["Dune"]
+    assert by_name["failing"].error == "boom"
+    assert by_name["slow"].error == "deadline exceeded"
+    assert by_name["slow"].items == []
+    assert results[-1].provider == "slow"
+    # The straggler was cancelled, not left running in the background.
+    assert slow.cancelled_in_time == 1
+
+
+def test_provider_timeout_is_reported():
+    slow = FakeProvider("slow", delays=[10.0], timeout=0.05)
+    (result,) = collect([slow], deadline=5.0)
+    assert result.error == "timeout"
+    assert slow.cancelled_in_time == 1
+
+
+def test_hedged_request_wins_and_cancels_the_first():
+    hedged = FakeProvider(
+        "hedged", [("Dune", "2021")], delays=[10.0, 0.0], hedge_after=0.05
+    )
+    (result,) = collect([hedged], deadline=5.0)
+    assert result.error is None
+    assert [item.title for item in result.items] == ["Dune"]
+    assert result.elapsed_ms < 1000
+    assert hedged.calls == 2
+    assert hedged.cancelled_in_time == 1
+
+    # A provider that answers before hedge_after is only called once.
+    quick = FakeProvider("quick", [("Dune", "2021")], hedge_after=1.0)
+    collect([quick])
+    assert quick.calls == 1
+
+
+def test_closing_the_stream_cancels_stragglers():
+    fast = FakeProvider("fast", [("Dune", "2021")])
+    slow = FakeProvider("slow", delays=[10.0], timeout=20.0)
+    results = collect([fast, slow], deadline=20.0, stop_after=1)
+    assert [result.provider for result in results] == ["fast"]
+    assert slow.cancelled_in_time == 1
+
+
+def test_results_are_merged_by_title_and_year():
+    first = FakeProvider("first", [("The Matrix", "1999"), ("Heat", "1995")])
+    second = FakeProvider(
+        "second",
+        [
+            ("the   MATRIX", "1999-03-31"),
+            ("The Matrix", "2003"),
+            ("Heat", ""),
+        ],
+        delays=[0.05],
+    )
+    first_result, second_result = collect([second, first])
+    assert first_result.provider == "first"
+    assert [item.title for item in first_result.items] == ["The Matrix", "Heat"]
+    # Only items with a new normalized title and year are passed on.
+    assert [(item.title, item.metadata["year"]) for item in second_result.items] == [
+        ("The Matrix", "2003"),
+        ("Heat", ""),
+    ]
@@ -0,0 +1,110 @@
+import os
+
+import pytest
+
+from src.files import FileIndex, parse_range
+
+BODY = bytes(range(256)) * 40  # 10240 bytes
+
+
+@pytest.fixture
+def media_dir(main, tmp_path, monkeypatch):
+    with open(tmp_path / "movie.mp4", "wb") as file:
+        file.write(BODY)
+    monkeypatch.setattr(main, "FILE_INDEX", FileIndex(str(tmp_path)))
+    return tmp_path
+
+
+@pytest.mark.parametrize(
+    "header, ranges",
+    [
+        (None, None),
+        ("bytes=0-99", [(0, 99)]),
+        ("bytes=100-", [(100, 10239)]),
+        ("bytes=-100", [(10140, 10239)]),
+        ("bytes=-20000", [(0, 10239)]),
+        ("bytes=10000-20000", [(10000, 10239)]),
+        ("bytes=0-0,5-9", [(0, 0), (5, 9)]),
+        ("bytes=10240-", []),
+        ("bytes=20000-30000", []),
+        ("bytes=-0", []),
+        ("bytes=9-5", None),
+        ("bytes=abc", None),
+        ("items=0-9", None),
+    ],
+)
+def test_parse_range(header, ranges):
+    assert parse_range(header, len(BODY)) == ranges
+
+
+def test_range_request(client, media_dir):
+    response = client.get("/files/movie.mp4", headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 100-199/10240"
+    assert response.headers["content-length"] == "100"
+    assert response.content == BODY[100:200]
+
+    response = client.get("/files/movie.mp4", headers={"Range": "bytes=-10"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 10230-10239/10240"
+    assert response.content == BODY[-10:]
+
+
+@pytest.mark.parametrize(
+    "header", ["bytes=10240-10300", "bytes=10240-", "bytes=99999-"]
+)
+def test_range_past_the_end(client, media_dir, header):
+    response = client.get("/files/movie.mp4", headers={"Range": header})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */10240"
+
+
+def test_stale_if_range_sends_the_whole_file(client, media_dir):
+    current = client.head("/files/movie.mp4")
+    etag, last_modified = current.headers["etag"], current.headers["last-modified"]
+
+    response = client.get(
+        "/files/movie.mp4", headers={"Range": "bytes=0-9", "If-Range": etag}
+    )
+    assert response.status_code == 206
+    response = client.get(
+        "/files/movie.mp4", headers={"Range": "bytes=0-9", "If-Range": last_modified}
+    )
+    assert response.status_code == 206
+
+    for if_range in (
+        '"stale-etag"',
+        "W/" + etag,
+        "Thu, 01 Jan 1998 00:00:00 GMT",
+    ):
+        response = client.get(
+            "/files/movie.mp4", headers={"Range": "bytes=0-9", "If-Range": if_range}
+        )
+        assert response.status_code == 200
+        assert "content-range" not in response.headers
+        assert response.content == BODY
+
+
+def test_head_and_revalidation(client, media_dir):
+    response = client.head("/files/movie.mp4")
+    assert response.status_code == 200
+    assert response.headers["content-length"] == str(len(BODY))
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-type"] == "video/mp4"
+    assert response.content == b""
+
+    response = client.head("/files/movie.mp4", headers={"Range": "bytes=0-9"})
+    assert response.status_code == 206
+    assert response.headers["content-length"] == "10"
+    assert response.content == b""
+
+    etag = response.headers["etag"]
+    response = client.get("/files/movie.mp4", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+def test_missing_and_escaping_paths(client, media_dir):
+    os.mkdir(media_dir / "folder")
+    assert client.get("/files/missing.mp4").status_code == 404
+    assert client.get("/files/folder").status_code == 404
+    assert client.get("/files/..%2F..%2Fetc%2Fpasswd").status_code == 404
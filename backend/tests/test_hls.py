@@ -0,0 +1,196 @@
+import asyncio
+
+import pytest
+
+from src.hls import SEGMENT, HlsError, HlsProxy
+from src.models import MediaSource
+from src.scraping import Scraper
+
+MASTER = b"""#EXTM3U
+#EXT-X-STREAM-INF:BANDWIDTH=800000
+low/index.m3u8
+#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aac",URI="audio/index.m3u8"
+"""
+MEDIA = b"""#EXTM3U
+#EXT-X-TARGETDURATION:6
+#EXT-X-KEY:METHOD=AES-128,URI="key.bin"
+#EXTINF:6.0,
+seg0.ts
+#EXTINF:6.0,
+https://cdn.example/seg1.ts
+#EXT-X-ENDLIST
+"""
+
+
+@pytest.fixture
+def loopback_is_public(monkeypatch):
+    """Let the proxy's public pool reach the local upstream"""
+    import src.scraping
+
+    is_public = src.scraping.is_public_address
+    monkeypatch.setattr(
+        src.scraping,
+        "is_public_address",
+        lambda host: host == "127.0.0.1" or is_public(host),
+    )
+
+
+def proxied_lines(body: str):
+    return [line for line in body.splitlines() if line and not line.startswith("#EXT")]
+
+
+def test_playlists_and_segments_through_the_api(
+    client, upstream, add_media, loopback_is_public
+):
+    upstream.serve("/v/master.m3u8", MASTER, "application/vnd.apple.mpegurl")
+    upstream.serve("/v/low/index.m3u8", MEDIA, "application/vnd.apple.mpegurl")
+    upstream.serve("/v/low/seg0.ts", b"\x47" * 1000, "video/mp2t")
+    add_media(
+        "hls-a",
+        sources=[
+            MediaSource(name="HLS", url=f"{upstream.url}/v/master.m3u8", quality="auto")
+        ],
+    )
+
+    master = client.get("/hls/hls-a/index.m3u8")
+    assert master.status_code == 200
+    assert master.headers["content-type"].startswith("application/vnd.apple.mpegurl")
+    variant_path = proxied_lines(master.text)[0]
+    assert variant_path.startswith("/hls/hls-a/p/")
+    assert variant_path.endswith("/index.m3u8")
+    assert 'URI="/hls/hls-a/p/' in master.text
+    assert upstream.url not in master.text
+
+    media = client.get(variant_path)
+    assert media.status_code == 200
+    segment_paths = proxied_lines(media.text)
+    assert [path.rsplit("/", 1)[-1] for path in segment_paths] == ["seg0.ts", "seg1.ts"]
+    assert 'URI="/hls/hls-a/s/' in media.text  # the key goes through the proxy too
+
+    for _ in range(2):
+        segment = client.get(segment_paths[0])
+        assert segment.status_code == 200
+        assert segment.content == b"\x47" * 1000
+    assert upstream.requests.count("/v/low/seg0.ts") == 1
+
+    # Tokens are bound to the media id and kind.
+    token = segment_paths[0].split("/")[4]
+    assert client.get(f"/hls/hls-b/s/{token}/seg0.ts").status_code == 403
+    assert client.get(f"/hls/hls-a/p/{token}/seg0.ts").status_code == 403
+
+
+def test_playlist_uris_must_be_public(main, client, upstream, add_media):
+    # The catalog names a local origin; its playlist names local URIs too.
+    upstream.serve("/v/master.m3u8", MASTER, "application/vnd.apple.mpegurl")
+    upstream.serve("/v/low/index.m3u8", MEDIA, "application/vnd.apple.mpegurl")
+    add_media(
+        "hls-local",
+        sources=[
+            MediaSource(name="HLS", url=f"{upstream.url}/v/master.m3u8", quality="auto")
+        ],
+    )
+    master = client.get("/hls/hls-local/index.m3u8")
+    assert master.status_code == 200
+
+    variant = client.get(proxied_lines(master.text)[0])
+    assert variant.status_code == 502
+    assert "public address" in variant.json()["detail"]
+    assert upstream.requests == ["/v/master.m3u8"]
+
+    # A segment URI as a local playlist would have it signed.
+    segment_path = main.HLS_PROXY.proxy_path(
+        "", "hls-local", SEGMENT, f"{upstream.url}/v/low/seg0.ts"
+    )
+    segment = client.get(segment_path)
+    assert segment.status_code == 502
+    assert "public address" in segment.json()["detail"]
+    assert client.get(segment_path, headers={"Range": "bytes=0-9"}).status_code == 502
+    assert upstream.requests == ["/v/master.m3u8"]
+
+
+def run_with_proxy(test, **options):
+    async def run():
+        proxy = HlsProxy(Scraper(), secret=b"secret", **options)
+        try:
+            return await test(proxy)
+        finally:
+            await proxy.scraper.close()
+
+    return asyncio.run(run())
+
+
+async def fetch(proxy, url):
+    status, headers, chunks = await proxy.segment(url)
+    return status, headers, b"".join([chunk async for chunk in chunks])
+
+
+def test_concurrent_requests_share_one_download(upstream, loopback_is_public):
+    body = bytes(range(256)) * 1024
+    upstream.serve("/seg.ts", body, "video/mp2t")
+    url = f"{upstream.url}/seg.ts"
+
+    async def test(proxy):
+        first = await asyncio.gather(*(fetch(proxy, url) for _ in range(4)))
+        cached = await fetch(proxy, url)
+        return first, cached, proxy.origin_requests
+
+    first, cached, origin_requests = run_with_proxy(test)
+    assert {result[2] for result in first} == {body}
+    assert cached == (
+        200,
+        {"Content-Type": "video/mp2t", "Content-Length": str(len(body))},
+        body,
+    )
+    assert origin_requests == 1
+    assert upstream.requests == ["/seg.ts"]
+
+
+def test_oversized_segments_are_passed_through(upstream, loopback_is_public):
+    body = b"x" * 300_000
+    upstream.serve("/big.ts", body, "video/mp2t")
+    url = f"{upstream.url}/big.ts"
+
+    async def test(proxy):
+        first = await asyncio.gather(*(fetch(proxy, url) for _ in range(2)))
+        assert url not in proxy._downloads
+        assert proxy.segments.get(url) is None
+        later = await fetch(proxy, url)
+        return first, later
+
+    first, later = run_with_proxy(test, max_segment_bytes=100_000)
+    assert [result[2] for result in first] == [body, body]
+    assert later[2] == body
+    # One shared download, then a passthrough request for the later viewer.
+    assert upstream.requests == ["/big.ts", "/big.ts"]
+
+
+def test_unshared_download_drops_chunks_once_read():
+    from src.hls import _Download
+
+    async def test():
+        download = _Download()
+        first, second = download.join(), download.join()
+        download.chunks.extend([b"a", b"b", b"c"])
+        download.unshare()
+        reader = download.follow(first)
+        assert [await reader.__anext__() for _ in range(3)] == [b"a", b"b", b"c"]
+        assert download.chunks == [b"a", b"b", b"c"]  # second has read none
+        other = download.follow(second)
+        assert await other.__anext__() == b"a"
+        assert download.chunks == [b"b", b"c"]
+        await other.aclose()
+        assert download.chunks == []
+        await reader.aclose()
+
+    asyncio.run(test())
+
+
+def test_upstream_errors(upstream, loopback_is_public):
+    async def test(proxy):
+        with pytest.raises(HlsError, match="HTTP 404"):
+            await proxy.segment(f"{upstream.url}/missing.ts")
+        with pytest.raises(HlsError, match="not an HLS playlist"):
+            upstream.serve("/fake.m3u8", b"<html>")
+            await proxy.playlist("m", f"{upstream.url}/fake.m3u8", "")
+
+    run_with_proxy(test)
@@ -0,0 +1,62 @@
+import sqlite3
+
+from src.catalog import SQLiteCatalog
+from src.indexes import (
+    build_indexes,
+    index_snapshot_path,
+    load_index_snapshot,
+    write_index_snapshot,
+)
+from src.models import MediaItem
+
+
+def item(media_id, title, genre="Drama"):
+    return MediaItem(id=media_id, title=title, sources=[], metadata={"genre": genre})
+
+
+def test_index_snapshot_is_reused_until_the_database_changes(tmp_path):
+    path = str(tmp_path / "catalog.db")
+    catalog = SQLiteCatalog(path)
+    catalog.upsert_many([item("a", "Midnight River"), item("b", "Holiday Inn")])
+    assert write_index_snapshot(catalog, build_indexes(catalog)) is not None
+    catalog.close()
+
+    catalog = SQLiteCatalog(path)
+    indexes = load_index_snapshot(catalog)
+    assert indexes is not None
+    assert [doc_id for doc_id, _ in indexes.search.search("river")] == ["a"]
+    assert [s[0] for s in indexes.suggest.suggest("hol", 5)] == ["b"]
+
+    # Changes made through this connection keep the snapshot writable.
+    song = item("c", "River Song")
+    catalog.upsert(song)
+    indexes.search.add(song.id, song.title)
+    indexes.suggest.add_many([(song.id, song.title, 0.0)])
+    indexes.facets.add_many([song])
+    assert write_index_snapshot(catalog, indexes) is not None
+    catalog.close()
+
+    # A change from any other connection makes the snapshot stale.
+    with sqlite3.connect(path) as conn:
+        conn.execute("DELETE FROM media WHERE id = 'a'")
+    catalog = SQLiteCatalog(path)
+    assert load_index_snapshot(catalog) is None
+    catalog.close()
+
+
+def test_index_snapshot_is_not_written_after_another_writer(tmp_path):
+    path = str(tmp_path / "catalog.db")
+    catalog = SQLiteCatalog(path)
+    catalog.upsert(item("a", "Midnight River"))
+    indexes = build_indexes(catalog)
+    other = SQLiteCatalog(path)
+    other.upsert(item("b", "Holiday Inn"))
+    other.close()
+
+    assert write_index_snapshot(catalog, indexes) is None
+    catalog.upsert(item("c", "River Song"))
+    assert catalog.generation is None
+    assert write_index_snapshot(catalog, indexes) is None
+    catalog.close()
+    assert not (tmp_path / "catalog.db.indexes").exists()
+    assert index_snapshot_path(catalog) == path + ".indexes"
@@ -0,0 +1,60 @@
+import asyncio
+import gzip
+import json
+import zlib
+
+import pytest
+
+from src.compact import CompactCatalog
+from src.ingest import IngestError, ingest
+
+
+def ndjson(start, count):
+    return b"".join(
+        json.dumps({"id": f"m{n}", "title": f"Title {n}", "sources": []}).encode()
+        + b"\n"
+        for n in range(start, start + count)
+    )
+
+
+def run_ingest(data, chunk_size=7):
+    async def chunks():
+        for offset in range(0, len(data), chunk_size):
+            yield data[offset : offset + chunk_size]
+
+    catalog = CompactCatalog()
+    report = asyncio.run(ingest(catalog, chunks(), batch_size=3))
+    return catalog, report
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 16])
+def test_plain_and_compressed_uploads(chunk_size):
+    for data in (
+        ndjson(0, 10),
+        gzip.compress(ndjson(0, 10)),
+        zlib.compress(ndjson(0, 10)),
+    ):
+        catalog, report = run_ingest(data, chunk_size)
+        assert (report.lines, report.upserted, report.failed) == (10, 10, 0)
+        assert len(catalog) == 10
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 16])
+def test_multi_member_gzip(chunk_size):
+    data = (
+        gzip.compress(ndjson(0, 4))
+        + gzip.compress(ndjson(4, 3))
+        + gzip.compress(ndjson(7, 5))
+    )
+    catalog, report = run_ingest(data, chunk_size)
+    assert report.compressed
+    assert (report.lines, report.upserted) == (12, 12)
+    assert sorted(item.id for item in catalog) == sorted(f"m{n}" for n in range(12))
+
+
+def test_truncated_and_trailing_data():
+    data = gzip.compress(ndjson(0, 4)) + gzip.compress(ndjson(4, 4))
+    with pytest.raises(IngestError, match="Truncated"):
+        run_ingest(data[:-5])
+    with pytest.raises(IngestError, match="Corrupt"):
+        run_ingest(data + b"trailing junk")
@@ -0,0 +1,152 @@
+import json
+
+from src.models import MAX_BATCH_IDS
+
+
+def test_next_link_only_carries_cached_parameters(client, add_media):
+    add_media("link-a", metadata={"genre": "Drama"})
+    add_media("link-b", metadata={"genre": "Drama"})
+
+    first = client.get("/media", params={"limit": 1, "utm_source": "<script>"})
+    assert first.headers["link"] == (
+        f'</media?after={first.json()[0]["id"]}&limit=1>; rel="next"'
+    )
+    # The cached page is shared with requests that sent other parameters.
+    second = client.get("/media", params={"limit": 1})
+    assert second.headers["link"] == first.headers["link"]
+
+    response = client.get(
+        "/media", params={"genre": "Drama", "limit": 1, "utm_source": "x"}
+    )
+    assert response.headers["link"] == (
+        '</media?genre=drama&after=link-a&limit=1>; rel="next"'
+    )
+
+
+def walk(client, url, params):
+    """Follow the Link headers of a listing, returning ids per page"""
+    pages = []
+    while True:
+        response = client.get(url, params=params)
+        assert response.status_code == 200
+        body = response.json()
+        items = body["items"] if isinstance(body, dict) else body
+        pages.append([item["id"] for item in items])
+        if "link" not in response.headers:
+            assert "x-next-cursor" not in response.headers
+            return pages
+        assert response.headers["x-next-cursor"] == pages[-1][-1]
+        url, params = response.headers["link"][1:].split(">;")[0], None
+
+
+def test_cursor_pagination_follows_links(client, add_media, main):
+    for n in range(5):
+        add_media(f"page-{n}", metadata={"genre": "Western"})
+    every = [item.id for item in main.CATALOG.iter_from(None)]
+
+    pages = walk(client, "/media", {"limit": 2})
+    assert sum(pages, []) == every
+    assert all(len(page) == 2 for page in pages[:-1])
+
+    pages = walk(client, "/media", {"genre": "western", "limit": 2})
+    assert pages == [["page-0", "page-1"], ["page-2", "page-3"], ["page-4"]]
+
+
+def test_unknown_cursor(client, add_media):
+    add_media("cursor-a", metadata={"genre": "Western"})
+    response = client.get("/media", params={"genre": "western", "after": "nope"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Unknown cursor"
+    response = client.get(
+        "/media",
+        params={"genre": "western", "after": "nope"},
+        headers={"Accept": "application/x-ndjson"},
+    )
+    assert response.status_code == 400
+    # Without filters the cursor is only a position in id order.
+    response = client.get("/media", params={"after": "page-"})
+    assert response.status_code == 200
+
+
+def test_ndjson_streams_one_item_per_line(client, add_media, main):
+    for n in range(3):
+        add_media(f"stream-{n}", metadata={"genre": "Western"})
+    ndjson = {"Accept": "application/x-ndjson"}
+    every = [item.id for item in main.CATALOG.iter_from(None)]
+
+    response = client.get("/media", headers=ndjson)
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.text.endswith("\n")
+    lines = response.text.splitlines()
+    assert [json.loads(line)["id"] for line in lines] == every
+
+    response = client.get(
+        "/media", params={"after": "stream-0", "limit": 1}, headers=ndjson
+    )
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == [
+        "stream-1"
+    ]
+    response = client.get("/media", params={"genre": "western"}, headers=ndjson)
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == [
+        "stream-0",
+        "stream-1",
+        "stream-2",
+    ]
+
+
+def test_etag_revalidation_and_invalidation(client, add_media):
+    add_media("etag-a", title="Before")
+    for url in ("/media/etag-a", "/media"):
+        response = client.get(url)
+        etag = response.headers["etag"]
+        for if_none_match in (etag, "W/" + etag, f'"other", {etag}', "*"):
+            revalidated = client.get(url, headers={"If-None-Match": if_none_match})
+            assert revalidated.status_code == 304
+            assert revalidated.content == b""
+            assert revalidated.headers["etag"] == etag
+        assert client.get(url, headers={"If-None-Match": '"other"'}).status_code == 200
+
+    item_etag = client.get("/media/etag-a").headers["etag"]
+    list_etag = client.get("/media").headers["etag"]
+    add_media("etag-a", title="After")
+    response = client.get("/media/etag-a", headers={"If-None-Match": item_etag})
+    assert response.status_code == 200
+    assert response.json()["title"] == "After"
+    assert response.headers["etag"] != item_etag
+    response = client.get("/media", headers={"If-None-Match": list_etag})
+    assert response.status_code == 200
+    titles = {item["id"]: item["title"] for item in response.json()}
+    assert titles["etag-a"] == "After"
+
+
+def test_batch_keeps_request_order(client, add_media):
+    add_media("batch-a", description="first")
+    add_media("batch-b", description="second")
+
+    ids = ["batch-b", "gone", "batch-a", "gone", "batch-b"]
+    response = client.post("/media/batch", json={"ids": ids})
+    assert response.status_code == 200
+    body = response.json()
+    assert [item and item["id"] for item in body["items"]] == [
+        "batch-b",
+        None,
+        "batch-a",
+        None,
+        "batch-b",
+    ]
+    assert body["items"][2] == client.get("/media/batch-a").json()
+    assert body["missing"] == ["gone"]
+
+    response = client.post(
+        "/media/batch", json={"ids": ["gone", "batch-a"], "fields": ["description"]}
+    )
+    assert response.json() == {
+        "items": [None, {"id": "batch-a", "description": "first"}],
+        "missing": ["gone"],
+    }
+    assert client.post("/media/batch", json={"ids": []}).json() == {
+        "items": [],
+        "missing": [],
+    }
+    too_many = {"ids": ["batch-a"] * (MAX_BATCH_IDS + 1)}
+    assert client.post("/media/batch", json=too_many).status_code == 422
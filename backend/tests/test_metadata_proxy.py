@@ -0,0 +1,121 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from src.metadata_proxy import MetadataError, MetadataProxy
+from src.scraping import Scraper
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def serve_json(upstream, path, value, delay=0.0):
+    def route(_path):
+        time.sleep(delay)
+        return 200, {"Content-Type": "application/json"}, json.dumps(value).encode()
+
+    upstream.routes[path] = route
+
+
+def run(test, **options):
+    """Run test(proxy) against a proxy with its own scraper"""
+
+    async def main():
+        scraper = Scraper()
+        try:
+            return await test(MetadataProxy(scraper, **options))
+        finally:
+            await scraper.close()
+
+    return asyncio.run(main())
+
+
+def test_concurrent_misses_share_one_request(upstream):
+    serve_json(upstream, "/search", {"title": "Midnight River"}, delay=0.2)
+    url = f"{upstream.url}/search?q=river"
+
+    async def test(proxy):
+        entries = await asyncio.gather(*(proxy.get("river", url) for _ in range(5)))
+        return entries, proxy.stats()
+
+    entries, stats = run(test)
+    assert [entry.json()["title"] for entry in entries] == ["Midnight River"] * 5
+    assert len(upstream.requests) == 1
+    assert stats.misses == 5
+    assert stats.coalesced == 4
+    assert stats.upstream_requests == 1
+
+
+def test_stale_entry_is_served_while_revalidating(upstream):
+    serve_json(upstream, "/search", {"version": 1})
+    url = f"{upstream.url}/search"
+    clock = Clock()
+
+    async def test(proxy):
+        await proxy.get("river", url)
+        serve_json(upstream, "/search", {"version": 2})
+        assert (await proxy.get("river", url)).json() == {"version": 1}
+
+        clock.now += 11
+        # Every stale lookup is answered at once; one request refreshes them.
+        stale = await asyncio.gather(*(proxy.get("river", url) for _ in range(3)))
+        assert [entry.json() for entry in stale] == [{"version": 1}] * 3
+        await asyncio.gather(*proxy._revalidating.values())
+        assert (await proxy.get("river", url)).json() == {"version": 2}
+        return proxy.stats()
+
+    stats = run(test, ttl=10, stale_ttl=60, clock=clock)
+    assert len(upstream.requests) == 2
+    assert stats.stale_hits == 3
+    assert stats.revalidations == 1
+    assert stats.memory_hits == 2
+
+
+def test_expired_entry_is_served_when_upstream_fails(upstream):
+    serve_json(upstream, "/search", {"version": 1})
+    url = f"{upstream.url}/search"
+    clock = Clock()
+
+    async def test(proxy):
+        await proxy.get("river", url)
+        upstream.routes["/search"] = lambda _path: (503, {}, b"unavailable")
+        clock.now += 1000
+        entry = await proxy.get("river", url)
+        with pytest.raises(MetadataError, match="lake"):
+            await proxy.get("lake", url)
+        return entry, proxy.stats()
+
+    entry, stats = run(test, ttl=10, stale_ttl=60, clock=clock)
+    assert entry.json() == {"version": 1}
+    assert stats.stale_hits == 1
+    assert stats.upstream_errors == 2
+
+
+def test_disk_tier_survives_a_restart(upstream, tmp_path):
+    serve_json(upstream, "/search", {"title": "Midnight River"})
+    url = f"{upstream.url}/search"
+    clock = Clock()
+    options = {"cache_dir": str(tmp_path), "ttl": 10, "clock": clock}
+
+    async def fetch(proxy):
+        await proxy.get("river", url)
+
+    async def reload(proxy):
+        entry = await proxy.get("river", url)
+        # Now in memory as well.
+        await proxy.get("river", url)
+        return entry, proxy.stats()
+
+    run(fetch, **options)
+    entry, stats = run(reload, **options)
+    assert entry.json() == {"title": "Midnight River"}
+    assert len(upstream.requests) == 1
+    assert (stats.disk_hits, stats.memory_hits, stats.misses) == (1, 1, 0)
+    assert stats.disk_entries == 1
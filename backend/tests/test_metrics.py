@@ -0,0 +1,82 @@
+from src.metrics import PROMETHEUS_MEDIA_TYPE, Histogram
+
+
+def scrape(client):
+    """Series of /metrics as {name{labels}: value}"""
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == PROMETHEUS_MEDIA_TYPE
+    series = {}
+    for line in response.text.splitlines():
+        if line and not line.startswith("#"):
+            name, _, value = line.rpartition(" ")
+            series[name] = float(value)
+    return series
+
+
+def delta(before, after, name):
+    return after.get(name, 0) - before.get(name, 0)
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram((1.0, 2.0))
+    for value in (0.5, 1.0, 1.5, 3.0):
+        histogram.observe(value)
+    lines = []
+    histogram.render("h", 'route="/x"', lines)
+    assert lines == [
+        'h_bucket{route="/x",le="1"} 2',
+        'h_bucket{route="/x",le="2"} 3',
+        'h_bucket{route="/x",le="+Inf"} 4',
+        'h_sum{route="/x"} 6.000000',
+        'h_count{route="/x"} 4',
+    ]
+
+
+def test_requests_are_counted_per_route_template(client, add_media):
+    add_media("metrics-a")
+    add_media("metrics-b")
+    before = scrape(client)
+    assert client.get("/media/metrics-a").status_code == 200
+    assert client.get("/media/metrics-b").status_code == 200
+    assert client.get("/media/metrics-missing").status_code == 404
+    assert client.get("/no/such/path").status_code == 404
+    after = scrape(client)
+
+    route = 'method="GET",route="/media/{media_id}"'
+    assert (
+        delta(before, after, f'streamy_http_requests_total{{{route},status="200"}}')
+        == 2
+    )
+    assert (
+        delta(before, after, f'streamy_http_requests_total{{{route},status="404"}}')
+        == 1
+    )
+    # Unknown paths share one series rather than one per path.
+    unmatched = 'method="GET",route="unmatched"'
+    assert (
+        delta(before, after, f'streamy_http_requests_total{{{unmatched},status="404"}}')
+        == 1
+    )
+    assert not any("/no/such/path" in name for name in after)
+
+    for family in (
+        "streamy_http_request_duration_seconds",
+        "streamy_http_handler_duration_seconds",
+        "streamy_http_response_size_bytes",
+    ):
+        assert delta(before, after, f"{family}_count{{{route}}}") == 3
+        assert delta(before, after, f'{family}_bucket{{{route},le="+Inf"}}') == 3
+    # Only the endpoints that returned a result were serialized.
+    assert (
+        delta(
+            before,
+            after,
+            f"streamy_http_serialization_duration_seconds_count{{{route}}}",
+        )
+        == 2
+    )
+    assert delta(before, after, f"streamy_http_response_size_bytes_sum{{{route}}}") > 0
+    # Nothing is left in flight except the scrape itself.
+    assert after[f"streamy_http_requests_in_flight{{{route}}}"] == 0
+    assert after['streamy_http_requests_in_flight{method="GET",route="/metrics"}'] == 1
@@ -0,0 +1,139 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+from src.catalog import SQLiteCatalog
+from src.indexes import load_index_snapshot
+from src.models import MediaItem
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs share_catalog() in a fresh interpreter, as the supervisor does.
+_SHARE = """
+import json, os, sys
+import run
+temporary = run.share_catalog()
+print(json.dumps({
+    "temporary": temporary,
+    "db": os.environ["STREAMY_CATALOG_DB"],
+    "readonly": os.environ.get("STREAMY_CATALOG_READONLY"),
+    "imported_main": "src.main" in sys.modules,
+}))
+"""
+
+
+def share(database: str) -> dict:
+    environ = dict(os.environ, STREAMY_CATALOG_DB=database)
+    result = subprocess.run(
+        [sys.executable, "-c", _SHARE],
+        cwd=BACKEND_DIR,
+        env=environ,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def journal_mode(path: str) -> str:
+    with sqlite3.connect(path) as conn:
+        return conn.execute("PRAGMA journal_mode").fetchone()[0]
+
+
+def test_share_catalog_copies_the_database(tmp_path):
+    database = str(tmp_path / "catalog.db")
+    catalog = SQLiteCatalog(database)
+    catalog.upsert_many(
+        MediaItem(id=f"m{n}", title=f"Title {n}", sources=[]) for n in range(20)
+    )
+    catalog.close()
+
+    shared = share(database)
+    assert shared["imported_main"] is False
+    assert shared["readonly"] == "1"
+    assert shared["db"] != database
+    assert shared["temporary"] == [shared["db"], shared["db"] + ".indexes"]
+
+    # The database keeps WAL mode; workers get a rollback-journal copy.
+    assert journal_mode(database) == "wal"
+    assert journal_mode(shared["db"]) == "delete"
+    copy = SQLiteCatalog(shared["db"], readonly=True)
+    assert len(copy) == 20
+    indexes = load_index_snapshot(copy)
+    assert indexes is not None
+    assert [doc_id for doc_id, _ in indexes.search.search("title 7")][0] == "m7"
+    copy.close()
+
+    # The indexes were saved for the database too.
+    catalog = SQLiteCatalog(database)
+    assert load_index_snapshot(catalog) is not None
+    catalog.close()
+    for path in shared["temporary"]:
+        os.unlink(path)
+
+
+def test_share_catalog_without_database(tmp_path):
+    environ = {
+        k: v
+        for k, v in os.environ.items()
+        if k not in ("STREAMY_CATALOG_DB", "STREAMY_CATALOG_READONLY")
+    }
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            _SHARE.replace('os.environ["STREAMY_CATALOG_DB"]', "None"),
+        ],
+        cwd=BACKEND_DIR,
+        env=environ,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert '"temporary": []' in result.stdout
+    assert '"imported_main": false' in result.stdout
+    # Each worker keeps its own writable in-memory catalog.
+    assert '"readonly": null' in result.stdout
+
+
+# A worker started by the supervisor: a fresh interpreter, with the
+# environment share_catalog() leaves, listing the catalog.
+_WORKER = """
+import json
+from fastapi.testclient import TestClient
+import src.main
+with TestClient(src.main.app) as client:
+    print(json.dumps([item["id"] for item in client.get("/media").json()]))
+"""
+
+
+def python(script: str, environ: dict) -> str:
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=BACKEND_DIR,
+        env=environ,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout.splitlines()[-1]
+
+
+def test_worker_without_database_lists_the_sample_catalog():
+    environ = {
+        name: value
+        for name, value in os.environ.items()
+        if name
+        not in (
+            "STREAMY_CATALOG_DB",
+            "STREAMY_CATALOG_SNAPSHOT",
+            "STREAMY_CATALOG_READONLY",
+        )
+    }
+    shared = python(
+        "import json, os, run; run.share_catalog(); print(json.dumps(dict(os.environ)))",
+        environ,
+    )
+    assert python(_WORKER, json.loads(shared)) == '["movie1", "movie2"]'
@@ -0,0 +1,84 @@
+import pytest
+
+from src.models import WebSource
+from src.scraping import is_public_address
+
+RESULTS_PAGE = b"""
+<html><body>
+  <div class="movie-item">
+    <a href="/watch/1"><img src="/posters/1.jpg"></a>
+    <h3>Midnight River</h3><span class="year">2019</span>
+  </div>
+  <div class="movie-item">
+    <a href="/watch/2"></a><h3>Holiday Inn</h3>
+  </div>
+</body></html>
+"""
+
+
+@pytest.fixture
+def configured_source(main, upstream, monkeypatch):
+    source = WebSource(id="local", name="Local", baseUrl=upstream.url)
+    monkeypatch.setattr(main, "WEB_SOURCES", [source])
+    upstream.serve("/search", RESULTS_PAGE)
+    return source
+
+
+def test_search_configured_sources(client, upstream, configured_source):
+    response = client.post("/scrape/search", json={"query": "river night"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["errors"] == {}
+    assert [item["title"] for item in body["results"]] == [
+        "Midnight River",
+        "Holiday Inn",
+    ]
+    first = body["results"][0]
+    assert first["thumbnail"] == f"{upstream.url}/posters/1.jpg"
+    assert first["sources"][0]["url"] == f"{upstream.url}/watch/1"
+    assert first["metadata"]["year"] == "2019"
+    assert upstream.requests == ["/search?q=river%20night"]
+
+
+def test_search_limit(client, configured_source):
+    response = client.post("/scrape/search", json={"query": "x", "limit": 1})
+    assert [item["title"] for item in response.json()["results"]] == ["Midnight River"]
+    for limit in (0, 101):
+        response = client.post("/scrape/search", json={"query": "x", "limit": limit})
+        assert response.status_code == 422
+
+
+def test_client_sources_cannot_reach_private_addresses(client, upstream):
+    upstream.serve("/search", RESULTS_PAGE)
+    sources = [
+        {"id": "loopback", "name": "Loopback", "baseUrl": upstream.url},
+        {"id": "localhost", "name": "Localhost", "baseUrl": "http://localhost:1"},
+        {"id": "metadata", "name": "Metadata", "baseUrl": "http://169.254.169.254"},
+    ]
+    response = client.post("/scrape/search", json={"query": "x", "sources": sources})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["results"] == []
+    assert set(body["errors"]) == {"loopback", "localhost", "metadata"}
+    assert all("public address" in error for error in body["errors"].values())
+    assert upstream.requests == []
+
+
+@pytest.mark.parametrize(
+    "address, public",
+    [
+        ("93.184.216.34", True),
+        ("2606:2800:220:1:248:1893:25c8:1946", True),
+        ("127.0.0.1", False),
+        ("10.1.2.3", False),
+        ("192.168.0.1", False),
+        ("169.254.169.254", False),
+        ("100.64.0.1", False),
+        ("::1", False),
+        ("::ffff:127.0.0.1", False),
+        ("fe80::1%eth0", False),
+        ("0.0.0.0", False),
+    ],
+)
+def test_is_public_address(address, public):
+    assert is_public_address(address) is public
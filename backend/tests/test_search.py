@@ -0,0 +1,32 @@
+from src.search import SearchIndex
+
+
+def test_add_many_keeps_vocabulary_sorted():
+    index = SearchIndex()
+    index.add("a", "Zebra crossing")
+    index.add_many(
+        [
+            ("b", "Apple orchard", "A quiet harvest"),
+            ("c", "Midnight river", None),
+            # Replaces "b" within the batch; "orchard" and "harvest" go away.
+            ("b", "Apple pie", None),
+        ]
+    )
+    assert index._vocabulary == sorted(index._vocabulary)
+    assert "orchard" not in index._vocabulary
+    assert "harvest" not in index._vocabulary
+    assert [doc_id for doc_id, _ in index.search("app")] == ["b"]
+    assert [doc_id for doc_id, _ in index.search("river")] == ["c"]
+
+
+def test_add_many_matches_one_at_a_time():
+    documents = [
+        (f"m{n}", f"Title {n} word{n % 7}", f"about {n % 3}") for n in range(50)
+    ]
+    batched = SearchIndex()
+    batched.add_many(documents)
+    single = SearchIndex()
+    for document in documents:
+        single.add(*document)
+    assert batched._vocabulary == single._vocabulary
+    assert batched.search("word3 about", 10) == single.search("word3 about", 10)
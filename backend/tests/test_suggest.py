@@ -0,0 +1,112 @@
+import time
+
+from src.snapshot import Snapshot, SnapshotWriter
+from src.suggest import MAX_LIMIT, SuggestIndex
+
+TITLES = [
+    ("dark-knight", "The Dark Knight", 90.0),
+    ("darkest-hour", "Darkest Hour", 40.0),
+    ("dark-city", "Dark City", 60.0),
+    ("knives-out", "Knives Out", 70.0),
+    ("godfather", "The Godfather", 95.0),
+]
+
+
+def build(documents=TITLES):
+    index = SuggestIndex()
+    index.build(documents)
+    return index
+
+
+def ids(index, query, limit=10):
+    return [media_id for media_id, _ in index.suggest(query, limit)]
+
+
+def wait_for_merge(index):
+    deadline = time.monotonic() + 10
+    while index._merging:
+        assert time.monotonic() < deadline, "merge did not finish"
+        time.sleep(0.01)
+
+
+def test_prefixes_rank_by_popularity():
+    index = build()
+    assert ids(index, "dar") == ["dark-knight", "dark-city", "darkest-hour"]
+    # Any word of a title starts a match, and the limit cuts the ranking.
+    assert ids(index, "kn") == ["dark-knight", "knives-out"]
+    assert ids(index, "dar", limit=1) == ["dark-knight"]
+    assert ids(index, "dark k") == ["dark-knight"]
+    assert index.suggest("the god", 5) == [("godfather", "The Godfather")]
+
+
+def test_typos_are_corrected_when_prefixes_run_out():
+    index = build()
+    assert ids(index, "godfahter") == ["godfather"]
+    assert ids(index, "knievs") == ["knives-out"]
+    # Exact completions come first; corrections only fill the rest.
+    assert ids(index, "dakr") == ["dark-knight", "dark-city", "darkest-hour"]
+    assert ids(index, "xyzzy") == []
+    # Tokens this short are never corrected.
+    assert ids(index, "dq") == []
+
+
+def test_updates_are_visible_before_and_after_a_merge():
+    index = build()
+    index.add_many([("dark-water", "Dark Water", 80.0)])
+    index.remove_many(["dark-knight"])
+    assert ids(index, "dark") == ["dark-water", "dark-city", "darkest-hour"]
+
+    # Enough new entries to fold the delta into the static part.
+    extra = [(f"film-{n}", f"Film Number {n}", 1.0) for n in range(3000)]
+    index.add_many(extra)
+    wait_for_merge(index)
+    assert len(index._delta) < 4096
+    index.add_many([("dark-star", "Dark Star", 85.0)])
+    index.set_popularity("dark-city", 99.0)
+    assert ids(index, "dark") == [
+        "dark-city",
+        "dark-star",
+        "dark-water",
+        "darkest-hour",
+    ]
+    assert ids(index, "film number 2999")[0] == "film-2999"
+    assert len(index) == 4 + 1 + 3000 + 1
+
+
+def test_snapshot_loads_the_merged_index(tmp_path):
+    index = build()
+    index.add_many([("dark-water", "Dark Water", 80.0)])
+    path = str(tmp_path / "suggest.snapshot")
+    media_ids = sorted([media_id for media_id, _, _ in TITLES] + ["dark-water"])
+    with SnapshotWriter(path) as writer:
+        writer.add_strings("catalog.ids", media_ids)
+        index.write_snapshot(
+            writer, {media_id: position for position, media_id in enumerate(media_ids)}
+        )
+
+    loaded = SuggestIndex.from_snapshot(Snapshot(path))
+    assert len(loaded) == 6
+    assert ids(loaded, "dar") == ids(index, "dar")
+    assert ids(loaded, "godfahter") == ["godfather"]
+    loaded.remove_many(["godfather"])
+    loaded.add_many([("god-of-war", "God of War", 10.0)])
+    assert ids(loaded, "god") == ["god-of-war"]
+
+
+def test_suggest_endpoint_limits(client, add_media):
+    for n in range(MAX_LIMIT + 5):
+        add_media(f"sg-{n}", title=f"Suggestible {n}")
+    response = client.get("/suggest", params={"q": "suggestib", "limit": MAX_LIMIT})
+    assert response.status_code == 200
+    assert response.json()["query"] == "suggestib"
+    assert len(response.json()["suggestions"]) == MAX_LIMIT
+
+    response = client.get("/suggest", params={"q": "suggestib"})
+    assert len(response.json()["suggestions"]) == 10
+    for params in (
+        {"q": "suggestib", "limit": 0},
+        {"q": "suggestib", "limit": MAX_LIMIT + 1},
+        {"q": "s" * 201},
+    ):
+        assert client.get("/suggest", params=params).status_code == 422
+    assert client.get("/suggest", params={"q": "  "}).json()["suggestions"] == []
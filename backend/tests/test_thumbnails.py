@@ -0,0 +1,87 @@
+import asyncio
+from io import BytesIO
+
+from PIL import Image
+
+from src.scraping import Scraper
+from src.thumbnails import ThumbnailService, snap_width
+
+
+def png(width=800, height=400) -> bytes:
+    output = BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(output, "PNG")
+    return output.getvalue()
+
+
+def decode(body: bytes) -> Image.Image:
+    return Image.open(BytesIO(body))
+
+
+def test_snap_width():
+    assert [snap_width(w) for w in (1, 92, 93, 342, 781, 4096)] == [
+        92,
+        92,
+        154,
+        342,
+        780,
+        780,
+    ]
+
+
+def test_thumbnail_resizes_and_caches(client, upstream, add_media):
+    upstream.serve("/poster-a.png", png(), "image/png")
+    add_media("thumb-a", sources=[], thumbnail=f"{upstream.url}/poster-a.png")
+
+    response = client.get("/thumbnail/thumb-a?w=300")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpeg"
+    assert response.headers["vary"] == "Accept"
+    image = decode(response.content)
+    assert (image.format, image.size) == ("JPEG", (342, 171))
+
+    response = client.get(
+        "/thumbnail/thumb-a?w=100", headers={"Accept": "image/webp,*/*"}
+    )
+    assert response.headers["content-type"] == "image/webp"
+    assert decode(response.content).size == (154, 77)
+
+    # Repeated and conditional requests are served from the caches.
+    etag = client.get("/thumbnail/thumb-a?w=300&fmt=jpeg").headers["etag"]
+    response = client.get(
+        "/thumbnail/thumb-a?w=300&fmt=jpeg", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert upstream.requests == ["/poster-a.png"]
+
+
+def test_thumbnail_errors(client, upstream, add_media):
+    assert client.get("/thumbnail/no-such-item").status_code == 404
+    upstream.serve("/broken.png", b"not an image", "image/png")
+    add_media("thumb-broken", sources=[], thumbnail=f"{upstream.url}/broken.png")
+    response = client.get("/thumbnail/thumb-broken")
+    assert response.status_code == 502
+    assert "cannot decode" in response.json()["detail"]
+
+
+def test_concurrent_requests_share_one_fetch_and_disk_cache(upstream, tmp_path):
+    upstream.serve("/poster-b.png", png(), "image/png")
+    url = f"{upstream.url}/poster-b.png"
+
+    async def render_all(service):
+        try:
+            return await asyncio.gather(
+                *(service.get(url, 342, "jpeg") for _ in range(8))
+            )
+        finally:
+            await service.scraper.close()
+            service.close()
+
+    service = ThumbnailService(Scraper(), cache_dir=str(tmp_path))
+    bodies = asyncio.run(render_all(service))
+    assert len(set(bodies)) == 1
+    assert upstream.requests == ["/poster-b.png"]
+
+    # A new service (e.g. after a restart) reads the variant from disk.
+    reloaded = ThumbnailService(Scraper(), cache_dir=str(tmp_path))
+    assert asyncio.run(render_all(reloaded)) == bodies
+    assert upstream.requests == ["/poster-b.png"]
@@ -0,0 +1,100 @@
+"""Compare the NumPy gradients with the per-row / per-ring drawing they replace.
+
+For every icon size, times the original PIL drawing loops and the
+vectorized generators in gradients.py, and reports how far the outputs
+differ (largest channel difference and share of differing pixels).
+
+    python development/tools/bench_gradients.py --sizes 48 192 1024 4096
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from gradients import linear_gradient, radial_gradient
+
+SIZES = [48, 72, 96, 144, 192, 1024, 4096]
+TOP, BOTTOM = (98, 0, 234), (26, 0, 71)
+INNER, OUTER = (138, 43, 226), (72, 61, 139)
+
+
+def line_gradient(width, height, start, end):
+    """The original create_gradient_background: one draw.line per row"""
+    image = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    for y in range(height):
+        ratio = y / height
+        r = int(start[0] * (1 - ratio) + end[0] * ratio)
+        g = int(start[1] * (1 - ratio) + end[1] * ratio)
+        b = int(start[2] * (1 - ratio) + end[2] * ratio)
+        draw.line([(0, y), (width, y)], fill=(r, g, b, 255))
+    return image
+
+
+def ellipse_gradient(size, inner, outer):
+    """The original create_adaptive_background: one filled circle per radius"""
+    image = Image.new('RGBA', (size, size), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    center = size // 2
+    max_radius = size // 2
+    for radius in range(max_radius, 0, -1):
+        ratio = (max_radius - radius) / max_radius
+        r = int(inner[0] * (1 - ratio) + outer[0] * ratio)
+        g = int(inner[1] * (1 - ratio) + outer[1] * ratio)
+        b = int(inner[2] * (1 - ratio) + outer[2] * ratio)
+        bbox = [center - radius, center - radius, center + radius, center + radius]
+        draw.ellipse(bbox, fill=(r, g, b, 255))
+    return image
+
+
+def timed(function, *args):
+    """Best of a few runs (one for slow ones) and the last result"""
+    best, result, runs = float('inf'), None, 0
+    while runs < 5 and (runs == 0 or best < 1.0):
+        started = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - started)
+        runs += 1
+    return best, result
+
+
+def compare(old, new):
+    old = np.asarray(old, dtype=np.int16)
+    new = np.asarray(new, dtype=np.int16)
+    diff = np.abs(old - new).max(axis=2)
+    return int(diff.max()), round(float((diff > 0).mean()) * 100, 3)
+
+
+def bench(name, old_function, new_function, args):
+    old_seconds, old = timed(old_function, *args)
+    new_seconds, new = timed(new_function, *args)
+    max_diff, differing = compare(old, new)
+    return {
+        'gradient': name,
+        'size': args[0],
+        'pil_ms': round(old_seconds * 1000, 2),
+        'numpy_ms': round(new_seconds * 1000, 2),
+        'speedup': round(old_seconds / new_seconds, 1),
+        'max_channel_diff': max_diff,
+        'differing_pixels_pct': differing,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        results.append(bench('linear', line_gradient, linear_gradient, (size, size, TOP, BOTTOM)))
+        results.append(bench('radial', ellipse_gradient, radial_gradient, (size, INNER, OUTER)))
+    results.append(bench('linear', line_gradient, linear_gradient, (1024, 500, TOP, BOTTOM)))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+"""Build every app icon and promotional graphic in one command.
+
+Renders run in a process pool. Each job renders one image and writes it to
+all of its outputs, so identical files (ic_launcher / ic_launcher_round)
+are encoded once. The 4K master render of a design is also downscaled for
+the 1024px store icon instead of drawing that size again.
+
+A manifest next to the outputs records, per job, a hash of everything the
+render depends on (the drawing scripts, its parameters, Pillow and NumPy
+versions, input images) and the hash of each output. Jobs whose key and
+outputs are unchanged are skipped, so a rebuild without changes only hashes
+a few files.
+
+    python development/tools/build_assets.py [--design streamy] [--force]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import numpy as np
+import PIL
+from PIL import Image
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEVELOPMENT_DIR = os.path.dirname(TOOLS_DIR)
+MANIFEST_NAME = '.asset_manifest.json'
+
+MIPMAPS = {
+    'mipmap-mdpi': 48,
+    'mipmap-hdpi': 72,
+    'mipmap-xhdpi': 96,
+    'mipmap-xxhdpi': 144,
+    'mipmap-xxxhdpi': 192,
+}
+MASTER_SIZE = 4096
+STORE_ICON_SIZE = 1024
+STORE_ICON = 'app_icons/streamy_icon_1024.png'
+
+# Scripts every job depends on: this one (job layout, resizing, encoding)
+# and the shared gradient code.
+COMMON_SOURCES = ['build_assets.py', 'gradients.py']
+# Scripts whose drawing code each design (and the promo graphics) uses.
+SOURCES = {
+    'smart_display': ['icons/generate_smart_display_icons.py', *COMMON_SOURCES],
+    'streamy': ['icon_generation/generate_icons.py', *COMMON_SOURCES],
+    'promotional': ['promotional/create_promotional_assets.py', *COMMON_SOURCES],
+}
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def icon_jobs(design):
+    """Jobs rendering every icon of a design"""
+    jobs = []
+    for folder, size in MIPMAPS.items():
+        res_dir = f'app_icons/android/{folder}'
+        if design == 'smart_display':
+            jobs.append(('icon', [f'{res_dir}/ic_launcher.png', f'{res_dir}/ic_launcher_round.png'], size, 'regular'))
+            jobs.append(('icon', [f'{res_dir}/ic_launcher_foreground.png'], size, 'foreground'))
+            jobs.append(('icon', [f'{res_dir}/ic_launcher_background.png'], size, 'background'))
+        else:
+            jobs.append(('icon', [f'{res_dir}/ic_launcher.png'], size, 'regular'))
+    jobs.append(('master', ['app_icons/streamy_icon_4k.png', STORE_ICON], MASTER_SIZE, 'regular'))
+    return [
+        {
+            'name': f'{design}:{kind}:{size}:{variant}',
+            'sources': SOURCES[design],
+            'render': kind,
+            'params': {'design': design, 'size': size, 'variant': variant},
+            'outputs': outputs,
+            'inputs': [],
+        }
+        for kind, outputs, size, variant in jobs
+    ]
+
+
+def promotional_jobs():
+    return [
+        {
+            'name': 'promotional:feature_graphic',
+            'sources': SOURCES['promotional'],
+            'render': 'feature_graphic',
+            'params': {},
+            'outputs': ['promotional_assets/feature_graphic_1024x500.png'],
+            'inputs': [],
+        },
+        {
+            'name': 'promotional:app_store_background',
+            'sources': SOURCES['promotional'],
+            'render': 'app_store_background',
+            'params': {},
+            'outputs': ['promotional_assets/app_store_screenshot_bg.png'],
+            'inputs': [STORE_ICON],
+        },
+    ]
+
+
+def job_key(job, root):
+    """Hash of everything the job's outputs are derived from"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps(
+        [job['render'], job['params'], job['outputs'], PIL.__version__, np.__version__],
+        sort_keys=True,
+    ).encode())
+    for source in job['sources']:
+        digest.update(file_hash(os.path.join(TOOLS_DIR, source)).encode())
+    for path in job['inputs']:
+        full = os.path.join(root, path)
+        digest.update(file_hash(full).encode() if os.path.exists(full) else b'missing')
+    return digest.hexdigest()
+
+
+def up_to_date(job, key, manifest, root):
+    entry = manifest.get(job['name'])
+    if entry is None or entry['key'] != key:
+        return False
+    for path in job['outputs']:
+        full = os.path.join(root, path)
+        if not os.path.exists(full) or file_hash(full) != entry['outputs'].get(path):
+            return False
+    return True
+
+
+def _draw_icon(design, size, variant):
+    if design == 'smart_display':
+        from icons.generate_smart_display_icons import create_adaptive_background_layer, create_smart_display_icon
+        if variant == 'background':
+            return create_adaptive_background_layer(size)
+        return create_smart_display_icon(size, is_foreground=variant == 'foreground')
+    from icon_generation.generate_icons import create_streamy_icon
+    return create_streamy_icon(size)
+
+
+def _png(image):
+    buffer = BytesIO()
+    image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def _write(root, path, data):
+    full = os.path.join(root, path)
+    os.makedirs(os.path.dirname(full), exist_ok=True)
+    temporary = f'{full}.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(data)
+    os.replace(temporary, full)
+    return hashlib.sha256(data).hexdigest()
+
+
+def run_job(job, root):
+    """Render one job in a worker and write its outputs; returns their hashes"""
+    render, params, outputs = job['render'], job['params'], job['outputs']
+    if render == 'icon':
+        images = [_draw_icon(**params)] * len(outputs)
+    elif render == 'master':
+        master = _draw_icon(**params)
+        images = [master, master.resize((STORE_ICON_SIZE, STORE_ICON_SIZE), Image.Resampling.LANCZOS)]
+    elif render == 'feature_graphic':
+        from promotional.create_promotional_assets import create_feature_graphic
+        images = [create_feature_graphic()]
+    else:
+        from promotional.create_promotional_assets import create_app_store_background
+        icon_path = os.path.join(root, job['inputs'][0])
+        icon = Image.open(icon_path) if os.path.exists(icon_path) else None
+        images = [create_app_store_background(icon)]
+
+    hashes = {}
+    encoded = {}
+    for path, image in zip(outputs, images):
+        # Outputs sharing one image share one encode.
+        if id(image) not in encoded:
+            encoded[id(image)] = _png(image)
+        hashes[path] = _write(root, path, encoded[id(image)])
+    return hashes
+
+
+def build(waves, root, workers, force=False):
+    """Run each wave of jobs in the pool; later waves may read earlier outputs"""
+    manifest_path = os.path.join(root, MANIFEST_NAME)
+    try:
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        manifest = {}
+
+    built = skipped = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for jobs in waves:
+                pending = {}
+                for job in jobs:
+                    key = job_key(job, root)
+                    if not force and up_to_date(job, key, manifest, root):
+                        skipped += 1
+                        continue
+                    pending[job['name']] = (key, pool.submit(run_job, job, root))
+                for name, (key, future) in pending.items():
+                    manifest[name] = {'key': key, 'outputs': future.result()}
+                    built += 1
+                    print(f"Built {name}")
+    finally:
+        # Keep what was built even if a later job failed.
+        os.makedirs(root, exist_ok=True)
+        with open(manifest_path, 'w') as file:
+            json.dump(manifest, file, indent=2, sort_keys=True)
+    return built, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--design', choices=['smart_display', 'streamy'], default='smart_display',
+                        help='icon design to build (default: smart_display, the shipped icons)')
+    parser.add_argument('--out', default=DEVELOPMENT_DIR,
+                        help='directory holding app_icons/ and promotional_assets/')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('--force', action='store_true', help='rebuild even if unchanged')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    # The promotional background embeds the store icon, so it runs after it.
+    built, skipped = build([icon_jobs(args.design), promotional_jobs()], args.out, args.jobs, args.force)
+    print(f"{built} built, {skipped} unchanged in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
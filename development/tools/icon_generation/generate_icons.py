@@ -1,23 +1,20 @@
 import os
+import sys
 from PIL import Image, ImageDraw, ImageFont
 import math
 
+# Shared helpers live in development/tools
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gradients import linear_gradient
+
+# development/app_icons in the repository
+APP_ICONS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'app_icons'
+)
+
 def create_gradient_background(size, colors):
     """Create a gradient background"""
-    image = Image.new('RGBA', (size, size), (0, 0, 0, 0))
-    draw = ImageDraw.Draw(image)
-    
-    # Create gradient effect
-    for y in range(size):
-        # Calculate color interpolation
-        ratio = y / size
-        r = int(colors[0][0] * (1 - ratio) + colors[2][0] * ratio)
-        g = int(colors[0][1] * (1 - ratio) + colors[2][1] * ratio)
-        b = int(colors[0][2] * (1 - ratio) + colors[2][2] * ratio)
-        
-        draw.line([(0, y), (size, y)], fill=(r, g, b, 255))
-    
-    return image
+    return linear_gradient(size, size, colors[0], colors[2])
 
 def create_rounded_rectangle(size, radius, color):
     """Create a rounded rectangle mask"""
@@ -144,7 +141,7 @@ def create_streamy_icon(size):
     
     return image
 
-def create_all_icon_sizes():
+def create_all_icon_sizes(output_dir=APP_ICONS_DIR):
     """Create all required Android icon sizes"""
     sizes = {
         'mipmap-mdpi': 48,
@@ -157,7 +154,6 @@ def create_all_icon_sizes():
     }
     
     # Create output directory
-    output_dir = '/workspaces/Streamy/app_icons'
     os.makedirs(output_dir, exist_ok=True)
     
     # Generate icons
@@ -1,30 +1,21 @@
 import os
+import shutil
+import sys
 from PIL import Image, ImageDraw, ImageFont
 import math
 
+# Shared helpers live in development/tools
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gradients import radial_gradient
+
+# development/app_icons in the repository
+APP_ICONS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'app_icons'
+)
+
 def create_adaptive_background(size, colors):
     """Create an adaptive background with gradient"""
-    image = Image.new('RGBA', (size, size), (0, 0, 0, 0))
-    draw = ImageDraw.Draw(image)
-    
-    # Create radial gradient effect
-    center = size // 2
-    max_radius = size // 2
-    
-    for radius in range(max_radius, 0, -1):
-        # Calculate color interpolation based on radius
-        ratio = (max_radius - radius) / max_radius
-        
-        # Interpolate between colors
-        r = int(colors[0][0] * (1 - ratio) + colors[1][0] * ratio)
-        g = int(colors[0][1] * (1 - ratio) + colors[1][1] * ratio)
-        b = int(colors[0][2] * (1 - ratio) + colors[1][2] * ratio)
-        
-        # Draw circle
-        bbox = [center - radius, center - radius, center + radius, center + radius]
-        draw.ellipse(bbox, fill=(r, g, b, 255))
-    
-    return image
+    return radial_gradient(size, colors[0], colors[1])
 
 def create_rounded_rectangle(size, radius, color):
     """Create a rounded rectangle mask for adaptive icons"""
@@ -140,10 +131,14 @@ def create_smart_display_icon(size, is_foreground=False):
     
     return image
 
+def create_adaptive_background_layer(size):
+    """Create the adaptive icon background layer"""
+    return Image.new('RGBA', (size, size), (138, 43, 226, 255))  # Solid purple background
+
 def create_adaptive_icon_set(size):
     """Create adaptive icon set (background + foreground)"""
     # Background (solid color or gradient)
-    bg_image = Image.new('RGBA', (size, size), (138, 43, 226, 255))  # Solid purple background
+    bg_image = create_adaptive_background_layer(size)
     
     # Foreground (monochrome icon)
     fg_image = create_smart_display_icon(size, is_foreground=True)
@@ -153,7 +148,7 @@ def create_adaptive_icon_set(size):
     
     return bg_image, fg_image, regular_icon
 
-def create_all_icon_sizes():
+def create_all_icon_sizes(output_dir=APP_ICONS_DIR):
     """Create all required Android icon sizes with adaptive support"""
     sizes = {
         'mipmap-mdpi': 48,
@@ -166,7 +161,6 @@ def create_all_icon_sizes():
     }
     
     # Create output directory
-    output_dir = '/workspaces/Streamy/app_icons'
     os.makedirs(output_dir, exist_ok=True)
     
     # Generate icons
@@ -186,12 +180,12 @@ def create_all_icon_sizes():
             bg_icon.save(f"{res_dir}/ic_launcher_background.png", "PNG")
             fg_icon.save(f"{res_dir}/ic_launcher_foreground.png", "PNG")
             
-            # Also create round icon
-            regular_icon.save(f"{res_dir}/ic_launcher_round.png", "PNG")
+            # The round icon is the same image
+            shutil.copyfile(f"{res_dir}/ic_launcher.png", f"{res_dir}/ic_launcher_round.png")
             
         else:
             # Save special sizes (regular icon only)
-            _, _, regular_icon = create_adaptive_icon_set(size)
+            regular_icon = create_smart_display_icon(size, is_foreground=False)
             regular_icon.save(f"{output_dir}/streamy_icon_{folder}.png", "PNG")
     
     print("All icons generated successfully!")
@@ -1,5 +1,15 @@
 from PIL import Image, ImageDraw, ImageFont
 import os
+import sys
+
+# Shared helpers live in development/tools
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gradients import linear_gradient
+
+# development/ in the repository, where the generated assets are kept
+DEVELOPMENT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PROMOTIONAL_DIR = os.path.join(DEVELOPMENT_DIR, 'promotional_assets')
+ICON_PATH = os.path.join(DEVELOPMENT_DIR, 'app_icons', 'streamy_icon_1024.png')
 
 def create_feature_graphic():
     """Create a feature graphic for Google Play Store (1024x500)"""
@@ -11,18 +21,10 @@ def create_feature_graphic():
     very_dark = (26, 0, 71)       # #1A0047
     white = (255, 255, 255, 255)
     
-    # Create base image
-    image = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    # Create base image with gradient background
+    image = linear_gradient(width, height, primary_color, very_dark)
     draw = ImageDraw.Draw(image)
     
-    # Create gradient background
-    for y in range(height):
-        ratio = y / height
-        r = int(primary_color[0] * (1 - ratio) + very_dark[0] * ratio)
-        g = int(primary_color[1] * (1 - ratio) + very_dark[1] * ratio)
-        b = int(primary_color[2] * (1 - ratio) + very_dark[2] * ratio)
-        draw.line([(0, y), (width, y)], fill=(r, g, b, 255))
-    
     # Add some geometric elements
     center_x, center_y = width // 2, height // 2
     
@@ -101,9 +103,19 @@ def create_feature_graphic():
     
     return image
 
-def create_promotional_assets():
+def create_app_store_background(icon=None):
+    """Create the App Store screenshot background (1242x2688 for iPhone X)"""
+    app_store_bg = Image.new('RGBA', (1242, 2688), (26, 0, 71, 255))
+    
+    # Add the app icon to center
+    if icon is not None:
+        icon = icon.resize((400, 400), Image.Resampling.LANCZOS)
+        app_store_bg.paste(icon, (421, 1144), icon)
+    
+    return app_store_bg
+
+def create_promotional_assets(output_dir=PROMOTIONAL_DIR, icon_path=ICON_PATH):
     """Create promotional assets for app store"""
-    output_dir = '/workspaces/Streamy/promotional_assets'
     os.makedirs(output_dir, exist_ok=True)
     
     # Feature graphic
@@ -112,17 +124,9 @@ def create_promotional_assets():
     feature_graphic.save(f"{output_dir}/feature_graphic_1024x500.png", "PNG")
     
     # Create different sizes for various stores
-    # App Store screenshot background (1242x2688 for iPhone X)
     print("Creating App Store assets...")
-    app_store_bg = Image.new('RGBA', (1242, 2688), (26, 0, 71, 255))
-    
-    # Add the app icon to center
-    icon_path = '/workspaces/Streamy/app_icons/streamy_icon_1024.png'
-    if os.path.exists(icon_path):
-        icon = Image.open(icon_path)
-        icon = icon.resize((400, 400), Image.Resampling.LANCZOS)
-        app_store_bg.paste(icon, (421, 1144), icon)
-    
+    icon = Image.open(icon_path) if os.path.exists(icon_path) else None
+    app_store_bg = create_app_store_background(icon)
     app_store_bg.save(f"{output_dir}/app_store_screenshot_bg.png", "PNG")
     
     print(f"Promotional assets created in: {output_dir}")
@@ -0,0 +1,18 @@
+import os
+
+import pytest
+from PIL import Image
+
+from build_assets import icon_jobs, run_job
+
+
+@pytest.mark.parametrize('design', ['smart_display', 'streamy'])
+def test_renders_every_icon_of_a_design(design, tmp_path):
+    jobs = [job for job in icon_jobs(design) if job['params']['size'] == 48]
+    assert jobs
+    for job in jobs:
+        hashes = run_job(job, str(tmp_path))
+        assert sorted(hashes) == sorted(job['outputs'])
+        for path in job['outputs']:
+            with Image.open(os.path.join(tmp_path, path)) as image:
+                assert image.size == (48, 48)
@@ -1,4 +1,5 @@
 import 'dart:convert';
+import 'dart:io' show gzip;
 import 'package:http/http.dart' as http;
 import '../models/media_item.dart';
 
@@ -40,6 +41,122 @@ class ApiService {
     }
   }
 
+  /// Fetches several items in one round trip. The result follows the order
+  /// of [ids] and holds null for ids the server does not know. [fields]
+  /// limits the returned fields (the id and title are always included).
+  Future<List<MediaItem?>> getMediaByIds(
+    List<String> ids, {
+    List<String>? fields,
+  }) async {
+    try {
+      final response = await http.post(
+        Uri.parse('$baseUrl/media/batch'),
+        headers: {'Content-Type': 'application/json'},
+        body: jsonEncode({
+          'ids': ids,
+          if (fields != null) 'fields': {...fields, 'title'}.toList(),
+        }),
+      );
+
+      if (response.statusCode == 200) {
+        final Map<String, dynamic> data = jsonDecode(response.body);
+        return (data['items'] as List)
+            .map((item) => item == null ? null : MediaItem.fromJson(item))
+            .toList();
+      } else {
+        throw Exception('Failed to load media items: ${response.statusCode}');
+      }
+    } catch (e) {
+      throw Exception('Failed to connect to API: $e');
+    }
+  }
+
+  /// Lists media matching all given filters, served from the backend's
+  /// facet index. Several [genres] or [qualities] match any of them.
+  Future<List<MediaItem>> getMediaByFilters({
+    List<String> genres = const [],
+    int? yearFrom,
+    int? yearTo,
+    List<String> qualities = const [],
+    int limit = 100,
+  }) async {
+    try {
+      final uri = Uri.parse('$baseUrl/media').replace(queryParameters: {
+        if (genres.isNotEmpty) 'genre': genres,
+        if (yearFrom != null) 'year_from': '$yearFrom',
+        if (yearTo != null) 'year_to': '$yearTo',
+        if (qualities.isNotEmpty) 'quality': qualities,
+        'limit': '$limit',
+      });
+      final response = await http.get(uri);
+
+      if (response.statusCode == 200) {
+        final Map<String, dynamic> data = jsonDecode(response.body);
+        return (data['items'] as List)
+            .map((item) => MediaItem.fromJson(item))
+            .toList();
+      } else {
+        throw Exception('Failed to load media: ${response.statusCode}');
+      }
+    } catch (e) {
+      throw Exception('Failed to connect to API: $e');
+    }
+  }
+
+  /// Playlist URL for playing a media source through the backend's HLS
+  /// proxy, which caches segments shared by all viewers.
+  String hlsUrl(String mediaId, {int source = 0}) {
+    return '$baseUrl/hls/${Uri.encodeComponent(mediaId)}/index.m3u8?source=$source';
+  }
+
+  /// Sends a batch of watch events, each a map with `media_id`, `type`
+  /// ('play' or 'progress') and an optional `position` in seconds, as one
+  /// gzip-compressed request. Returns how many events were accepted.
+  Future<int> sendWatchEvents(List<Map<String, dynamic>> events) async {
+    try {
+      final response = await http.post(
+        Uri.parse('$baseUrl/events'),
+        headers: {
+          'Content-Type': 'application/json',
+          'Content-Encoding': 'gzip',
+        },
+        body: gzip.encode(utf8.encode(jsonEncode({'events': events}))),
+      );
+
+      if (response.statusCode == 200) {
+        final Map<String, dynamic> data = jsonDecode(response.body);
+        return data['accepted'] as int;
+      } else {
+        throw Exception('Failed to send watch events: ${response.statusCode}');
+      }
+    } catch (e) {
+      throw Exception('Failed to connect to API: $e');
+    }
+  }
+
+  /// Ids of the most watched media across all viewers over the last hour
+  /// ('1h') or day ('24h'), most watched first.
+  Future<List<String>> getTrending({String window = '24h', int limit = 20}) async {
+    try {
+      final uri = Uri.parse('$baseUrl/trending').replace(queryParameters: {
+        'window': window,
+        'limit': '$limit',
+      });
+      final response = await http.get(uri);
+
+      if (response.statusCode == 200) {
+        final Map<String, dynamic> data = jsonDecode(response.body);
+        return (data['items'] as List)
+            .map((item) => item['id'] as String)
+            .toList();
+      } else {
+        throw Exception('Failed to load trending media: ${response.statusCode}');
+      }
+    } catch (e) {
+      throw Exception('Failed to connect to API: $e');
+    }
+  }
+
   Future<List<MediaItem>> searchMedia(String query) async {
     try {
       final response = await http.get(Uri.parse('$baseUrl/search/$query'));
@@ -4,6 +4,7 @@ import 'package:flutter/foundation.dart';
 import 'package:hive/hive.dart';
 import 'package:http/http.dart' as http;
 import '../models/media_item.dart';
+import 'api_service.dart';
 import 'web_scraping_service.dart';
 
 /// Enhanced Content Discovery and Search Service
@@ -23,6 +24,7 @@ class ContentDiscoveryService extends ChangeNotifier {
   late Box<TrendingCache> _trendingCacheBox;
   
   final WebScrapingService _webScrapingService = WebScrapingService();
+  final ApiService _apiService = ApiService();
   final http.Client _httpClient = http.Client();
   
   // Search debouncing
@@ -39,6 +41,12 @@ class ContentDiscoveryService extends ChangeNotifier {
   List<MediaItem> _currentSearchResults = [];
   bool _isSearching = false;
   
+  // Watch events waiting to be sent to the backend in one batch
+  final List<Map<String, dynamic>> _pendingWatchEvents = [];
+  Timer? _watchEventFlushTimer;
+  static const Duration _watchEventFlushDelay = Duration(seconds: 30);
+  static const int _maxPendingWatchEvents = 1000;
+  
   // Trending content
   List<MediaItem> _trendingMovies = [];
   List<MediaItem> _trendingTVShows = [];
@@ -152,11 +160,10 @@ class ContentDiscoveryService extends ChangeNotifier {
     return results;
   }
   
-  /// Search TMDB API
+  /// Search TMDB through the backend's caching metadata proxy, which
+  /// holds the API key
   Future<List<MediaItem>> _searchTMDB(String query) async {
-    // Note: You'll need to add your TMDB API key
-    const apiKey = 'YOUR_TMDB_API_KEY';
-    final url = 'https://api.themoviedb.org/3/search/multi?api_key=$apiKey&query=${Uri.encodeComponent(query)}';
+    final url = '${_apiService.baseUrl}/metadata/tmdb/search?query=${Uri.encodeComponent(query)}';
     
     try {
       final response = await _httpClient.get(Uri.parse(url));
@@ -182,11 +189,10 @@ class ContentDiscoveryService extends ChangeNotifier {
     return [];
   }
   
-  /// Search OMDB API
+  /// Search OMDB through the backend's caching metadata proxy, which
+  /// holds the API key
   Future<List<MediaItem>> _searchOMDB(String query) async {
-    // Note: You'll need to add your OMDB API key
-    const apiKey = 'YOUR_OMDB_API_KEY';
-    final url = 'http://www.omdbapi.com/?apikey=$apiKey&s=${Uri.encodeComponent(query)}';
+    final url = '${_apiService.baseUrl}/metadata/omdb/search?query=${Uri.encodeComponent(query)}';
     
     try {
       final response = await _httpClient.get(Uri.parse(url));
@@ -409,9 +415,48 @@ class ContentDiscoveryService extends ChangeNotifier {
     );
     
     await _watchHistoryBox.put(item.id, historyItem);
+    _queueWatchEvent(item, watchedDuration);
     notifyListeners();
   }
   
+  /// Queue a play or progress event for the backend's trending rankings
+  void _queueWatchEvent(MediaItem item, Duration? watchedDuration) {
+    final position = watchedDuration ?? Duration.zero;
+    _pendingWatchEvents.add({
+      'media_id': item.id,
+      'type': position > Duration.zero ? 'progress' : 'play',
+      if (position > Duration.zero) 'position': position.inMilliseconds / 1000,
+    });
+    if (_pendingWatchEvents.length >= _maxPendingWatchEvents) {
+      _flushWatchEvents();
+    } else {
+      _watchEventFlushTimer ??= Timer(_watchEventFlushDelay, _flushWatchEvents);
+    }
+  }
+  
+  /// Send queued watch events in one request, keeping them on failure
+  Future<void> _flushWatchEvents() async {
+    _watchEventFlushTimer?.cancel();
+    _watchEventFlushTimer = null;
+    if (_pendingWatchEvents.isEmpty) return;
+    
+    final events = List<Map<String, dynamic>>.of(_pendingWatchEvents);
+    _pendingWatchEvents.clear();
+    try {
+      await _apiService.sendWatchEvents(events);
+    } catch (e) {
+      if (kDebugMode) {
+        print('Error sending watch events: $e');
+      }
+      // Retried with the next flush; the oldest events go first if offline
+      _pendingWatchEvents.insertAll(0, events);
+      if (_pendingWatchEvents.length > _maxPendingWatchEvents) {
+        _pendingWatchEvents.removeRange(
+            0, _pendingWatchEvents.length - _maxPendingWatchEvents);
+      }
+    }
+  }
+  
   /// Get watch history
   List<WatchHistoryItem> getWatchHistory() {
     final history = _watchHistoryBox.values.toList();
@@ -432,13 +477,18 @@ class ContentDiscoveryService extends ChangeNotifier {
   /// Update trending content
   Future<void> _updateTrendingContent() async {
     try {
-      // This would typically call external APIs like TMDB
-      // For now, we'll use placeholder logic
+      // Ranked by the backend from everyone's play and progress events
+      final trendingIds = await _apiService.getTrending(window: '24h');
+      final popular = trendingIds.isEmpty
+          ? <MediaItem>[]
+          : (await _apiService.getMediaByIds(trendingIds))
+              .whereType<MediaItem>()
+              .toList();
       
       final trendingCache = TrendingCache(
         movies: [],
         tvShows: [],
-        popular: [],
+        popular: popular,
         lastUpdated: DateTime.now(),
       );
       
@@ -478,8 +528,15 @@ class ContentDiscoveryService extends ChangeNotifier {
   
   /// Get content by genre
   Future<List<MediaItem>> getContentByGenre(String genre) async {
-    // Implementation for genre-based content discovery
-    return [];
+    // Filtered on the server by its genre index
+    try {
+      return await _apiService.getMediaByFilters(genres: [genre]);
+    } catch (e) {
+      if (kDebugMode) {
+        print('Genre browse error: $e');
+      }
+      return [];
+    }
   }
   
   /// Get recommendations based on watch history
@@ -494,6 +551,7 @@ class ContentDiscoveryService extends ChangeNotifier {
   @override
   void dispose() {
     _searchDebounceTimer?.cancel();
+    _flushWatchEvents();
     _httpClient.close();
     super.dispose();
   }